@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+bulk_load_benchmark.py
+Benchmark the update Lambda's bulk loader.
+
+Streams synthetic chunk records (random text and a vector of the index
+profile's size) through BulkLoader and reports docs/s, requests, retries
+and the batch size the loader settled on, for fixed and adaptive batch
+sizes and several worker counts.
+
+By default the records go to InMemoryBulkClient, the local stand-in with
+per-request and per-document latency that rejects items with 429 above a
+concurrent document capacity. ``--host`` loads a real OpenSearch instead,
+e.g. a local container started with
+``docker run -p 9200:9200 -e discovery.type=single-node
+-e DISABLE_SECURITY_PLUGIN=true opensearchproject/opensearch``.
+
+Usage:
+    python benchmarks/bulk_load_benchmark.py [--docs 5000] [--dimensions 256]
+    python benchmarks/bulk_load_benchmark.py --docs 20000 --dimensions 1536
+    python benchmarks/bulk_load_benchmark.py --workers 1,4,8 --capacity 2000
+    python benchmarks/bulk_load_benchmark.py --host http://localhost:9200
+"""
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "layers", "index_layer")
+)
+
+from bulk_loader import BulkLoader, InMemoryBulkClient  # noqa: E402
+
+INDEX_NAME = "bulk-load-benchmark"
+VECTOR_FIELD_NAME = "bedrock-knowledge-base-default-vector"
+WORDS = "mash tun valve leak pressure gasket seal boil kettle fermenter pump".split()
+
+
+def records(count, dimensions, seed=0):
+    """
+    Yield chunk records shaped like the direct ingestion's documents.
+    """
+    generator = random.Random(seed)
+    for i in range(count):
+        yield {
+            VECTOR_FIELD_NAME: [
+                round(generator.uniform(-1, 1), 6) for _ in range(dimensions)
+            ],
+            "AMAZON_BEDROCK_TEXT_CHUNK": " ".join(generator.choices(WORDS, k=300)),
+            "AMAZON_BEDROCK_METADATA": json.dumps({"source": f"s3://bench/{i}.md"}),
+            "x-amz-bedrock-kb-source-uri": f"s3://bench/{i}.md",
+        }
+
+
+def opensearch_client(host, dimensions):
+    """
+    Client for a local OpenSearch with a fresh benchmark index.
+    """
+    from opensearchpy import OpenSearch
+
+    client = OpenSearch(hosts=[host], pool_maxsize=32, timeout=60)
+    if client.indices.exists(index=INDEX_NAME):
+        client.indices.delete(index=INDEX_NAME)
+    client.indices.create(
+        index=INDEX_NAME,
+        body={
+            "settings": {"index.knn": True},
+            "mappings": {
+                "properties": {
+                    VECTOR_FIELD_NAME: {"type": "knn_vector", "dimension": dimensions}
+                }
+            },
+        },
+    )
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--workers", default="1,4,8")
+    parser.add_argument(
+        "--batch-sizes",
+        default="50,500",
+        help="Fixed batch sizes compared with the adaptive loader",
+    )
+    parser.add_argument("--target-latency", type=float, default=0.5)
+    parser.add_argument("--host", help="OpenSearch URL, else the in-memory stand-in")
+    parser.add_argument("--base-latency", type=float, default=0.02)
+    parser.add_argument("--latency-per-doc", type=float, default=0.0005)
+    parser.add_argument("--capacity", type=int, default=3000)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    configurations = [("adaptive", None)] + [
+        (f"fixed {size}", int(size)) for size in args.batch_sizes.split(",")
+    ]
+    print(
+        f"{'batching':<12} {'workers':>7} {'docs/s':>9} {'requests':>9} "
+        f"{'retries':>8} {'failed':>7} {'final batch':>12}"
+    )
+    for workers in [int(w) for w in args.workers.split(",")]:
+        for name, size in configurations:
+            if args.host:
+                client = opensearch_client(args.host, args.dimensions)
+            else:
+                client = InMemoryBulkClient(
+                    base_latency=args.base_latency,
+                    latency_per_doc=args.latency_per_doc,
+                    capacity=args.capacity,
+                    failure_rate=args.failure_rate,
+                )
+            loader = BulkLoader(
+                client,
+                INDEX_NAME,
+                workers=workers,
+                initial_batch_size=size or 100,
+                min_batch_size=size or 10,
+                max_batch_size=size or 1000,
+                target_latency=args.target_latency,
+                base_delay=0.05,
+                progress_interval=float("inf"),
+            )
+            stats = loader.load(records(args.docs, args.dimensions))
+            print(
+                f"{name:<12} {workers:>7} {stats['docs_per_second']:>9} "
+                f"{stats['requests']:>9} {stats['retries']:>8} "
+                f"{stats['failed']:>7} {stats['batch_size']:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+chat_replay.py
+Offline record/replay load test of the /chat API.
+
+``record`` calls the live agent and saves each ``invoke_agent`` event
+stream (chunks, traces and knowledge base references) together with the
+time every event arrived to a fixture file.
+
+``run`` replays fixtures through fake AWS clients with the recorded
+inter-event timing and drives ``index.handler`` with synthetic API Gateway
+events at the requested concurrency. It reports latency percentiles, CPU
+time, peak memory and log bytes per request. No network access is needed.
+
+Usage:
+    python benchmarks/chat_replay.py record --agent-id AGENTID "How do I clean the mash tun?"
+    python benchmarks/chat_replay.py run [--requests 200] [--concurrency 8] [--speed 1.0]
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import random
+import argparse
+import resource
+import statistics
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(BENCHMARK_DIR, "..", "lambdas", "invoke-lambda")
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures", "chat")
+
+ORIGIN_VERIFY_VALUE = "replay-origin-verify"
+
+# Environment of the Lambda under test. The chat state table is left unset so
+# jobs and sessions use the in-memory stores, and identical fixture queries
+# are not coalesced unless --coalesce-window is given.
+ENVIRONMENT = {
+    "AGENT_ID": "REPLAY",
+    "REGION_NAME": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "replay",
+    "AWS_SECRET_ACCESS_KEY": "replay",
+    "X_ORIGIN_VERIFY_SECRET_ARN": "arn:aws:secretsmanager:us-east-1:000000000000:secret:replay",
+    "AWS_LAMBDA_FUNCTION_NAME": "",
+    "POWERTOOLS_SERVICE_NAME": "invoke-lambda",
+    "POWERTOOLS_TRACE_DISABLED": "true",
+    "LATENCY_SINKS": "emf",
+    "COALESCE_WINDOW_SECONDS": "0",
+}
+
+
+def encode_value(value):
+    """
+    JSON default hook for event stream payloads.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    return str(value)
+
+
+def decode_value(value):
+    """
+    JSON object hook restoring payloads written by encode_value().
+    """
+    if set(value) == {"__bytes__"}:
+        return base64.b64decode(value["__bytes__"])
+    return value
+
+
+def cited_uris(event):
+    """
+    Collect the S3 URIs of knowledge base references in an event.
+    """
+    uris = []
+    observation = (
+        event.get("trace", {})
+        .get("trace", {})
+        .get("orchestrationTrace", {})
+        .get("observation", {})
+    )
+    output = observation.get("knowledgeBaseLookupOutput", {})
+    for reference in output.get("retrievedReferences", []):
+        uri = reference.get("location", {}).get("s3Location", {}).get("uri")
+        if uri:
+            uris.append(uri)
+
+    for citation in event.get("chunk", {}).get("attribution", {}).get("citations", []):
+        for reference in citation.get("retrievedReferences", []):
+            uri = reference.get("location", {}).get("s3Location", {}).get("uri")
+            if uri:
+                uris.append(uri)
+
+    return uris
+
+
+def record(args):
+    """
+    Record live agent event streams to fixture files.
+    """
+    import boto3
+
+    session = boto3.session.Session(region_name=args.region)
+    agent_client = session.client("bedrock-agent")
+    runtime_client = session.client("bedrock-agent-runtime")
+    s3_client = session.client("s3")
+
+    alias_id = args.alias_id
+    if not alias_id:
+        sys.path.insert(0, LAMBDA_DIR)
+        os.environ.setdefault("AGENT_ID", args.agent_id)
+        os.environ.setdefault("REGION_NAME", args.region)
+        from routes.chat import get_highest_agent_version_alias_id
+
+        alias_id = get_highest_agent_version_alias_id(
+            agent_client.list_agent_aliases(agentId=args.agent_id)
+        )
+
+    os.makedirs(args.output, exist_ok=True)
+    for query in args.queries:
+        start = time.perf_counter()
+        response = runtime_client.invoke_agent(
+            agentId=args.agent_id,
+            agentAliasId=alias_id,
+            sessionId=str(uuid.uuid4()),
+            enableTrace=True,
+            inputText=query,
+        )
+        response_ms = (time.perf_counter() - start) * 1000
+
+        events = []
+        objects = {}
+        for event in response["completion"]:
+            offset_ms = (time.perf_counter() - start) * 1000
+            events.append({"offset_ms": round(offset_ms, 1), "event": event})
+            for uri in cited_uris(event):
+                if uri in objects:
+                    continue
+                bucket, _, key = uri.split("//")[1].partition("/")
+                head = s3_client.head_object(Bucket=bucket, Key=key)
+                objects[uri] = {"size": head["ContentLength"]}
+
+        fixture = {
+            "query": query,
+            "response_ms": round(response_ms, 1),
+            "events": events,
+            "objects": objects,
+        }
+        name = "".join(c if c.isalnum() else "_" for c in query.lower())[:60]
+        path = os.path.join(args.output, f"{name.strip('_')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, indent=2, default=encode_value)
+        print(f"{path}: {len(events)} events in {events[-1]['offset_ms']:.0f} ms")
+
+
+def load_fixtures(path):
+    """
+    Load all fixture files from a directory.
+    """
+    fixtures = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".json"):
+            with open(os.path.join(path, name), encoding="utf-8") as f:
+                fixtures.append(json.load(f, object_hook=decode_value))
+
+    if not fixtures:
+        raise SystemExit(f"No fixtures found in {path}")
+
+    return fixtures
+
+
+class FakeAgentClient:
+    """
+    Stand-in for the bedrock-agent client with one published alias.
+    """
+
+    def list_agent_aliases(self, **kwargs):
+        return {
+            "agentAliasSummaries": [
+                {
+                    "agentAliasId": "REPLAYALIAS",
+                    "routingConfiguration": [{"agentVersion": "1"}],
+                }
+            ]
+        }
+
+
+class FakeAgentRuntimeClient:
+    """
+    Replays recorded event streams for invoke_agent.
+
+    Fixtures are matched by query text, unknown queries take the next
+    fixture in turn. ``speed`` scales the recorded timing; 0 replays
+    without any delay.
+    """
+
+    def __init__(self, fixtures, speed=1.0):
+        self.fixtures = {fixture["query"]: fixture for fixture in fixtures}
+        self.ordered = fixtures
+        self.speed = speed
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _sleep_until(self, start, offset_ms):
+        delay = start + offset_ms * self.speed / 1000 - time.perf_counter()
+        if delay > 0:
+            # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
+            time.sleep(delay)  # nosem: arbitrary-sleep
+
+    def invoke_agent(self, **kwargs):
+        fixture = self.fixtures.get(kwargs["inputText"])
+        if fixture is None:
+            with self._lock:
+                fixture = self.ordered[self._next % len(self.ordered)]
+                self._next += 1
+
+        start = time.perf_counter()
+        self._sleep_until(start, fixture["response_ms"])
+
+        def completion():
+            for entry in fixture["events"]:
+                self._sleep_until(start, entry["offset_ms"])
+                yield entry["event"]
+
+        return {"completion": completion(), "sessionId": kwargs["sessionId"]}
+
+
+class FakeS3Client:
+    """
+    Serves cited objects with their recorded size.
+    """
+
+    def __init__(self, fixtures):
+        self.sizes = {}
+        for fixture in fixtures:
+            for uri, info in fixture.get("objects", {}).items():
+                self.sizes[uri.split("//")[1]] = info.get("size", 0)
+
+    def get_object(self, Bucket, Key):
+        size = self.sizes.get(f"{Bucket}/{Key}", 0)
+        # Binary content, like the docx documents the knowledge base cites.
+        return {"Body": io.BytesIO(b"\xff" * size), "ContentLength": size}
+
+
+class FakeSecretsManagerClient:
+    def get_secret_value(self, **kwargs):
+        return {"SecretString": json.dumps({"headerValue": ORIGIN_VERIFY_VALUE})}
+
+
+class FakeLambdaContext:
+    function_name = "replay-invoke-lambda"
+    function_version = "$LATEST"
+    memory_limit_in_mb = 1024
+    invoked_function_arn = (
+        "arn:aws:lambda:us-east-1:000000000000:function:replay-invoke-lambda"
+    )
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+def api_gateway_event(query, session_id):
+    """
+    Build a POST /v1/chat proxy event as API Gateway sends it.
+    """
+    request_id = str(uuid.uuid4())
+    headers = {
+        "Content-Type": "application/json",
+        "Host": "replay.execute-api.us-east-1.amazonaws.com",
+        "X-Origin-Verify": ORIGIN_VERIFY_VALUE,
+    }
+    return {
+        "resource": "/{proxy+}",
+        "path": "/v1/chat",
+        "httpMethod": "POST",
+        "headers": headers,
+        "multiValueHeaders": {name: [value] for name, value in headers.items()},
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "pathParameters": {"proxy": "v1/chat"},
+        "stageVariables": None,
+        "requestContext": {
+            "resourcePath": "/{proxy+}",
+            "httpMethod": "POST",
+            "path": "/prod/v1/chat",
+            "stage": "prod",
+            "requestId": request_id,
+            "requestTimeEpoch": int(time.time() * 1000),
+            "identity": {"sourceIp": "127.0.0.1", "userAgent": "chat-replay"},
+        },
+        "body": json.dumps({"query": query, "session_id": session_id}),
+        "isBase64Encoded": False,
+    }
+
+
+class CountingStream(io.TextIOBase):
+    """
+    Stdout replacement that counts bytes written per thread.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def reset_thread(self):
+        self.local.count = 0
+
+    def thread_count(self):
+        return getattr(self.local, "count", 0)
+
+    def write(self, text):
+        size = len(text.encode("utf-8"))
+        self.local.count = getattr(self.local, "count", 0) + size
+        with self._lock:
+            self.total += size
+        return len(text)
+
+    def writable(self):
+        return True
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(args):
+    """
+    Replay fixtures through index.handler and print a report.
+    """
+    for assignment in args.env:
+        name, _, value = assignment.partition("=")
+        ENVIRONMENT[name] = value
+    if args.coalesce_window is not None:
+        ENVIRONMENT["COALESCE_WINDOW_SECONDS"] = str(args.coalesce_window)
+    os.environ.update(ENVIRONMENT)
+
+    fixtures = load_fixtures(args.fixtures)
+    sys.path.insert(0, LAMBDA_DIR)
+
+    # The Lambda logs to stdout; count it instead of printing it.
+    real_stdout = sys.stdout
+    stream = CountingStream(real_stdout)
+    sys.stdout = stream
+
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+
+    import clients
+
+    clients.set_client("bedrock-agent", FakeAgentClient())
+    clients.set_client(
+        "bedrock-agent-runtime", FakeAgentRuntimeClient(fixtures, args.speed)
+    )
+    clients.set_client("s3", FakeS3Client(fixtures))
+    clients.set_client("secretsmanager", FakeSecretsManagerClient())
+
+    init_start = time.perf_counter()
+    import index
+
+    init_ms = (time.perf_counter() - init_start) * 1000
+    init_log_bytes = stream.total
+
+    rng = random.Random(args.seed)
+    queries = [rng.choice(fixtures)["query"] for _ in range(args.requests)]
+
+    def one_request(i):
+        stream.reset_thread()
+        event = api_gateway_event(queries[i], f"replay-{i % args.sessions}")
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        response = index.handler(event, FakeLambdaContext())
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        ok = response["statusCode"] == 200 and json.loads(response["body"]).get("ok")
+        return {
+            "latency_ms": elapsed_ms,
+            "cpu_ms": (time.thread_time() - cpu_start) * 1000,
+            "log_bytes": stream.thread_count(),
+            "ok": bool(ok),
+        }
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(one_request, range(args.requests)))
+    wall_s = time.perf_counter() - start
+    process_cpu_s = time.process_time() - cpu_start
+
+    peak_bytes = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+    sys.stdout = real_stdout
+
+    latencies = [r["latency_ms"] for r in results]
+    cpu = [r["cpu_ms"] for r in results]
+    log_bytes = [r["log_bytes"] for r in results]
+    failures = sum(not r["ok"] for r in results)
+
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}, "
+        f"{len(fixtures)} fixtures, speed {args.speed}"
+    )
+    print(f"  init {init_ms:.1f} ms, {init_log_bytes} log bytes")
+    print(
+        f"  throughput {args.requests / wall_s:.1f} req/s, "
+        f"wall {wall_s:.2f} s, failures {failures}"
+    )
+    print()
+    print(f"{'':<20} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}")
+    for label, values in (
+        ("latency ms", latencies),
+        ("cpu ms", cpu),
+        ("log bytes", log_bytes),
+    ):
+        print(
+            f"{label:<20} {percentile(values, 50):>10.1f} {percentile(values, 90):>10.1f} "
+            f"{percentile(values, 99):>10.1f} {max(values):>10.1f}"
+        )
+    print()
+    print(f"  process cpu {process_cpu_s * 1000 / args.requests:.2f} ms/request")
+    print(
+        f"  mean log bytes {statistics.mean(log_bytes):.0f}/request, "
+        f"total {stream.total} bytes"
+    )
+    if peak_bytes:
+        print(f"  python heap peak {peak_bytes / 2**20:.1f} MiB (tracemalloc)")
+    print(
+        f"  max rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Record live event streams")
+    record_parser.add_argument("queries", nargs="+")
+    record_parser.add_argument("--agent-id", required=True)
+    record_parser.add_argument("--alias-id", help="Defaults to the newest alias")
+    record_parser.add_argument("--region", default="us-east-1")
+    record_parser.add_argument("--output", default=FIXTURE_DIR)
+    record_parser.set_defaults(func=record)
+
+    run_parser = commands.add_parser("run", help="Replay fixtures under load")
+    run_parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    run_parser.add_argument("--requests", type=int, default=200)
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument(
+        "--sessions", type=int, default=16, help="Distinct chat sessions"
+    )
+    run_parser.add_argument(
+        "--speed", type=float, default=1.0, help="Timing scale, 0 for no delay"
+    )
+    run_parser.add_argument("--coalesce-window", type=int)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--no-tracemalloc", action="store_true")
+    run_parser.add_argument(
+        "--env", action="append", default=[], metavar="NAME=VALUE",
+        help="Extra environment for the Lambda, e.g. TRACE_LEVEL=full",
+    )
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
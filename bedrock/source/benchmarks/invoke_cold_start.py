@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+invoke_cold_start.py
+Startup profile of the invoke Lambda.
+
+Imports ``index`` from lambdas/invoke-lambda in fresh interpreters with
+``-X importtime`` and reports the total init time plus the import time
+spent in each of the heaviest top-level packages. Prefetching is disabled so
+no AWS calls are made.
+
+Usage:
+    python benchmarks/invoke_cold_start.py [--runs 5] [--top 15]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+LAMBDA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "invoke-lambda"
+)
+
+ENVIRONMENT = {
+    "AGENT_ID": "BENCHMARK",
+    "REGION_NAME": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "X_ORIGIN_VERIFY_SECRET_ARN": "arn:aws:secretsmanager:us-east-1:000000000000:secret:benchmark",
+    "PREFETCH_ON_INIT": "false",
+    "POWERTOOLS_TRACE_DISABLED": "true",
+}
+
+
+def profile_once():
+    """
+    Import the handler module once in a fresh interpreter.
+
+    Returns:
+        tuple: Wall time in milliseconds and import microseconds per
+            top-level package.
+    """
+    env = dict(os.environ, **ENVIRONMENT)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import index"],
+        cwd=LAMBDA_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[12:].split("|")
+        # Attribute each module's own import time to its top-level package.
+        packages[name.strip().split(".")[0]] += int(self_us)
+
+    return wall_ms, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    wall_times = []
+    totals = defaultdict(list)
+    for _ in range(args.runs):
+        wall_ms, packages = profile_once()
+        wall_times.append(wall_ms)
+        for name, import_us in packages.items():
+            totals[name].append(import_us / 1000)
+
+    print(f"Interpreter start + import index over {args.runs} runs")
+    print(
+        f"  median {statistics.median(wall_times):.1f} ms, "
+        f"max {max(wall_times):.1f} ms"
+    )
+    print()
+    print(f"{'package':<40} {'median ms':>10}")
+    ranked = sorted(
+        totals.items(), key=lambda item: statistics.median(item[1]), reverse=True
+    )
+    for name, values in ranked[: args.top]:
+        print(f"{name:<40} {statistics.median(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,793 @@
+#!/usr/bin/env python3
+"""
+retrieval_benchmark.py
+Offline benchmark of vector index and chunking parameters.
+
+Parses the SOP and recipe documents in files/data, chunks them the way the
+knowledge base does (fixed size chunks with overlap, sizes in words as a
+stand-in for tokens) and embeds the chunks with a deterministic hashing
+model, or with a Bedrock embedding model through a local cache file. The
+corpus is padded with perturbed copies of the chunk vectors to the requested
+index size, since the real corpus is too small for approximate search to
+matter.
+
+For each chunking, dimension and index configuration it builds an exact
+NumPy index and FAISS HNSW (fp32, fp16 scalar quantized or binary) and IVF
+indexes in-process and reports:
+
+- recall@k against exact search over full precision vectors of the same
+  dimension, which is what quantization and the HNSW/IVF parameters cost,
+- ref@k against exact search at the largest dimension in the grid, which
+  adds what smaller embeddings cost (only meaningful with a real model),
+- doc@k, the share of labelled questions whose expected document is
+  retrieved,
+- p50/p95/p99 single query latency, build time and index size.
+
+An ``exact+bm25`` row fuses BM25 over the chunk text with exact kNN the way
+the invoke Lambda's hybrid retrieval does, to compare doc@k with and without
+the lexical half.
+
+``--write-profile NAME`` stores the fastest HNSW configuration that meets
+``--target-recall`` as a profile in
+lambdas/create-index-lambda/index_profiles.json.
+
+Requires numpy, and faiss-cpu for the approximate indexes.
+
+Usage:
+    python benchmarks/retrieval_benchmark.py [--vectors 20000] [--k 5]
+    python benchmarks/retrieval_benchmark.py --m 8,16,32 --ef-search 32,64,128,256,512
+    python benchmarks/retrieval_benchmark.py --embedder bedrock \\
+        --embedding-model amazon.titan-embed-text-v2:0 --dimensions 256,512,1024
+    python benchmarks/retrieval_benchmark.py --write-profile benchmarked
+"""
+import io
+import os
+import re
+import sys
+import glob
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import statistics
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # Only the exact index is benchmarked without FAISS.
+    faiss = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(BENCHMARK_DIR, "..")
+sys.path.insert(0, os.path.join(SOURCE_DIR, "lambdas", "invoke-lambda"))
+
+import hybrid_search  # noqa: E402
+
+DATA_DIR = os.path.join(SOURCE_DIR, "files", "data")
+PROFILES_PATH = os.path.join(
+    SOURCE_DIR, "lambdas", "create-index-lambda", "index_profiles.json"
+)
+EMBEDDING_CACHE = os.path.join(BENCHMARK_DIR, "fixtures", "retrieval", "embeddings.npz")
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Questions an operator would ask, with the document that answers them.
+QUESTIONS = [
+    ("How do I clean the mash tun after a brew?", "mash-tun-sop"),
+    ("The mash tun is leaking at the false bottom, how do I fix it?", "mash-tun-sop"),
+    ("The boil kettle is not reaching boiling temperature", "boil-kettle-100"),
+    ("How do I descale the BrewMaster Kettle 8000 heating element?", "boil-kettle-100"),
+    ("Bottles are underfilled on line 401", "bottling-sop"),
+    ("How do I replace the capper on the BrewMaster Pro 3000?", "bottling-sop"),
+    ("Fermenter 100 is running warm, what should I check?", "fermenter-sop"),
+    ("How do I test the FermentMaster 9000 pressure relief valve?", "fermenter-sop"),
+    ("How do I adjust the roller gap on the malt mill?", "malt-mill-sop"),
+    ("The MillMaster 7500 makes a grinding noise", "malt-mill-sop"),
+    ("The roaster drum is not rotating", "roaster-sop"),
+    ("What safety equipment do I need to repair the RoastMaster 5000?", "roaster-sop"),
+    ("What grain bill is used for Admiral beer?", "admiral"),
+    ("What bitterness and ABV should Brewer's Gold have?", "brewers_gold"),
+    ("When should Calypso hops be added for pear aroma?", "calypso"),
+    ("What is the Southern Brewer fermentation temperature?", "southern_brewer"),
+    ("How long should Viking hops be boiled?", "viking"),
+    # Equipment codes as operators type them.
+    ("MashTun100 false bottom is clogged", "mash-tun-sop"),
+    ("BoilKettle100 heating element fault", "boil-kettle-100"),
+    ("MaltMill100 roller gap adjustment", "malt-mill-sop"),
+]
+
+
+def docx_text(file_path):
+    """
+    Return the non-empty paragraphs of a Word document.
+    """
+    with open(file_path, "rb") as f:
+        with zipfile.ZipFile(io.BytesIO(f.read())) as archive:
+            document = ET.fromstring(archive.read("word/document.xml"))
+
+    paragraphs = []
+    for paragraph in document.iter(f"{WORD_NAMESPACE}p"):
+        text = "".join(
+            node.text or "" for node in paragraph.iter(f"{WORD_NAMESPACE}t")
+        ).strip()
+        if text:
+            paragraphs.append(text)
+
+    return paragraphs
+
+
+def load_documents(data_dir=DATA_DIR):
+    """
+    Load the documents as ``{name: text}``, name being the file's stem.
+    """
+    documents = {}
+    for file_path in sorted(
+        glob.glob(os.path.join(data_dir, "**", "*.docx"), recursive=True)
+    ):
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        documents[name] = "\n".join(docx_text(file_path))
+
+    return documents
+
+
+def chunk_documents(documents, chunk_size, overlap):
+    """
+    Split documents into fixed size chunks of words.
+
+    Args:
+        documents (dict): ``{name: text}``.
+        chunk_size (int): Words per chunk.
+        overlap (float): Share of each chunk repeated in the next one.
+
+    Returns:
+        tuple: Chunk texts and the name of the document of each chunk.
+    """
+    step = max(1, int(chunk_size * (1 - overlap)))
+    texts, sources = [], []
+    for name, text in documents.items():
+        words = text.split()
+        for start in range(0, max(1, len(words) - chunk_size + step), step):
+            texts.append(" ".join(words[start : start + chunk_size]))
+            sources.append(name)
+
+    return texts, sources
+
+
+def _features(text):
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    for word in words:
+        yield word, 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield f"3:{padded[i:i + 3]}", 0.3
+    for first, second in zip(words, words[1:]):
+        yield f"2:{first} {second}", 0.5
+
+
+class HashingEmbedder:
+    """
+    Deterministic stand-in for an embedding model.
+
+    Words, word bigrams and character trigrams are hashed into signed
+    buckets, and the bucket counts are projected to the requested dimension
+    with a seeded Gaussian matrix. Texts sharing vocabulary get similar
+    vectors, the vectors are dense like real embeddings (so sign bits keep
+    information for binary indexes), and every dimension approximates the
+    same geometry, like a model producing reduced size embeddings.
+    """
+
+    name = "hashing"
+    buckets = 4096
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self._projections = {}
+
+    def _projection(self, dimension):
+        if dimension not in self._projections:
+            rng = np.random.default_rng([self.seed, dimension])
+            self._projections[dimension] = rng.standard_normal(
+                (self.buckets, dimension), dtype=np.float32
+            )
+        return self._projections[dimension]
+
+    def embed(self, texts, dimension):
+        counts = np.zeros((len(texts), self.buckets), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in _features(text):
+                digest = hashlib.blake2b(
+                    feature.encode("utf-8"), digest_size=8
+                ).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                counts[row, (value >> 1) % self.buckets] += sign * weight
+
+        return normalize(normalize(counts) @ self._projection(dimension))
+
+
+class BedrockEmbedder:
+    """
+    Embeddings from a Bedrock model, cached in a local .npz file so later
+    runs are offline and deterministic.
+    """
+
+    def __init__(self, model_id, cache_path=EMBEDDING_CACHE, region_name=None):
+        self.model_id = model_id
+        self.name = model_id
+        self.cache_path = cache_path
+        self.region_name = region_name
+        self.cache = {}
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                self.cache = {key: cached[key] for key in cached.files}
+        self._client = None
+
+    def _invoke(self, text, dimension):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("bedrock-runtime", region_name=self.region_name)
+
+        body = {"inputText": text}
+        if "v2" in self.model_id:
+            # Titan v2 produces reduced size embeddings on request.
+            body.update(dimensions=dimension, normalize=True)
+        response = self._client.invoke_model(
+            modelId=self.model_id, body=json.dumps(body)
+        )
+        embedding = json.loads(response["body"].read())["embedding"]
+        if len(embedding) != dimension:
+            raise ValueError(
+                f"{self.model_id} returned {len(embedding)} dimensions, not {dimension}"
+            )
+
+        return np.asarray(embedding, dtype=np.float32)
+
+    def embed(self, texts, dimension):
+        vectors = []
+        missing = 0
+        for text in texts:
+            key = hashlib.sha256(
+                f"{self.model_id}|{dimension}|{text}".encode("utf-8")
+            ).hexdigest()
+            if key not in self.cache:
+                self.cache[key] = self._invoke(text, dimension)
+                missing += 1
+            vectors.append(self.cache[key])
+
+        if missing:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            np.savez_compressed(self.cache_path, **self.cache)
+            print(
+                f"Embedded {missing} texts with {self.model_id}, cached in {self.cache_path}"
+            )
+
+        return normalize(np.vstack(vectors))
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def pad_corpus(vectors, sources, size, noise, rng):
+    """
+    Grow the corpus to ``size`` vectors with synthetic chunks.
+
+    Each synthetic chunk mixes three real chunks with random weights plus
+    noise, which spreads them between the real ones instead of stacking
+    near-duplicates. It is labelled with the document of its heaviest
+    chunk, so doc@k stays meaningful. The same seed gives every dimension
+    the same mixtures.
+    """
+    if size <= len(vectors):
+        return vectors, list(sources)
+
+    count = size - len(vectors)
+    picks = rng.integers(0, len(vectors), (count, 3))
+    weights = rng.dirichlet(np.ones(3), count).astype(np.float32)
+    mixtures = np.einsum("nk,nkd->nd", weights, vectors[picks])
+    mixtures += rng.normal(0, noise / np.sqrt(vectors.shape[1]), mixtures.shape).astype(
+        np.float32
+    )
+    heaviest = picks[np.arange(count), weights.argmax(axis=1)]
+
+    return (
+        np.vstack([vectors, normalize(mixtures)]),
+        list(sources) + [sources[i] for i in heaviest],
+    )
+
+
+def analyze(text):
+    """
+    Approximate the index's equipment_text analyzer: standard tokens, kept
+    whole and split on case changes and digits, lowercased.
+    """
+    tokens = []
+    for token in re.findall(r"\w+", text):
+        parts = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", token)
+        tokens.append(token.lower())
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+
+    return tokens
+
+
+class BM25:
+    """
+    Okapi BM25 over the real chunks, the lexical half of hybrid search.
+    """
+
+    def __init__(self, texts, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = [analyze(text) for text in texts]
+        self.lengths = np.array([len(tokens) for tokens in self.documents])
+        self.average_length = self.lengths.mean()
+        self.frequencies = []
+        document_frequency = {}
+        for tokens in self.documents:
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            self.frequencies.append(counts)
+            for token in counts:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        count = len(self.documents)
+        self.idf = {
+            token: np.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for token, frequency in document_frequency.items()
+        }
+
+    def search(self, text, k):
+        scores = np.zeros(len(self.documents))
+        for token in set(analyze(text)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for i, counts in enumerate(self.frequencies):
+                frequency = counts.get(token)
+                if frequency:
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self.lengths[i] / self.average_length
+                    )
+                    scores[i] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        top = np.argsort(-scores)[:k]
+        return [
+            {"_id": int(i), "_score": float(scores[i])} for i in top if scores[i] > 0
+        ]
+
+
+def hybrid_search_rows(bm25, corpus, query_texts, queries, k, lexical_weight):
+    """
+    Fuse BM25 and exact kNN hits with the invoke Lambda's hybrid fusion.
+    """
+    results, latencies = [], []
+    for text, query in zip(query_texts, queries):
+        start = time.perf_counter()
+        scores = corpus @ query
+        top = np.argsort(-scores)[: k * hybrid_search.HYBRID_CANDIDATE_FACTOR]
+        vector_hits = [{"_id": int(i), "_score": float(scores[i])} for i in top]
+        lexical_hits = bm25.search(text, k * hybrid_search.HYBRID_CANDIDATE_FACTOR)
+        hits = hybrid_search.fuse(lexical_hits, vector_hits, lexical_weight, size=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([hit["_id"] for hit in hits] + [-1] * (k - len(hits)))
+
+    return np.array(results), latencies
+
+
+def exact_search(corpus, queries, k):
+    """
+    Brute force inner product search.
+    """
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def build_index(kind, vectors, m=16, ef_construction=256, nlist=256):
+    """
+    Build a FAISS index.
+
+    Args:
+        kind (str): "hnsw", "hnsw-fp16", "hnsw-binary" or "ivf".
+        vectors (np.ndarray): Normalized float32 vectors.
+
+    Returns:
+        tuple: The index, the vectors in the form it searches (packed sign
+            bits for binary indexes) and a function setting its query time
+            parameter.
+    """
+    dimension = vectors.shape[1]
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, m, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "hnsw-fp16":
+        index = faiss.IndexHNSWSQ(
+            dimension, faiss.ScalarQuantizer.QT_fp16, m, faiss.METRIC_INNER_PRODUCT
+        )
+    elif kind == "hnsw-binary":
+        index = faiss.IndexBinaryHNSW(dimension, m)
+        vectors = binarize(vectors)
+    elif kind == "ivf":
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(
+            quantizer,
+            dimension,
+            min(nlist, len(vectors) // 39),
+            faiss.METRIC_INNER_PRODUCT,
+        )
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index kind {kind}")
+
+    if kind.startswith("hnsw"):
+        index.hnsw.efConstruction = ef_construction
+        if kind == "hnsw-fp16":
+            index.train(vectors)
+
+        def set_search(value):
+            index.hnsw.efSearch = value
+
+    else:
+
+        def set_search(value):
+            index.nprobe = value
+
+    index.add(vectors)
+
+    return index, vectors, set_search
+
+
+def binarize(vectors):
+    """
+    Pack the signs of float vectors into bits, as binary embeddings are.
+    """
+    return np.packbits(vectors > 0, axis=1)
+
+
+def index_bytes(index):
+    if isinstance(index, faiss.IndexBinary):
+        return len(faiss.serialize_index_binary(index))
+    return len(faiss.serialize_index(index))
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def doc_at_k(found, sources, expected):
+    hits = sum(
+        any(sources[i] == document for i in row if i >= 0)
+        for row, document in zip(found, expected)
+    )
+    return hits / len(expected)
+
+
+def time_queries(search, queries):
+    """
+    Run queries one at a time, returning the results and latencies in ms.
+    """
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query[None, :]))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return np.vstack(results), latencies
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def run_benchmark(args):
+    embedder = (
+        BedrockEmbedder(args.embedding_model, region_name=args.region)
+        if args.embedder == "bedrock"
+        else HashingEmbedder(args.seed)
+    )
+    documents = load_documents()
+    print(
+        f"{len(documents)} documents, {sum(len(t.split()) for t in documents.values())} "
+        f"words, embedder {embedder.name}, {args.vectors} vectors, k={args.k}"
+    )
+    if faiss is None:
+        print("faiss is not installed, only the exact index is benchmarked")
+
+    rows = []
+    reference_dimension = max(args.dimensions)
+    for chunk_size in args.chunk_sizes:
+        texts, sources = chunk_documents(documents, chunk_size, args.overlap)
+
+        # Labelled questions, plus chunk openings as extra unlabelled queries.
+        rng = np.random.default_rng(args.seed)
+        query_texts = [question for question, _ in QUESTIONS]
+        expected = [document for _, document in QUESTIONS]
+        for i in rng.choice(len(texts), min(args.queries, len(texts)), replace=False):
+            query_texts.append(" ".join(texts[i].split()[:12]))
+
+        bm25 = BM25(texts)
+
+        # Full precision vectors of the largest dimension, to measure what
+        # smaller embeddings lose.
+        reference, _ = pad_corpus(
+            embedder.embed(texts, reference_dimension),
+            sources,
+            args.vectors,
+            args.noise,
+            np.random.default_rng(args.seed),
+        )
+        reference_truth = exact_search(
+            reference, embedder.embed(query_texts, reference_dimension), args.k
+        )
+
+        for dimension in args.dimensions:
+            corpus, corpus_sources = pad_corpus(
+                embedder.embed(texts, dimension),
+                sources,
+                args.vectors,
+                args.noise,
+                np.random.default_rng(args.seed),
+            )
+            queries = embedder.embed(query_texts, dimension)
+            # Ground truth at this dimension, to measure what the index loses.
+            truth = exact_search(corpus, queries, args.k)
+            common = {
+                "chunk_size": chunk_size,
+                "overlap": args.overlap,
+                "chunks": len(texts),
+                "dimension": dimension,
+                "vectors": len(corpus),
+            }
+
+            def record(config, found, latencies, build_seconds, size):
+                rows.append(
+                    dict(
+                        common,
+                        **config,
+                        recall=recall_at_k(found, truth),
+                        reference_recall=recall_at_k(found, reference_truth),
+                        doc=doc_at_k(found[: len(expected)], corpus_sources, expected),
+                        p50_ms=percentile(latencies, 50),
+                        p95_ms=percentile(latencies, 95),
+                        p99_ms=percentile(latencies, 99),
+                        build_s=build_seconds,
+                        bytes=size,
+                    )
+                )
+
+            found, latencies = time_queries(
+                lambda query: exact_search(corpus, query, args.k), queries
+            )
+            record({"index": "exact"}, found, latencies, 0.0, corpus.nbytes)
+
+            if args.lexical_weight:
+                found, latencies = hybrid_search_rows(
+                    bm25, corpus, query_texts, queries, args.k, args.lexical_weight
+                )
+                record(
+                    {"index": "exact+bm25", "lexical_weight": args.lexical_weight},
+                    found,
+                    latencies,
+                    0.0,
+                    corpus.nbytes,
+                )
+
+            if faiss is None:
+                continue
+
+            for kind in args.index_kinds:
+                builds = (
+                    [{"nlist": nlist} for nlist in args.nlist]
+                    if kind == "ivf"
+                    else [
+                        {"m": m, "ef_construction": ef_construction}
+                        for m in args.m
+                        for ef_construction in args.ef_construction
+                    ]
+                )
+                for build in builds:
+                    start = time.perf_counter()
+                    index, searched, set_search = build_index(kind, corpus, **build)
+                    build_seconds = time.perf_counter() - start
+                    size = index_bytes(index)
+                    search_queries = (
+                        binarize(queries) if kind == "hnsw-binary" else queries
+                    )
+
+                    for value in args.nprobe if kind == "ivf" else args.ef_search:
+                        set_search(value)
+                        found, latencies = time_queries(
+                            lambda query: index.search(query, args.k)[1],
+                            search_queries,
+                        )
+                        knob = "nprobe" if kind == "ivf" else "ef_search"
+                        record(
+                            dict(build, index=kind, **{knob: value}),
+                            found,
+                            latencies,
+                            build_seconds,
+                            size,
+                        )
+                    del index, searched
+
+    return rows
+
+
+def print_rows(rows):
+    header = (
+        f"{'chunk':>5} {'dim':>5} {'index':<12} {'params':<40} {'recall':>7} {'ref':>5} "
+        f"{'doc':>5} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'build s':>8} {'MiB':>7}"
+    )
+    print(header)
+    for row in rows:
+        params = ",".join(
+            f"{key}={row[key]}"
+            for key in (
+                "m",
+                "ef_construction",
+                "ef_search",
+                "nlist",
+                "nprobe",
+                "lexical_weight",
+            )
+            if key in row
+        )
+        print(
+            f"{row['chunk_size']:>5} {row['dimension']:>5} {row['index']:<12} "
+            f"{params:<40} {row['recall']:>7.3f} {row['reference_recall']:>5.2f} {row['doc']:>5.2f} "
+            f"{row['p50_ms']:>7.3f} {row['p95_ms']:>7.3f} {row['p99_ms']:>7.3f} "
+            f"{row['build_s']:>8.2f} {row['bytes'] / 2**20:>7.1f}"
+        )
+
+
+QUANTIZATION_OF_INDEX = {"hnsw": "none", "hnsw-fp16": "fp16", "hnsw-binary": "binary"}
+
+
+def best_profile(rows, target_recall, embedding_models):
+    """
+    Pick the HNSW configuration with the lowest p95 latency that reaches the
+    target recall and that an available embedding model can produce.
+
+    Returns:
+        dict: A profile in the index_profiles.json format, or None.
+    """
+    candidates = []
+    for row in rows:
+        quantization = QUANTIZATION_OF_INDEX.get(row["index"])
+        if quantization is None or row["recall"] < target_recall:
+            continue
+        data_type = "BINARY" if quantization == "binary" else "FLOAT32"
+        models = [
+            model_id
+            for model_id, model in embedding_models.items()
+            if row["dimension"] in model["dimensions"]
+            and data_type in model["data_types"]
+        ]
+        if models:
+            candidates.append((row["p95_ms"], row["bytes"], row, models[0], data_type))
+
+    if not candidates:
+        return None
+
+    _, _, row, model_id, data_type = min(candidates, key=lambda c: (c[0], c[1]))
+    return {
+        "description": (
+            f"Benchmarked: recall@k {row['recall']:.3f}, p95 {row['p95_ms']:.2f} ms "
+            f"over {row['chunks']} chunks of {row['chunk_size']} words padded to "
+            f"{row['vectors']} vectors."
+        ),
+        "embedding_model_id": model_id,
+        "dimension": row["dimension"],
+        "embedding_data_type": data_type,
+        "quantization": QUANTIZATION_OF_INDEX[row["index"]],
+        "space_type": "hamming" if data_type == "BINARY" else "innerproduct",
+        "m": row["m"],
+        "ef_construction": row["ef_construction"],
+        "ef_search": row["ef_search"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--embedder", choices=("hashing", "bedrock"), default="hashing")
+    parser.add_argument("--embedding-model", default="amazon.titan-embed-text-v2:0")
+    parser.add_argument("--region", default=None)
+    parser.add_argument("--dimensions", type=int_list, default=[256, 512, 1024])
+    parser.add_argument("--chunk-sizes", type=int_list, default=[300])
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument(
+        "--index-kinds",
+        type=lambda v: v.split(","),
+        default=["hnsw", "hnsw-fp16", "hnsw-binary", "ivf"],
+    )
+    parser.add_argument("--m", type=int_list, default=[8, 16])
+    parser.add_argument("--ef-construction", type=int_list, default=[128, 512])
+    parser.add_argument("--ef-search", type=int_list, default=[32, 64, 128, 256, 512])
+    parser.add_argument("--nlist", type=int_list, default=[256])
+    parser.add_argument("--nprobe", type=int_list, default=[4, 16, 64])
+    parser.add_argument(
+        "--lexical-weight",
+        type=float,
+        default=hybrid_search.HYBRID_LEXICAL_WEIGHT,
+        help="BM25 share of the hybrid score, 0 to skip the hybrid row",
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--output", help="Write all result rows to a JSON file")
+    parser.add_argument(
+        "--write-profile",
+        metavar="NAME",
+        help="Store the best configuration as a profile in index_profiles.json",
+    )
+    args = parser.parse_args()
+
+    rows = run_benchmark(args)
+    print_rows(rows)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"arguments": vars(args), "results": rows}, f, indent=1)
+
+    with open(PROFILES_PATH, encoding="utf-8") as f:
+        definitions = json.load(f)
+    profile = best_profile(rows, args.target_recall, definitions["embedding_models"])
+    if profile is None:
+        models = definitions["embedding_models"]
+        reached = [
+            row
+            for row in rows
+            if row["index"] in QUANTIZATION_OF_INDEX
+            and row["recall"] >= args.target_recall
+        ]
+        if not reached:
+            print(f"\nNo HNSW configuration reached recall@{args.k} {args.target_recall}")
+        else:
+            # Rows that reached the recall but no embedding model produces.
+            print(
+                f"\n{len(reached)} HNSW configurations reached recall@{args.k} "
+                f"{args.target_recall}, but none with a dimension and data type "
+                "of an available embedding model:"
+            )
+            for model_id, model in models.items():
+                print(
+                    f"  {model_id}: dimensions "
+                    f"{', '.join(str(d) for d in model['dimensions'])}, "
+                    f"data types {', '.join(model['data_types'])}"
+                )
+        return 1
+
+    print(f"\nFastest configuration with recall@{args.k} >= {args.target_recall}:")
+    print(json.dumps(profile, indent=2))
+    if args.write_profile:
+        definitions["profiles"][args.write_profile] = profile
+        with open(PROFILES_PATH, "w", encoding="utf-8") as f:
+            json.dump(definitions, f, indent=2)
+            f.write("\n")
+        print(
+            f"Wrote profile {args.write_profile} to {os.path.relpath(PROFILES_PATH)}, "
+            f"deploy it with -c vector_index_profile={args.write_profile}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+serialize_responses.py
+Micro-benchmark of the invoke Lambda's response serializers.
+
+Serializes representative chat responses (a single answer, a finished batch
+job read back from DynamoDB with Decimal numbers, and a partial streaming
+job) with each available serializer from lambdas/invoke-lambda/utils.py
+and with the previous ``json.dumps(obj, cls=CustomEncoder)`` call.
+
+Usage:
+    python benchmarks/serialize_responses.py [--number 2000]
+"""
+import os
+import sys
+import json
+import uuid
+import decimal
+import timeit
+import argparse
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "invoke-lambda"
+    ),
+)
+
+import utils  # noqa: E402
+
+ANSWER = (
+    "To clean the mash tun, first drain the vessel and rinse it with 60 °C "
+    "water. Circulate a 2 % caustic solution for 20 minutes, rinse again, "
+    "then circulate the acid sanitiser. Confirm the vessel is depressurised "
+    "and locked out before opening the manway. "
+) * 6
+
+SOURCES = (
+    "### **Relevant Documents:**\n\n"
+    "1. 📁 **[Standard Operating Procedure (SOP) for Repairing the Mash Tun]"
+    "(s3://assets/data/sop/mash-tun-sop.docx)**\n"
+    "2. 📁 **[Standard Operating Procedure (SOP) for Repairing the Boil Kettle]"
+    "(s3://assets/data/sop/boil-kettle-100.docx)**\n"
+)
+
+
+def chat_response():
+    return {"ok": True, "response": {"answer": ANSWER, "source": SOURCES}}
+
+
+def batch_job(items=50):
+    # DynamoDB returns every number as a Decimal.
+    now = decimal.Decimal(1714644000)
+    return {
+        "ok": True,
+        "job_id": str(uuid.uuid4()),
+        "status": "SUCCEEDED",
+        "partial": None,
+        "response": {
+            "results": [
+                {
+                    "index": decimal.Decimal(i),
+                    "query": f"What is the cleaning procedure for vessel {i}?",
+                    "ok": True,
+                    "response": {"answer": ANSWER, "source": SOURCES},
+                    "latency_ms": decimal.Decimal("2315.25"),
+                }
+                for i in range(items)
+            ]
+        },
+        "error": None,
+        "created_at": now,
+        "updated_at": now + 42,
+    }
+
+
+def partial_job():
+    return {
+        "ok": True,
+        "job_id": uuid.uuid4(),
+        "status": "RUNNING",
+        "partial": {"answer": ANSWER[:300]},
+        "response": None,
+        "error": None,
+    }
+
+
+class LegacyEncoder(json.JSONEncoder):
+    """
+    The encoder used before the serializer layer, for comparison.
+    """
+
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            if obj % 1 > 0:
+                return float(obj)
+            else:
+                return int(obj)
+
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+
+        return super(LegacyEncoder, self).default(obj)
+
+
+def legacy_dumps(obj):
+    return json.dumps(obj, cls=LegacyEncoder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    serializers = {"legacy json + CustomEncoder": legacy_dumps}
+    for name, serializer in utils.SERIALIZERS.items():
+        serializers[name] = serializer
+
+    payloads = {
+        "chat response": chat_response(),
+        "batch job (50 items)": batch_job(),
+        "partial job": partial_job(),
+    }
+
+    print(f"{'payload':<24} {'serializer':<30} {'us/op':>10} {'bytes':>8}")
+    for payload_name, payload in payloads.items():
+        for name, serializer in serializers.items():
+            size = len(serializer(payload).encode("utf-8"))
+            number = args.number if "batch" not in payload_name else args.number // 10
+            seconds = min(
+                timeit.repeat(lambda: serializer(payload), number=number, repeat=5)
+            )
+            print(
+                f"{payload_name:<24} {name:<30} "
+                f"{seconds / number * 1e6:>10.1f} {size:>8}"
+            )
+    if "orjson" not in utils.SERIALIZERS:
+        print("\norjson is not installed, only the standard library encoder was run")
+
+
+if __name__ == "__main__":
+    main()
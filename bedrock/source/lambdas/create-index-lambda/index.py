@@ -3,13 +3,21 @@ import os
 import boto3
 import json
 import logging
-import cfnresponse
-import time
+from index_profiles import get_profile, build_index_body, vector_bytes
+from index_versions import deploy_version, delete_versions
+from index_warmup import warm_up
 
 HOST = os.environ.get("COLLECTION_HOST")
 VECTOR_INDEX_NAME = os.environ.get("VECTOR_INDEX_NAME")
 VECTOR_FIELD_NAME = os.environ.get("VECTOR_FIELD_NAME")
 REGION_NAME = os.environ.get("REGION_NAME")
+# Named profile from index_profiles.json, the file's default when unset.
+VECTOR_INDEX_PROFILE = os.environ.get("VECTOR_INDEX_PROFILE")
+# How long to wait for a new index to be usable before failing the deployment.
+INDEX_READY_TIMEOUT_SECONDS = int(os.environ.get("INDEX_READY_TIMEOUT_SECONDS", "300"))
+# Lowest sample query recall of a new index version against the serving one
+# before the alias is moved to it.
+INDEX_SWAP_MIN_RECALL = float(os.environ.get("INDEX_SWAP_MIN_RECALL", "0.9"))
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -18,6 +26,20 @@ def log(message):
     logger.info(message)
 
 
+def index_ready(client, index_name):
+    """
+    Readiness probe for a new vector index: the vector field is mapped and
+    the index answers searches.
+    """
+    mapping = client.indices.get_mapping(index=index_name)
+    properties = mapping[index_name]["mappings"].get("properties", {})
+    if properties.get(VECTOR_FIELD_NAME, {}).get("type") != "knn_vector":
+        return False
+
+    client.search(index=index_name, body={"size": 0})
+    return True
+
+
 def lambda_handler(event, context):
     """
     Lambda handler to create OpenSearch Index
@@ -40,24 +62,11 @@ def lambda_handler(event, context):
 
     creds = session.get_credentials()
 
-    # Get STS client from session
-    sts_client = session.client("sts")
-
-    # Get caller identity
-    caller_identity = sts_client.get_caller_identity()
-
-    # Print the caller identity information
-    log(f"Caller Identity: {caller_identity}")
-
-    # Specifically, print the ARN of the caller
-    log(f"ARN: {caller_identity['Arn']}")
-
     log(f"HOST: {HOST}")
     host = HOST.split("//")[1]
 
     region = REGION_NAME
     service = "aoss"
-    status = cfnresponse.SUCCESS
     response = {}
 
     try:
@@ -73,66 +82,49 @@ def lambda_handler(event, context):
         )
         index_name = VECTOR_INDEX_NAME
 
-        if event["RequestType"] == "Create":
-            log(f"Creating index: {index_name}")
-
-            index_body = {
-                # This section contains specific index-level configurations.
-                "settings": {
-                    # This setting enables you to perform real-time k-NN search on an index. k-NN search lets you find the "k" closest points in your vector space by Euclidean distance or cosine similarity.
-                    "index.knn": True,
-                    "index.knn.algo_param.ef_search": 512,
-                },
-                "mappings": {
-                    "properties": {  # Properties section is where you define the fields (properties) of the documents that will be stored in the index.
-                        VECTOR_FIELD_NAME: {  # Name of the field
-                            # This specifies that the field is a k-NN vector type. This type is provided by the k-NN plugin and is necessary for performing nearest neighbor searches on the data.
-                            "type": "knn_vector",
-                            "dimension": 1536,
-                            "method": {  # 'method' contains settings for the algorithm used for k-NN calculations. Default method is l2(stands for Euclidean distance). You can also use cosine similarity.
-                                # Space in which distance calculations will be done. "l2" stands for L2 space (Euclidean distance)
-                                "space_type": "innerproduct",
-                                # Underlying engine to perform the vector calculations. FAISS is a library for efficient similarity search and clustering of dense vectors. The alternative is "nmslib".
-                                "engine": "FAISS",
-                                # This specifies the exact algorithm FAISS will use for k-NN calculations. HNSW stands for Hierarchical Navigable Small World, which is efficient for similarity searches.
-                                "name": "hnsw",
-                                "parameters": {
-                                    "m": 16,
-                                    "ef_construction": 512,
-                                },
-                            },
-                        },
-                        "AMAZON_BEDROCK_METADATA": {"type": "text", "index": False},
-                        "AMAZON_BEDROCK_TEXT_CHUNK": {"type": "text"},
-                        "id": {"type": "text"},
-                    }
-                },
-            }
-
-            response = client.indices.create(index_name, body=index_body)
+        if event["RequestType"] in ("Create", "Update"):
+            profile = get_profile(VECTOR_INDEX_PROFILE)
+            index_body = build_index_body(profile, VECTOR_FIELD_NAME)
+            log(
+                f"Index profile {profile['name']}: {profile['dimension']} dimensions, "
+                f"{profile['quantization']} quantization, about "
+                f"{vector_bytes(profile, 1_000_000) / 2**20:.0f} MiB per million vectors"
+            )
+
+            # The index name is an alias of a versioned index; a changed body
+            # builds and verifies a new version before the alias is moved.
+            response = deploy_version(
+                client,
+                index_name,
+                index_body,
+                VECTOR_FIELD_NAME,
+                ready=index_ready,
+                ready_timeout=INDEX_READY_TIMEOUT_SECONDS,
+                min_recall=INDEX_SWAP_MIN_RECALL,
+                warm_up=lambda client, name: warm_up(client, name, VECTOR_FIELD_NAME),
+            )
 
             log(f"Response: {response}")
 
-            # wait 1 minute - need to change to syncronous call in cdk and implement response
-            log("Sleeping for 1 minutes to let index create.")
-            # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
-            time.sleep(60)  # nosem: arbitrary-sleep
-
         elif event["RequestType"] == "Delete":
-            log(f"Deleting index: {index_name}")
-            response = client.indices.delete(index_name)
-            log(f"Response: {response}")
-        else:
-            log("Continuing without action.")
+            # Stacks created before the index was versioned had a different
+            # physical ID; their first Update replaces it and CloudFormation
+            # then deletes the old ID, which must not touch the index.
+            if event.get("PhysicalResourceId") != VECTOR_INDEX_NAME:
+                log(f"Skipping delete of {event.get('PhysicalResourceId')}.")
+            else:
+                log(f"Deleting index: {index_name}")
+                response = {"deleted": delete_versions(client, index_name)}
+                log(f"Response: {response}")
 
     except Exception as e:
         logging.error("Exception: %s" % e, exc_info=True)
-        status = cfnresponse.FAILED
-
-    finally:
-        cfnresponse.send(event, context, status, response)
+        # The custom resource provider only reports a failure if the handler
+        # raises, e.g. when the index doesn't become ready in time.
+        raise
 
     return {
-        "statusCode": 200,
-        "body": json.dumps("Create index lambda ran successfully."),
-    }
\ No newline at end of file
+        # Stable across updates, so a new index version isn't a replacement.
+        "PhysicalResourceId": VECTOR_INDEX_NAME,
+        "Data": {"IndexVersion": response.get("index", "")},
+    }
@@ -0,0 +1,204 @@
+"""
+index_profiles.py
+
+Named vector index profiles for the knowledge base index.
+
+A profile fixes the embedding model and dimension, how vectors are stored
+(full precision, fp16 scalar quantization or binary) and the HNSW graph and
+search parameters. The profiles live in index_profiles.json, which the stack
+also reads to configure the knowledge base's embedding model, so the index
+and the embeddings always agree.
+"""
+import os
+import json
+
+PROFILES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "index_profiles.json"
+)
+
+QUANTIZATIONS = ("none", "fp16", "binary")
+
+TEXT_FIELD_NAME = "AMAZON_BEDROCK_TEXT_CHUNK"
+# Metadata attributes from the documents' .metadata.json files, stored by the
+# knowledge base as fields of each chunk.
+EQUIPMENT_FIELD_NAME = "equipment"
+EQUIPMENT_TAGS_FIELD_NAME = "equipment_tags"
+# SiteWise asset model of the equipment, used to scope retrieval.
+EQUIPMENT_MODEL_FIELD_NAME = "equipment_model"
+DOCUMENT_TYPE_FIELD_NAME = "document_type"
+SOURCE_URI_FIELD_NAME = "x-amz-bedrock-kb-source-uri"
+
+# Indexes equipment codes such as "BoilKettle100" both whole and as their
+# parts, so "boilkettle100", "boil kettle 100" and "BoilKettle100" all match.
+TEXT_ANALYSIS = {
+    "filter": {
+        "equipment_code_parts": {
+            "type": "word_delimiter_graph",
+            "split_on_case_change": True,
+            "split_on_numerics": True,
+            "preserve_original": True,
+        }
+    },
+    "analyzer": {
+        "equipment_text": {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": ["equipment_code_parts", "lowercase"],
+        }
+    },
+    "normalizer": {
+        "lowercase_keyword": {"type": "custom", "filter": ["lowercase"]},
+    },
+}
+
+
+def load_profiles(profiles_path=PROFILES_PATH):
+    """
+    Load the profile definitions.
+    """
+    with open(profiles_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_profile(name=None, profiles_path=PROFILES_PATH):
+    """
+    Return a validated profile by name, or the default profile.
+
+    Raises:
+        ValueError: If the profile doesn't exist or doesn't match its
+            embedding model.
+    """
+    definitions = load_profiles(profiles_path)
+    name = name or definitions["default"]
+    if name not in definitions["profiles"]:
+        raise ValueError(
+            f"Unknown index profile {name}, expected one of "
+            f"{sorted(definitions['profiles'])}"
+        )
+
+    profile = dict(definitions["profiles"][name], name=name)
+    validate_profile(profile, definitions["embedding_models"])
+
+    return profile
+
+
+def validate_profile(profile, embedding_models):
+    """
+    Check a profile's vector settings against its embedding model.
+    """
+    model = embedding_models.get(profile["embedding_model_id"])
+    if model is None:
+        raise ValueError(f"Unknown embedding model {profile['embedding_model_id']}")
+    if profile["dimension"] not in model["dimensions"]:
+        raise ValueError(
+            f"{profile['embedding_model_id']} produces {model['dimensions']} "
+            f"dimensions, not {profile['dimension']}"
+        )
+    if profile["embedding_data_type"] not in model["data_types"]:
+        raise ValueError(
+            f"{profile['embedding_model_id']} doesn't produce "
+            f"{profile['embedding_data_type']} embeddings"
+        )
+    if profile["quantization"] not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {profile['quantization']}")
+
+    # Binary embeddings can only be stored as bits and compared by Hamming distance.
+    binary = profile["embedding_data_type"] == "BINARY"
+    if binary != (profile["quantization"] == "binary"):
+        raise ValueError("Binary embeddings need binary quantization and vice versa")
+    if binary != (profile["space_type"] == "hamming"):
+        raise ValueError("Hamming distance is only supported for binary embeddings")
+
+
+def build_vector_field(profile):
+    """
+    Build the knn_vector mapping of the embedding field.
+    """
+    method = {
+        # FAISS supports fp16 scalar quantization and binary vectors.
+        "engine": "faiss",
+        # Hierarchical Navigable Small World graph.
+        "name": "hnsw",
+        "space_type": profile["space_type"],
+        "parameters": {
+            # Links per node, more links raise recall and memory.
+            "m": profile["m"],
+            # Candidate list size while building the graph.
+            "ef_construction": profile["ef_construction"],
+        },
+    }
+    if profile["quantization"] == "fp16":
+        # Store each component in 2 bytes instead of 4.
+        method["parameters"]["encoder"] = {
+            "name": "sq",
+            "parameters": {"type": "fp16"},
+        }
+
+    field = {
+        "type": "knn_vector",
+        "dimension": profile["dimension"],
+        "method": method,
+    }
+    if profile["quantization"] == "binary":
+        # The dimension counts bits, packed 8 to a byte.
+        field["data_type"] = "binary"
+
+    return field
+
+
+def build_index_body(profile, vector_field_name):
+    """
+    Build the create index request for a profile.
+
+    Besides the vector field, the chunk text is analyzed for BM25 with
+    equipment codes split into their parts, and the equipment metadata is
+    mapped as keywords, so hybrid queries can match exact tags.
+
+    Args:
+        profile (dict): A profile from get_profile().
+        vector_field_name (str): Name of the embedding field.
+
+    Returns:
+        dict: Settings and mappings of the vector index.
+    """
+    keyword = {"type": "keyword", "normalizer": "lowercase_keyword"}
+    return {
+        "settings": {
+            # Enables k-NN search on the index.
+            "index.knn": True,
+            # Candidate list size at query time, the main recall/latency knob.
+            "index.knn.algo_param.ef_search": profile["ef_search"],
+            "analysis": TEXT_ANALYSIS,
+        },
+        "mappings": {
+            "properties": {
+                vector_field_name: build_vector_field(profile),
+                "AMAZON_BEDROCK_METADATA": {"type": "text", "index": False},
+                # Analyzed for BM25, with the exact text for short chunks.
+                TEXT_FIELD_NAME: {
+                    "type": "text",
+                    "analyzer": "equipment_text",
+                    "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
+                },
+                EQUIPMENT_FIELD_NAME: keyword,
+                EQUIPMENT_TAGS_FIELD_NAME: keyword,
+                EQUIPMENT_MODEL_FIELD_NAME: keyword,
+                DOCUMENT_TYPE_FIELD_NAME: keyword,
+                SOURCE_URI_FIELD_NAME: {"type": "keyword"},
+                "id": {"type": "text"},
+            }
+        },
+    }
+
+
+def vector_bytes(profile, vectors):
+    """
+    Approximate memory of the HNSW graph for a number of vectors, from the
+    OpenSearch sizing guidance of 1.1 * (bytes per vector + 8 * m).
+    """
+    bytes_per_component = {"none": 4, "fp16": 2, "binary": 1 / 8}[
+        profile["quantization"]
+    ]
+    per_vector = profile["dimension"] * bytes_per_component + 8 * profile["m"]
+
+    return int(1.1 * per_vector * vectors)
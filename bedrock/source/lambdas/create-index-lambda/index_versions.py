@@ -0,0 +1,376 @@
+"""
+index_versions.py
+
+Versioned vector indexes behind an alias.
+
+The knowledge base and the retrieval queries use the index name, which is
+an alias of a physical index named after a hash of its settings and
+mappings, e.g. ``bedrock-knowledgebase-index-3f9a0c1e2b4d``. A changed
+mapping builds the new version next to the serving one, copies the chunks
+over (vectors included, nothing is embedded again), verifies the copy by
+document count and by the recall of sample queries against the serving
+index, and then moves the alias in one update_aliases call. Versions the
+alias no longer points to are deleted.
+
+Searches keep hitting the serving version while the new one is built; a
+version that fails verification is never swapped in and is rebuilt on the
+next deployment.
+"""
+import json
+import hashlib
+import logging
+
+from opensearchpy import NotFoundError
+
+from bulk_loader import BulkLoader
+from index_profiles import SOURCE_URI_FIELD_NAME, TEXT_FIELD_NAME
+from waiters import wait_until
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Source URIs per page of the composite aggregation, and per chunk search.
+URI_PAGE_SIZE = 500
+SEARCH_BATCH_SIZE = 50
+
+
+class IndexVersionError(Exception):
+    """
+    A new index version can't be filled from or swapped for the serving one.
+    """
+
+
+def version_name(alias, index_body):
+    """
+    Physical index name of an index body, stable for the same body.
+    """
+    body = json.dumps(index_body, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    return f"{alias}-{digest[:12]}"
+
+
+def alias_indices(client, alias):
+    """
+    Return the physical indexes an alias points to.
+    """
+    if not client.indices.exists_alias(name=alias):
+        return []
+
+    return sorted(client.indices.get_alias(name=alias))
+
+
+def version_indices(client, alias):
+    """
+    Return the index versions of an alias, whether it points to them or not.
+    """
+    try:
+        return sorted(client.indices.get(index=f"{alias}-*"))
+    except NotFoundError:
+        return []
+
+
+def legacy_index(client, alias):
+    """
+    Whether a physical index has the alias's name, as created before the
+    index was versioned.
+    """
+    return client.indices.exists(index=alias) and not client.indices.exists_alias(
+        name=alias
+    )
+
+
+def _properties(client, index_name):
+    mapping = client.indices.get_mapping(index=index_name)
+    return next(iter(mapping.values()))["mappings"].get("properties", {})
+
+
+def check_compatible(client, source, target, vector_field_name):
+    """
+    Raise IndexVersionError unless the vectors of one index fit the other.
+    """
+    old = _properties(client, source).get(vector_field_name, {})
+    new = _properties(client, target).get(vector_field_name, {})
+    for key in ("dimension", "data_type"):
+        if old.get(key) != new.get(key):
+            raise IndexVersionError(
+                f"Can't copy {vector_field_name} from {source} to {target}: "
+                f"{key} {old.get(key)} != {new.get(key)}. A new embedding model "
+                "or size needs a new knowledge base."
+            )
+
+
+def _source_uri_field(client, index_name):
+    # Indexes without an explicit mapping have the dynamic keyword subfield.
+    field = _properties(client, index_name).get(SOURCE_URI_FIELD_NAME, {})
+    if field.get("type") == "keyword":
+        return SOURCE_URI_FIELD_NAME
+    return f"{SOURCE_URI_FIELD_NAME}.keyword"
+
+
+def iter_documents(client, index_name, page_size=URI_PAGE_SIZE):
+    """
+    Yield every chunk of an index as a bulk loader record.
+
+    Vector collections have no scroll, so the source URIs are paged with a
+    composite aggregation and their chunks fetched with terms queries.
+    """
+    field = _source_uri_field(client, index_name)
+    after = None
+    while True:
+        composite = {
+            "size": page_size,
+            "sources": [{"uri": {"terms": {"field": field}}}],
+        }
+        if after:
+            composite["after"] = after
+        response = client.search(
+            index=index_name,
+            body={"size": 0, "aggs": {"uris": {"composite": composite}}},
+        )
+        aggregation = response["aggregations"]["uris"]
+        uris = [bucket["key"]["uri"] for bucket in aggregation["buckets"]]
+        if not uris:
+            return
+
+        for i in range(0, len(uris), SEARCH_BATCH_SIZE):
+            response = client.search(
+                index=index_name,
+                body={
+                    "size": 10000,
+                    "query": {"terms": {field: uris[i : i + SEARCH_BATCH_SIZE]}},
+                },
+            )
+            for hit in response["hits"]["hits"]:
+                yield {"_source": hit["_source"]}
+
+        after = aggregation.get("after_key")
+        if after is None:
+            return
+
+
+def _neighbours(client, index_name, vector_field_name, vector, k):
+    response = client.search(
+        index=index_name,
+        body={
+            "size": k,
+            "_source": [SOURCE_URI_FIELD_NAME, TEXT_FIELD_NAME],
+            "query": {"knn": {vector_field_name: {"vector": vector, "k": k}}},
+        },
+    )
+    # Copies get new IDs, so chunks are compared by source and text.
+    return {
+        (
+            hit["_source"].get(SOURCE_URI_FIELD_NAME),
+            hit["_source"].get(TEXT_FIELD_NAME),
+        )
+        for hit in response["hits"]["hits"]
+    }
+
+
+def verify_copy(
+    client,
+    source,
+    target,
+    vector_field_name,
+    samples=20,
+    k=10,
+    min_recall=0.9,
+    timeout=300,
+):
+    """
+    Check that a new version serves the same chunks as the serving one.
+
+    Args:
+        client: OpenSearch client.
+        source (str): The serving index.
+        target (str): The new version.
+        vector_field_name (str): The indexes' vector field.
+        samples (int): Chunks of the serving index used as queries.
+        k (int): Neighbours compared per query.
+        min_recall (float): Lowest mean share of the serving index's
+            neighbours the new version has to return.
+        timeout (float): Seconds to wait for the document counts to match.
+
+    Returns:
+        dict: ``documents`` in the new version and the sample ``recall``.
+
+    Raises:
+        IndexVersionError: If the new version misses too many neighbours.
+        WaiterTimeout: If the document counts don't match in time.
+    """
+
+    def counts_match():
+        expected = client.count(index=source)["count"]
+        return client.count(index=target)["count"] == expected
+
+    # Counts of a vector collection are eventually consistent.
+    wait_until(
+        counts_match, f"Document count of {target}", timeout=timeout, consecutive=2
+    )
+
+    hits = client.search(
+        index=source, body={"size": samples, "_source": [vector_field_name]}
+    )["hits"]["hits"]
+    recalls = []
+    for hit in hits:
+        vector = hit["_source"].get(vector_field_name)
+        if vector is None:
+            continue
+        expected = _neighbours(client, source, vector_field_name, vector, k)
+        found = _neighbours(client, target, vector_field_name, vector, k)
+        if expected:
+            recalls.append(len(expected & found) / len(expected))
+
+    recall = sum(recalls) / len(recalls) if recalls else 1.0
+    documents = client.count(index=target)["count"]
+    logger.info(
+        f"Verified {target}: {documents} documents, recall {recall:.3f} over "
+        f"{len(recalls)} sample queries."
+    )
+    if recall < min_recall:
+        raise IndexVersionError(
+            f"Recall of {target} against {source} is {recall:.3f}, "
+            f"below {min_recall}"
+        )
+
+    return {"documents": documents, "recall": recall}
+
+
+def swap_alias(client, alias, index_name, previous=(), legacy=False):
+    """
+    Point the alias at an index in one atomic update, replacing its previous
+    indexes, or the legacy physical index with the alias's name.
+    """
+    actions = [{"add": {"index": index_name, "alias": alias}}]
+    actions += [
+        {"remove": {"index": name, "alias": alias}}
+        for name in previous
+        if name != index_name
+    ]
+    if legacy:
+        actions.append({"remove_index": {"index": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    logger.info(f"Alias {alias} now points to {index_name}.")
+
+
+def collect_garbage(client, alias, keep):
+    """
+    Delete the versions of an alias other than the ones to keep.
+    """
+    deleted = []
+    for name in version_indices(client, alias):
+        if name not in keep:
+            client.indices.delete(index=name)
+            deleted.append(name)
+    if deleted:
+        logger.info(f"Deleted index versions {deleted}.")
+
+    return deleted
+
+
+def deploy_version(
+    client,
+    alias,
+    index_body,
+    vector_field_name,
+    ready,
+    ready_timeout=300,
+    min_recall=0.9,
+    warm_up=None,
+):
+    """
+    Make the alias serve an index with the given body, building, filling
+    and verifying a new version first when the body changed.
+
+    Args:
+        client: OpenSearch client.
+        alias (str): The index name the knowledge base uses.
+        index_body (dict): Settings and mappings from build_index_body.
+        vector_field_name (str): The index's vector field.
+        ready (callable): Readiness probe taking the client and index name.
+        ready_timeout (float): Seconds to wait for the new version to be
+            ready and its document count to match.
+        min_recall (float): See verify_copy.
+        warm_up (callable): Takes the client and index name and warms up a
+            new version before the alias is moved to it, see index_warmup.
+
+    Returns:
+        dict: The serving ``index``, whether the alias was ``swapped``, the
+            ``copied`` documents, the ``recall`` of the new version and the
+            result of its ``warmup``.
+    """
+    name = version_name(alias, index_body)
+    current = alias_indices(client, alias)
+    legacy = legacy_index(client, alias)
+    if current == [name]:
+        logger.info(f"Alias {alias} already points to {name}.")
+        collect_garbage(client, alias, keep={name})
+        return {
+            "index": name,
+            "swapped": False,
+            "copied": 0,
+            "recall": None,
+            "warmup": None,
+        }
+
+    # A version left over from a failed attempt may be partially filled.
+    if client.indices.exists(index=name):
+        client.indices.delete(index=name)
+    logger.info(f"Creating index version {name} for {alias}.")
+    client.indices.create(index=name, body=index_body)
+    # The collection is eventually consistent, require the probe to pass
+    # twice in a row before the version is filled or served.
+    wait_until(
+        lambda: ready(client, name),
+        f"Index {name}",
+        timeout=ready_timeout,
+        consecutive=2,
+    )
+
+    source = current[0] if current else (alias if legacy else None)
+    copied = 0
+    recall = None
+    if source:
+        check_compatible(client, source, name, vector_field_name)
+        logger.info(f"Copying the chunks of {source} to {name}.")
+        stats = BulkLoader(client, name).load(
+            iter_documents(client, source), raise_on_error=True
+        )
+        copied = stats["succeeded"]
+        recall = verify_copy(
+            client,
+            source,
+            name,
+            vector_field_name,
+            min_recall=min_recall,
+            timeout=ready_timeout,
+        )["recall"]
+
+    # Searches through the alias shouldn't be the first to load the graphs.
+    warmup = None
+    if warm_up:
+        try:
+            warmup = warm_up(client, name)
+        except Exception as e:
+            logger.warning(f"Failed to warm up {name}: {e}")
+
+    swap_alias(client, alias, name, previous=current, legacy=legacy)
+    collect_garbage(client, alias, keep={name})
+
+    return {
+        "index": name,
+        "swapped": True,
+        "copied": copied,
+        "recall": recall,
+        "warmup": warmup,
+    }
+
+
+def delete_versions(client, alias):
+    """
+    Delete the alias and all its versions, or the legacy index.
+    """
+    if legacy_index(client, alias):
+        client.indices.delete(index=alias)
+    return collect_garbage(client, alias, keep=set())
@@ -0,0 +1,126 @@
+import os
+import threading
+
+from aws_lambda_powertools import Logger
+
+from clients import get_client
+
+logger = Logger()
+
+KNOWLEDGE_BASE_ID = os.environ.get("KNOWLEDGE_BASE_ID")
+# Metadata attribute holding the SiteWise asset model of a chunk.
+RETRIEVAL_FILTER_KEY = os.environ.get("RETRIEVAL_FILTER_KEY", "equipment_model")
+# Asset models with documents of their own, comma separated. Retrieval is only
+# scoped to these, e.g. not to an Area asset. Empty scopes to any model.
+RETRIEVAL_SCOPED_MODELS = {
+    model
+    for model in os.environ.get("RETRIEVAL_SCOPED_MODELS", "").split(",")
+    if model
+}
+# Document types that stay searchable in a scoped session, e.g. recipes
+# that apply to every piece of equipment.
+RETRIEVAL_SHARED_DOCUMENT_TYPES = [
+    document_type
+    for document_type in os.environ.get(
+        "RETRIEVAL_SHARED_DOCUMENT_TYPES", "recipe"
+    ).split(",")
+    if document_type
+]
+
+_asset_models = {}
+_lock = threading.Lock()
+
+
+def asset_model_name(asset_id):
+    """
+    Return the SiteWise asset model name of an asset, the ``modelName`` of
+    list_all_assets. Names are cached per container.
+
+    Returns:
+        str: The model name, or None if the asset can't be described.
+    """
+    with _lock:
+        if asset_id in _asset_models:
+            return _asset_models[asset_id]
+
+    sitewise = get_client("iotsitewise")
+    try:
+        model_id = sitewise.describe_asset(assetId=asset_id)["assetModelId"]
+        name = sitewise.describe_asset_model(assetModelId=model_id)["assetModelName"]
+    except Exception as e:
+        logger.warning(f"Could not resolve the asset model of {asset_id}: {e}")
+        return None
+
+    with _lock:
+        _asset_models[asset_id] = name
+
+    return name
+
+
+def scoped_model(asset_ids):
+    """
+    Pick the asset model to scope retrieval to from the assets resolved in a
+    turn, preferring the most recent asset whose model has documents.
+
+    Args:
+        asset_ids (list): Asset IDs from the agent trace, most recent last.
+
+    Returns:
+        str: The asset model name, or None.
+    """
+    for asset_id in reversed(asset_ids or []):
+        name = asset_model_name(asset_id)
+        if name and (not RETRIEVAL_SCOPED_MODELS or name in RETRIEVAL_SCOPED_MODELS):
+            return name
+
+    return None
+
+
+def retrieval_filter(model_name):
+    """
+    Knowledge base retrieval filter for chunks of one asset model plus the
+    shared document types.
+    """
+    model_filter = {"equals": {"key": RETRIEVAL_FILTER_KEY, "value": model_name}}
+    if not RETRIEVAL_SHARED_DOCUMENT_TYPES:
+        return model_filter
+
+    return {
+        "orAll": [
+            model_filter,
+            {"in": {"key": "document_type", "value": RETRIEVAL_SHARED_DOCUMENT_TYPES}},
+        ]
+    }
+
+
+def scope_session_state(session_state, model_name):
+    """
+    Add the retrieval filter of an asset model to a ``sessionState``.
+
+    Args:
+        session_state (dict): Session state for invoke_agent, or None.
+        model_name (str): Asset model under discussion, or None.
+
+    Returns:
+        dict: The scoped session state, or the given one unchanged if there
+        is no model or no knowledge base ID.
+    """
+    if not model_name or not KNOWLEDGE_BASE_ID:
+        return session_state
+
+    session_state = dict(session_state or {})
+    session_state["promptSessionAttributes"] = dict(
+        session_state.get("promptSessionAttributes", {}), asset_model=model_name
+    )
+    session_state["knowledgeBaseConfigurations"] = [
+        {
+            "knowledgeBaseId": KNOWLEDGE_BASE_ID,
+            "retrievalConfiguration": {
+                "vectorSearchConfiguration": {
+                    "filter": retrieval_filter(model_name),
+                }
+            },
+        }
+    ]
+
+    return session_state
@@ -0,0 +1,157 @@
+import os
+import json
+import hmac
+import time
+import threading
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from clients import get_client
+
+logger = Logger()
+
+X_ORIGIN_VERIFY_SECRET_ARN = os.environ.get("X_ORIGIN_VERIFY_SECRET_ARN")
+ORIGIN_VERIFY_HEADER = "X-Origin-Verify"
+# How long the accepted header values are used before the secret is read again.
+ORIGIN_VERIFY_REFRESH_SECONDS = int(
+    os.environ.get("ORIGIN_VERIFY_REFRESH_SECONDS", "300")
+)
+# A mismatching header triggers an early refresh at most this often, so
+# rotation is picked up quickly without letting bad requests drive reads.
+ORIGIN_VERIFY_MIN_REFRESH_SECONDS = int(
+    os.environ.get("ORIGIN_VERIFY_MIN_REFRESH_SECONDS", "30")
+)
+
+# Secrets Manager staging labels accepted during a rotation.
+ACCEPTED_VERSION_STAGES = ("AWSCURRENT", "AWSPREVIOUS")
+
+
+def get_header(headers, name):
+    """
+    Look up a header case-insensitively.
+    """
+    if not headers:
+        return None
+
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, candidate in headers.items():
+            if key.lower() == lowered:
+                return candidate
+
+    return value
+
+
+class OriginVerifier:
+    """
+    Checks the origin verification header against the cached secret.
+
+    Both the current and the previous version of the secret are accepted,
+    so requests signed with either keep working while the secret rotates.
+    Values are compared in constant time.
+    """
+
+    def __init__(
+        self,
+        secret_id,
+        refresh_seconds=ORIGIN_VERIFY_REFRESH_SECONDS,
+        min_refresh_seconds=ORIGIN_VERIFY_MIN_REFRESH_SECONDS,
+    ):
+        self.secret_id = secret_id
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self._values = ()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _read_stage(self, stage):
+        try:
+            response = get_client("secretsmanager").get_secret_value(
+                SecretId=self.secret_id, VersionStage=stage
+            )
+        except ClientError as e:
+            # There is no previous version before the first rotation.
+            if stage != "AWSCURRENT" and e.response["Error"]["Code"] in (
+                "ResourceNotFoundException",
+                "InvalidRequestException",
+            ):
+                return None
+            raise
+
+        return json.loads(response["SecretString"])["headerValue"].encode("utf-8")
+
+    def refresh(self):
+        """
+        Read the accepted header values from Secrets Manager.
+        """
+        with self._lock:
+            values = [self._read_stage(stage) for stage in ACCEPTED_VERSION_STAGES]
+            self._values = tuple(value for value in values if value)
+            self._loaded_at = time.monotonic()
+
+    def _try_refresh(self):
+        # Keep serving the cached values if Secrets Manager is unavailable.
+        try:
+            self.refresh()
+        except Exception as e:
+            if not self._values:
+                raise
+            logger.warning(f"Failed to refresh the origin verify secret: {e}")
+            self._loaded_at = time.monotonic()
+
+    def _age(self):
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def _matches(self, value):
+        matched = False
+        for accepted in self._values:
+            # Check every accepted value so timing doesn't reveal which matched.
+            matched |= hmac.compare_digest(value, accepted)
+        return matched
+
+    def verify(self, headers):
+        """
+        Return whether the request carries a valid origin verification header.
+
+        Args:
+            headers (dict): Request headers of the API Gateway event.
+        """
+        header = get_header(headers, ORIGIN_VERIFY_HEADER)
+        if not header:
+            return False
+        value = header.encode("utf-8")
+
+        age = self._age()
+        if age is None or age >= self.refresh_seconds:
+            self._try_refresh()
+        elif not self._matches(value) and age >= self.min_refresh_seconds:
+            # The secret may have rotated since it was cached.
+            self._try_refresh()
+
+        return self._matches(value)
+
+
+_origin_verifier = None
+
+
+def get_origin_verifier():
+    """
+    Return the origin verifier for this container.
+    """
+    global _origin_verifier
+    if _origin_verifier is None:
+        _origin_verifier = OriginVerifier(X_ORIGIN_VERIFY_SECRET_ARN)
+
+    return _origin_verifier
+
+
+def set_origin_verifier(origin_verifier):
+    """
+    Replace the origin verifier, e.g. with a stub in tests.
+    """
+    global _origin_verifier
+    _origin_verifier = origin_verifier
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import threading
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from clients import get_client
+
+logger = Logger()
+
+# Manifest written by the update Lambda when the knowledge base is synced.
+CITATION_MANIFEST_BUCKET = os.environ.get("CITATION_MANIFEST_BUCKET")
+CITATION_MANIFEST_KEY = os.environ.get(
+    "CITATION_MANIFEST_KEY", "manifests/citation-manifest.json"
+)
+# How often the manifest's ETag is checked for a newer version.
+CITATION_MANIFEST_CHECK_SECONDS = int(
+    os.environ.get("CITATION_MANIFEST_CHECK_SECONDS", "300")
+)
+
+
+class CitationManifest:
+    """
+    Per-container copy of the citation manifest.
+
+    The manifest is loaded on first use and re-checked with a conditional
+    GET every ``check_seconds``, so it is only downloaded again when its
+    ETag changed. Requests never wait on S3 for it after the first load;
+    while one thread re-checks, the others keep using the loaded copy.
+    """
+
+    def __init__(self, bucket, key, check_seconds=CITATION_MANIFEST_CHECK_SECONDS):
+        self.bucket = bucket
+        self.key = key
+        self.check_seconds = check_seconds
+        self.etag = None
+        self._documents = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self, uri):
+        """
+        Return the manifest entry of a document, or None if it isn't listed.
+
+        Returns:
+            dict: ``title``, ``url``, ``doc_type`` and ``sections``.
+        """
+        self.refresh()
+        return self._documents.get(uri)
+
+    def refresh(self, force=False):
+        """
+        Reload the manifest if it is due for a check and has changed.
+        """
+        if not self.bucket:
+            return
+
+        due = self._checked_at is None or (
+            time.monotonic() - self._checked_at >= self.check_seconds
+        )
+        if not (due or force):
+            return
+
+        # The first load blocks, later checks are skipped while one is running.
+        if not self._lock.acquire(blocking=self._checked_at is None):
+            return
+        try:
+            self._load()
+        finally:
+            self._checked_at = time.monotonic()
+            self._lock.release()
+
+    def _load(self):
+        kwargs = {"IfNoneMatch": self.etag} if self.etag else {}
+        try:
+            response = get_client("s3").get_object(
+                Bucket=self.bucket, Key=self.key, **kwargs
+            )
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code in ("304", "NotModified"):
+                return
+            if code in ("NoSuchKey", "404"):
+                logger.info("No citation manifest, citations are read from S3")
+                return
+            logger.warning(f"Failed to load citation manifest: {e}")
+            return
+
+        manifest = json.loads(response["Body"].read())
+        self._documents = manifest.get("documents", {})
+        self.etag = response.get("ETag")
+        logger.info(
+            f"Loaded citation manifest with {len(self._documents)} documents"
+        )
+
+
+_citation_manifest = None
+
+
+def get_citation_manifest():
+    """
+    Return the citation manifest of this container.
+    """
+    global _citation_manifest
+    if _citation_manifest is None:
+        _citation_manifest = CitationManifest(
+            CITATION_MANIFEST_BUCKET, CITATION_MANIFEST_KEY
+        )
+
+    return _citation_manifest
+
+
+def set_citation_manifest(citation_manifest):
+    """
+    Replace the citation manifest, e.g. with one for a local bucket in tests.
+    """
+    global _citation_manifest
+    _citation_manifest = citation_manifest
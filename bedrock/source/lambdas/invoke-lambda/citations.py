@@ -0,0 +1,90 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads resolving cited documents while the agent is still generating.
+CITATION_RESOLVER_WORKERS = int(os.environ.get("CITATION_RESOLVER_WORKERS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_resolver_executor():
+    """
+    Return the thread pool shared by all citation collectors of the container.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=CITATION_RESOLVER_WORKERS,
+                    thread_name_prefix="citation",
+                )
+
+    return _executor
+
+
+def reference_uris(references):
+    """
+    Extract the S3 URIs from a list of retrieved references.
+    """
+    return [
+        reference["location"]["s3Location"]["uri"]
+        for reference in references
+        if "s3Location" in reference.get("location", {})
+    ]
+
+
+class CitationCollector:
+    """
+    Collects cited documents from every knowledge base lookup of a response.
+
+    URIs are de-duplicated as they arrive and each new one is handed to the
+    resolver straight away, so document lookups overlap with the rest of
+    the agent's generation.
+    """
+
+    def __init__(self, resolver=None, executor=None):
+        """
+        Args:
+            resolver (callable): Resolves a URI to its citation, e.g. a
+                (title, link) tuple. Without a resolver URIs are only collected.
+            executor (Executor): Runs the resolver, defaults to the shared pool.
+        """
+        self.resolver = resolver
+        self.executor = executor
+        self.uris = []
+        self._seen = set()
+        self._futures = {}
+
+    def add(self, uris):
+        """
+        Add cited URIs, starting resolution for the ones not seen before.
+        """
+        for uri in uris:
+            if uri in self._seen:
+                continue
+            self._seen.add(uri)
+            self.uris.append(uri)
+            if self.resolver:
+                executor = self.executor or get_resolver_executor()
+                self._futures[uri] = executor.submit(self.resolver, uri)
+
+    def add_references(self, references):
+        """
+        Add the URIs of a list of retrieved references.
+        """
+        self.add(reference_uris(references))
+
+    def resolved(self):
+        """
+        Wait for all resolutions and return them in citation order.
+
+        Returns:
+            list: The resolver's result for each URI.
+        """
+        if not self.resolver:
+            return list(self.uris)
+
+        return [self._futures[uri].result() for uri in self.uris]
@@ -0,0 +1,88 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+REGION_NAME = os.environ.get("REGION_NAME")
+
+# One session and connection pool sized for the batch worker threads.
+CLIENT_CONFIG = Config(
+    region_name=REGION_NAME,
+    max_pool_connections=int(os.environ.get("CLIENT_MAX_POOL_CONNECTIONS", "20")),
+    connect_timeout=5,
+    read_timeout=60,
+    tcp_keepalive=True,
+    retries={"max_attempts": 3, "mode": "standard"},
+)
+
+# Agent responses stream for as long as the agent runs, up to the function
+# timeout; every other call should fail fast and be retried.
+SERVICE_CONFIGS = {
+    "bedrock-agent-runtime": CLIENT_CONFIG.merge(Config(read_timeout=900)),
+}
+
+_session = None
+_clients = {}
+_resources = {}
+_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(region_name=REGION_NAME)
+
+    return _session
+
+
+def get_client(service_name):
+    """
+    Return the shared client for a service, created on first use.
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = _clients[service_name] = get_session().client(
+                    service_name,
+                    config=SERVICE_CONFIGS.get(service_name, CLIENT_CONFIG),
+                )
+
+    return client
+
+
+def get_resource(service_name):
+    """
+    Return the shared resource for a service, created on first use.
+    """
+    resource = _resources.get(service_name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                resource = _resources[service_name] = get_session().resource(
+                    service_name, config=CLIENT_CONFIG
+                )
+
+    return resource
+
+
+def set_client(service_name, client):
+    """
+    Replace the client for a service, e.g. with a fake in tests.
+    """
+    _clients[service_name] = client
+
+
+def reset():
+    """
+    Drop all clients, e.g. after a SnapStart restore when pooled
+    connections and credentials from the snapshot are stale.
+    """
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
@@ -0,0 +1,276 @@
+import os
+import re
+import time
+import hashlib
+import threading
+
+from botocore.exceptions import ClientError
+
+from clients import get_resource
+
+CHAT_STATE_TABLE_NAME = os.environ.get("CHAT_STATE_TABLE_NAME")
+
+# Identical queries within the same window share one agent invocation; 0 disables.
+COALESCE_WINDOW_SECONDS = int(os.environ.get("COALESCE_WINDOW_SECONDS", "30"))
+# Share in-flight invocations across containers through the chat state table.
+COALESCE_SHARED = os.environ.get("COALESCE_SHARED", "false").lower() == "true"
+# How long a leader may hold the shared lock before followers take over.
+COALESCE_LEASE_SECONDS = int(os.environ.get("COALESCE_LEASE_SECONDS", "300"))
+# How long a follower of a synchronous request waits for the leader, below
+# API Gateway's 29 seconds. Asynchronous jobs wait as long as they can run.
+COALESCE_MAX_WAIT_SECONDS = float(os.environ.get("COALESCE_MAX_WAIT_SECONDS", "25"))
+
+
+class CoalescingTimeout(TimeoutError):
+    """
+    The leader of a coalesced query didn't finish within the wait limit.
+    """
+
+
+def normalize_query(query):
+    """
+    Normalize query text so trivially different spellings coalesce.
+    """
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip(" ?!.")
+
+
+def coalescing_key(
+    query, window_seconds=COALESCE_WINDOW_SECONDS, now=None, scope=""
+):
+    """
+    Build the coalescing key from the normalized query and a freshness bucket.
+
+    Args:
+        query (str): The user query.
+        window_seconds (int): Width of the data freshness bucket.
+        now (float): Current time, defaults to time.time().
+        scope (str): What else the answer depends on, e.g. the asset model
+            and the agent session of a follow-up, so queries are only shared
+            within the same scope.
+
+    Returns:
+        str: Hex digest identifying the query within its freshness bucket.
+    """
+    now = time.time() if now is None else now
+    bucket = int(now // window_seconds) if window_seconds > 0 else 0
+    return hashlib.sha256(
+        f"{bucket}:{scope}:{normalize_query(query)}".encode("utf-8")
+    ).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Share one execution of a function between concurrent callers of a key.
+
+    Callers within the container wait on the leader's in-flight call. When a
+    shared store is configured, only one container runs the function and
+    the others wait for its published result.
+    """
+
+    def __init__(self, shared_store=None, poll_interval=0.5):
+        self.shared_store = shared_store
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, max_wait=COALESCE_MAX_WAIT_SECONDS):
+        """
+        Run fn once for all concurrent callers of key.
+
+        Args:
+            key (str): Coalescing key of the call.
+            fn (callable): The call to share.
+            max_wait (float): Seconds a follower waits for the leader, None
+                to wait for as long as it runs.
+
+        Returns:
+            tuple: The result of fn and whether it was shared from another call.
+
+        Raises:
+            CoalescingTimeout: If the leader doesn't finish within max_wait.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(max_wait):
+                raise CoalescingTimeout(f"Coalesced call {key} still running")
+            if call.error:
+                raise call.error
+            return call.result, True
+
+        shared = False
+        try:
+            if self.shared_store:
+                call.result, shared = self._do_shared(key, fn, max_wait)
+            else:
+                call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result, shared
+
+    def _do_shared(self, key, fn, max_wait):
+        deadline = None if max_wait is None else time.time() + max_wait
+        while True:
+            if self.shared_store.acquire(key, COALESCE_LEASE_SECONDS):
+                published = False
+                try:
+                    result = fn()
+                    self.shared_store.publish(key, result)
+                    published = True
+                finally:
+                    if not published:
+                        # Let a waiting container take over now rather than
+                        # when the lease expires.
+                        self.shared_store.release(key)
+                return result, False
+
+            result = self.shared_store.get_result(key)
+            if result is not None:
+                return result, True
+
+            if deadline is not None and time.time() >= deadline:
+                raise CoalescingTimeout(f"Coalesced call {key} still running")
+
+            # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
+            time.sleep(self.poll_interval)  # nosem: arbitrary-sleep
+
+
+class InMemoryFlightStore:
+    """
+    Local stand-in for the shared lock/result store.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, lease_seconds):
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item and (item.get("result") is not None or item["lease_until"] > now):
+                return False
+            self._items[key] = {"lease_until": now + lease_seconds, "result": None}
+            return True
+
+    def publish(self, key, result):
+        with self._lock:
+            self._items[key] = {"lease_until": 0, "result": result}
+
+    def release(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item and item.get("result") is None:
+                del self._items[key]
+
+    def get_result(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            return item["result"] if item else None
+
+
+class DynamoDBFlightStore:
+    """
+    Shared lock/result store in the chat state table, keyed by
+    ``pk = "flight#<key>"``. Results expire with the freshness window.
+    """
+
+    key_prefix = "flight#"
+
+    def __init__(self, table_name):
+        self.table = get_resource("dynamodb").Table(table_name)
+
+    def acquire(self, key, lease_seconds):
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={
+                    "pk": f"{self.key_prefix}{key}",
+                    "lease_until": now + lease_seconds,
+                    "expires_at": now + lease_seconds + COALESCE_WINDOW_SECONDS,
+                },
+                ConditionExpression="attribute_not_exists(pk) OR "
+                "(attribute_not_exists(#result) AND lease_until < :now)",
+                ExpressionAttributeNames={"#result": "result"},
+                ExpressionAttributeValues={":now": now},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+        return True
+
+    def publish(self, key, result):
+        self.table.update_item(
+            Key={"pk": f"{self.key_prefix}{key}"},
+            UpdateExpression="SET #result = :result, expires_at = :expires_at",
+            ExpressionAttributeNames={"#result": "result"},
+            ExpressionAttributeValues={
+                ":result": result,
+                ":expires_at": int(time.time()) + COALESCE_WINDOW_SECONDS,
+            },
+        )
+
+    def release(self, key):
+        """
+        Drop an unpublished lease, e.g. after the leader failed.
+        """
+        try:
+            self.table.delete_item(
+                Key={"pk": f"{self.key_prefix}{key}"},
+                ConditionExpression="attribute_not_exists(#result)",
+                ExpressionAttributeNames={"#result": "result"},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    def get_result(self, key):
+        item = self.table.get_item(
+            Key={"pk": f"{self.key_prefix}{key}"}, ConsistentRead=True
+        ).get("Item")
+        return item.get("result") if item else None
+
+
+_single_flight = None
+
+
+def get_single_flight():
+    """
+    Return the single-flight group for this container.
+    """
+    global _single_flight
+    if _single_flight is None:
+        shared_store = None
+        if COALESCE_SHARED and CHAT_STATE_TABLE_NAME:
+            shared_store = DynamoDBFlightStore(CHAT_STATE_TABLE_NAME)
+        _single_flight = SingleFlight(shared_store)
+
+    return _single_flight
+
+
+def set_single_flight(single_flight):
+    """
+    Replace the single-flight group, e.g. with an ``InMemoryFlightStore`` in tests.
+    """
+    global _single_flight
+    _single_flight = single_flight
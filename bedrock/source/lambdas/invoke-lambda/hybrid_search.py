@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import threading
+
+from aws_lambda_powertools import Logger
+
+from clients import get_client, get_session
+
+logger = Logger()
+
+# Knowledge base collection queried by POST /search (routes/search.py). The
+# stack only sets these, adds the opensearch-py layer and grants access with
+# the hybrid_search context value; without them the route answers 404.
+COLLECTION_HOST = os.environ.get("COLLECTION_HOST")
+VECTOR_INDEX_NAME = os.environ.get("VECTOR_INDEX_NAME")
+VECTOR_FIELD_NAME = os.environ.get(
+    "VECTOR_FIELD_NAME", "bedrock-knowledge-base-default-vector"
+)
+# Must match the embedding model and size of the index profile.
+EMBEDDING_MODEL_ID = os.environ.get("EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v1")
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "1536"))
+# Share of the fused score that comes from BM25, the rest from kNN.
+HYBRID_LEXICAL_WEIGHT = float(os.environ.get("HYBRID_LEXICAL_WEIGHT", "0.3"))
+# Candidates fetched from each query before fusion, per result returned.
+HYBRID_CANDIDATE_FACTOR = int(os.environ.get("HYBRID_CANDIDATE_FACTOR", "4"))
+
+TEXT_FIELD_NAME = "AMAZON_BEDROCK_TEXT_CHUNK"
+EQUIPMENT_FIELD_NAME = "equipment"
+EQUIPMENT_TAGS_FIELD_NAME = "equipment_tags"
+SOURCE_URI_FIELD_NAME = "x-amz-bedrock-kb-source-uri"
+
+# Equipment codes and valve tags such as "BoilKettle100" or "FV-101".
+EQUIPMENT_TAG = re.compile(r"\b(?:[A-Z][a-z]+){1,3}\d{2,}\b|\b[A-Z]{1,4}-\d{2,}\b")
+
+
+def equipment_tags(text):
+    """
+    Return the equipment codes mentioned in a query.
+    """
+    return list(dict.fromkeys(EQUIPMENT_TAG.findall(text or "")))
+
+
+def build_filter(filters):
+    """
+    Turn ``{field: value or [values]}`` into term filters.
+    """
+    clauses = []
+    for field, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({"terms": {field: list(value)}})
+        else:
+            clauses.append({"term": {field: value}})
+
+    return clauses
+
+
+def lexical_query(text, size, filters=None):
+    """
+    BM25 query over the chunk text, boosting chunks tagged with the
+    equipment the query names.
+    """
+    should = [
+        {
+            "match": {
+                TEXT_FIELD_NAME: {"query": text, "operator": "or"},
+            }
+        }
+    ]
+    tags = equipment_tags(text)
+    if tags:
+        lowered = [tag.lower() for tag in tags]
+        should.append({"terms": {EQUIPMENT_FIELD_NAME: lowered, "boost": 2.0}})
+        should.append({"terms": {EQUIPMENT_TAGS_FIELD_NAME: lowered, "boost": 2.0}})
+
+    return {
+        "size": size,
+        "_source": {"excludes": [VECTOR_FIELD_NAME]},
+        "query": {
+            "bool": {
+                "should": should,
+                "minimum_should_match": 1,
+                "filter": build_filter(filters),
+            }
+        },
+    }
+
+
+def knn_query(vector, size, filters=None, vector_field=VECTOR_FIELD_NAME):
+    """
+    kNN query over the embedding field, filtered during the search.
+    """
+    knn = {"vector": list(vector), "k": size}
+    clauses = build_filter(filters)
+    if clauses:
+        knn["filter"] = {"bool": {"filter": clauses}}
+
+    return {
+        "size": size,
+        "_source": {"excludes": [vector_field]},
+        "query": {"knn": {vector_field: knn}},
+    }
+
+
+def min_max_normalize(hits):
+    """
+    Scale the scores of one result list to [0, 1].
+
+    BM25 scores are unbounded and kNN scores are similarities, so they are
+    only comparable after normalizing each list. A list whose hits all score
+    the same gets 1.0 for every hit.
+    """
+    if not hits:
+        return {}
+
+    scores = [hit["_score"] for hit in hits]
+    low, high = min(scores), max(scores)
+    spread = high - low
+    return {
+        hit["_id"]: (hit["_score"] - low) / spread if spread else 1.0 for hit in hits
+    }
+
+
+def fuse(lexical_hits, vector_hits, lexical_weight=HYBRID_LEXICAL_WEIGHT, size=None):
+    """
+    Combine BM25 and kNN hits by a weighted sum of min-max normalized scores.
+
+    A hit missing from one list scores 0 there.
+
+    Returns:
+        list: Hits sorted by fused score, each with ``_score`` replaced by the
+            fused score and the normalized scores in ``_lexical_score`` and
+            ``_vector_score``.
+    """
+    lexical = min_max_normalize(lexical_hits)
+    vector = min_max_normalize(vector_hits)
+    hits = {hit["_id"]: hit for hit in vector_hits}
+    hits.update({hit["_id"]: hit for hit in lexical_hits})
+
+    fused = []
+    for hit_id, hit in hits.items():
+        lexical_score = lexical.get(hit_id, 0.0)
+        vector_score = vector.get(hit_id, 0.0)
+        fused.append(
+            dict(
+                hit,
+                _score=lexical_weight * lexical_score
+                + (1 - lexical_weight) * vector_score,
+                _lexical_score=lexical_score,
+                _vector_score=vector_score,
+            )
+        )
+
+    fused.sort(key=lambda hit: hit["_score"], reverse=True)
+    return fused[:size] if size else fused
+
+
+def embed_query(text):
+    """
+    Embed a query with the knowledge base's embedding model.
+    """
+    body = {"inputText": text}
+    if "v2" in EMBEDDING_MODEL_ID:
+        body.update(dimensions=EMBEDDING_DIMENSIONS, normalize=True)
+
+    response = get_client("bedrock-runtime").invoke_model(
+        modelId=EMBEDDING_MODEL_ID, body=json.dumps(body)
+    )
+    return json.loads(response["body"].read())["embedding"]
+
+
+class HybridRetriever:
+    """
+    Retrieves knowledge base chunks with BM25 and kNN in one round trip.
+
+    Both queries go to the index in a single multi-search request and the
+    results are fused client side, as OpenSearch Serverless has no search
+    pipelines to normalize scores in the collection.
+    """
+
+    def __init__(
+        self,
+        search_client,
+        index_name=VECTOR_INDEX_NAME,
+        embed=embed_query,
+        lexical_weight=HYBRID_LEXICAL_WEIGHT,
+        candidate_factor=HYBRID_CANDIDATE_FACTOR,
+    ):
+        self.search_client = search_client
+        self.index_name = index_name
+        self.embed = embed
+        self.lexical_weight = lexical_weight
+        self.candidate_factor = candidate_factor
+
+    def retrieve(self, text, k=5, filters=None):
+        """
+        Return the top chunks for a query.
+
+        Args:
+            text (str): The query.
+            k (int): Number of chunks to return.
+            filters (dict): Exact metadata filters, e.g. ``{"equipment": "mashtun100"}``.
+
+        Returns:
+            list: Dicts with ``text``, ``source``, ``score`` and the normalized
+                ``lexical_score`` and ``vector_score``.
+        """
+        candidates = k * self.candidate_factor
+        header = json.dumps({"index": self.index_name})
+        body = "\n".join(
+            [
+                header,
+                json.dumps(lexical_query(text, candidates, filters)),
+                header,
+                json.dumps(knn_query(self.embed(text), candidates, filters)),
+            ]
+        )
+        lexical_response, vector_response = self.search_client.msearch(
+            body=body + "\n"
+        )["responses"]
+        for response in (lexical_response, vector_response):
+            if "error" in response:
+                raise RuntimeError(f"Hybrid search failed: {response['error']}")
+
+        hits = fuse(
+            lexical_response["hits"]["hits"],
+            vector_response["hits"]["hits"],
+            self.lexical_weight,
+            size=k,
+        )
+        return [
+            {
+                "text": hit["_source"].get(TEXT_FIELD_NAME),
+                "source": hit["_source"].get(SOURCE_URI_FIELD_NAME),
+                "score": hit["_score"],
+                "lexical_score": hit["_lexical_score"],
+                "vector_score": hit["_vector_score"],
+            }
+            for hit in hits
+        ]
+
+
+def create_search_client(host=COLLECTION_HOST):
+    """
+    Create a SigV4 signed client for the knowledge base collection.
+
+    opensearch-py is only needed by this retrieval path, so it is imported
+    here rather than at module load.
+    """
+    from opensearchpy import AWSV4SignerAuth, OpenSearch, RequestsHttpConnection
+
+    session = get_session()
+    auth = AWSV4SignerAuth(session.get_credentials(), session.region_name, "aoss")
+    return OpenSearch(
+        hosts=[{"host": host.split("//")[-1], "port": 443}],
+        http_auth=auth,
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=RequestsHttpConnection,
+        pool_maxsize=20,
+    )
+
+
+_hybrid_retriever = None
+_lock = threading.Lock()
+
+
+def get_hybrid_retriever():
+    """
+    Return the hybrid retriever for this container.
+    """
+    global _hybrid_retriever
+    if _hybrid_retriever is None:
+        with _lock:
+            if _hybrid_retriever is None:
+                _hybrid_retriever = HybridRetriever(create_search_client())
+
+    return _hybrid_retriever
+
+
+def set_hybrid_retriever(hybrid_retriever):
+    """
+    Replace the hybrid retriever, e.g. with a stub in tests.
+    """
+    global _hybrid_retriever
+    _hybrid_retriever = hybrid_retriever
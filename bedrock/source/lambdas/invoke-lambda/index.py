@@ -1,9 +1,7 @@
 import os
-import json
-from pydantic import ValidationError
+import random
 from botocore.exceptions import ClientError
-from aws_lambda_powertools.utilities import parameters
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger
 from aws_lambda_powertools.logging import correlation_paths
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools.event_handler.api_gateway import Response
@@ -12,24 +10,36 @@ from aws_lambda_powertools.event_handler import (
     CORSConfig,
     content_types,
 )
-from utils import CustomEncoder
+from utils import dumps
 from routes.health import router as health_router
-from routes.chat import router as chat_router
-
-tracer = Tracer()
+from routes.chat import router as chat_router, run_job, get_agent_alias_id
+from routes.batch import router as batch_router
+from routes.search import router as search_router
+from clients import reset as reset_clients
+from auth import get_origin_verifier
+from citation_manifest import get_citation_manifest
+from tracing import get_tracer
+
+tracer = get_tracer()
 logger = Logger()
 
-X_ORIGIN_VERIFY_SECRET_ARN = os.environ.get("X_ORIGIN_VERIFY_SECRET_ARN")
+# Fetch the secret, agent alias and citation manifest during the init phase
+# instead of on the first request.
+PREFETCH_ON_INIT = os.environ.get("PREFETCH_ON_INIT", "true").lower() == "true"
+# Share of invocations whose full event is logged, 0 disables.
+LOG_EVENT_SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", "0.01"))
 
 cors_config = CORSConfig(allow_origin="*", max_age=300)
 app = APIGatewayRestResolver(
     cors=cors_config,
     strip_prefixes=["/v1"],
-    serializer=lambda obj: json.dumps(obj, cls=CustomEncoder),
+    serializer=dumps,
 )
 
 app.include_router(health_router)
 app.include_router(chat_router)
+app.include_router(batch_router)
+app.include_router(search_router)
 
 
 @app.exception_handler(ClientError)
@@ -39,42 +49,94 @@ def handle_value_error(e: ClientError):
     return Response(
         status_code=200,
         content_type=content_types.APPLICATION_JSON,
-        body=json.dumps(
-            {"error": True, "message": str(e)},
-            cls=CustomEncoder,
-        ),
+        body=dumps({"error": True, "message": str(e)}),
     )
 
 
-@app.exception_handler(ValidationError)
-def handle_value_error(e: ValidationError):
-    logger.exception(e)
+def prefetch():
+    """
+    Warm the secret cache, the agent alias cache and the citation manifest.
+    """
+    try:
+        get_origin_verifier().refresh()
+        get_agent_alias_id()
+        get_citation_manifest().refresh()
+    except Exception as e:
+        logger.warning(f"Prefetch failed, continuing lazily: {e}")
+
+
+if PREFETCH_ON_INIT:
+    prefetch()
+
+try:
+    # Available on runtimes with SnapStart enabled.
+    from snapshot_restore_py import register_after_restore
+except ImportError:
+    pass
+else:
+
+    @register_after_restore
+    def after_restore():
+        # Pooled connections and credentials from the snapshot are stale.
+        reset_clients()
+        if PREFETCH_ON_INIT:
+            prefetch()
+
+
+def log_sampled_event(event):
+    """
+    Log the incoming event for a sample of invocations, without the
+    origin verification header.
+    """
+    # nosemgrep: <insecure-random Message: random is fine for sampling>
+    if random.random() >= LOG_EVENT_SAMPLE_RATE:  # nosem: insecure-random
+        return
+
+    headers = event.get("headers")
+    if headers and "X-Origin-Verify" in headers:
+        event = dict(event, headers=dict(headers, **{"X-Origin-Verify": "***"}))
+        event.pop("multiValueHeaders", None)
+    logger.info(event)
+
+
+FORBIDDEN = {"statusCode": 403, "body": "Forbidden"}
+HEALTH_RESPONSE = {
+    "statusCode": 200,
+    "headers": {
+        "Content-Type": content_types.APPLICATION_JSON,
+        "Access-Control-Allow-Origin": "*",
+    },
+    "body": dumps({"ok": True}),
+    "isBase64Encoded": False,
+}
 
-    return Response(
-        status_code=200,
-        content_type=content_types.APPLICATION_JSON,
-        body=json.dumps(
-            {"error": True, "message": [str(error) for error in e.errors()]},
-            cls=CustomEncoder,
-        ),
-    )
 
+def handler(event: dict, context: LambdaContext) -> dict:
+    """
+    Reject unverified requests and answer health checks before any
+    logging, tracing or routing work is done.
+    """
+    # Asynchronous chat jobs are started by this function invoking itself.
+    if "chat_job_id" in event:
+        return handle_request(event, context)
 
-def get_origin_verify_header_value():
-    origin_verify_header_value = parameters.get_secret(
-        X_ORIGIN_VERIFY_SECRET_ARN, transform="json", max_age=60
-    )["headerValue"]
+    if not get_origin_verifier().verify(event.get("headers")):
+        return FORBIDDEN
 
-    return origin_verify_header_value
+    if event.get("httpMethod") == "GET" and event.get("path", "").endswith(
+        "/health"
+    ):
+        return HEALTH_RESPONSE
 
+    return handle_request(event, context)
 
-@logger.inject_lambda_context(
-    log_event=True, correlation_id_path=correlation_paths.API_GATEWAY_REST
-)
+
+@logger.inject_lambda_context(correlation_id_path=correlation_paths.API_GATEWAY_REST)
 @tracer.capture_lambda_handler
-def handler(event: dict, context: LambdaContext) -> dict:
-    origin_verify_header_value = get_origin_verify_header_value()
-    if event["headers"]["X-Origin-Verify"] == origin_verify_header_value:
-        return app.resolve(event, context)
+def handle_request(event: dict, context: LambdaContext) -> dict:
+    log_sampled_event(event)
+
+    if "chat_job_id" in event:
+        return run_job(event, context)
 
-    return {"statusCode": 403, "body": "Forbidden"}
\ No newline at end of file
+    return app.resolve(event, context)
\ No newline at end of file
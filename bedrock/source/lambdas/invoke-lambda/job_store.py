@@ -0,0 +1,226 @@
+import os
+import time
+import uuid
+import threading
+from abc import ABC, abstractmethod
+
+from clients import get_resource
+
+CHAT_STATE_TABLE_NAME = os.environ.get("CHAT_STATE_TABLE_NAME")
+
+# Finished jobs are kept around long enough for the front end to poll them.
+JOB_TTL_SECONDS = int(os.environ.get("CHAT_JOB_TTL_SECONDS", "86400"))
+
+JOB_PENDING = "PENDING"
+JOB_RUNNING = "RUNNING"
+JOB_SUCCEEDED = "SUCCEEDED"
+JOB_FAILED = "FAILED"
+
+
+class JobStore(ABC):
+    """
+    Persistence for asynchronous chat jobs.
+
+    A job record is a plain dict with ``job_id``, ``status``, ``request``,
+    ``partial``, ``result``, ``error``, ``created_at`` and ``updated_at``.
+    """
+
+    def create(self, request):
+        """
+        Create a new pending job for the given chat request.
+
+        Args:
+            request (dict): The original chat request body.
+
+        Returns:
+            dict: The newly created job record.
+        """
+        now = int(time.time())
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "status": JOB_PENDING,
+            "request": request,
+            "partial": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.put(job)
+
+        return job
+
+    @abstractmethod
+    def put(self, job):
+        """
+        Store a job record, replacing any with the same ID.
+        """
+
+    @abstractmethod
+    def get(self, job_id):
+        """
+        Return a job record, or None if there is no such job.
+        """
+
+    @abstractmethod
+    def update(self, job_id, **fields):
+        """
+        Set fields of a job record and its update time.
+        """
+
+    @abstractmethod
+    def put_item_result(self, job_id, index, result):
+        """
+        Store the result of one item of a batch job, apart from the job so
+        its size doesn't grow with the results.
+        """
+
+    @abstractmethod
+    def get_item_results(self, job_id, count):
+        """
+        Return the stored item results of a batch job, None for unfinished
+        items.
+        """
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Local stand-in for tests and for running the Lambda outside of AWS.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._item_results = {}
+        self._lock = threading.Lock()
+
+    def put(self, job):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            job["updated_at"] = int(time.time())
+            return dict(job)
+
+    def put_item_result(self, job_id, index, result):
+        with self._lock:
+            self._item_results[(job_id, index)] = dict(result)
+
+    def get_item_results(self, job_id, count):
+        with self._lock:
+            return [self._item_results.get((job_id, i)) for i in range(count)]
+
+
+class DynamoDBJobStore(JobStore):
+    """
+    Job store backed by the chat state DynamoDB table.
+
+    Items are keyed by ``pk = "job#<job_id>"``, the results of batch items
+    by ``pk = "job#<job_id>#<index>"``, and expire through the table's
+    ``expires_at`` TTL attribute.
+    """
+
+    key_prefix = "job#"
+
+    def __init__(self, table_name):
+        self.table = get_resource("dynamodb").Table(table_name)
+
+    def _key(self, job_id):
+        return {"pk": f"{self.key_prefix}{job_id}"}
+
+    def put(self, job):
+        item = dict(job, **self._key(job["job_id"]))
+        item["expires_at"] = job["created_at"] + JOB_TTL_SECONDS
+        self.table.put_item(Item=item)
+
+    def get(self, job_id):
+        item = self.table.get_item(Key=self._key(job_id), ConsistentRead=True).get(
+            "Item"
+        )
+        if not item:
+            return None
+
+        item.pop("pk", None)
+        item.pop("expires_at", None)
+        return item
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = int(time.time())
+        names = {f"#f{i}": name for i, name in enumerate(fields)}
+        values = {f":v{i}": value for i, value in enumerate(fields.values())}
+        assignments = ", ".join(f"#f{i} = :v{i}" for i in range(len(fields)))
+
+        response = self.table.update_item(
+            Key=self._key(job_id),
+            UpdateExpression=f"SET {assignments}",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ConditionExpression="attribute_exists(pk)",
+            ReturnValues="ALL_NEW",
+        )
+        item = response["Attributes"]
+        item.pop("pk", None)
+        item.pop("expires_at", None)
+        return item
+
+    def put_item_result(self, job_id, index, result):
+        self.table.put_item(
+            Item={
+                "pk": f"{self.key_prefix}{job_id}#{index}",
+                "result": result,
+                "expires_at": int(time.time()) + JOB_TTL_SECONDS,
+            }
+        )
+
+    def get_item_results(self, job_id, count):
+        results = [None] * count
+        keys = [{"pk": f"{self.key_prefix}{job_id}#{i}"} for i in range(count)]
+        resource = get_resource("dynamodb")
+        # BatchGetItem reads at most 100 keys and may return some unprocessed.
+        for start in range(0, count, 100):
+            request = {
+                self.table.name: {"Keys": keys[start : start + 100], "ConsistentRead": True}
+            }
+            while request:
+                response = resource.batch_get_item(RequestItems=request)
+                for item in response["Responses"].get(self.table.name, []):
+                    index = int(item["pk"].rsplit("#", 1)[1])
+                    results[index] = item["result"]
+                request = response.get("UnprocessedKeys")
+
+        return results
+
+
+_job_store = None
+
+
+def get_job_store():
+    """
+    Return the job store for this container.
+
+    DynamoDB is used when ``CHAT_STATE_TABLE_NAME`` is set, otherwise an
+    in-memory store is used.
+    """
+    global _job_store
+    if _job_store is None:
+        if CHAT_STATE_TABLE_NAME:
+            _job_store = DynamoDBJobStore(CHAT_STATE_TABLE_NAME)
+        else:
+            _job_store = InMemoryJobStore()
+
+    return _job_store
+
+
+def set_job_store(job_store):
+    """
+    Replace the job store, e.g. with an ``InMemoryJobStore`` in tests.
+    """
+    global _job_store
+    _job_store = job_store
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from aws_lambda_powertools import Logger
+
+from tracing import TRACE_DISABLED
+
+logger = Logger()
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "AssistedDiagnosis")
+SERVICE_NAME = os.environ.get("POWERTOOLS_SERVICE_NAME", "invoke-lambda")
+# Comma separated list of sinks: emf, xray, local.
+LATENCY_SINKS = os.environ.get("LATENCY_SINKS", "emf,xray")
+
+
+class EMFSink:
+    """
+    Writes phase timings as a CloudWatch embedded metric format record.
+
+    Every phase becomes a millisecond metric named after the phase; phases
+    recorded more than once (e.g. orchestration steps) are emitted as arrays.
+    """
+
+    def __init__(self, namespace=METRICS_NAMESPACE, stream=None):
+        self.namespace = namespace
+        self.stream = stream
+
+    def emit(self, phases, properties):
+        values = {}
+        for phase in phases:
+            values.setdefault(phase["name"], []).append(phase["duration_ms"])
+
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [["Service"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": "Milliseconds"} for name in values
+                        ],
+                    }
+                ],
+            },
+            "Service": SERVICE_NAME,
+            **properties,
+        }
+        for name, durations in values.items():
+            record[name] = durations[0] if len(durations) == 1 else durations
+
+        print(json.dumps(record, default=str), file=self.stream or sys.stdout)
+
+
+class XRaySink:
+    """
+    Adds one X-Ray subsegment per phase below the current segment.
+    """
+
+    def __init__(self):
+        from aws_xray_sdk.core import xray_recorder
+
+        self.recorder = xray_recorder
+
+    def emit(self, phases, properties):
+        for phase in phases:
+            try:
+                subsegment = self.recorder.begin_subsegment(f"## {phase['name']}")
+                if subsegment is None:
+                    return
+                subsegment.start_time = phase["start"]
+                for key, value in phase.get("annotations", {}).items():
+                    subsegment.put_annotation(key, value)
+                self.recorder.end_subsegment(phase["end"])
+            except Exception as e:
+                logger.debug(f"Unable to record X-Ray subsegment: {e}")
+                return
+
+
+class LocalSink:
+    """
+    Keeps emitted phases in memory for tests and local runs.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, phases, properties):
+        self.records.append({"phases": list(phases), "properties": dict(properties)})
+
+
+def create_sinks(names=LATENCY_SINKS):
+    sinks = []
+    for name in filter(None, (n.strip().lower() for n in names.split(","))):
+        if name == "emf":
+            sinks.append(EMFSink())
+        elif name == "xray":
+            if TRACE_DISABLED:
+                continue
+            try:
+                sinks.append(XRaySink())
+            except ImportError:
+                logger.debug("aws_xray_sdk not available, skipping X-Ray sink")
+        elif name == "local":
+            sinks.append(LocalSink())
+
+    return sinks
+
+
+_default_sinks = None
+
+
+def get_default_sinks():
+    global _default_sinks
+    if _default_sinks is None:
+        _default_sinks = create_sinks()
+
+    return _default_sinks
+
+
+def set_default_sinks(sinks):
+    """
+    Replace the sinks used by new recorders, e.g. with ``[LocalSink()]`` in tests.
+    """
+    global _default_sinks
+    _default_sinks = sinks
+
+
+class LatencyRecorder:
+    """
+    Records per-phase timings of a single chat request.
+
+    Phases are either measured around a block with ``phase()``, marked as
+    elapsed time since the request started with ``mark()``, or recorded
+    from externally measured start and end times with ``record()``.
+    """
+
+    def __init__(self, sinks=None, **properties):
+        self.sinks = get_default_sinks() if sinks is None else sinks
+        self.properties = properties
+        self.phases = []
+        self._marks = set()
+        self._lock = threading.Lock()
+        self._start_wall = time.time()
+        self._start = time.perf_counter()
+
+    def now(self):
+        return time.perf_counter()
+
+    def _to_wall(self, perf_time):
+        return self._start_wall + (perf_time - self._start)
+
+    def record(self, name, start, end=None, **annotations):
+        """
+        Record a phase from perf_counter() start and end times.
+        """
+        end = self.now() if end is None else end
+        with self._lock:
+            self.phases.append(
+                {
+                    "name": name,
+                    "start": self._to_wall(start),
+                    "end": self._to_wall(end),
+                    "duration_ms": round((end - start) * 1000, 1),
+                    "annotations": annotations,
+                }
+            )
+
+    def mark(self, name):
+        """
+        Record the time elapsed since the request started, once per name.
+        """
+        with self._lock:
+            if name in self._marks:
+                return
+            self._marks.add(name)
+
+        self.record(name, self._start)
+
+    @contextmanager
+    def phase(self, name, **annotations):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.record(name, start, **annotations)
+
+    def emit(self):
+        """
+        Record the total request time and send all phases to the sinks.
+        """
+        self.record("total", self._start)
+        for sink in self.sinks:
+            try:
+                sink.emit(self.phases, self.properties)
+            except Exception as e:
+                logger.warning(f"Failed to emit latency metrics: {e}")
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.event_handler.api_gateway import Router
+from aws_lambda_powertools.event_handler.exceptions import BadRequestError
+
+from job_store import get_job_store, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED
+from routes.chat import (
+    answer_query,
+    dispatch_chat_job,
+    seconds_left,
+    JOB_RUNNERS,
+    COALESCE_MAX_WAIT_SECONDS,
+)
+from tracing import get_tracer
+
+tracer = get_tracer()
+router = Router()
+logger = Logger()
+
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "50"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "8"))
+
+
+def normalize_batch_request(data):
+    """
+    Turn a batch request body into a list of chat items.
+
+    ``queries`` may hold plain strings or objects with ``query`` and an
+    optional ``session_id``. Items without a session ID get their own
+    session derived from the batch ``session_id``, so concurrent items
+    never share an agent session.
+
+    Returns:
+        tuple: Items with ``index``, ``query`` and ``session_id``, and the
+            validated ``max_concurrency``.
+
+    Raises:
+        ValueError: If the queries or ``max_concurrency`` are invalid.
+    """
+    queries = data["queries"]
+    if len(queries) > BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch may contain at most {BATCH_MAX_ITEMS} queries")
+
+    max_concurrency = data.get("max_concurrency", BATCH_MAX_CONCURRENCY)
+    if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int):
+        if not (isinstance(max_concurrency, str) and max_concurrency.isdigit()):
+            raise ValueError("max_concurrency must be a positive integer")
+        max_concurrency = int(max_concurrency)
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be a positive integer")
+
+    items = []
+    for i, entry in enumerate(queries):
+        if isinstance(entry, str):
+            entry = {"query": entry}
+        items.append(
+            {
+                "index": i,
+                "query": entry["query"],
+                "session_id": entry.get("session_id")
+                or f"{data['session_id']}-batch-{i}",
+            }
+        )
+
+    return items, max_concurrency
+
+
+def run_batch(
+    items,
+    max_concurrency=BATCH_MAX_CONCURRENCY,
+    trace_level=None,
+    on_result=None,
+    deadline=None,
+):
+    """
+    Answer a list of chat items with bounded parallelism.
+
+    Failures are isolated per item; throttling is retried inside
+    answer_query. The alias lookup and citation cache are shared by all
+    items through the module level caches in routes.chat.
+
+    Args:
+        items (list): Items from normalize_batch_request().
+        max_concurrency (int): Number of agent invocations run at once.
+        trace_level (str): Trace level applied to every item.
+        on_result (callable): Called with each result as soon as it finishes.
+        deadline (float): Monotonic time until which items wait for coalesced
+            invocations, None to wait for as long as they run.
+
+    Returns:
+        list: Results in the order of the items.
+    """
+    max_concurrency = max(1, min(int(max_concurrency), BATCH_MAX_CONCURRENCY))
+    results = [None] * len(items)
+
+    def answer(item):
+        result = {"index": item["index"], "query": item["query"]}
+        try:
+            result["response"] = answer_query(
+                item["query"],
+                item["session_id"],
+                trace_level=trace_level,
+                max_wait=seconds_left(deadline),
+            )
+            result["ok"] = True
+        except Exception as e:
+            logger.exception(f"Batch item {item['index']} failed")
+            result["ok"] = False
+            result["error"] = str(e)
+
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [executor.submit(answer, item) for item in items]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["index"]] = result
+            if on_result:
+                on_result(result)
+
+    return results
+
+
+@tracer.capture_method
+def run_batch_job(job_id, deadline=None):
+    """
+    Worker entry point for an asynchronous batch job.
+
+    Each finished item is stored on its own and the job only keeps counts,
+    so the job item stays small; GET /chat/{job_id} reads the item results
+    for progress.
+    """
+    job_store = get_job_store()
+    job = job_store.get(job_id)
+    if not job:
+        logger.error(f"Batch job {job_id} not found")
+        return {"ok": False}
+
+    job_store.update(job_id, status=JOB_RUNNING)
+    request = job["request"]
+    counts = {"total": len(request["items"]), "completed": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def on_result(result):
+        job_store.put_item_result(job_id, result["index"], result)
+        with lock:
+            counts["completed"] += 1
+            counts["failed"] += 0 if result["ok"] else 1
+            job_store.update(job_id, partial=dict(counts))
+
+    try:
+        run_batch(
+            request["items"],
+            max_concurrency=request.get("max_concurrency", BATCH_MAX_CONCURRENCY),
+            trace_level=request.get("trace_level"),
+            on_result=on_result,
+            deadline=deadline,
+        )
+    except Exception as e:
+        logger.exception(f"Batch job {job_id} failed")
+        job_store.update(job_id, status=JOB_FAILED, error=str(e))
+        return {"ok": False}
+
+    job_store.update(job_id, status=JOB_SUCCEEDED, result=dict(counts))
+
+    return {"ok": True}
+
+
+JOB_RUNNERS["batch"] = run_batch_job
+
+
+@router.post("/chat/batch")
+@tracer.capture_method
+def chat_batch():
+    data: dict = router.current_event.json_body
+
+    logger.info(data)
+
+    try:
+        items, max_concurrency = normalize_batch_request(data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise BadRequestError(f"Invalid batch request: {e}")
+
+    if data.get("async"):
+        job = get_job_store().create(
+            {
+                "items": items,
+                "max_concurrency": max_concurrency,
+                "trace_level": data.get("trace_level"),
+            }
+        )
+        dispatch_chat_job(job["job_id"], kind="batch")
+
+        return {"ok": True, "job_id": job["job_id"], "status": job["status"]}
+
+    results = run_batch(
+        items,
+        max_concurrency=max_concurrency,
+        trace_level=data.get("trace_level"),
+        deadline=time.monotonic() + COALESCE_MAX_WAIT_SECONDS,
+    )
+
+    return {"ok": True, "results": results}
@@ -1,33 +1,70 @@
 import os
-import uuid
-import boto3
-from datetime import datetime
-from pydantic import BaseModel
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger
 from aws_lambda_powertools.event_handler.api_gateway import Router
-import boto3
 import json
-import logging
 from collections import OrderedDict
-import re
-
-tracer = Tracer()
+import time
+import random
+import threading
+from functools import lru_cache
+from botocore.exceptions import ClientError
+
+from clients import get_client
+from job_store import (
+    get_job_store,
+    DynamoDBJobStore,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JOB_FAILED,
+)
+from trace_processing import TraceProcessor
+from citations import CitationCollector
+from citation_manifest import get_citation_manifest
+from latency import LatencyRecorder
+from session_store import (
+    get_session_store,
+    agent_session_id,
+    build_session_state,
+    record_turn,
+    record_shared_turn,
+)
+from coalescing import (
+    get_single_flight,
+    coalescing_key,
+    COALESCE_WINDOW_SECONDS,
+    COALESCE_MAX_WAIT_SECONDS,
+)
+from asset_scope import scoped_model, scope_session_state
+from tracing import get_tracer
+
+tracer = get_tracer()
 router = Router()
 logger = Logger()
 
-
-
-
 AGENT_ID = os.environ["AGENT_ID"]
 REGION_NAME = os.environ["REGION_NAME"]
+# Function that runs asynchronous chat jobs; defaults to this Lambda itself.
+CHAT_WORKER_FUNCTION_NAME = os.environ.get(
+    "CHAT_WORKER_FUNCTION_NAME", os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+)
+# How long the newest agent alias is reused before listing aliases again.
+ALIAS_CACHE_SECONDS = int(os.environ.get("ALIAS_CACHE_SECONDS", "300"))
+THROTTLE_MAX_RETRIES = int(os.environ.get("THROTTLE_MAX_RETRIES", "5"))
+THROTTLING_ERROR_CODES = (
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "throttlingException",
+)
+# Least time between two writes of a job's partial answer.
+JOB_PARTIAL_WRITE_SECONDS = float(os.environ.get("JOB_PARTIAL_WRITE_SECONDS", "0.5"))
+# Time kept back from a job's remaining Lambda time to record its outcome.
+JOB_DEADLINE_MARGIN_SECONDS = float(
+    os.environ.get("JOB_DEADLINE_MARGIN_SECONDS", "10")
+)
 
 logger.info(f"Agent id: {AGENT_ID}")
 
-agent_client = boto3.client("bedrock-agent", region_name=REGION_NAME)
-agent_runtime_client = boto3.client(
-    "bedrock-agent-runtime", region_name=REGION_NAME)
-s3_resource = boto3.resource("s3", region_name=REGION_NAME)
-
 
 def get_highest_agent_version_alias_id(response):
     """
@@ -59,30 +96,89 @@ def get_highest_agent_version_alias_id(response):
     return highest_version_alias_id
 
 
-def invoke_agent(user_input, session_id):
+_alias_cache = {"alias_id": None, "expires": 0.0}
+_alias_lock = threading.Lock()
+
+
+def get_agent_alias_id():
+    """
+    Return the newest agent alias ID, shared by all requests of the container
+    for ALIAS_CACHE_SECONDS.
+    """
+    with _alias_lock:
+        if _alias_cache["alias_id"] and _alias_cache["expires"] > time.monotonic():
+            return _alias_cache["alias_id"]
+
+        response = get_client("bedrock-agent").list_agent_aliases(agentId=AGENT_ID)
+        logger.debug(f"list_agent_aliases: {response}")
+        agent_alias_id = get_highest_agent_version_alias_id(response)
+        if agent_alias_id:
+            _alias_cache["alias_id"] = agent_alias_id
+            _alias_cache["expires"] = time.monotonic() + ALIAS_CACHE_SECONDS
+
+        return agent_alias_id
+
+
+def call_with_backoff(fn, max_retries=THROTTLE_MAX_RETRIES, base_delay=1.0):
+    """
+    Call fn, retrying with full jitter exponential backoff while throttled.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code not in THROTTLING_ERROR_CODES or attempt == max_retries:
+                raise
+            # nosemgrep: <insecure-random Message: random is fine for jitter>
+            delay = random.uniform(0, base_delay * 2**attempt)  # nosem: insecure-random
+            logger.info(f"Throttled ({code}), retrying in {delay:.1f}s")
+            # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
+            time.sleep(delay)  # nosem: arbitrary-sleep
+
+
+def invoke_agent(
+    user_input, session_id, enable_trace=True, latency=None, session_state=None
+):
     """
     Get response from Agent
     """
-    response = agent_client.list_agent_aliases(agentId=AGENT_ID)
+    latency = latency or LatencyRecorder(sinks=[])
+    with latency.phase("alias_lookup"):
+        agent_alias_id = get_agent_alias_id()
 
-    logger.info(f"list_agent_aliases: {response}")
-    agent_alias_id = get_highest_agent_version_alias_id(response)
     if not agent_alias_id:
         return "No agent published alias found - cannot invoke agent"
-    streaming_response = agent_runtime_client.invoke_agent(
-        agentId=AGENT_ID,
-        agentAliasId=agent_alias_id,
-        sessionId=session_id,
-        enableTrace=True,
-        inputText=user_input,
-    )
+    kwargs = {"sessionState": session_state} if session_state else {}
+    with latency.phase("invoke_agent"):
+        streaming_response = get_client("bedrock-agent-runtime").invoke_agent(
+            agentId=AGENT_ID,
+            agentAliasId=agent_alias_id,
+            sessionId=session_id,
+            enableTrace=enable_trace,
+            inputText=user_input,
+            **kwargs,
+        )
 
     return streaming_response
 
 
-def get_agent_response(response):
-    logger.info(f"Getting agent response... {response}")
+def get_agent_response(response, on_chunk=None, trace_processor=None, latency=None):
+    """
+    Consume the agent event stream.
 
+    Args:
+        response (dict): Response from invoke_agent().
+        on_chunk (callable): Optional callback receiving the answer text
+            accumulated so far, called after every chunk event.
+        trace_processor (TraceProcessor): Handles trace events as they
+            arrive, defaults to the environment's trace level.
+        latency (LatencyRecorder): Receives time-to-first-event and
+            time-to-first-chunk marks.
+
+    Returns:
+        tuple: The answer text and the list of cited S3 URIs.
+    """
     # Ensure both values are always returned
     chunk_text = "No response received"  # Default value
     source_file_list = []  # Default as empty list
@@ -91,71 +187,94 @@ def get_agent_response(response):
         logger.error(f"No completion found in response: {response}")
         return chunk_text, source_file_list  # ✅ Now returns TWO values
 
-    trace_list = []
+    if trace_processor is None:
+        trace_processor = TraceProcessor(latency=latency)
+    latency = latency or LatencyRecorder(sinks=[])
+
+    chunk_list = []
     for event in response["completion"]:
-        logger.info(f"Event keys: {event.keys()}")
+        latency.mark("time_to_first_event")
 
         if "trace" in event:
-            logger.info(event["trace"])
-            trace_list.append(event["trace"])
+            try:
+                trace_processor.process(event["trace"])
+            except Exception as e:
+                logger.warning(f"Error processing agent trace: {e}")
 
         if "chunk" in event:
+            latency.mark("time_to_first_chunk")
+            for citation in (
+                event["chunk"].get("attribution", {}).get("citations", [])
+            ):
+                trace_processor.citations.add_references(
+                    citation.get("retrievedReferences", [])
+                )
             chunk_bytes = event["chunk"]["bytes"]
-            chunk_text = chunk_bytes.decode("utf-8")
-            logger.info(f"Response from the agent: {chunk_text}")
+            chunk_list.append(chunk_bytes.decode("utf-8"))
+            chunk_text = "".join(chunk_list)
+            if on_chunk:
+                on_chunk(chunk_text)
 
-    # Ensuring source_file_list is set, even if no trace data exists
-    try:
-        source_file_list = extract_source_list_from_kb(trace_list) if trace_list else []
-    except Exception as e:
-        logger.warning(f"Error extracting source list from KB: {e}")
-        source_file_list = []
+    trace_processor.finish()
+    logger.debug(f"Response from the agent: {chunk_text}")
 
-    return chunk_text, source_file_list 
+    return chunk_text, trace_processor.source_list
 
 
-def extract_source_list_from_kb(trace_list):
+def resolve_source(input_source):
     """
-    Extract the knowledge base lookup output from the trace list and return the S3 bucket paths.
+    Resolve a cited S3 URI to its title and link.
+
+    The citation manifest answers without touching S3; documents missing
+    from it are read once and cached per container.
+
+    Returns:
+        tuple: The source title and link.
+    """
+    entry = get_citation_manifest().get(input_source)
+    if entry:
+        return (entry["title"], entry["url"])
+
+    return read_source(input_source)
+
+
+@lru_cache(maxsize=512)
+def read_source(input_source):
+    """
+    Resolve a cited S3 URI by reading the document itself.
+
+    Returns:
+        tuple: The source title and link.
     """
-    
-    for trace in trace_list:
-        if  'orchestrationTrace' in trace['trace'].keys() and 'observation' in trace['trace']['orchestrationTrace'].keys():
-            if 'knowledgeBaseLookupOutput' in trace['trace']['orchestrationTrace']['observation']:
-                ref_list = trace['trace']['orchestrationTrace']['observation']['knowledgeBaseLookupOutput']['retrievedReferences']
-    logger.info(f"ref_list: {ref_list}")
-    ref_s3_list = []
-    for rl in ref_list:
-        ref_s3_list.append(rl['location']['s3Location']['uri'])
-    
-    return ref_s3_list
+    string = input_source.split("//")[1]
+    bucket = string.partition("/")[0]
+    obj = string.partition("/")[2]
+    body = get_client("s3").get_object(Bucket=bucket, Key=obj)["Body"].read()
+
+    try:
+        # Try parsing as JSON for richer metadata
+        res = json.loads(body.decode('utf-8'))  # Ensure UTF-8 decoding
+        source_link_url = res.get("Url", "")
+        source_title = res.get("Topic", os.path.basename(obj))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        # Fallback for non-JSON documents (like docx, PDFs)
+        source_link_url = f"s3://{bucket}/{obj}"
+        source_title = f"{os.path.basename(obj)}"
+
+    return (source_title, source_link_url)
 
 
 def source_link(input_source_list):
     """
     Formats the source list into a visually enhanced markdown string with clickable links and S3 icons.
     """
-    source_dict_list = []
-    for i, input_source in enumerate(input_source_list):
-        string = input_source.split("//")[1]
-        bucket = string.partition("/")[0]
-        obj = string.partition("/")[2]
-        file = s3_resource.Object(bucket, obj)
-        body = file.get()["Body"].read()
+    return format_sources([resolve_source(input_source) for input_source in input_source_list])
 
-        try:
-            # Try parsing as JSON for richer metadata
-            res = json.loads(body.decode('utf-8'))  # Ensure UTF-8 decoding
-            source_link_url = res.get("Url", "")
-            source_title = res.get("Topic", f"Document {i+1}")
-        except (UnicodeDecodeError, json.JSONDecodeError):
-            # Fallback for non-JSON documents (like docx, PDFs)
-            source_link_url = f"s3://{bucket}/{obj}"
-            source_title = f"{os.path.basename(obj)}"
-
-        source_dict = (source_title, source_link_url)
-        source_dict_list.append(source_dict)
 
+def format_sources(source_dict_list):
+    """
+    Format resolved (title, link) sources as a markdown list.
+    """
     # Get unique sources
     unique_sources = list(OrderedDict.fromkeys(source_dict_list))
 
@@ -168,7 +287,235 @@ def source_link(input_source_list):
     return refs_str
 
 
-   
+def answer_query(
+    query,
+    session_id,
+    on_chunk=None,
+    trace_level=None,
+    asset_model=None,
+    max_wait=COALESCE_MAX_WAIT_SECONDS,
+):
+    """
+    Run a single chat query through the agent and format the answer.
+
+    The compact server-side session supplies the agent session ID and the
+    curated session state, and records the turn afterwards. Identical
+    queries arriving within the coalescing window share a single agent
+    invocation and its result; sessions that received a shared answer keep
+    it in their summary, as their own agent session never saw the exchange.
+
+    Knowledge base retrieval is scoped to the SiteWise asset model under
+    discussion: the one given with the request, else the model of the
+    asset the agent last looked up in this session.
+
+    max_wait bounds how long the query waits for a coalesced invocation
+    started by another request; the default suits synchronous API requests,
+    jobs pass the time they have left, or None to wait for as long as it runs.
+
+    Returns:
+        dict: The answer text and the markdown formatted source list.
+    """
+    session_store = get_session_store()
+    session = session_store.load(session_id)
+    if asset_model:
+        session["asset_model"] = asset_model
+    agent_session = agent_session_id(session)
+    session_state = scope_session_state(
+        build_session_state(session), session.get("asset_model")
+    )
+
+    def run():
+        return call_with_backoff(
+            lambda: invoke_and_format(
+                query, agent_session, on_chunk, trace_level, session_state
+            )
+        )
+
+    shared = False
+    if COALESCE_WINDOW_SECONDS <= 0:
+        response_body, context = run()
+    else:
+        # Follow-ups depend on the session's history, which the agent keeps
+        # per agent session, so only first turns are shared across sessions.
+        scope = session.get("asset_model") or ""
+        if session["turns"] or session["summary"] or session["assets"]:
+            scope = f"{scope}:{agent_session}"
+        (response_body, context), shared = get_single_flight().do(
+            coalescing_key(query, scope=scope), run, max_wait=max_wait
+        )
+        if shared:
+            logger.info("Answer shared from a coalesced in-flight query")
+
+    try:
+        record = record_shared_turn if shared else record_turn
+        record(session, query, response_body["answer"], context["asset_ids"])
+        session["asset_model"] = (
+            scoped_model(context["asset_ids"]) or session.get("asset_model")
+        )
+        session_store.save(session)
+    except Exception as e:
+        logger.warning(f"Failed to save chat session: {e}")
+
+    return response_body
+
+
+def invoke_and_format(
+    query, session_id, on_chunk=None, trace_level=None, session_state=None
+):
+    """
+    Invoke the agent for a query and format the answer with its sources.
+
+    Returns:
+        tuple: The response body and the context resolved from the trace.
+    """
+    latency = LatencyRecorder()
+    # Cited documents are resolved in the background while the agent streams.
+    citations = CitationCollector(resolve_source)
+    trace_processor = TraceProcessor(trace_level, latency=latency, citations=citations)
+    streaming_response = invoke_agent(
+        query,
+        session_id,
+        enable_trace=trace_processor.enable_trace,
+        latency=latency,
+        session_state=session_state,
+    )
+    response, _ = get_agent_response(
+        streaming_response,
+        on_chunk=on_chunk,
+        trace_processor=trace_processor,
+        latency=latency,
+    )
+    # Only the resolutions still outstanding when the stream ends are waited on.
+    with latency.phase("citation_resolution"):
+        reference_str = format_sources(citations.resolved())
+    latency.emit()
+
+    context = {"asset_ids": trace_processor.asset_ids}
+
+    return {"answer": response, "source": reference_str}, context
+
+
+def dispatch_chat_job(job_id, kind="chat"):
+    """
+    Start the worker for an asynchronous chat job.
+
+    Args:
+        job_id (str): ID of the job in the job store.
+        kind (str): Name of the worker in JOB_RUNNERS that runs the job.
+
+    With a shared job store the Lambda invokes itself asynchronously so the
+    API request can return immediately; otherwise the job runs on a
+    background thread of this process.
+    """
+    if CHAT_WORKER_FUNCTION_NAME and isinstance(get_job_store(), DynamoDBJobStore):
+        get_client("lambda").invoke(
+            FunctionName=CHAT_WORKER_FUNCTION_NAME,
+            InvocationType="Event",
+            Payload=json.dumps({"chat_job_id": job_id, "job_kind": kind}),
+        )
+    else:
+        threading.Thread(
+            target=JOB_RUNNERS[kind], args=(job_id,), daemon=True
+        ).start()
+
+
+def job_deadline(context=None):
+    """
+    Monotonic time by which a job should be done, None without a limit.
+
+    Args:
+        context (LambdaContext): Context of the Lambda invocation running
+            the job, None when it runs on a background thread.
+    """
+    if context is None:
+        return None
+
+    remaining = context.get_remaining_time_in_millis() / 1000
+    return time.monotonic() + max(remaining - JOB_DEADLINE_MARGIN_SECONDS, 0)
+
+
+def seconds_left(deadline):
+    """
+    Seconds until a job deadline, None if the job has no deadline.
+    """
+    if deadline is None:
+        return None
+
+    return max(deadline - time.monotonic(), 0)
+
+
+def run_job(event, context=None):
+    """
+    Run the asynchronous job described by a worker invocation event.
+    """
+    return JOB_RUNNERS[event.get("job_kind", "chat")](
+        event["chat_job_id"], deadline=job_deadline(context)
+    )
+
+
+@tracer.capture_method
+def run_chat_job(job_id, deadline=None):
+    """
+    Worker entry point for an asynchronous chat job.
+
+    Partial answers are written to the job record as chunks arrive, at most
+    once every JOB_PARTIAL_WRITE_SECONDS, and the last one is flushed with
+    the outcome; the final answer replaces them once the agent completes.
+    A coalesced invocation is waited on until the deadline from
+    job_deadline().
+    """
+    job_store = get_job_store()
+    job = job_store.get(job_id)
+    if not job:
+        logger.error(f"Chat job {job_id} not found")
+        return {"ok": False}
+
+    job_store.update(job_id, status=JOB_RUNNING)
+    request = job["request"]
+
+    partial = {"text": None, "written_at": None}
+
+    def on_chunk(text):
+        partial["text"] = text
+        now = time.monotonic()
+        if (
+            partial["written_at"] is None
+            or now - partial["written_at"] >= JOB_PARTIAL_WRITE_SECONDS
+        ):
+            job_store.update(job_id, partial={"answer": text})
+            partial["written_at"] = now
+            partial["text"] = None
+
+    def unwritten_partial():
+        return {"partial": {"answer": partial["text"]}} if partial["text"] else {}
+
+    try:
+        response_body = answer_query(
+            request["query"],
+            request["session_id"],
+            on_chunk=on_chunk,
+            trace_level=request.get("trace_level"),
+            asset_model=request.get("asset_model"),
+            max_wait=seconds_left(deadline),
+        )
+    except Exception as e:
+        logger.exception(f"Chat job {job_id} failed")
+        job_store.update(
+            job_id, status=JOB_FAILED, error=str(e), **unwritten_partial()
+        )
+        return {"ok": False}
+
+    job_store.update(
+        job_id, status=JOB_SUCCEEDED, result=response_body, **unwritten_partial()
+    )
+
+    return {"ok": True}
+
+
+# Workers for asynchronous jobs by kind, other routes register their own.
+JOB_RUNNERS = {"chat": run_chat_job}
+
+
 @router.post("/chat")
 @tracer.capture_method
 def chat():
@@ -176,14 +523,52 @@ def chat():
 
     logger.info(data)
 
-    streaming_response = invoke_agent(data["query"], data["session_id"])
-    response, source_file_list = get_agent_response(streaming_response)
-    if isinstance(source_file_list, list):
-        reference_str = source_link(source_file_list)
-    else:
-        reference_str = source_file_list
+    if data.get("async"):
+        job = get_job_store().create(
+            {
+                "query": data["query"],
+                "session_id": data["session_id"],
+                "trace_level": data.get("trace_level"),
+                "asset_model": data.get("asset_model"),
+            }
+        )
+        dispatch_chat_job(job["job_id"])
+
+        return {"ok": True, "job_id": job["job_id"], "status": job["status"]}
+
+    response_body = answer_query(
+        data["query"],
+        data["session_id"],
+        trace_level=data.get("trace_level"),
+        asset_model=data.get("asset_model"),
+    )
 
-    response_body = {"answer": response, "source": reference_str}
+    return {"ok": True, "response": response_body}
 
 
-    return {"ok": True, "response":response_body}
\ No newline at end of file
+@router.get("/chat/<job_id>")
+@tracer.capture_method
+def get_chat_job(job_id: str):
+    job = get_job_store().get(job_id)
+    if not job:
+        return {"ok": False, "message": f"Chat job {job_id} not found"}
+
+    partial = job.get("partial")
+    result = job.get("result")
+    items = job["request"].get("items")
+    if items:
+        # Batch jobs store each item's result apart from the job.
+        results = get_job_store().get_item_results(job_id, len(items))
+        if result is None:
+            partial = dict(partial or {}, results=[r for r in results if r])
+        else:
+            result = dict(result, results=results)
+
+    return {
+        "ok": True,
+        "job_id": job_id,
+        "status": job["status"],
+        "partial": partial,
+        "response": result,
+        "error": job.get("error"),
+    }
@@ -1,7 +1,9 @@
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger
 from aws_lambda_powertools.event_handler.api_gateway import Router
 
-tracer = Tracer()
+from tracing import get_tracer
+
+tracer = get_tracer()
 router = Router()
 logger = Logger()
 
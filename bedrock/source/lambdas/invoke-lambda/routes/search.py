@@ -0,0 +1,78 @@
+import os
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.event_handler.api_gateway import Router
+from aws_lambda_powertools.event_handler.exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
+
+from hybrid_search import get_hybrid_retriever, COLLECTION_HOST
+from tracing import get_tracer
+
+tracer = get_tracer()
+router = Router()
+logger = Logger()
+
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "20"))
+# Metadata fields a search may be filtered on, mapped as keywords in the index.
+SEARCH_FILTER_FIELDS = ("equipment", "equipment_model", "document_type")
+
+
+def normalize_search_request(data):
+    """
+    Validate a search request body.
+
+    ``filters`` maps metadata fields to a value or a list of values; an
+    ``asset_model`` is shorthand for an ``equipment_model`` filter.
+
+    Returns:
+        tuple: The query, the number of results and the filters.
+
+    Raises:
+        ValueError: If the query, ``k`` or the filters are invalid.
+    """
+    query = data["query"]
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("query must be a non-empty string")
+
+    k = data.get("k", 5)
+    if (
+        isinstance(k, bool)
+        or not isinstance(k, int)
+        or not 1 <= k <= SEARCH_MAX_RESULTS
+    ):
+        raise ValueError(f"k must be an integer from 1 to {SEARCH_MAX_RESULTS}")
+
+    filters = dict(data.get("filters") or {})
+    unknown = set(filters) - set(SEARCH_FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+    if data.get("asset_model"):
+        filters["equipment_model"] = data["asset_model"]
+
+    return query, k, filters
+
+
+@router.post("/search")
+@tracer.capture_method
+def search():
+    """
+    Retrieve knowledge base chunks with hybrid BM25 and kNN search.
+
+    Only available when the stack is deployed with the hybrid_search
+    context value, which points the function at the collection.
+    """
+    if not COLLECTION_HOST:
+        raise NotFoundError("Hybrid search is not enabled")
+
+    data: dict = router.current_event.json_body
+
+    logger.info(data)
+
+    try:
+        query, k, filters = normalize_search_request(data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise BadRequestError(f"Invalid search request: {e}")
+
+    return {"ok": True, "results": get_hybrid_retriever().retrieve(query, k, filters)}
@@ -0,0 +1,279 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+from clients import get_resource
+
+CHAT_STATE_TABLE_NAME = os.environ.get("CHAT_STATE_TABLE_NAME")
+
+# Backend for chat sessions: dynamodb, sqlite or memory.
+SESSION_STORE = os.environ.get(
+    "SESSION_STORE", "dynamodb" if CHAT_STATE_TABLE_NAME else "memory"
+).lower()
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "/tmp/chat_sessions.db")
+# Approximate number of tokens of history kept verbatim before trimming.
+SESSION_TOKEN_BUDGET = int(os.environ.get("SESSION_TOKEN_BUDGET", "1500"))
+SESSION_MAX_ANSWER_CHARS = int(os.environ.get("SESSION_MAX_ANSWER_CHARS", "600"))
+SESSION_MAX_SUMMARY_CHARS = int(os.environ.get("SESSION_MAX_SUMMARY_CHARS", "1200"))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+# Number of recently resolved assets passed on to the agent.
+SESSION_MAX_ASSETS = 5
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate, roughly four characters per token.
+    """
+    return len(text) // 4 + 1
+
+
+def _first_sentence(text, limit=160):
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence[:limit]
+
+
+def new_session(session_id):
+    return {
+        "session_id": session_id,
+        "generation": 0,
+        "summary": "",
+        "turns": [],
+        "assets": [],
+        # SiteWise asset model retrieval is scoped to, see asset_scope.py.
+        "asset_model": None,
+        "updated_at": int(time.time()),
+    }
+
+
+def agent_session_id(session):
+    """
+    Bedrock session ID for the current generation of a chat session.
+
+    The generation is bumped whenever the turns are folded into the summary,
+    so the agent starts from a fresh session that only carries the curated
+    context instead of replaying the full history.
+    """
+    if not session["generation"]:
+        return session["session_id"]
+
+    return f"{session['session_id']}-{session['generation']}"
+
+
+def _summarize(session, query, answer):
+    session["summary"] = (
+        f"{session['summary']} Q: {query[:160]} A: {_first_sentence(answer)}"
+    ).strip()[-SESSION_MAX_SUMMARY_CHARS:]
+
+
+def _record_assets(session, assets):
+    for asset_id in assets or []:
+        if asset_id in session["assets"]:
+            session["assets"].remove(asset_id)
+        session["assets"].append(asset_id)
+    session["assets"] = session["assets"][-SESSION_MAX_ASSETS:]
+    session["updated_at"] = int(time.time())
+
+
+def record_turn(session, query, answer, assets=None, budget=SESSION_TOKEN_BUDGET):
+    """
+    Append a compact turn to the session and trim it to the token budget.
+
+    Turns are kept for the current agent session generation only; older
+    generations survive as a short extractive summary.
+
+    Args:
+        session (dict): Session record from a SessionStore.
+        query (str): The user query.
+        answer (str): The agent answer.
+        assets (list): Asset IDs resolved while answering, most recent last.
+        budget (int): Approximate token budget for verbatim turns.
+
+    Returns:
+        bool: True if old turns were folded into the summary.
+    """
+    session["turns"].append([query, answer[:SESSION_MAX_ANSWER_CHARS]])
+    _record_assets(session, assets)
+
+    # Once the turns replayed by the agent exceed the budget, fold them into
+    # the summary and rotate to a fresh agent session.
+    tokens = sum(estimate_tokens(q) + estimate_tokens(a) for q, a in session["turns"])
+    if tokens <= budget:
+        return False
+
+    for old_query, old_answer in session["turns"]:
+        _summarize(session, old_query, old_answer)
+    session["turns"] = []
+    session["generation"] += 1
+
+    return True
+
+
+def record_shared_turn(session, query, answer, assets=None):
+    """
+    Record a turn answered by an invocation of another session.
+
+    The session's own agent session never saw the exchange, so it is kept
+    in the summary, which reaches the agent as ``conversation_summary`` on
+    the next query, instead of in the turns the agent replays itself.
+
+    Args:
+        session (dict): Session record from a SessionStore.
+        query (str): The user query.
+        answer (str): The shared agent answer.
+        assets (list): Asset IDs resolved while answering, most recent last.
+    """
+    _summarize(session, query, answer)
+    _record_assets(session, assets)
+
+
+def build_session_state(session):
+    """
+    Curated ``sessionState`` for invoke_agent.
+
+    Returns:
+        dict: Session state with prompt attributes, or None for a new session.
+    """
+    prompt_attributes = {}
+    if session["summary"]:
+        prompt_attributes["conversation_summary"] = session["summary"]
+    if session["assets"]:
+        prompt_attributes["last_resolved_asset_ids"] = ",".join(session["assets"])
+
+    if not prompt_attributes:
+        return None
+
+    return {"promptSessionAttributes": prompt_attributes}
+
+
+class SessionStore(ABC):
+    """
+    Persistence for compact chat sessions.
+    """
+
+    def load(self, session_id):
+        """
+        Return the stored session, or a new one if none exists.
+        """
+        session = self.get(session_id)
+        return session if session else new_session(session_id)
+
+    @abstractmethod
+    def get(self, session_id):
+        """
+        Return the stored session, or None if there is none.
+        """
+
+    @abstractmethod
+    def save(self, session):
+        """
+        Store a session, replacing the previous one.
+        """
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Local stand-in for tests and for running outside of AWS.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return json.loads(session) if session else None
+
+    def save(self, session):
+        with self._lock:
+            self._sessions[session["session_id"]] = json.dumps(session)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in a local SQLite file, one JSON document per session.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, body TEXT NOT NULL, updated_at INTEGER)"
+            )
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, body, updated_at) "
+                "VALUES (?, ?, ?)",
+                (session["session_id"], json.dumps(session), session["updated_at"]),
+            )
+
+
+class DynamoDBSessionStore(SessionStore):
+    """
+    Session store in the chat state table, keyed by ``pk = "session#<id>"``.
+
+    The session is stored as a single JSON string attribute to keep the
+    item compact and the read a single ``GetItem``.
+    """
+
+    key_prefix = "session#"
+
+    def __init__(self, table_name):
+        self.table = get_resource("dynamodb").Table(table_name)
+
+    def get(self, session_id):
+        item = self.table.get_item(Key={"pk": f"{self.key_prefix}{session_id}"}).get(
+            "Item"
+        )
+        return json.loads(item["body"]) if item else None
+
+    def save(self, session):
+        self.table.put_item(
+            Item={
+                "pk": f"{self.key_prefix}{session['session_id']}",
+                "body": json.dumps(session),
+                "expires_at": session["updated_at"] + SESSION_TTL_SECONDS,
+            }
+        )
+
+
+_session_store = None
+
+
+def get_session_store():
+    """
+    Return the session store configured by ``SESSION_STORE``.
+    """
+    global _session_store
+    if _session_store is None:
+        if SESSION_STORE == "dynamodb" and CHAT_STATE_TABLE_NAME:
+            _session_store = DynamoDBSessionStore(CHAT_STATE_TABLE_NAME)
+        elif SESSION_STORE == "sqlite":
+            _session_store = SQLiteSessionStore()
+        else:
+            _session_store = InMemorySessionStore()
+
+    return _session_store
+
+
+def set_session_store(session_store):
+    """
+    Replace the session store, e.g. with an ``InMemorySessionStore`` in tests.
+    """
+    global _session_store
+    _session_store = session_store
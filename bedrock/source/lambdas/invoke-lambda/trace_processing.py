@@ -0,0 +1,242 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import random
+from datetime import datetime, timezone
+
+from aws_lambda_powertools import Logger
+
+from clients import get_client
+from citations import CitationCollector
+
+logger = Logger()
+
+TRACE_OFF = "off"
+TRACE_CITATIONS = "citations"
+TRACE_SUMMARY = "summary"
+TRACE_FULL = "full"
+TRACE_LEVELS = (TRACE_OFF, TRACE_CITATIONS, TRACE_SUMMARY, TRACE_FULL)
+
+# Default level for this environment, requests may override it per call.
+TRACE_LEVEL = os.environ.get("TRACE_LEVEL", TRACE_CITATIONS).lower()
+# Full traces are written to S3 for this fraction of requests only.
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_BATCH_SIZE = int(os.environ.get("TRACE_BATCH_SIZE", "50"))
+TRACE_BUCKET_NAME = os.environ.get("TRACE_BUCKET_NAME")
+TRACE_PREFIX = os.environ.get("TRACE_PREFIX", "traces/")
+
+
+def resolve_trace_level(requested=None):
+    """
+    Pick the trace level for a request, falling back to the environment default.
+    """
+    level = (requested or TRACE_LEVEL).lower()
+    if level not in TRACE_LEVELS:
+        logger.warning(f"Unknown trace level {level}, using {TRACE_CITATIONS}")
+        level = TRACE_CITATIONS
+
+    return level
+
+
+class S3TraceSink:
+    """
+    Writes batches of full traces as gzip compressed JSON lines to S3.
+    """
+
+    def __init__(self, bucket_name, prefix=TRACE_PREFIX):
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+
+    def write(self, request_id, part, traces):
+        body = gzip.compress(
+            "\n".join(json.dumps(trace, default=str) for trace in traces).encode(
+                "utf-8"
+            )
+        )
+        key = (
+            f"{self.prefix}{datetime.now(timezone.utc):%Y/%m/%d}/"
+            f"{request_id}-{part:04d}.jsonl.gz"
+        )
+        get_client("s3").put_object(
+            Bucket=self.bucket_name,
+            Key=key,
+            Body=body,
+            ContentType="application/x-ndjson",
+            ContentEncoding="gzip",
+        )
+
+
+class InMemoryTraceSink:
+    """
+    Local stand-in for the S3 trace sink.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def write(self, request_id, part, traces):
+        self.batches.append((request_id, part, list(traces)))
+
+
+class TraceProcessor:
+    """
+    Consumes agent trace events as they arrive.
+
+    The work done per event depends on the level:
+
+    - ``off``: tracing is disabled on the agent invocation.
+    - ``citations``: references from every knowledge base lookup are
+      collected as they arrive and queried asset IDs are extracted,
+      nothing else is kept.
+    - ``summary``: additionally records per-step timings and tool names.
+    - ``full``: additionally batches raw traces of sampled requests to S3.
+    """
+
+    def __init__(
+        self,
+        level=None,
+        request_id=None,
+        sink=None,
+        sample_rate=None,
+        latency=None,
+        citations=None,
+    ):
+        self.level = resolve_trace_level(level)
+        self.request_id = request_id or str(uuid.uuid4())
+        self.latency = latency
+        self.citations = citations or CitationCollector()
+        self.asset_ids = []
+        self.steps = {}
+        self._pending_tool = None
+        self._batch = []
+        self._part = 0
+        self._sink = sink
+
+        if self.level == TRACE_FULL:
+            sample_rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+            # nosemgrep: <insecure-random Message: random is fine for sampling>
+            self.sampled = random.random() < sample_rate  # nosem: insecure-random
+            if self._sink is None and TRACE_BUCKET_NAME:
+                self._sink = S3TraceSink(TRACE_BUCKET_NAME)
+        else:
+            self.sampled = False
+
+    @property
+    def source_list(self):
+        """
+        Cited S3 URIs from all knowledge base lookups, in citation order.
+        """
+        return self.citations.uris
+
+    @property
+    def enable_trace(self):
+        return self.level != TRACE_OFF
+
+    @property
+    def keeps_summary(self):
+        return self.level in (TRACE_SUMMARY, TRACE_FULL)
+
+    def process(self, trace):
+        """
+        Process a single ``trace`` event from the agent response stream.
+        """
+        if self.level == TRACE_OFF:
+            return
+
+        orchestration = trace.get("trace", {}).get("orchestrationTrace", {})
+        action = orchestration.get("invocationInput", {}).get(
+            "actionGroupInvocationInput", {}
+        )
+        for parameter in action.get("parameters", []):
+            if parameter.get("name") == "asset_id" and parameter.get("value"):
+                self.asset_ids.append(parameter["value"])
+
+        observation = orchestration.get("observation", {})
+        if "knowledgeBaseLookupOutput" in observation:
+            self.citations.add_references(
+                observation["knowledgeBaseLookupOutput"].get("retrievedReferences", [])
+            )
+
+        if (self.keeps_summary or self.latency) and orchestration:
+            self._record_step(orchestration)
+
+        if self.sampled and self._sink:
+            self._batch.append(trace)
+            if len(self._batch) >= TRACE_BATCH_SIZE:
+                self.flush()
+
+    def _record_step(self, orchestration):
+        now = time.perf_counter()
+        for part in orchestration.values():
+            trace_id = part.get("traceId")
+            if trace_id:
+                break
+        else:
+            return
+
+        step = self.steps.get(trace_id)
+        if step is None:
+            step = self.steps[trace_id] = {"start": now, "end": now, "tools": []}
+        step["end"] = now
+
+        invocation = orchestration.get("invocationInput", {})
+        if "actionGroupInvocationInput" in invocation:
+            action = invocation["actionGroupInvocationInput"]
+            tool = (
+                f"{action.get('actionGroupName')}:{action.get('verb', '')}"
+                f"{action.get('apiPath', '')}"
+            )
+            step["tools"].append(tool)
+            self._pending_tool = ("action_group", tool, now)
+        elif "knowledgeBaseLookupInput" in invocation:
+            tool = f"knowledgeBase:{invocation['knowledgeBaseLookupInput'].get('knowledgeBaseId')}"
+            step["tools"].append(tool)
+            self._pending_tool = ("knowledge_base_retrieval", tool, now)
+
+        # Tool durations run from the invocation input to its observation.
+        observation = orchestration.get("observation", {})
+        if self._pending_tool and (
+            "actionGroupInvocationOutput" in observation
+            or "knowledgeBaseLookupOutput" in observation
+        ):
+            phase, tool, start = self._pending_tool
+            self._pending_tool = None
+            if self.latency:
+                self.latency.record(phase, start, now, tool=tool)
+
+    def summary(self):
+        """
+        Return per-step durations in milliseconds and the tools each step used.
+        """
+        return [
+            {
+                "trace_id": trace_id,
+                "duration_ms": round((step["end"] - step["start"]) * 1000, 1),
+                "tools": step["tools"],
+            }
+            for trace_id, step in self.steps.items()
+        ]
+
+    def flush(self):
+        if self._batch and self._sink:
+            try:
+                self._sink.write(self.request_id, self._part, self._batch)
+            except Exception as e:
+                logger.warning(f"Failed to write trace batch: {e}")
+            self._part += 1
+        self._batch = []
+
+    def finish(self):
+        """
+        Flush buffered traces and log the step summary once per request.
+        """
+        self.flush()
+        if self.latency:
+            for step in self.steps.values():
+                self.latency.record("orchestration_step", step["start"], step["end"])
+        if self.keeps_summary:
+            logger.info(
+                {"trace_level": self.level, "steps": self.summary()},
+            )
@@ -1,17 +1,104 @@
+import os
 import json
 import uuid
 import decimal
+import datetime
+
+try:
+    import orjson
+except ImportError:  # Not in the runtime unless packaged with the function.
+    orjson = None
+
+# JSON encoder for API responses: auto (orjson when installed), orjson or json.
+JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", "auto").lower()
+
+
+def encode_default(obj):
+    """
+    Convert values the JSON encoders don't handle natively.
+
+    Covers DynamoDB Decimals, UUIDs, dates and times, sets and NumPy arrays
+    and scalars (anything with ``tolist``), without importing NumPy.
+    """
+    if isinstance(obj, decimal.Decimal):
+        if obj == obj.to_integral_value():
+            return int(obj)
+        return float(obj)
+
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
 
 class CustomEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            if obj % 1 > 0:
-                return float(obj)
-            else:
-                return int(obj)
+        try:
+            return encode_default(obj)
+        except TypeError:
+            return super(CustomEncoder, self).default(obj)
+
+
+def json_dumps(obj):
+    """
+    Serialize with the standard library encoder.
+    """
+    return json.dumps(
+        obj, cls=CustomEncoder, separators=(",", ":"), ensure_ascii=False
+    )
+
+
+def orjson_dumps(obj):
+    """
+    Serialize with orjson, which handles UUIDs, datetimes and NumPy natively.
+    """
+    return orjson.dumps(
+        obj,
+        default=encode_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    ).decode("utf-8")
+
+
+SERIALIZERS = {"json": json_dumps}
+if orjson is not None:
+    SERIALIZERS["orjson"] = orjson_dumps
+
+_serializer = None
+
+
+def get_serializer():
+    """
+    Return the response serializer selected by ``JSON_SERIALIZER``.
+    """
+    global _serializer
+    if _serializer is None:
+        if JSON_SERIALIZER == "auto":
+            _serializer = SERIALIZERS.get("orjson", json_dumps)
+        else:
+            _serializer = SERIALIZERS.get(JSON_SERIALIZER, json_dumps)
+
+    return _serializer
+
+
+def set_serializer(serializer):
+    """
+    Replace the response serializer, e.g. to compare encoders.
+    """
+    global _serializer
+    _serializer = serializer
 
-        if isinstance(obj, uuid.UUID):
-            return str(obj)
 
-        return super(CustomEncoder, self).default(obj)
\ No newline at end of file
+def dumps(obj):
+    """
+    Serialize an API response body to a JSON string.
+    """
+    return get_serializer()(obj)
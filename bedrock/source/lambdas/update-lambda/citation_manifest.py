@@ -0,0 +1,199 @@
+"""
+citation_manifest.py
+
+Build the citation manifest used by the invoke Lambda to format the sources
+of an answer without reading the cited documents at query time.
+
+The manifest maps each knowledge base document's S3 URI to its title,
+canonical URL, document type and section anchors. Section files written by
+the preprocessing step are described by their ``.metadata.json`` sidecars,
+falling back to the headings at the top of the file.
+"""
+import os
+import re
+import json
+import time
+import logging
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MANIFEST_VERSION = 1
+METADATA_SUFFIX = ".metadata.json"
+
+
+def slugify(text):
+    """
+    Turn a heading into a URL fragment.
+    """
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def humanize(key):
+    """
+    Derive a readable title from an object key, e.g. "mash-tun-sop.docx"
+    becomes "Mash Tun Sop".
+    """
+    name = os.path.splitext(os.path.basename(key))[0]
+    return re.sub(r"[-_]+", " ", name).strip().title()
+
+
+def parse_section_file(body):
+    """
+    Read the title and section of a preprocessed section file, which starts
+    with "# <document title>" and "## <heading path>".
+
+    Returns:
+        tuple: The document title (or None) and a list with the section.
+    """
+    title = None
+    sections = []
+    for line in body.decode("utf-8").splitlines():
+        if line.startswith("# ") and title is None:
+            title = line[2:].strip()
+        elif line.startswith("## "):
+            sections.append(line[3:].split(" > ")[-1].strip())
+            break
+
+    return title, sections
+
+
+def describe_section(metadata):
+    """
+    Read the title, document type and section of a section file from the
+    metadata attributes of its sidecar.
+
+    Returns:
+        tuple: The document title (or None), document type (or None) and a
+            list with the section.
+    """
+    sections = []
+    if metadata.get("section"):
+        section_id = metadata.get("section_id", "")
+        # Section IDs are "<document>--<anchor>", unique within the document.
+        anchor = section_id.split("--", 1)[1] if "--" in section_id else ""
+        sections.append(
+            {
+                "title": metadata["section"],
+                "anchor": anchor or slugify(metadata["section"]),
+            }
+        )
+
+    return metadata.get("title"), metadata.get("document_type"), sections
+
+
+def describe_document(s3_client, bucket, key, has_metadata=False):
+    """
+    Build the manifest entry of a single document.
+
+    Args:
+        s3_client: Boto3 S3 client.
+        bucket (str): The assets bucket.
+        key (str): Key of the document.
+        has_metadata (bool): Whether the document has a metadata sidecar.
+
+    Returns:
+        dict: ``title``, ``url``, ``doc_type`` and ``sections``.
+    """
+    uri = f"s3://{bucket}/{key}"
+    parts = key.split("/")
+    entry = {
+        "title": humanize(key),
+        "url": uri,
+        # Documents are grouped by folder, e.g. data/sop/ and data/recipes/.
+        "doc_type": parts[-2] if len(parts) > 1 else "document",
+        "sections": [],
+    }
+
+    extension = os.path.splitext(key)[1].lower()
+    if extension == ".md" and len(parts) > 2:
+        # Section files live at data/<folder>/<document>/<section>.md.
+        entry["doc_type"] = parts[-3]
+    if extension == ".json":
+        # Same fields the invoke Lambda reads from JSON documents.
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        document = json.loads(body.decode("utf-8"))
+        entry["title"] = document.get("Topic", os.path.basename(key))
+        entry["url"] = document.get("Url", "")
+    elif extension == ".md" and has_metadata:
+        body = s3_client.get_object(Bucket=bucket, Key=f"{key}{METADATA_SUFFIX}")
+        metadata = json.loads(body["Body"].read()).get("metadataAttributes", {})
+        title, doc_type, sections = describe_section(metadata)
+        entry["title"] = title or entry["title"]
+        entry["doc_type"] = doc_type or entry["doc_type"]
+        entry["sections"] = sections
+    elif extension == ".md":
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        title, sections = parse_section_file(body)
+        entry["title"] = title or entry["title"]
+        entry["sections"] = [
+            {"title": section, "anchor": slugify(section)} for section in sections
+        ]
+
+    return entry
+
+
+def build_citation_manifest(s3_client, bucket, prefix):
+    """
+    Describe every knowledge base document below a prefix.
+
+    Args:
+        s3_client: Boto3 S3 client.
+        bucket (str): The assets bucket.
+        prefix (str): Prefix of the knowledge base documents, e.g. "data/".
+
+    Returns:
+        dict: The manifest, with documents keyed by S3 URI.
+    """
+    keys = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    sidecars = {key for key in keys if key.endswith(METADATA_SUFFIX)}
+
+    documents = {}
+    for key in keys:
+        # Skip folders and Bedrock metadata sidecar files.
+        if key.endswith("/") or key in sidecars:
+            continue
+        try:
+            documents[f"s3://{bucket}/{key}"] = describe_document(
+                s3_client, bucket, key, f"{key}{METADATA_SUFFIX}" in sidecars
+            )
+        except Exception as e:
+            logger.warning(f"Could not describe {key}, using defaults: {e}")
+            documents[f"s3://{bucket}/{key}"] = {
+                "title": humanize(key),
+                "url": f"s3://{bucket}/{key}",
+                "doc_type": "document",
+                "sections": [],
+            }
+
+    return {
+        "version": MANIFEST_VERSION,
+        "generated_at": int(time.time()),
+        "documents": documents,
+    }
+
+
+def publish_citation_manifest(s3_client, bucket, prefix, manifest_key):
+    """
+    Build the citation manifest and write it to the assets bucket.
+
+    Returns:
+        int: Number of documents in the manifest.
+    """
+    manifest = build_citation_manifest(s3_client, bucket, prefix)
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=manifest_key,
+        Body=json.dumps(manifest, separators=(",", ":")).encode("utf-8"),
+        ContentType="application/json",
+    )
+    logger.info(
+        f"Published citation manifest s3://{bucket}/{manifest_key} "
+        f"with {len(manifest['documents'])} documents."
+    )
+
+    return len(manifest["documents"])
@@ -14,6 +14,34 @@ class Connections:
 
     log_level = os.environ["LOG_LEVEL"]
 
+    # Knowledge base documents and the citation manifest built from them.
+    assets_bucket_name = os.environ.get("ASSETS_BUCKET_NAME")
+    documents_prefix = os.environ.get("DOCUMENTS_PREFIX", "data/")
+    citation_manifest_key = os.environ.get(
+        "CITATION_MANIFEST_KEY", "manifests/citation-manifest.json"
+    )
+    # Content hashes of the ingested documents, for incremental syncs.
+    ingestion_manifest_key = os.environ.get(
+        "INGESTION_MANIFEST_KEY", "manifests/ingestion-manifest.json"
+    )
+
+    # "bedrock" syncs through the data source, "direct" writes the chunks to
+    # the vector index with cached embeddings, see direct_ingestion.py.
+    ingestion_mode = os.environ.get("INGESTION_MODE", "bedrock").lower()
+    collection_host = os.environ.get("COLLECTION_HOST")
+    vector_index_name = os.environ.get("VECTOR_INDEX_NAME")
+    vector_field_name = os.environ.get(
+        "VECTOR_FIELD_NAME", "bedrock-knowledge-base-default-vector"
+    )
+    # Must match the embedding model and size of the index profile.
+    embedding_model_id = os.environ.get(
+        "EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v1"
+    )
+    embedding_dimensions = int(os.environ.get("EMBEDDING_DIMENSIONS", "1536"))
+    embedding_cache_prefix = os.environ.get("EMBEDDING_CACHE_PREFIX", "embeddings/")
+
     update_agent = False
 
-    bedrock_agent = boto3.client("bedrock-agent", region_name=region_name)
\ No newline at end of file
+    bedrock_agent = boto3.client("bedrock-agent", region_name=region_name)
+    s3 = boto3.client("s3", region_name=region_name)
+    bedrock_runtime = boto3.client("bedrock-runtime", region_name=region_name)
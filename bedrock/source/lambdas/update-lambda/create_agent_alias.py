@@ -5,16 +5,22 @@ To create an agent alias before invoking the agent.
 Ref: https://docs.aws.amazon.com/bedrock/latest/APIReference/API_agent_CreateAgentAlias.html
 """
 
-import time
 import logging
 
+from waiters import wait_for_status
+
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
 def create_bedrock_agent_alias(
-    bedrock_agent, agent_id, agent_alias_name, description="agent alias description"
+    bedrock_agent,
+    agent_id,
+    agent_alias_name,
+    description="agent alias description",
+    timeout=300,
+    clock=None,
 ):
     """
     Create Amazon Bedrock Agent Alias before invoking the agent.
@@ -24,9 +30,15 @@ def create_bedrock_agent_alias(
         agent_id (str): The ID of the agent to create the alias for.
         agent_alias_name (str): The name of the alias to create.
         description (str): The description of the alias to create.
+        timeout (float): Seconds to wait for the alias to be prepared.
+        clock (Clock): Clock for the waiter, e.g. a FakeClock in tests.
 
     Returns:
-        None
+        str: The ID of the new alias.
+
+    Raises:
+        WaiterError: If the alias ends up in a failed state.
+        WaiterTimeout: If the alias isn't prepared in time.
     """
     # Create Bedrock Agent Alias
     response = bedrock_agent.create_agent_alias(
@@ -38,36 +50,20 @@ def create_bedrock_agent_alias(
     # Get Agent Alias ID
     agent_alias_id = response["agentAlias"]["agentAliasId"]
 
-    # Initial backoff interval in seconds
-    backoff_interval = 5
-    # Maximum backoff interval
-    max_backoff = 60
-    # Maximum number of retries
-    max_retries = 10
-
-    # Check the create agent alias status in a loop
-    for attempt in range(max_retries):
-        response = bedrock_agent.get_agent_alias(
+    def describe():
+        alias = bedrock_agent.get_agent_alias(
             agentId=agent_id, agentAliasId=agent_alias_id
-        )
-        alias_state = response["agentAlias"]["agentAliasStatus"]
+        )["agentAlias"]
+        return alias["agentAliasStatus"], "; ".join(alias.get("failureReasons", []))
+
+    # 'CREATING'|'PREPARED'|'FAILED'|'UPDATING'|'DELETING'|'DISSOCIATED'
+    wait_for_status(
+        describe,
+        f"The Bedrock Agent {agent_id} Alias {agent_alias_name}",
+        success={"PREPARED"},
+        pending={"CREATING", "UPDATING"},
+        timeout=timeout,
+        clock=clock,
+    )
 
-        if alias_state == "PREPARED":
-            logger.info(
-                f"The Bedrock Agent {agent_id} Alias {agent_alias_name} created successfully."
-            )
-            break
-        elif alias_state in ["CREATING", "UPDATING"]:
-            logger.info(
-                f"The Bedrock Agent {agent_id} Alias {agent_alias_name} is currently {alias_state.lower()}. Waiting..."
-            )
-            # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
-            time.sleep(backoff_interval)  # nosem: arbitrary-sleep
-            backoff_interval = min(
-                max_backoff, backoff_interval * 2
-            )  # Exponential backoff with a maximum limit
-        else:
-            logger.info(
-                f"Unexpected state for create_agent_alias {agent_alias_id}: {alias_state}"
-            )
-            break
\ No newline at end of file
+    return agent_alias_id
@@ -0,0 +1,229 @@
+"""
+direct_ingestion.py
+
+Ingest the knowledge base documents straight into the vector index, with
+embeddings from the embedding cache.
+
+The documents are the preprocessed section files, one chunk each (the data
+source doesn't chunk them either). Changes are detected with an ingestion
+manifest like the Bedrock sync's, marked as written by direct ingestion so
+that switching modes starts over with every document. The chunks of added
+and changed documents are embedded, cache misses only, and written in the
+layout the knowledge base uses, replacing the chunks previously indexed for
+the same source. Re-ingesting a mostly unchanged corpus, e.g. into a new index,
+then costs S3 reads and bulk writes instead of an embedding call per chunk.
+"""
+import json
+import logging
+from functools import partial
+
+from ingestion_controller import (
+    ADDED,
+    CHANGED,
+    DELETED,
+    DIRECT_INGESTION,
+    METADATA_SUFFIX,
+    detect_changes,
+    list_documents,
+    load_manifest,
+    save_manifest,
+)
+from embedding_cache import EmbeddingCache, chunk_hash, embed_texts
+from bulk_loader import BulkLoader
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Fields of a knowledge base chunk in the vector index.
+TEXT_FIELD_NAME = "AMAZON_BEDROCK_TEXT_CHUNK"
+METADATA_FIELD_NAME = "AMAZON_BEDROCK_METADATA"
+SOURCE_URI_FIELD_NAME = "x-amz-bedrock-kb-source-uri"
+DATA_SOURCE_ID_FIELD_NAME = "x-amz-bedrock-kb-data-source-id"
+# Source URIs looked up per search for their indexed chunk IDs.
+SEARCH_BATCH_SIZE = 50
+
+
+def create_search_client(host, region_name):
+    """
+    Create a SigV4 signed client for the knowledge base collection.
+    """
+    import boto3
+    from opensearchpy import AWSV4SignerAuth, OpenSearch, RequestsHttpConnection
+
+    credentials = boto3.Session().get_credentials()
+    return OpenSearch(
+        hosts=[{"host": host.split("//")[-1], "port": 443}],
+        http_auth=AWSV4SignerAuth(credentials, region_name, "aoss"),
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=RequestsHttpConnection,
+        pool_maxsize=20,
+        timeout=60,
+    )
+
+
+def chunk_document(uri, text, vector, attributes, vector_field_name, data_source_id):
+    """
+    Build the index document of a chunk the way the knowledge base writes
+    it: text, vector, source and the metadata attributes as fields.
+    """
+    document = dict(attributes)
+    document.update(
+        {
+            vector_field_name: vector,
+            TEXT_FIELD_NAME: text,
+            METADATA_FIELD_NAME: json.dumps({"source": uri}),
+            SOURCE_URI_FIELD_NAME: uri,
+            DATA_SOURCE_ID_FIELD_NAME: data_source_id,
+        }
+    )
+
+    return document
+
+
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def indexed_chunk_ids(search_client, index_name, uris):
+    """
+    Return the IDs of the chunks indexed for the given source URIs.
+    """
+    ids = []
+    for batch in _batches(list(uris), SEARCH_BATCH_SIZE):
+        response = search_client.search(
+            index=index_name,
+            body={
+                "size": 10000,
+                "_source": False,
+                "query": {"terms": {SOURCE_URI_FIELD_NAME: batch}},
+            },
+        )
+        ids.extend(hit["_id"] for hit in response["hits"]["hits"])
+
+    return ids
+
+
+def bulk_write(search_client, index_name, documents=(), delete_ids=()):
+    """
+    Index documents and delete chunks by ID with the bulk loader.
+
+    Vector collections assign document IDs themselves, so new chunks are
+    indexed without one and replaced chunks are deleted by the ID they got,
+    after the new chunks are written so a source is never missing.
+
+    Returns:
+        dict: Load statistics of the documents from BulkLoader.load.
+    """
+    loader = BulkLoader(search_client, index_name)
+    stats = loader.load(
+        ({"_source": document} for document in documents), raise_on_error=True
+    )
+    loader.load(
+        ({"_op_type": "delete", "_id": _id} for _id in delete_ids),
+        raise_on_error=True,
+    )
+
+    return stats
+
+
+def ingest_directly(
+    s3,
+    bedrock_runtime,
+    search_client,
+    bucket,
+    prefix,
+    manifest_key,
+    index_name,
+    vector_field_name,
+    model_id,
+    dimensions,
+    data_source_id,
+    cache_prefix="embeddings/",
+):
+    """
+    Bring the vector index in line with the documents under a prefix.
+
+    Args:
+        s3: Boto3 S3 client.
+        bedrock_runtime: Boto3 bedrock-runtime client.
+        search_client: OpenSearch client for the collection.
+        bucket (str): The assets bucket.
+        prefix (str): Prefix of the knowledge base documents, e.g. "data/".
+        manifest_key (str): Key of the ingestion manifest.
+        index_name (str): The vector index.
+        vector_field_name (str): The index's vector field.
+        model_id (str): Embedding model of the knowledge base.
+        dimensions (int): Embedding size of the index.
+        data_source_id (str): The knowledge base data source.
+        cache_prefix (str): Prefix of the embedding cache in the bucket.
+
+    Returns:
+        dict: ``mode`` ("direct"), ``changes``, embedding ``cache`` hits
+            and misses and the bulk load's ``docs_per_second``.
+    """
+    current = list_documents(s3, bucket, prefix)
+    manifest = load_manifest(s3, bucket, manifest_key, DIRECT_INGESTION, data_source_id)
+    changes, entries = detect_changes(
+        s3, bucket, current, manifest.get("documents", {}) if manifest else {}
+    )
+    upserts = sorted(key for key, change in changes.items() if change != DELETED)
+    deletes = sorted(key for key, change in changes.items() if change == DELETED)
+    logger.info(
+        f"Writing {len(upserts)} and deleting {len(deletes)} of "
+        f"{len(current)} documents."
+    )
+
+    texts = []
+    attributes = []
+    for key in upserts:
+        texts.append(
+            s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+        )
+        metadata = {}
+        if current[key]["metadata_etag"] is not None:
+            body = s3.get_object(Bucket=bucket, Key=f"{key}{METADATA_SUFFIX}")["Body"]
+            metadata = json.loads(body.read()).get("metadataAttributes", {})
+        attributes.append(metadata)
+
+    cache = EmbeddingCache(s3, bucket, cache_prefix, model_id, dimensions).load()
+    vectors = cache.embed(
+        texts, partial(embed_texts, bedrock_runtime, model_id, dimensions=dimensions)
+    )
+
+    uris = {key: f"s3://{bucket}/{key}" for key in upserts + deletes}
+    stale_ids = indexed_chunk_ids(search_client, index_name, uris.values())
+    load_stats = bulk_write(
+        search_client,
+        index_name,
+        documents=[
+            chunk_document(
+                uris[key], text, vector, metadata, vector_field_name, data_source_id
+            )
+            for key, text, vector, metadata in zip(upserts, texts, vectors, attributes)
+        ],
+        delete_ids=stale_ids,
+    )
+
+    for key, text in zip(upserts, texts):
+        entries[key]["chunk_sha256"] = chunk_hash(text)
+    live = {entry.get("chunk_sha256") for entry in entries.values()}
+    # An entry without a chunk hash keeps the whole cache.
+    cache.save(live=None if None in live else live)
+    cache.close()
+    save_manifest(s3, bucket, manifest_key, entries, DIRECT_INGESTION, data_source_id)
+
+    counts = {ADDED: 0, CHANGED: 0, DELETED: 0}
+    for change in changes.values():
+        counts[change] += 1
+    cache_stats = {"hits": cache.hits, "misses": cache.misses}
+    logger.info(f"Direct ingestion finished: {counts}, embedding cache: {cache_stats}")
+
+    return {
+        "mode": "direct",
+        "changes": counts,
+        "cache": cache_stats,
+        "docs_per_second": load_stats["docs_per_second"],
+    }
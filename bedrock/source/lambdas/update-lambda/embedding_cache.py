@@ -0,0 +1,245 @@
+"""
+embedding_cache.py
+
+Cache of chunk embeddings in the assets bucket, keyed by the SHA-256 of the
+chunk text.
+
+The vectors are one file of little-endian float32 rows that is memory
+mapped after download (numpy.memmap reads it as well), and a small JSON
+index maps each chunk hash to its row. Rewrites go to a new vectors file
+that the index is switched to last, so a reader never sees an index that
+points past the end of its vectors.
+"""
+import os
+import sys
+import json
+import mmap
+import array
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CACHE_VERSION = 1
+INDEX_NAME = "index.json"
+# Concurrent embedding requests; the Titan text models take one input each.
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "16"))
+
+
+def chunk_hash(text):
+    """
+    Cache key of a chunk.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_prefix(prefix, model_id, dimensions):
+    """
+    Prefix of the cache of one embedding model and size, e.g.
+    ``embeddings/amazon.titan-embed-text-v2-0-1024/``.
+    """
+    name = "".join(c if c.isalnum() or c in ".-" else "-" for c in model_id)
+    return f"{prefix.rstrip('/')}/{name}-{dimensions}/"
+
+
+def embed_texts(bedrock_runtime, model_id, texts, dimensions, batch_size=None):
+    """
+    Embed texts with a Titan embedding model, ``batch_size`` requests at a
+    time.
+
+    Returns:
+        list: One vector per text, in order.
+    """
+    def embed(text):
+        body = {"inputText": text}
+        if "v2" in model_id:
+            body.update(dimensions=dimensions, normalize=True)
+        response = bedrock_runtime.invoke_model(modelId=model_id, body=json.dumps(body))
+        return json.loads(response["body"].read())["embedding"]
+
+    with ThreadPoolExecutor(max_workers=batch_size or EMBEDDING_BATCH_SIZE) as pool:
+        return list(pool.map(embed, texts))
+
+
+class EmbeddingCache:
+    """
+    Embedding vectors of one model and size, looked up by chunk hash.
+    """
+
+    def __init__(self, s3, bucket, prefix, model_id, dimensions, work_dir=None):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = cache_prefix(prefix, model_id, dimensions)
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.work_dir = work_dir or tempfile.gettempdir()
+        self.rows = {}
+        self.vectors_key = None
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._mmap = None
+        self._file = None
+        self._added = {}
+
+    def load(self):
+        """
+        Download and memory map the cached vectors. A missing or mismatched
+        cache leaves the cache empty.
+        """
+        try:
+            body = self.s3.get_object(
+                Bucket=self.bucket, Key=f"{self.prefix}{INDEX_NAME}"
+            )["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            logger.info(f"No embedding cache at {self.prefix}, starting empty.")
+            return self
+
+        index = json.loads(body)
+        if (
+            index.get("version") != CACHE_VERSION
+            or index.get("dimensions") != self.dimensions
+            or index.get("model_id") != self.model_id
+        ):
+            logger.info(f"Embedding cache at {self.prefix} doesn't match, ignoring it.")
+            return self
+
+        self.rows = index["rows"]
+        self.vectors_key = index["vectors_key"]
+        self.generation = index["generation"]
+        if self.rows:
+            local_path = os.path.join(self.work_dir, os.path.basename(self.vectors_key))
+            self.s3.download_file(self.bucket, self.vectors_key, local_path)
+            self._file = open(local_path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._vectors = memoryview(self._mmap).cast("f")
+            if len(self._vectors) < len(self.rows) * self.dimensions:
+                logger.warning(f"Embedding cache at {self.prefix} is truncated.")
+                self.close()
+                self.rows = {}
+        logger.info(f"Loaded {len(self.rows)} cached embeddings from {self.prefix}.")
+
+        return self
+
+    def get(self, key):
+        """
+        Return the cached vector of a chunk hash, or None.
+        """
+        if key in self._added:
+            return self._added[key]
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        start = row * self.dimensions
+        return self._vectors[start : start + self.dimensions].tolist()
+
+    def put(self, key, vector):
+        if len(vector) != self.dimensions:
+            raise ValueError(
+                f"Expected {self.dimensions} dimensions, got {len(vector)}"
+            )
+        self._added[key] = vector
+
+    def embed(self, texts, embed_misses):
+        """
+        Look up the vectors of texts, embedding only the cache misses.
+
+        Args:
+            texts (list): Chunk texts.
+            embed_misses (callable): Embeds a list of texts, e.g. a partial
+                of embed_texts.
+
+        Returns:
+            list: One vector per text, in order.
+        """
+        keys = [chunk_hash(text) for text in texts]
+        misses = {}
+        for key, text in zip(keys, texts):
+            if self.get(key) is None:
+                misses.setdefault(key, text)
+
+        self.hits += len(keys) - len(misses)
+        self.misses += len(misses)
+        if misses:
+            for key, vector in zip(misses, embed_misses(list(misses.values()))):
+                self.put(key, vector)
+
+        return [self.get(key) for key in keys]
+
+    def save(self, live=None):
+        """
+        Write new vectors back to the bucket.
+
+        Args:
+            live (set): Chunk hashes still in use. When given, rows of other
+                chunks are dropped once they make up half of the file.
+        """
+        dead = set(self.rows) - live if live is not None else set()
+        if len(dead) * 2 <= len(self.rows):
+            dead = set()
+        if not self._added and not dead:
+            return
+
+        vectors = array.array("f")
+        rows = {}
+        for key, row in sorted(self.rows.items(), key=lambda item: item[1]):
+            if key in dead:
+                continue
+            rows[key] = len(rows)
+            start = row * self.dimensions
+            vectors.extend(self._vectors[start : start + self.dimensions])
+        for key, vector in self._added.items():
+            rows[key] = len(rows)
+            vectors.extend(vector)
+        body = vectors.tobytes()
+        if sys.byteorder != "little":
+            swapped = array.array("f", vectors)
+            swapped.byteswap()
+            body = swapped.tobytes()
+
+        previous_key = self.vectors_key
+        self.generation += 1
+        self.vectors_key = f"{self.prefix}vectors-{self.generation:06d}.f32"
+        self.s3.put_object(
+            Bucket=self.bucket, Key=self.vectors_key, Body=body
+        )
+        index = {
+            "version": CACHE_VERSION,
+            "model_id": self.model_id,
+            "dimensions": self.dimensions,
+            "dtype": "<f4",
+            "generation": self.generation,
+            "vectors_key": self.vectors_key,
+            "rows": rows,
+        }
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{INDEX_NAME}",
+            Body=json.dumps(index, separators=(",", ":")).encode("utf-8"),
+            ContentType="application/json",
+        )
+        if previous_key:
+            self.s3.delete_object(Bucket=self.bucket, Key=previous_key)
+        logger.info(
+            f"Saved {len(rows)} embeddings to {self.vectors_key}, "
+            f"{len(self._added)} new and {len(dead)} dropped."
+        )
+
+        # Keep serving lookups from the rows just written.
+        self.close()
+        self.rows = rows
+        self._vectors = memoryview(vectors)
+        self._added = {}
+
+    def close(self):
+        if self._vectors is not None:
+            self._vectors.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+        self._vectors = self._mmap = self._file = None
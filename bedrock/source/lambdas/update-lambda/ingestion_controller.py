@@ -0,0 +1,448 @@
+"""
+ingestion_controller.py
+
+Incremental knowledge base ingestion driven by a content hash manifest.
+
+The manifest in the assets bucket records the hash of every document that
+was ingested. On each run the documents under the data prefix are compared
+with it and only added, changed and deleted documents are sent to the
+knowledge base with the document level ingestion APIs, so sync time scales
+with the size of the change instead of the size of the corpus.
+Ref: https://docs.aws.amazon.com/bedrock/latest/userguide/kb-direct-ingestion.html
+"""
+import json
+import time
+import hashlib
+import logging
+
+from trigger_data_source_sync import trigger_data_source_sync
+from waiters import wait_until, WaiterTimeout
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MANIFEST_VERSION = 1
+# Ingestion paths that keep a manifest, see direct_ingestion.py.
+BEDROCK_INGESTION = "bedrock"
+DIRECT_INGESTION = "direct"
+METADATA_SUFFIX = ".metadata.json"
+# Most documents the ingestion APIs accept per call.
+MAX_DOCUMENTS_PER_CALL = 10
+
+ADDED = "added"
+CHANGED = "changed"
+DELETED = "deleted"
+
+# Document states after which polling stops.
+TERMINAL_STATUSES = {
+    "INDEXED",
+    "PARTIALLY_INDEXED",
+    "METADATA_PARTIALLY_INDEXED",
+    "METADATA_UPDATE_FAILED",
+    "FAILED",
+    "IGNORED",
+    "NOT_FOUND",
+}
+# SYNCED marks documents covered by a completed full sync whose individual
+# status could not be read.
+SUCCESS_STATUSES = {
+    "INDEXED",
+    "PARTIALLY_INDEXED",
+    "METADATA_PARTIALLY_INDEXED",
+    "SYNCED",
+}
+
+
+def load_manifest(
+    s3, bucket, manifest_key, ingestion_mode=BEDROCK_INGESTION, data_source_id=None
+):
+    """
+    Load the ingestion manifest, or None if there is none yet.
+
+    A manifest written by the other ingestion mode or for another data
+    source counts as none: the documents it records were indexed by a
+    different path or into a different data source, so switching starts
+    with a full sync.
+    """
+    try:
+        body = s3.get_object(Bucket=bucket, Key=manifest_key)["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+
+    manifest = json.loads(body)
+    if manifest.get("version") != MANIFEST_VERSION:
+        logger.info("Ingestion manifest has an old version, ignoring it.")
+        return None
+    if manifest.get("ingestion_mode") != ingestion_mode:
+        logger.info(
+            f"Ingestion manifest is from {manifest.get('ingestion_mode')} "
+            f"ingestion, not {ingestion_mode}, ignoring it."
+        )
+        return None
+    if data_source_id and manifest.get("data_source_id") != data_source_id:
+        logger.info(
+            f"Ingestion manifest is for data source {manifest.get('data_source_id')}, "
+            f"not {data_source_id}, ignoring it."
+        )
+        return None
+
+    return manifest
+
+
+def save_manifest(
+    s3,
+    bucket,
+    manifest_key,
+    documents,
+    ingestion_mode=BEDROCK_INGESTION,
+    data_source_id=None,
+):
+    """
+    Write the ingestion manifest.
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "ingestion_mode": ingestion_mode,
+        "data_source_id": data_source_id,
+        "updated_at": int(time.time()),
+        "documents": documents,
+    }
+    s3.put_object(
+        Bucket=bucket,
+        Key=manifest_key,
+        Body=json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def list_documents(s3, bucket, prefix):
+    """
+    List the documents under a prefix with the ETags of their metadata files.
+
+    Returns:
+        dict: ``{key: {"etag", "size", "metadata_etag"}}``.
+    """
+    objects = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if not obj["Key"].endswith("/"):
+                objects[obj["Key"]] = obj
+
+    documents = {}
+    for key, obj in objects.items():
+        if key.endswith(METADATA_SUFFIX):
+            continue
+        metadata = objects.get(f"{key}{METADATA_SUFFIX}")
+        documents[key] = {
+            "etag": obj["ETag"],
+            "size": obj["Size"],
+            "metadata_etag": metadata["ETag"] if metadata else None,
+        }
+
+    return documents
+
+
+def content_hash(s3, bucket, key, has_metadata):
+    """
+    SHA-256 of a document together with its metadata file.
+    """
+    digest = hashlib.sha256()
+    keys = [key, f"{key}{METADATA_SUFFIX}"] if has_metadata else [key]
+    for object_key in keys:
+        body = s3.get_object(Bucket=bucket, Key=object_key)["Body"]
+        for chunk in iter(lambda: body.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def detect_changes(s3, bucket, current, previous):
+    """
+    Compare the listed documents with the manifest.
+
+    Documents whose ETags match the manifest keep their recorded hash, so
+    only new or touched objects are downloaded and hashed. Entries marked
+    ``pending_delete`` are documents whose deletion didn't complete: they
+    are deleted again while absent and added again once they reappear.
+
+    Args:
+        current (dict): Documents from list_documents().
+        previous (dict): Documents from the manifest.
+
+    Returns:
+        tuple: ``{key: change}`` for added, changed and deleted documents and
+            the manifest entries of all current documents.
+    """
+    changes = {}
+    entries = {}
+    for key, listing in current.items():
+        recorded = previous.get(key)
+        if recorded and recorded.get("pending_delete"):
+            recorded = None
+        if (
+            recorded
+            and recorded["etag"] == listing["etag"]
+            and recorded.get("metadata_etag") == listing["metadata_etag"]
+        ):
+            entries[key] = recorded
+            continue
+
+        sha256 = content_hash(s3, bucket, key, listing["metadata_etag"] is not None)
+        entries[key] = dict(listing, sha256=sha256)
+        if recorded is None:
+            changes[key] = ADDED
+        elif recorded.get("sha256") != sha256:
+            changes[key] = CHANGED
+
+    for key in previous:
+        if key not in current:
+            changes[key] = DELETED
+
+    return changes, entries
+
+
+def _batches(items, size=MAX_DOCUMENTS_PER_CALL):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _identifier(bucket, key):
+    return {"dataSourceType": "S3", "s3": {"uri": f"s3://{bucket}/{key}"}}
+
+
+def _key_of(identifier, bucket):
+    return identifier["s3"]["uri"][len(f"s3://{bucket}/") :]
+
+
+def ingest_documents(
+    bedrock_agent, knowledgebase_id, data_source_id, bucket, keys, has_metadata
+):
+    """
+    Ingest documents through the document level API.
+    """
+    for batch in _batches(keys):
+        documents = []
+        for key in batch:
+            document = {
+                "content": {
+                    "dataSourceType": "S3",
+                    "s3": {"s3Location": {"uri": f"s3://{bucket}/{key}"}},
+                }
+            }
+            if has_metadata(key):
+                document["metadata"] = {
+                    "type": "S3_LOCATION",
+                    "s3Location": {"uri": f"s3://{bucket}/{key}{METADATA_SUFFIX}"},
+                }
+            documents.append(document)
+
+        bedrock_agent.ingest_knowledge_base_documents(
+            knowledgeBaseId=knowledgebase_id,
+            dataSourceId=data_source_id,
+            documents=documents,
+        )
+
+
+def delete_documents(bedrock_agent, knowledgebase_id, data_source_id, bucket, keys):
+    """
+    Remove deleted documents from the knowledge base.
+    """
+    for batch in _batches(keys):
+        bedrock_agent.delete_knowledge_base_documents(
+            knowledgeBaseId=knowledgebase_id,
+            dataSourceId=data_source_id,
+            documentIdentifiers=[_identifier(bucket, key) for key in batch],
+        )
+
+
+def wait_for_documents(
+    bedrock_agent,
+    knowledgebase_id,
+    data_source_id,
+    bucket,
+    keys,
+    deleted=(),
+    timeout=600,
+    clock=None,
+):
+    """
+    Poll the status of ingested and deleted documents until they settle.
+
+    Deleted documents are done once the knowledge base reports NOT_FOUND.
+    Documents still pending at the deadline keep their last status, so they
+    are reported and retried by the next run.
+
+    Returns:
+        dict: ``{key: {"status", "reason"}}`` for every document.
+    """
+    statuses = {key: {"status": "PENDING", "reason": None} for key in keys}
+
+    def settled():
+        pending = [
+            key for key in keys if statuses[key]["status"] not in TERMINAL_STATUSES
+        ]
+        for batch in _batches(pending):
+            response = bedrock_agent.get_knowledge_base_documents(
+                knowledgeBaseId=knowledgebase_id,
+                dataSourceId=data_source_id,
+                documentIdentifiers=[_identifier(bucket, key) for key in batch],
+            )
+            for detail in response.get("documentDetails", []):
+                key = _key_of(detail["identifier"], bucket)
+                statuses[key] = {
+                    "status": detail["status"],
+                    "reason": detail.get("statusReason"),
+                }
+
+        return all(
+            status["status"] in TERMINAL_STATUSES for status in statuses.values()
+        )
+
+    try:
+        wait_until(
+            settled,
+            f"Ingestion of {len(keys)} documents",
+            timeout=timeout,
+            initial_delay=5,
+            max_delay=30,
+            clock=clock,
+        )
+    except WaiterTimeout as e:
+        logger.warning(str(e))
+
+    for key in deleted:
+        if statuses[key]["status"] == "NOT_FOUND":
+            statuses[key]["status"] = "DELETED"
+
+    return statuses
+
+
+def list_document_statuses(bedrock_agent, knowledgebase_id, data_source_id, bucket):
+    """
+    Read the status of every document after a full data source sync.
+    """
+    statuses = {}
+    paginator = bedrock_agent.get_paginator("list_knowledge_base_documents")
+    for page in paginator.paginate(
+        knowledgeBaseId=knowledgebase_id, dataSourceId=data_source_id
+    ):
+        for detail in page.get("documentDetails", []):
+            if detail["identifier"].get("dataSourceType") != "S3":
+                continue
+            statuses[_key_of(detail["identifier"], bucket)] = {
+                "status": detail["status"],
+                "reason": detail.get("statusReason"),
+            }
+
+    return statuses
+
+
+def sync_knowledge_base(
+    bedrock_agent,
+    s3,
+    knowledgebase_id,
+    data_source_id,
+    bucket,
+    prefix,
+    manifest_key,
+):
+    """
+    Bring the knowledge base in line with the documents under a prefix.
+
+    Without a manifest (the first deployment) the whole data source is
+    synced with an ingestion job. Afterwards only the documents that
+    changed since the manifest was written are ingested or deleted.
+    Documents that fail to ingest are left out of the manifest and
+    documents whose deletion doesn't complete stay in it marked
+    ``pending_delete``, so the next run retries both.
+
+    Args:
+        bedrock_agent: Boto3 bedrock-agent client.
+        s3: Boto3 S3 client.
+        knowledgebase_id (str): The ID of the Knowledgebase.
+        data_source_id (str): The ID of the Data Source.
+        bucket (str): The assets bucket.
+        prefix (str): Prefix of the knowledge base documents, e.g. "data/".
+        manifest_key (str): Key of the ingestion manifest.
+
+    Returns:
+        dict: ``mode`` ("full" or "incremental"), ``changes`` and the
+            per-document ``documents`` report with change and status.
+    """
+    current = list_documents(s3, bucket, prefix)
+    manifest = load_manifest(
+        s3, bucket, manifest_key, BEDROCK_INGESTION, data_source_id
+    )
+
+    if manifest is None:
+        logger.info("No ingestion manifest, starting a full data source sync.")
+        trigger_data_source_sync(bedrock_agent, knowledgebase_id, data_source_id)
+        changes, entries = detect_changes(s3, bucket, current, {})
+        statuses = {key: {"status": "SYNCED", "reason": None} for key in current}
+        try:
+            statuses.update(
+                list_document_statuses(
+                    bedrock_agent, knowledgebase_id, data_source_id, bucket
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Could not read document statuses: {e}")
+        mode = "full"
+    else:
+        previous = manifest.get("documents", {})
+        changes, entries = detect_changes(s3, bucket, current, previous)
+        upserts = [key for key, change in changes.items() if change != DELETED]
+        deletes = [key for key, change in changes.items() if change == DELETED]
+        logger.info(
+            f"Ingesting {len(upserts)} and deleting {len(deletes)} of "
+            f"{len(current)} documents."
+        )
+
+        ingest_documents(
+            bedrock_agent,
+            knowledgebase_id,
+            data_source_id,
+            bucket,
+            upserts,
+            has_metadata=lambda key: current[key]["metadata_etag"] is not None,
+        )
+        delete_documents(bedrock_agent, knowledgebase_id, data_source_id, bucket, deletes)
+        statuses = wait_for_documents(
+            bedrock_agent,
+            knowledgebase_id,
+            data_source_id,
+            bucket,
+            upserts + deletes,
+            deleted=deletes,
+        )
+        mode = "incremental"
+
+    report = {}
+    for key, change in changes.items():
+        status = statuses.get(key, {"status": "UNKNOWN", "reason": None})
+        report[key] = dict(status, change=change)
+        if change == DELETED:
+            if status["status"] != "DELETED":
+                # Kept, so the next run deletes the document again.
+                entries[key] = dict(previous[key], pending_delete=True)
+                logger.warning(
+                    f"Document {key} was not deleted: "
+                    f"{status['status']} {status['reason']}"
+                )
+        elif status["status"] not in SUCCESS_STATUSES:
+            # Not recorded, so the next run picks the document up again.
+            entries.pop(key, None)
+            logger.warning(
+                f"Document {key} was not indexed: {status['status']} {status['reason']}"
+            )
+
+    save_manifest(s3, bucket, manifest_key, entries, BEDROCK_INGESTION, data_source_id)
+
+    counts = {ADDED: 0, CHANGED: 0, DELETED: 0}
+    for change in changes.values():
+        counts[change] += 1
+    logger.info(f"Knowledge base {mode} sync finished: {counts}, report: {report}")
+
+    return {"mode": mode, "changes": counts, "documents": report}
@@ -1,9 +1,12 @@
-
 from trigger_data_source_sync import trigger_data_source_sync
+from ingestion_controller import sync_knowledge_base
+from direct_ingestion import ingest_directly, create_search_client
+from index_warmup import warm_up
 from prepare_agent import prepare_bedrock_agent
 from create_agent_alias import create_bedrock_agent_alias
+from citation_manifest import publish_citation_manifest
+from step_graph import run_step_graph, StepFailed
 from connections import Connections
-import cfnresponse
 
 import logging
 
@@ -20,69 +23,214 @@ agent_resource_role_arn = Connections.agent_resource_role_arn
 data_source_id = Connections.data_source_id
 knowledgebase_id = Connections.knowledgebase_id
 update_agent = Connections.update_agent
+s3 = Connections.s3
+assets_bucket_name = Connections.assets_bucket_name
+documents_prefix = Connections.documents_prefix
+citation_manifest_key = Connections.citation_manifest_key
+ingestion_manifest_key = Connections.ingestion_manifest_key
 
 
-def lambda_handler(event, context):
+def sync_documents():
+    """
+    Sync the knowledge base with the documents in the assets bucket.
+
+    Returns:
+        dict: Sync mode and the number of added, changed and deleted documents.
     """
-    Trigger Glue Crawler, Data Source Sync, Create Agent Alias, and Update Agent Prompts (optional).
+    if not assets_bucket_name:
+        # Without the bucket the manifest can't be kept, sync everything.
+        trigger_data_source_sync(bedrock_agent, knowledgebase_id, data_source_id)
+        return {"SyncMode": "full"}
+
+    if Connections.ingestion_mode == "direct":
+        result = ingest_directly(
+            s3,
+            Connections.bedrock_runtime,
+            create_search_client(Connections.collection_host, Connections.region_name),
+            assets_bucket_name,
+            documents_prefix,
+            ingestion_manifest_key,
+            Connections.vector_index_name,
+            Connections.vector_field_name,
+            Connections.embedding_model_id,
+            Connections.embedding_dimensions,
+            data_source_id,
+            cache_prefix=Connections.embedding_cache_prefix,
+        )
+        return {
+            "SyncMode": result["mode"],
+            **result["changes"],
+            "EmbeddingCacheHits": result["cache"]["hits"],
+            "EmbeddingCacheMisses": result["cache"]["misses"],
+            "BulkDocsPerSecond": result["docs_per_second"],
+        }
+
+    result = sync_knowledge_base(
+        bedrock_agent,
+        s3,
+        knowledgebase_id,
+        data_source_id,
+        assets_bucket_name,
+        documents_prefix,
+        ingestion_manifest_key,
+    )
+
+    return {"SyncMode": result["mode"], **result["changes"]}
+
+
+def publish_manifest():
     """
-    logger.info(f"Received event: {event}")
+    Publish the citation manifest. The invoke Lambda falls back to reading
+    cited documents when there is none, so a failure here is not fatal.
+    """
+    if not assets_bucket_name:
+        logger.info("No assets bucket configured, skipping citation manifest.")
+        return
 
-    status = cfnresponse.SUCCESS
-    status_code = 200
-    status_body = "Success"
-    response = {}
+    try:
+        publish_citation_manifest(
+            s3, assets_bucket_name, documents_prefix, citation_manifest_key
+        )
+    except Exception as e:
+        logger.warning(f"Failed to publish citation manifest: {e}")
+
+
+def warm_up_index():
+    """
+    Load the vector index's graphs once the documents are ingested, so the
+    first question doesn't pay for it. A failure here is not fatal.
+
+    Returns:
+        dict: Warm-up method and first query and steady state latencies.
+    """
+    if not Connections.collection_host or not Connections.vector_index_name:
+        logger.info("No vector index configured, skipping warm-up.")
+        return {}
 
     try:
-        if event["RequestType"] == "Create":
-            # Trigger Data Source Sync
-            logger.info("Starting Data Source Sync.")
-            trigger_data_source_sync(bedrock_agent, knowledgebase_id, data_source_id)
-            logger.info("Data Source Sync triggered successfully.")
+        result = warm_up(
+            create_search_client(Connections.collection_host, Connections.region_name),
+            Connections.vector_index_name,
+            Connections.vector_field_name,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to warm up the vector index: {e}")
+        return {}
 
-            # Preapre Bedrock Agent
-            logger.info("Starting Preparing Bedrock Agent.")
-            prepare_bedrock_agent(bedrock_agent, agent_id)
-            logger.info("Bedrock Agent Prepared successfully.")
+    return {
+        "WarmupMethod": result["method"],
+        "WarmupFirstQueryMs": result["first_query_ms"],
+        "WarmupSteadyStateMs": result["steady_state_ms"],
+    }
 
-            # Create Agent Alias
-            logger.info("Creating Agent Alias.")
-            create_bedrock_agent_alias(bedrock_agent, agent_id, agent_alias_name)
-            logger.info("Agent Alias created successfully.")
 
-        elif event["RequestType"] == "Delete":
+def step_durations(durations):
+    """
+    Flatten step durations into custom resource response data.
+    """
+    return {f"{name}_seconds": seconds for name, seconds in durations.items()}
+
+
+def provision_steps():
+    """
+    Steps run on Create. Document ingestion is the long pole and doesn't
+    depend on the agent, so it runs alongside preparing the agent; the alias
+    is created once the agent is prepared and the index is warmed up once
+    the documents are in.
+    """
+    return {
+        "sync_documents": (sync_documents, []),
+        "publish_manifest": (publish_manifest, []),
+        "warm_up_index": (warm_up_index, ["sync_documents"]),
+        "prepare_agent": (lambda: prepare_bedrock_agent(bedrock_agent, agent_id), []),
+        "create_alias": (
+            lambda: create_bedrock_agent_alias(
+                bedrock_agent, agent_id, agent_alias_name
+            ),
+            ["prepare_agent"],
+        ),
+    }
+
+
+def teardown_steps():
+    """
+    Steps run on Delete. Aliases are deleted concurrently, then the agent.
+    """
+    response = bedrock_agent.list_agent_aliases(agentId=agent_id)
+    alias_ids = [summary["agentAliasId"] for summary in response["agentAliasSummaries"]]
+    logger.info(f"Deleting alias ids: {alias_ids}.")
+
+    def delete_alias(agent_alias_id):
+        return lambda: bedrock_agent.delete_agent_alias(
+            agentId=agent_id, agentAliasId=agent_alias_id
+        )
+
+    steps = {
+        f"delete_alias_{agent_alias_id}": (delete_alias(agent_alias_id), [])
+        for agent_alias_id in alias_ids
+    }
+    steps["delete_agent"] = (
+        lambda: bedrock_agent.delete_agent(
+            agentId=agent_id, skipResourceInUseCheck=False
+        ),
+        list(steps),
+    )
 
-            response = bedrock_agent.list_agent_aliases(agentId=agent_id)
-            alias_ids = [
-                summary["agentAliasId"] for summary in response["agentAliasSummaries"]
-            ]
-            logger.info(f"Deleting alias ids: {alias_ids}.")
+    return steps
 
-            for agent_alias_id in alias_ids:
-                bedrock_agent.delete_agent_alias(
-                    agentId=agent_id, agentAliasId=agent_alias_id
-                )
 
-            response = bedrock_agent.delete_agent(
-                agentId=agent_id, skipResourceInUseCheck=False
+def lambda_handler(event, context):
+    """
+    Trigger Data Source Sync, Prepare Agent and Create Agent Alias as a step
+    graph, and report each step's duration in the response data.
+
+    Runs as the on_event handler of a custom resource provider, which takes
+    the response data from the returned ``Data`` and reports a failure when
+    the handler raises.
+    """
+    logger.info(f"Received event: {event}")
+
+    response = {}
+
+    try:
+        if event["RequestType"] == "Create":
+            results, durations = run_step_graph(provision_steps())
+            response = {
+                **results["sync_documents"],
+                **results["warm_up_index"],
+                **step_durations(durations),
+            }
+            logger.info("Knowledge base synced and agent alias created successfully.")
+
+        elif event["RequestType"] == "Update":
+            # Documents changed, ingest only the deltas
+            results, durations = run_step_graph(
+                {
+                    "sync_documents": (sync_documents, []),
+                    "publish_manifest": (publish_manifest, []),
+                    "warm_up_index": (warm_up_index, ["sync_documents"]),
+                }
             )
+            response = {
+                **results["sync_documents"],
+                **results["warm_up_index"],
+                **step_durations(durations),
+            }
+            logger.info("Data Source Sync finished successfully.")
+
+        elif event["RequestType"] == "Delete":
+            _, durations = run_step_graph(teardown_steps())
+            response = step_durations(durations)
             logger.info(f"Deleted agent id: {agent_id}.")
         else:
             logger.info("Continuing without action.")
 
     except Exception as e:
-        # Log the error
-        logger.error(f"An error occurred: {e}")
-
-        status = cfnresponse.FAILED
-        status_code = 500
-        status_body = "An error occurred during the process."
-
         response = {"Error": str(e)}
+        if isinstance(e, StepFailed):
+            response.update(step_durations(e.durations))
+        logger.error(f"An error occurred: {e}, response: {response}")
+        raise
 
-    finally:
-        logger.error(f"Sending status: {status} with response: {response}")
-        cfnresponse.send(event, context, status, response)
-
-    # If everything went well
-    return {"statusCode": status_code, "body": status_body}
+    logger.info(f"Returning response data: {response}")
+    return {"Data": response}
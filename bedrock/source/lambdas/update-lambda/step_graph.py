@@ -0,0 +1,97 @@
+"""
+step_graph.py
+
+Run provisioning steps as a small dependency graph.
+
+Each step starts as soon as the steps it depends on have finished, so
+independent steps such as the knowledge base sync and the agent preparation
+run concurrently.
+"""
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class StepFailed(Exception):
+    """
+    One or more steps of the graph failed.
+    """
+
+    def __init__(self, errors, durations):
+        message = "; ".join(f"{name}: {error}" for name, error in errors.items())
+        super().__init__(message)
+        self.errors = errors
+        self.durations = durations
+
+
+def run_step_graph(steps, max_workers=4):
+    """
+    Run steps once their dependencies have completed.
+
+    Steps whose dependencies failed are skipped. Steps that are already
+    running are allowed to finish before the failure is raised.
+
+    Args:
+        steps (dict): ``{name: (callable, [dependency names])}``.
+        max_workers (int): Number of steps run at once.
+
+    Returns:
+        tuple: ``{name: result}`` and ``{name: duration in seconds}``.
+
+    Raises:
+        StepFailed: If any step raised, with the errors and the durations of
+            the steps that ran.
+    """
+    for name, (_, dependencies) in steps.items():
+        unknown = set(dependencies) - set(steps)
+        if unknown:
+            raise ValueError(f"Step {name} depends on unknown steps {unknown}")
+
+    results = {}
+    durations = {}
+    errors = {}
+    remaining = dict(steps)
+    running = {}
+
+    def timed(name, fn):
+        start = time.monotonic()
+        logger.info(f"Starting step {name}.")
+        try:
+            return fn()
+        finally:
+            durations[name] = round(time.monotonic() - start, 1)
+            logger.info(f"Step {name} finished in {durations[name]}s.")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while remaining or running:
+            for name, (fn, dependencies) in list(remaining.items()):
+                if any(dependency in errors for dependency in dependencies):
+                    logger.warning(f"Skipping step {name}, a dependency failed.")
+                    errors[name] = "skipped"
+                    del remaining[name]
+                elif all(dependency in results for dependency in dependencies):
+                    running[executor.submit(timed, name, fn)] = name
+                    del remaining[name]
+
+            if not running:
+                if remaining:
+                    raise ValueError(f"Steps {list(remaining)} have a dependency cycle")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.error(f"Step {name} failed: {e}")
+                    errors[name] = e
+
+    if errors:
+        raise StepFailed(errors, durations)
+
+    return results, durations
@@ -1,10 +1,9 @@
 import json
-import uuid
-from datetime import datetime
-from datetime import timezone
 
 import logging
 
+from work_orders import get_repository
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -26,13 +25,15 @@ def lambda_handler(event, context):
 def handle_submit_work_order(event):
     parameters = event.get('parameters', [])
     try:
-        equipment_id = ""
-        for p in parameters:
-            if p["name"]  == "equipment_id":
-                equipment_id = p ["value"]
-
-        # todo request description
-        request_description = event["inputText"]
+        # The OpenAPI request body's properties, and parameters as before.
+        properties = event.get('requestBody', {}).get('content', {}).get('application/json', {}).get('properties', [])
+        values = {p["name"]: p["value"] for p in parameters + properties}
+        equipment_id = values.get("equipmentId", values.get("equipment_id", ""))
+        if not equipment_id.strip():
+            raise KeyError("equipmentId")
+
+        # The user's request when the agent doesn't pass a description
+        request_description = values.get("requestDescription") or event["inputText"]
     except json.JSONDecodeError as e:
         logger.error(f"Invalid JSON in request body: {str(e)}")
         return error_response(400, f"Invalid JSON in request body: {str(e)}", event)
@@ -40,23 +41,35 @@ def handle_submit_work_order(event):
         logger.error(f"Missing required field in request body: {str(e)}")
         return error_response(400, f"Missing required field in request body: {str(e)}", event)
 
-    work_order_number = str(uuid.uuid4().int)[:5]
-    submission_datetime = datetime.now(timezone.utc).isoformat()
-    message = f"Work order {work_order_number} has been submitted for equipment {equipment_id} at {submission_datetime} with the following request: {request_description}"
+    # Agent retries of the same request in a session return the same order.
+    work_order, created = get_repository().submit(
+        equipment_id, request_description, session_id=event.get('sessionId')
+    )
+    work_order_number = work_order["work_order_number"]
+    submission_datetime = work_order["submitted_at"]
+    if created:
+        message = f"Work order {work_order_number} has been submitted for equipment {equipment_id} at {submission_datetime} with the following request: {request_description}"
+    else:
+        message = f"Work order {work_order_number} was already submitted for equipment {work_order['equipment_id']} at {submission_datetime} with the following request: {work_order['request_description']}"
 
     response_body = {
         "workOrderNumber": work_order_number,
-        "equipmentId": equipment_id,
-        "requestDescription": request_description,
+        "equipmentId": work_order["equipment_id"],
+        "requestDescription": work_order["request_description"],
         "submissionDatetime": submission_datetime,
+        "status": work_order["status"],
+        "duplicate": not created,
         "message": message
     }
 
-    logger.info(f"Work order created successfully: {json.dumps(response_body)}")
-    return success_response(response_body, event)
+    if created:
+        logger.info(f"Work order created successfully: {json.dumps(response_body)}")
+    else:
+        logger.info(f"Returning existing work order: {json.dumps(response_body)}")
+    return success_response(response_body, event, 201 if created else 200)
 
 
-def success_response(response, event):
+def success_response(response, event, status_code=201):
     actionGroup = event.get('actionGroup')
     apiPath = event.get('apiPath')
     httpMethod = event.get('httpMethod')
@@ -72,7 +85,7 @@ def success_response(response, event):
         'actionGroup': actionGroup,
         'apiPath': apiPath,
         'httpMethod': httpMethod,
-        'httpStatusCode': 201,
+        'httpStatusCode': status_code,
         'responseBody': responseBody
     }
 
@@ -0,0 +1,616 @@
+"""
+work_orders.py
+
+Work order repository with idempotent submission.
+
+A submission is identified by an idempotency key derived from the agent
+session, the equipment and the request text, so an agent that retries the
+action gets the work order it already created instead of a second one.
+Numbers come from an atomic counter, and the order and its key are written
+together with conditions, so concurrent retries can't both create one.
+Work orders are looked up by number, and through secondary indexes by
+equipment, status and submission time.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+WORK_ORDER_TABLE_NAME = os.environ.get("WORK_ORDER_TABLE_NAME")
+
+# Backend for work orders: dynamodb, sqlite or memory.
+WORK_ORDER_STORE = os.environ.get(
+    "WORK_ORDER_STORE", "dynamodb" if WORK_ORDER_TABLE_NAME else "memory"
+).lower()
+WORK_ORDER_DB_PATH = os.environ.get("WORK_ORDER_DB_PATH", "/tmp/work_orders.db")
+# How long a repeated submission returns the existing work order.
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+OPEN = "OPEN"
+IN_PROGRESS = "IN_PROGRESS"
+DONE = "DONE"
+CANCELLED = "CANCELLED"
+STATUSES = (OPEN, IN_PROGRESS, DONE, CANCELLED)
+
+
+class WorkOrderNotFound(Exception):
+    pass
+
+
+class WorkOrderConflict(Exception):
+    """
+    The work order isn't in the status the update expected.
+    """
+
+
+def equipment_key(equipment_id):
+    """
+    Normalized equipment ID, so "Boiler 123" and "boiler  123" are the same
+    equipment in lookups and idempotency keys.
+    """
+    return re.sub(r"\s+", " ", equipment_id.strip()).casefold()
+
+
+def idempotency_key(session_id, equipment_id, request_description):
+    """
+    Key of a submission: the same request for the same equipment in the
+    same session maps to the same key.
+    """
+    text = re.sub(r"\s+", " ", request_description.strip()).casefold()
+    parts = [session_id or "", equipment_key(equipment_id), text]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def format_number(value):
+    return f"{value:05d}"
+
+
+def new_work_order(number, equipment_id, request_description, session_id, key):
+    submitted_at = datetime.now(timezone.utc).isoformat()
+    return {
+        "work_order_number": number,
+        "equipment_id": equipment_id,
+        "request_description": request_description,
+        "session_id": session_id,
+        "status": OPEN,
+        "submitted_at": submitted_at,
+        "updated_at": submitted_at,
+        "idempotency_key": key,
+    }
+
+
+class WorkOrderRepository(ABC):
+    """
+    Persistence for work orders.
+    """
+
+    def submit(self, equipment_id, request_description, session_id=None):
+        """
+        Create a work order, or return the one a previous submission of the
+        same request created.
+
+        Args:
+            equipment_id (str): The equipment to service.
+            request_description (str): What should be done.
+            session_id (str): The agent session submitting the request.
+
+        Returns:
+            tuple: The work order and whether it was created by this call.
+        """
+        key = idempotency_key(session_id, equipment_id, request_description)
+        existing = self.find_by_idempotency_key(key)
+        if existing:
+            return existing, False
+
+        work_order = new_work_order(
+            format_number(self.next_number()),
+            equipment_id,
+            request_description,
+            session_id,
+            key,
+        )
+        stored = self.insert(work_order)
+        return stored, stored["work_order_number"] == work_order["work_order_number"]
+
+    @abstractmethod
+    def next_number(self):
+        """
+        Increment and return the work order counter.
+        """
+
+    @abstractmethod
+    def insert(self, work_order):
+        """
+        Store a new work order unless its idempotency key is taken.
+
+        Returns:
+            dict: The stored work order, or the one holding the key.
+        """
+
+    @abstractmethod
+    def find_by_idempotency_key(self, key):
+        """
+        Return the work order created for an idempotency key, or None.
+        """
+
+    @abstractmethod
+    def get(self, work_order_number):
+        """
+        Return a work order, or None if there is no such work order.
+        """
+
+    @abstractmethod
+    def list_by_equipment(self, equipment_id, limit=20):
+        """
+        Return the work orders of the equipment, newest first.
+        """
+
+    @abstractmethod
+    def list_by_status(self, status, limit=20):
+        """
+        Return the work orders in a status, newest first.
+        """
+
+    @abstractmethod
+    def list_submitted_between(self, start, end, limit=100):
+        """
+        Return the work orders submitted between two ISO 8601 times, oldest
+        first.
+        """
+
+    @abstractmethod
+    def update_status(self, work_order_number, status, expected_status=None):
+        """
+        Set the status of a work order.
+
+        Args:
+            work_order_number (str): The work order.
+            status (str): One of STATUSES.
+            expected_status (str): Only update from this status.
+
+        Returns:
+            dict: The updated work order.
+
+        Raises:
+            WorkOrderNotFound: If there is no such work order.
+            WorkOrderConflict: If it isn't in the expected status.
+        """
+
+
+def _check_status(status):
+    if status not in STATUSES:
+        raise ValueError(f"Unknown status {status}, expected one of {STATUSES}")
+
+
+class InMemoryWorkOrderRepository(WorkOrderRepository):
+    """
+    Local stand-in for tests and for running outside of AWS.
+    """
+
+    def __init__(self):
+        self._counter = 0
+        self._work_orders = {}
+        self._keys = {}
+        # Secondary indexes, in submission order.
+        self._by_equipment = {}
+        self._by_status = {status: {} for status in STATUSES}
+        self._lock = threading.Lock()
+
+    def next_number(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def _find(self, key):
+        number, expires_at = self._keys.get(key, (None, 0))
+        return self._work_orders[number] if expires_at > time.time() else None
+
+    def insert(self, work_order):
+        with self._lock:
+            existing = self._find(work_order["idempotency_key"])
+            if existing:
+                return dict(existing)
+
+            number = work_order["work_order_number"]
+            self._work_orders[number] = dict(work_order)
+            self._keys[work_order["idempotency_key"]] = (
+                number,
+                time.time() + IDEMPOTENCY_TTL_SECONDS,
+            )
+            self._by_equipment.setdefault(
+                equipment_key(work_order["equipment_id"]), []
+            ).append(number)
+            self._by_status[work_order["status"]][number] = None
+            return dict(work_order)
+
+    def find_by_idempotency_key(self, key):
+        with self._lock:
+            work_order = self._find(key)
+            return dict(work_order) if work_order else None
+
+    def get(self, work_order_number):
+        with self._lock:
+            work_order = self._work_orders.get(work_order_number)
+            return dict(work_order) if work_order else None
+
+    def list_by_equipment(self, equipment_id, limit=20):
+        with self._lock:
+            numbers = self._by_equipment.get(equipment_key(equipment_id), [])
+            return [dict(self._work_orders[n]) for n in reversed(numbers[-limit:])]
+
+    def list_by_status(self, status, limit=20):
+        _check_status(status)
+        with self._lock:
+            numbers = sorted(self._by_status[status], key=int)[-limit:]
+            return [dict(self._work_orders[n]) for n in reversed(numbers)]
+
+    def list_submitted_between(self, start, end, limit=100):
+        with self._lock:
+            work_orders = sorted(
+                (
+                    w
+                    for w in self._work_orders.values()
+                    if start <= w["submitted_at"] <= end
+                ),
+                key=lambda w: w["submitted_at"],
+            )
+            return [dict(w) for w in work_orders[:limit]]
+
+    def update_status(self, work_order_number, status, expected_status=None):
+        _check_status(status)
+        with self._lock:
+            work_order = self._work_orders.get(work_order_number)
+            if work_order is None:
+                raise WorkOrderNotFound(work_order_number)
+            if expected_status and work_order["status"] != expected_status:
+                raise WorkOrderConflict(
+                    f"Work order {work_order_number} is {work_order['status']}, "
+                    f"not {expected_status}"
+                )
+            del self._by_status[work_order["status"]][work_order_number]
+            self._by_status[status][work_order_number] = None
+            work_order["status"] = status
+            work_order["updated_at"] = datetime.now(timezone.utc).isoformat()
+            return dict(work_order)
+
+
+class SQLiteWorkOrderRepository(WorkOrderRepository):
+    """
+    Work orders in a local SQLite file, with indexes on equipment, status
+    and submission time.
+    """
+
+    def __init__(self, path=WORK_ORDER_DB_PATH):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(
+                "CREATE TABLE IF NOT EXISTS work_orders ("
+                "work_order_number TEXT PRIMARY KEY, equipment_key TEXT NOT NULL, "
+                "status TEXT NOT NULL, submitted_at TEXT NOT NULL, "
+                "body TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS work_orders_equipment "
+                "ON work_orders (equipment_key, submitted_at);"
+                "CREATE INDEX IF NOT EXISTS work_orders_status "
+                "ON work_orders (status, submitted_at);"
+                "CREATE INDEX IF NOT EXISTS work_orders_submitted "
+                "ON work_orders (submitted_at);"
+                "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+                "key TEXT PRIMARY KEY, work_order_number TEXT NOT NULL, "
+                "expires_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+            )
+
+    def next_number(self):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO counters (name, value) VALUES ('work_order', 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+            )
+            return self._connection.execute(
+                "SELECT value FROM counters WHERE name = 'work_order'"
+            ).fetchone()[0]
+
+    def _find(self, key):
+        row = self._connection.execute(
+            "SELECT w.body FROM idempotency_keys k JOIN work_orders w "
+            "ON w.work_order_number = k.work_order_number "
+            "WHERE k.key = ? AND k.expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def insert(self, work_order):
+        with self._lock, self._connection:
+            existing = self._find(work_order["idempotency_key"])
+            if existing:
+                return existing
+
+            self._connection.execute(
+                "INSERT INTO work_orders (work_order_number, equipment_key, status, "
+                "submitted_at, body) VALUES (?, ?, ?, ?, ?)",
+                (
+                    work_order["work_order_number"],
+                    equipment_key(work_order["equipment_id"]),
+                    work_order["status"],
+                    work_order["submitted_at"],
+                    json.dumps(work_order),
+                ),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO idempotency_keys "
+                "(key, work_order_number, expires_at) VALUES (?, ?, ?)",
+                (
+                    work_order["idempotency_key"],
+                    work_order["work_order_number"],
+                    time.time() + IDEMPOTENCY_TTL_SECONDS,
+                ),
+            )
+            return work_order
+
+    def find_by_idempotency_key(self, key):
+        with self._lock:
+            return self._find(key)
+
+    def _select(self, where, parameters, order, limit):
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT body FROM work_orders WHERE {where} "
+                f"ORDER BY submitted_at {order} LIMIT ?",
+                (*parameters, limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, work_order_number):
+        work_orders = self._select("work_order_number = ?", (work_order_number,), "", 1)
+        return work_orders[0] if work_orders else None
+
+    def list_by_equipment(self, equipment_id, limit=20):
+        return self._select(
+            "equipment_key = ?", (equipment_key(equipment_id),), "DESC", limit
+        )
+
+    def list_by_status(self, status, limit=20):
+        _check_status(status)
+        return self._select("status = ?", (status,), "DESC", limit)
+
+    def list_submitted_between(self, start, end, limit=100):
+        return self._select("submitted_at BETWEEN ? AND ?", (start, end), "ASC", limit)
+
+    def update_status(self, work_order_number, status, expected_status=None):
+        _check_status(status)
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT body FROM work_orders WHERE work_order_number = ?",
+                (work_order_number,),
+            ).fetchone()
+            if row is None:
+                raise WorkOrderNotFound(work_order_number)
+            work_order = json.loads(row[0])
+            if expected_status and work_order["status"] != expected_status:
+                raise WorkOrderConflict(
+                    f"Work order {work_order_number} is {work_order['status']}, "
+                    f"not {expected_status}"
+                )
+            work_order["status"] = status
+            work_order["updated_at"] = datetime.now(timezone.utc).isoformat()
+            self._connection.execute(
+                "UPDATE work_orders SET status = ?, body = ? "
+                "WHERE work_order_number = ?",
+                (status, json.dumps(work_order), work_order_number),
+            )
+            return work_order
+
+
+class DynamoDBWorkOrderRepository(WorkOrderRepository):
+    """
+    Work orders in the work order table, keyed by ``pk``:
+
+    - ``work_order#<number>``: the work order, with the ``equipment_key``,
+      ``status`` and ``submitted_day`` partition keys of the secondary
+      indexes, all sorted by ``submitted_at``.
+    - ``idempotency#<key>``: the number of the work order a submission
+      created, expiring with the table's TTL.
+    - ``counter#work_order``: the last work order number.
+
+    Only work order items have the index attributes, so the indexes hold
+    nothing else and every lookup is a single Query.
+    """
+
+    work_order_prefix = "work_order#"
+    idempotency_prefix = "idempotency#"
+    counter_key = "counter#work_order"
+    # Index attributes, not part of the work order.
+    index_attributes = ("pk", "equipment_key", "submitted_day")
+
+    def __init__(self, table_name):
+        import boto3
+
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self.client = self.table.meta.client
+
+    def _work_order(self, item):
+        return {k: v for k, v in item.items() if k not in self.index_attributes}
+
+    def next_number(self):
+        response = self.table.update_item(
+            Key={"pk": self.counter_key},
+            UpdateExpression="ADD #value :one",
+            ExpressionAttributeNames={"#value": "value"},
+            ExpressionAttributeValues={":one": 1},
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(response["Attributes"]["value"])
+
+    def insert(self, work_order):
+        now = int(time.time())
+        key_item = {
+            "pk": f"{self.idempotency_prefix}{work_order['idempotency_key']}",
+            "work_order_number": work_order["work_order_number"],
+            "expires_at": now + IDEMPOTENCY_TTL_SECONDS,
+        }
+        item = {
+            **work_order,
+            "pk": f"{self.work_order_prefix}{work_order['work_order_number']}",
+            "submitted_day": work_order["submitted_at"][:10],
+        }
+        # Index keys can't be empty strings, such an order isn't indexed.
+        if equipment_key(work_order["equipment_id"]):
+            item["equipment_key"] = equipment_key(work_order["equipment_id"])
+        try:
+            self.client.transact_write_items(
+                TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": self.table.name,
+                            "Item": key_item,
+                            # TTL deletes lazily, an expired key can be reused.
+                            "ConditionExpression": (
+                                "attribute_not_exists(pk) OR expires_at < :now"
+                            ),
+                            "ExpressionAttributeValues": {":now": now},
+                        }
+                    },
+                    {
+                        "Put": {
+                            "TableName": self.table.name,
+                            "Item": item,
+                            "ConditionExpression": "attribute_not_exists(pk)",
+                        }
+                    },
+                ]
+            )
+        except self.client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons", [])
+            if reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+                # A concurrent retry of the same submission won.
+                existing = self.find_by_idempotency_key(work_order["idempotency_key"])
+                if existing:
+                    return existing
+            raise
+
+        return work_order
+
+    def find_by_idempotency_key(self, key):
+        item = self.table.get_item(
+            Key={"pk": f"{self.idempotency_prefix}{key}"}, ConsistentRead=True
+        ).get("Item")
+        if not item or item["expires_at"] < time.time():
+            return None
+
+        return self.get(item["work_order_number"])
+
+    def get(self, work_order_number):
+        item = self.table.get_item(
+            Key={"pk": f"{self.work_order_prefix}{work_order_number}"},
+            ConsistentRead=True,
+        ).get("Item")
+        return self._work_order(item) if item else None
+
+    def _query(self, index_name, key, value, limit, newest_first=True, between=None):
+        condition = "#key = :value"
+        names = {"#key": key}
+        values = {":value": value}
+        if between:
+            condition += " AND #submitted_at BETWEEN :start AND :end"
+            names["#submitted_at"] = "submitted_at"
+            values.update({":start": between[0], ":end": between[1]})
+        response = self.table.query(
+            IndexName=index_name,
+            KeyConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ScanIndexForward=not newest_first,
+            Limit=limit,
+        )
+        return [self._work_order(item) for item in response["Items"]]
+
+    def list_by_equipment(self, equipment_id, limit=20):
+        return self._query(
+            "equipment-index", "equipment_key", equipment_key(equipment_id), limit
+        )
+
+    def list_by_status(self, status, limit=20):
+        _check_status(status)
+        return self._query("status-index", "status", status, limit)
+
+    def list_submitted_between(self, start, end, limit=100):
+        # One partition per day keeps writes spread, a range reads each day.
+        work_orders = []
+        day = datetime.fromisoformat(start[:10])
+        while day.date().isoformat() <= end[:10] and len(work_orders) < limit:
+            work_orders += self._query(
+                "submitted-day-index",
+                "submitted_day",
+                day.date().isoformat(),
+                limit - len(work_orders),
+                newest_first=False,
+                between=(start, end),
+            )
+            day += timedelta(days=1)
+
+        return work_orders
+
+    def update_status(self, work_order_number, status, expected_status=None):
+        _check_status(status)
+        condition = "attribute_exists(pk)"
+        values = {
+            ":status": status,
+            ":updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if expected_status:
+            condition += " AND #status = :expected"
+            values[":expected"] = expected_status
+        try:
+            response = self.table.update_item(
+                Key={"pk": f"{self.work_order_prefix}{work_order_number}"},
+                UpdateExpression="SET #status = :status, updated_at = :updated_at",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues=values,
+                ReturnValues="ALL_NEW",
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            work_order = self.get(work_order_number)
+            if work_order is None:
+                raise WorkOrderNotFound(work_order_number)
+            raise WorkOrderConflict(
+                f"Work order {work_order_number} is {work_order['status']}, "
+                f"not {expected_status}"
+            )
+
+        return self._work_order(response["Attributes"])
+
+
+_repository = None
+
+
+def get_repository():
+    """
+    Return the work order repository configured by ``WORK_ORDER_STORE``.
+    """
+    global _repository
+    if _repository is None:
+        if WORK_ORDER_STORE == "dynamodb" and WORK_ORDER_TABLE_NAME:
+            _repository = DynamoDBWorkOrderRepository(WORK_ORDER_TABLE_NAME)
+        elif WORK_ORDER_STORE == "sqlite":
+            _repository = SQLiteWorkOrderRepository()
+        else:
+            _repository = InMemoryWorkOrderRepository()
+
+    return _repository
+
+
+def set_repository(repository):
+    """
+    Replace the repository, e.g. with an ``InMemoryWorkOrderRepository`` in
+    tests.
+    """
+    global _repository
+    _repository = repository
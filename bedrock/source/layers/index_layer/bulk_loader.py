@@ -0,0 +1,408 @@
+"""
+bulk_loader.py
+
+Parallel ``_bulk`` loader for the vector index.
+
+Records are streamed into batches that a pool of workers sends with the
+_bulk API. The batch size adapts to the response latency: it grows while
+requests finish under the target latency, is halved when they are slow or
+throttled, and stays below the sizes that were throttled. Items that fail
+with a retryable status (429 or 5xx) are retried with backoff; other
+failures are reported. At most ``max_pending`` batches are in flight or
+queued, so a fast producer waits for the collection instead of buffering
+the whole corpus in memory.
+
+Records use the opensearch-py helpers format: a dict with optional
+``_op_type`` ("index" by default, or "delete"), ``_index`` and ``_id``,
+and the document either as ``_source`` or as the remaining keys.
+
+``InMemoryBulkClient`` is a local stand-in for the collection with
+configurable latency and throttling, e.g. for benchmarks/bulk_load_benchmark.py.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "4"))
+BULK_INITIAL_BATCH_SIZE = int(os.environ.get("BULK_INITIAL_BATCH_SIZE", "100"))
+BULK_MAX_BATCH_SIZE = int(os.environ.get("BULK_MAX_BATCH_SIZE", "1000"))
+# Bulk requests are kept below this size whatever the batch size.
+BULK_MAX_BATCH_BYTES = int(os.environ.get("BULK_MAX_BATCH_BYTES", str(8 * 2**20)))
+# Batches grow while requests take less than this and shrink above it.
+BULK_TARGET_LATENCY_SECONDS = float(os.environ.get("BULK_TARGET_LATENCY_SECONDS", "1.0"))
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", "5"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+METADATA_KEYS = ("_op_type", "_index", "_id", "_source")
+
+
+class BulkLoadError(Exception):
+    """
+    Raised by ``BulkLoader.load(raise_on_error=True)`` when items failed.
+    """
+
+    def __init__(self, stats):
+        super().__init__(
+            f"{stats['failed']} of {stats['docs']} bulk items failed, "
+            f"e.g. {stats['errors'][:1]}"
+        )
+        self.stats = stats
+
+
+def _status(error):
+    """
+    HTTP status of a client exception, e.g. opensearchpy's TransportError.
+    """
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+class BulkLoader:
+    """
+    Loads records into an index with parallel, adaptively sized _bulk
+    requests.
+    """
+
+    def __init__(
+        self,
+        client,
+        index_name,
+        workers=BULK_WORKERS,
+        initial_batch_size=BULK_INITIAL_BATCH_SIZE,
+        min_batch_size=10,
+        max_batch_size=BULK_MAX_BATCH_SIZE,
+        max_batch_bytes=BULK_MAX_BATCH_BYTES,
+        target_latency=BULK_TARGET_LATENCY_SECONDS,
+        max_retries=BULK_MAX_RETRIES,
+        max_pending=None,
+        base_delay=0.5,
+        progress_interval=10.0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.client = client
+        self.index_name = index_name
+        self.workers = workers
+        self.batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.max_pending = max_pending or workers * 2
+        self.base_delay = base_delay
+        self.progress_interval = progress_interval
+        self.clock = clock
+        self.sleep = sleep
+        # Seconds without throttling before batches grow again.
+        self.throttle_cooldown = 10 * target_latency
+        self._last_throttle = self._last_change = float("-inf")
+        # Batches stop growing just below the sizes that were throttled.
+        self._ceiling = max_batch_size
+        self._lock = threading.Lock()
+        self._stats = None
+
+    def _lines(self, record):
+        op_type = record.get("_op_type", "index")
+        meta = {"_index": record.get("_index", self.index_name)}
+        if "_id" in record:
+            meta["_id"] = record["_id"]
+        action = json.dumps({op_type: meta})
+        if op_type == "delete":
+            return action, None
+
+        source = record.get("_source")
+        if source is None:
+            source = {k: v for k, v in record.items() if k not in METADATA_KEYS}
+        return action, json.dumps(source, separators=(",", ":"))
+
+    def _batches(self, records):
+        batch = []
+        size = 0
+        for record in records:
+            item = self._lines(record)
+            item_bytes = len(item[0]) + len(item[1] or "") + 2
+            if batch and (
+                len(batch) >= self.batch_size or size + item_bytes > self.max_batch_bytes
+            ):
+                yield batch
+                batch, size = [], 0
+            batch.append(item)
+            size += item_bytes
+        if batch:
+            yield batch
+
+    def _adapt(self, latency, throttled, size):
+        """
+        Grow the batch size while requests are fast, halve it when they are
+        slow or throttled. The size changes at most once per request
+        latency, so the responses of concurrent requests sent before a
+        change don't change it again. After throttling it doesn't grow for
+        a while, and never again above nine tenths of the smallest batch
+        that was throttled, so it settles below the collection's capacity
+        instead of probing it over and over.
+        """
+        now = self.clock()
+        with self._lock:
+            settled = now - self._last_change >= latency
+            if throttled:
+                self._last_throttle = now
+                self._ceiling = min(
+                    self._ceiling, max(self.min_batch_size, size * 9 // 10)
+                )
+            if throttled or latency > self.target_latency:
+                if settled:
+                    self._last_change = now
+                    self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            elif (
+                settled
+                # Batches built before the last growth say nothing about
+                # the current size.
+                and size >= self.batch_size
+                and latency < self.target_latency / 2
+                and now - self._last_throttle >= self.throttle_cooldown
+                and self.batch_size < self._ceiling
+            ):
+                self._last_change = now
+                self.batch_size = min(
+                    self._ceiling,
+                    self.batch_size + max(1, self.batch_size // 4),
+                )
+
+    def _record(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                if key == "errors":
+                    self._stats["errors"].extend(value[: 10 - len(self._stats["errors"])])
+                else:
+                    self._stats[key] += value
+
+    def _backoff(self, attempt):
+        # nosemgrep: <insecure-random Message: random is fine for jitter>
+        delay = random.uniform(0, self.base_delay * 2**attempt)  # nosem: insecure-random
+        # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
+        self.sleep(delay)  # nosem: arbitrary-sleep
+
+    def _split(self, queue, items, attempt):
+        size = self.batch_size
+        queue.extend(
+            (items[i : i + size], attempt)
+            for i in reversed(range(0, len(items), size))
+        )
+
+    def _send(self, batch):
+        """
+        Send one batch, retrying retryable items until they succeed or run
+        out of attempts. Batches queued before the batch size shrank, and
+        retried items, are split to the current batch size.
+        """
+        queue = []
+        self._split(queue, batch, 0)
+        while queue:
+            pending, attempt = queue.pop()
+            body = "".join(
+                f"{action}\n" + (f"{source}\n" if source is not None else "")
+                for action, source in pending
+            )
+            start = self.clock()
+            try:
+                response = self.client.bulk(body=body)
+            except Exception as e:
+                status = _status(e)
+                self._adapt(self.clock() - start, status == 429, len(pending))
+                self._record(requests=1)
+                if status is not None and status not in RETRYABLE_STATUSES:
+                    self._record(failed=len(pending), errors=[str(e)])
+                    continue
+                retry, failed, throttled = pending, [], status == 429
+            else:
+                retry = []
+                failed = []
+                throttled = False
+                for item, result in zip(pending, response.get("items", [])):
+                    outcome = next(iter(result.values()))
+                    status = outcome.get("status", 200)
+                    # Deleting a document that is already gone is fine.
+                    if status < 300 or (status == 404 and "delete" in result):
+                        continue
+                    if status in RETRYABLE_STATUSES:
+                        retry.append(item)
+                        throttled = throttled or status == 429
+                    else:
+                        failed.append(outcome.get("error", status))
+
+                self._adapt(self.clock() - start, throttled, len(pending))
+                self._record(
+                    succeeded=len(pending) - len(retry) - len(failed),
+                    failed=len(failed),
+                    errors=failed,
+                    requests=1,
+                )
+
+            if not retry:
+                continue
+            if attempt == self.max_retries:
+                self._record(failed=len(retry), errors=["retries exhausted"])
+                continue
+            self._record(retries=len(retry))
+            self._backoff(attempt)
+            self._split(queue, retry, attempt + 1)
+
+    def load(self, records, raise_on_error=False):
+        """
+        Write records to the index.
+
+        Args:
+            records (iterable): Records in the helpers format, consumed as
+                the workers keep up.
+            raise_on_error (bool): Raise BulkLoadError if items failed.
+
+        Returns:
+            dict: ``docs``, ``succeeded``, ``failed``, ``retries``,
+                ``requests``, ``seconds``, ``docs_per_second``,
+                ``batch_size`` (the final adapted size) and up to ten
+                ``errors``.
+        """
+        self._stats = {
+            "docs": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "requests": 0,
+            "errors": [],
+        }
+        slots = threading.BoundedSemaphore(self.max_pending)
+        start = last_report = self.clock()
+
+        def run(batch):
+            try:
+                self._send(batch)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = []
+            for batch in self._batches(records):
+                # Back-pressure: wait for a free slot before queuing more.
+                slots.acquire()
+                self._stats["docs"] += len(batch)
+                futures.append(pool.submit(run, batch))
+                now = self.clock()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    logger.info(
+                        f"Bulk loaded {self._stats['succeeded']} of "
+                        f"{self._stats['docs']} queued documents, "
+                        f"{self._stats['succeeded'] / (now - start):.0f} docs/s, "
+                        f"batch size {self.batch_size}."
+                    )
+            for future in futures:
+                future.result()
+
+        seconds = self.clock() - start
+        stats = dict(
+            self._stats,
+            seconds=round(seconds, 3),
+            docs_per_second=round(self._stats["succeeded"] / seconds, 1)
+            if seconds > 0
+            else None,
+            batch_size=self.batch_size,
+        )
+        logger.info(
+            f"Bulk load into {self.index_name} finished: {stats['succeeded']} "
+            f"documents, {stats['failed']} failed, {stats['retries']} retried, "
+            f"{stats['docs_per_second']} docs/s."
+        )
+        if raise_on_error and stats["failed"]:
+            raise BulkLoadError(stats)
+
+        return stats
+
+
+class InMemoryBulkClient:
+    """
+    Local stand-in for the collection's _bulk API.
+
+    Latency grows with the request size, and items are rejected with 429
+    while more than ``capacity`` documents are being written at once, so
+    batch sizing, retries and back-pressure can be exercised without a
+    collection.
+    """
+
+    def __init__(
+        self,
+        base_latency=0.02,
+        latency_per_doc=0.0005,
+        capacity=None,
+        failure_rate=0.0,
+        seed=0,
+        sleep=time.sleep,
+    ):
+        self.base_latency = base_latency
+        self.latency_per_doc = latency_per_doc
+        self.capacity = capacity
+        self.failure_rate = failure_rate
+        self.sleep = sleep
+        self.documents = {}
+        self.requests = 0
+        self._in_flight = 0
+        self._next_id = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def bulk(self, body):
+        lines = [line for line in body.split("\n") if line]
+        items = []
+        i = 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            op_type, meta = next(iter(action.items()))
+            source = None
+            if op_type != "delete":
+                source = json.loads(lines[i + 1])
+                i += 1
+            items.append((op_type, meta, source))
+            i += 1
+
+        with self._lock:
+            self.requests += 1
+            self._in_flight += len(items)
+            overloaded = self.capacity is not None and self._in_flight > self.capacity
+        try:
+            # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
+            self.sleep(self.base_latency + self.latency_per_doc * len(items))  # nosem: arbitrary-sleep
+            results = []
+            with self._lock:
+                for op_type, meta, source in items:
+                    # nosemgrep: <insecure-random Message: random is fine for simulated failures>
+                    failing = self._random.random() < self.failure_rate  # nosem: insecure-random
+                    if overloaded or failing:
+                        results.append({op_type: {"status": 429, "error": "rejected"}})
+                    elif op_type == "delete":
+                        found = self.documents.pop((meta["_index"], meta["_id"]), None)
+                        results.append({op_type: {"status": 200 if found else 404}})
+                    else:
+                        _id = meta.get("_id")
+                        if _id is None:
+                            self._next_id += 1
+                            _id = str(self._next_id)
+                        self.documents[(meta["_index"], _id)] = source
+                        results.append({op_type: {"_id": _id, "status": 201}})
+        finally:
+            with self._lock:
+                self._in_flight -= len(items)
+
+        return {
+            "errors": any(
+                next(iter(r.values()))["status"] >= 300 for r in results
+            ),
+            "items": results,
+        }
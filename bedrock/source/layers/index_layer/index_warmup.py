@@ -0,0 +1,138 @@
+"""
+index_warmup.py
+
+Warm up the HNSW graphs of the vector index.
+
+The native k-NN graphs are loaded into memory by the first search that
+needs them, so the first queries after an index is created or re-ingested
+are much slower than the rest. Warming up calls the k-NN warmup API where
+the domain has it (vector collections don't) and then runs a synthetic
+query set: vectors of indexed chunks, or random vectors of the index's
+dimension while it is empty. The latency of the first query and of the
+last round are reported, to see what a cold graph costs.
+
+It is shared by the create index and update Lambdas through the index
+layer.
+"""
+import time
+import random
+import logging
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Synthetic queries per round, and rounds; the last round is steady state.
+WARMUP_QUERIES = 20
+WARMUP_ROUNDS = 2
+
+
+def warmup_api(client, index_name):
+    """
+    Load the index's graphs with the k-NN warmup API.
+
+    Returns:
+        bool: Whether the API is supported and succeeded.
+    """
+    try:
+        response = client.transport.perform_request(
+            "GET", f"/_plugins/_knn/warmup/{index_name}"
+        )
+    except Exception as e:
+        logger.info(f"k-NN warmup API unavailable for {index_name}: {e}")
+        return False
+
+    logger.info(f"k-NN warmup API response for {index_name}: {response}")
+    return not response.get("_shards", {}).get("failed")
+
+
+def _vector_field(client, index_name, vector_field_name):
+    mapping = client.indices.get_mapping(index=index_name)
+    properties = next(iter(mapping.values()))["mappings"].get("properties", {})
+    return properties.get(vector_field_name, {})
+
+
+def synthetic_queries(client, index_name, vector_field_name, count, seed=0):
+    """
+    Query vectors for a warm-up: indexed chunk vectors, topped up with
+    random ones of the field's size.
+    """
+    response = client.search(
+        index=index_name, body={"size": count, "_source": [vector_field_name]}
+    )
+    vectors = [
+        hit["_source"][vector_field_name]
+        for hit in response["hits"]["hits"]
+        if hit["_source"].get(vector_field_name)
+    ]
+
+    field = _vector_field(client, index_name, vector_field_name)
+    generator = random.Random(seed)
+    while len(vectors) < count:
+        if field.get("data_type") == "binary":
+            # Binary vectors are given as signed bytes, 8 dimensions each.
+            vectors.append(
+                [generator.randint(-128, 127) for _ in range(field["dimension"] // 8)]
+            )
+        else:
+            vectors.append(
+                [generator.uniform(-1, 1) for _ in range(field["dimension"])]
+            )
+
+    return vectors
+
+
+def warm_up(
+    client,
+    index_name,
+    vector_field_name,
+    queries=WARMUP_QUERIES,
+    rounds=WARMUP_ROUNDS,
+    k=10,
+    clock=time.perf_counter,
+):
+    """
+    Warm up an index and measure cold versus warm query latency.
+
+    Args:
+        client: OpenSearch client.
+        index_name (str): Index or alias to warm up.
+        vector_field_name (str): The index's vector field.
+        queries (int): Synthetic queries per round.
+        rounds (int): Passes over the queries, at least one.
+        k (int): Neighbours per query.
+        clock (callable): Seconds, for the latencies.
+
+    Returns:
+        dict: ``method`` ("warmup_api" or "synthetic"), ``queries`` run,
+            ``first_query_ms`` and the median ``steady_state_ms`` of the
+            last round.
+    """
+    method = "warmup_api" if warmup_api(client, index_name) else "synthetic"
+    vectors = synthetic_queries(client, index_name, vector_field_name, queries)
+
+    latencies = []
+    for _ in range(max(rounds, 1)):
+        latencies.append([])
+        for vector in vectors:
+            start = clock()
+            client.search(
+                index=index_name,
+                body={
+                    "size": k,
+                    "_source": False,
+                    "query": {"knn": {vector_field_name: {"vector": vector, "k": k}}},
+                },
+            )
+            latencies[-1].append((clock() - start) * 1000)
+
+    steady = sorted(latencies[-1])
+    result = {
+        "method": method,
+        "queries": sum(len(round_) for round_ in latencies),
+        "first_query_ms": round(latencies[0][0], 1) if vectors else None,
+        "steady_state_ms": round(steady[len(steady) // 2], 1) if steady else None,
+    }
+    logger.info(f"Warmed up {index_name}: {result}")
+
+    return result
@@ -0,0 +1,211 @@
+"""
+waiters.py
+
+Polling helpers for provisioning steps that complete asynchronously.
+
+Waiters poll with capped exponential backoff, jitter and an overall
+deadline, and raise instead of returning when the resource fails, enters
+an unexpected state or the deadline passes. A ``FakeClock`` can be passed
+to run them in tests without sleeping.
+
+It is shared by the provisioning Lambdas through the index layer.
+"""
+import time
+import random
+import logging
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class WaiterError(Exception):
+    """
+    The resource reached a failed or unexpected state.
+    """
+
+    def __init__(self, message, state=None, reason=None):
+        super().__init__(message)
+        self.state = state
+        self.reason = reason
+
+
+class WaiterTimeout(WaiterError):
+    """
+    The resource did not become ready before the deadline.
+    """
+
+
+class Clock:
+    """
+    Wall clock used by the waiters.
+    """
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        # nosemgrep: <arbitrary-sleep Message: time.sleep() call>
+        time.sleep(seconds)  # nosem: arbitrary-sleep
+
+
+class FakeClock(Clock):
+    """
+    Clock for tests, sleeping only advances its time.
+    """
+
+    def __init__(self, start=0.0):
+        self.time = start
+        self.sleeps = []
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.time += seconds
+
+
+class Backoff:
+    """
+    Capped exponential delays with equal jitter, bounded by a deadline.
+    """
+
+    def __init__(
+        self, clock, timeout, initial_delay=2.0, max_delay=30.0, rng=None
+    ):
+        self.clock = clock
+        self.deadline = clock.now() + timeout
+        self.delay = initial_delay
+        self.max_delay = max_delay
+        # nosemgrep: <insecure-random Message: random is fine for jitter>
+        self.rng = rng or random.Random()  # nosem: insecure-random
+
+    def remaining(self):
+        return self.deadline - self.clock.now()
+
+    def sleep(self):
+        """
+        Sleep for the next delay, or return False once the deadline passed.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            return False
+
+        delay = min(self.delay, self.max_delay)
+        self.clock.sleep(min(remaining, self.rng.uniform(delay / 2, delay)))
+        self.delay = delay * 2
+        return True
+
+
+def wait_for_status(
+    describe,
+    name,
+    success,
+    pending,
+    timeout=600,
+    initial_delay=2.0,
+    max_delay=30.0,
+    clock=None,
+    rng=None,
+):
+    """
+    Poll a resource's status until it reaches a success state.
+
+    Args:
+        describe (callable): Returns the current state, or a (state, reason)
+            tuple with the failure reason if there is one.
+        name (str): Description of the resource for logs and errors.
+        success (iterable): States that end the wait successfully.
+        pending (iterable): States that keep the wait going. Any other state
+            raises WaiterError.
+        timeout (float): Seconds before WaiterTimeout is raised.
+        initial_delay (float): Upper bound of the first delay.
+        max_delay (float): Upper bound of any delay.
+        clock (Clock): Clock to use, e.g. a FakeClock in tests.
+        rng (random.Random): Source of jitter.
+
+    Returns:
+        str: The success state.
+
+    Raises:
+        WaiterError: If the resource reaches a state that isn't pending.
+        WaiterTimeout: If the deadline passes first.
+    """
+    clock = clock or Clock()
+    backoff = Backoff(clock, timeout, initial_delay, max_delay, rng)
+
+    while True:
+        state = describe()
+        reason = None
+        if isinstance(state, tuple):
+            state, reason = state
+
+        if state in success:
+            logger.info(f"{name} is {state}.")
+            return state
+        if state not in pending:
+            raise WaiterError(
+                f"{name} entered state {state}: {reason or 'no reason given'}",
+                state=state,
+                reason=reason,
+            )
+
+        logger.info(f"{name} is {state}, waiting up to {backoff.remaining():.0f}s.")
+        if not backoff.sleep():
+            raise WaiterTimeout(
+                f"{name} still {state} after {timeout}s", state=state, reason=reason
+            )
+
+
+def wait_until(
+    probe,
+    name,
+    timeout=300,
+    initial_delay=1.0,
+    max_delay=15.0,
+    consecutive=1,
+    clock=None,
+    rng=None,
+):
+    """
+    Poll a readiness probe until it passes.
+
+    Exceptions from the probe count as "not ready yet"; the last one is
+    reported if the deadline passes.
+
+    Args:
+        probe (callable): Returns True once the resource is ready.
+        name (str): Description of the resource for logs and errors.
+        timeout (float): Seconds before WaiterTimeout is raised.
+        consecutive (int): Number of passing probes in a row required, for
+            eventually consistent services.
+
+    Raises:
+        WaiterTimeout: If the probe doesn't pass before the deadline.
+    """
+    clock = clock or Clock()
+    backoff = Backoff(clock, timeout, initial_delay, max_delay, rng)
+    passed = 0
+    last_error = None
+
+    while True:
+        try:
+            ready = probe()
+            last_error = None
+        except Exception as e:
+            ready = False
+            last_error = e
+
+        passed = passed + 1 if ready else 0
+        if passed >= consecutive:
+            logger.info(f"{name} is ready.")
+            return
+
+        if last_error:
+            logger.info(f"{name} is not ready yet: {last_error}")
+        if not backoff.sleep():
+            reason = f": {last_error}" if last_error else ""
+            raise WaiterTimeout(
+                f"{name} not ready after {timeout}s{reason}", reason=last_error
+            )
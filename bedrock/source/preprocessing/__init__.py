@@ -0,0 +1,13 @@
+from .asset_models import load_asset_models
+from .build import preprocess_documents, equipment_models, PREPROCESSOR_VERSION
+from .docx_structure import parse_docx
+from .sections import chunk_document
+
+__all__ = [
+    "preprocess_documents",
+    "equipment_models",
+    "load_asset_models",
+    "PREPROCESSOR_VERSION",
+    "parse_docx",
+    "chunk_document",
+]
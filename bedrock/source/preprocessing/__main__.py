@@ -0,0 +1,39 @@
+"""
+Preprocess the knowledge base documents without deploying, e.g. to review
+the section files:
+
+    python -m preprocessing [--source files/data] [--output .build/knowledge-base/data]
+        [--state .build/preprocess-state.json]
+        [--assets cfn/sitewise-assets-reduced.json]
+"""
+import argparse
+
+from .asset_models import load_asset_models
+from .build import preprocess_documents
+from .sections import MAX_SECTION_WORDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--source", default="files/data")
+    parser.add_argument("--output", default=".build/knowledge-base/data")
+    parser.add_argument("--state", default=".build/preprocess-state.json")
+    parser.add_argument("--assets", default="cfn/sitewise-assets-reduced.json")
+    parser.add_argument("--max-words", type=int, default=MAX_SECTION_WORDS)
+    args = parser.parse_args()
+
+    counts = preprocess_documents(
+        args.source,
+        args.output,
+        state_path=args.state,
+        max_words=args.max_words,
+        asset_models=load_asset_models(args.assets),
+    )
+    print(
+        f"Preprocessed {counts['processed']}, skipped {counts['skipped']} unchanged "
+        f"and removed {counts['removed']} deleted documents into {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+asset_models.py
+
+Resolve the equipment named by a document to its SiteWise asset and asset
+model, so chunks carry the same ``modelName`` the SiteWise action group
+reports in list_all_assets.
+
+The asset names and models are read from the CloudFormation template that
+creates the SiteWise assets.
+"""
+import re
+import json
+
+ASSET_TYPE = "AWS::IoTSiteWise::Asset"
+ASSET_MODEL_TYPE = "AWS::IoTSiteWise::AssetModel"
+
+
+def load_asset_models(template_path):
+    """
+    Read the asset to asset model mapping of a SiteWise assets template.
+
+    Args:
+        template_path (str): CloudFormation template, e.g.
+            cfn/sitewise-assets-reduced.json.
+
+    Returns:
+        dict: Asset model name by asset name, empty if the file is missing.
+    """
+    try:
+        with open(template_path, encoding="utf-8") as f:
+            resources = json.load(f).get("Resources", {})
+    except OSError:
+        return {}
+
+    model_names = {
+        logical_id: resource["Properties"]["AssetModelName"]
+        for logical_id, resource in resources.items()
+        if resource.get("Type") == ASSET_MODEL_TYPE
+    }
+
+    asset_models = {}
+    for resource in resources.values():
+        if resource.get("Type") != ASSET_TYPE:
+            continue
+        model = resource["Properties"].get("AssetModelId")
+        model = model.get("Ref") if isinstance(model, dict) else model
+        if model in model_names:
+            asset_models[resource["Properties"]["AssetName"]] = model_names[model]
+
+    return dict(sorted(asset_models.items()))
+
+
+def resolve_equipment(equipment, asset_models):
+    """
+    Match an equipment name from a document to a SiteWise asset.
+
+    Documents sometimes shorten the asset name, e.g. "Line 401" for the
+    asset BottleLine401, so an asset whose name ends with the equipment
+    name matches too if it is the only one.
+
+    Args:
+        equipment (str): Equipment name in SiteWise style, e.g. "Line401".
+        asset_models (dict): Asset model name by asset name.
+
+    Returns:
+        tuple: The asset name and asset model name. Without a match the
+        equipment name is kept and the model is the name without its
+        trailing number.
+    """
+    if equipment in asset_models:
+        return equipment, asset_models[equipment]
+
+    matches = [name for name in asset_models if name.endswith(equipment)]
+    if len(matches) == 1:
+        return matches[0], asset_models[matches[0]]
+
+    return equipment, re.sub(r"\d+$", "", equipment) or equipment
@@ -0,0 +1,224 @@
+"""
+build.py
+
+Preprocess the knowledge base documents into section files.
+
+Every .docx file below the source directory becomes one Markdown file per
+section with a ``.metadata.json`` sidecar, at
+``<folder>/<document>/<section>.md``. Other files are copied unchanged.
+The output only depends on the input bytes, and a state file keyed by the
+content hash of each source lets unchanged files be skipped.
+"""
+import os
+import json
+import shutil
+import hashlib
+
+from .docx_structure import parse_docx
+from .sections import chunk_document, MAX_SECTION_WORDS
+
+# Bump when the output format changes so cached outputs are rebuilt.
+PREPROCESSOR_VERSION = 2
+METADATA_SUFFIX = ".metadata.json"
+
+
+def _sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write(file_path, content):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(content)
+
+
+def process_file(
+    source_path,
+    relative_path,
+    output_dir,
+    max_words=MAX_SECTION_WORDS,
+    asset_models=None,
+):
+    """
+    Write the outputs of one source file.
+
+    Returns:
+        list: Output paths relative to the output directory.
+    """
+    folder, file_name = os.path.split(relative_path)
+    name, extension = os.path.splitext(file_name)
+
+    if extension.lower() != ".docx":
+        os.makedirs(os.path.join(output_dir, folder), exist_ok=True)
+        shutil.copyfile(source_path, os.path.join(output_dir, relative_path))
+        return [relative_path]
+
+    with open(source_path, "rb") as f:
+        structure = parse_docx(f.read())
+
+    outputs = []
+    for chunk in chunk_document(
+        name, folder.split(os.sep)[-1], structure, max_words, asset_models
+    ):
+        section = chunk.section_id.split("--", 1)[1]
+        output = os.path.join(folder, name, f"{section}.md")
+        _write(os.path.join(output_dir, output), chunk.text)
+        _write(
+            os.path.join(output_dir, output + METADATA_SUFFIX),
+            json.dumps(
+                {"metadataAttributes": chunk.metadata},
+                indent=2,
+                sort_keys=True,
+                ensure_ascii=False,
+            )
+            + "\n",
+        )
+        outputs += [output, output + METADATA_SUFFIX]
+
+    return outputs
+
+
+def _load_state(state_path, settings):
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if (
+        state.get("version") != PREPROCESSOR_VERSION
+        or state.get("settings") != settings
+    ):
+        return {}
+    return state.get("sources", {})
+
+
+def _remove(output_dir, outputs):
+    for output in outputs:
+        file_path = os.path.join(output_dir, output)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        # Drop folders left empty, e.g. of a deleted document.
+        directory = os.path.dirname(file_path)
+        while (
+            directory != output_dir
+            and os.path.isdir(directory)
+            and not os.listdir(directory)
+        ):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+
+def preprocess_documents(
+    source_dir,
+    output_dir,
+    state_path=None,
+    max_words=MAX_SECTION_WORDS,
+    asset_models=None,
+):
+    """
+    Bring the output directory in line with the source documents.
+
+    Sources whose content hash matches the state file and whose outputs
+    exist are skipped; outputs of changed or deleted sources are removed.
+    Changing ``max_words`` or ``asset_models`` rebuilds everything.
+
+    Args:
+        source_dir (str): Directory with the documents, e.g. files/data.
+        output_dir (str): Directory the section files are written to.
+        state_path (str): State file, by default next to the output
+            directory so it isn't uploaded with it.
+        max_words (int): Size above which sections are split.
+        asset_models (dict): SiteWise asset model name by asset name, see
+            load_asset_models.
+
+    Returns:
+        dict: Counts of ``processed``, ``skipped`` and ``removed`` sources.
+    """
+    source_dir = os.path.abspath(source_dir)
+    output_dir = os.path.abspath(output_dir)
+    state_path = state_path or f"{output_dir.rstrip(os.sep)}.state.json"
+    settings = {
+        "max_words": max_words,
+        "asset_models": hashlib.sha256(
+            json.dumps(asset_models or {}, sort_keys=True).encode("utf-8")
+        ).hexdigest(),
+    }
+    previous = _load_state(state_path, settings)
+    if not previous and os.path.isdir(output_dir):
+        # Unknown outputs, e.g. from another preprocessor version.
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    sources = {}
+    counts = {"processed": 0, "skipped": 0, "removed": 0}
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.startswith("."):
+                continue
+            source_path = os.path.join(root, file_name)
+            relative_path = os.path.relpath(source_path, source_dir)
+            sha256 = _sha256(source_path)
+
+            recorded = previous.get(relative_path)
+            if (
+                recorded
+                and recorded["sha256"] == sha256
+                and all(
+                    os.path.exists(os.path.join(output_dir, output))
+                    for output in recorded["outputs"]
+                )
+            ):
+                sources[relative_path] = recorded
+                counts["skipped"] += 1
+                continue
+
+            if recorded:
+                _remove(output_dir, recorded["outputs"])
+            outputs = process_file(
+                source_path, relative_path, output_dir, max_words, asset_models
+            )
+            sources[relative_path] = {"sha256": sha256, "outputs": outputs}
+            counts["processed"] += 1
+
+    for relative_path, recorded in previous.items():
+        if relative_path not in sources:
+            _remove(output_dir, recorded["outputs"])
+            counts["removed"] += 1
+
+    _write(
+        state_path,
+        json.dumps(
+            {
+                "version": PREPROCESSOR_VERSION,
+                "settings": settings,
+                "sources": sources,
+            },
+            indent=1,
+            sort_keys=True,
+        )
+        + "\n",
+    )
+
+    return counts
+
+
+def equipment_models(output_dir):
+    """
+    Return the SiteWise asset models the preprocessed documents cover.
+    """
+    models = set()
+    for root, _, files in os.walk(output_dir):
+        for file_name in files:
+            if file_name.endswith(METADATA_SUFFIX):
+                with open(os.path.join(root, file_name), encoding="utf-8") as f:
+                    attributes = json.load(f)["metadataAttributes"]
+                if attributes.get("equipment_model"):
+                    models.add(attributes["equipment_model"])
+
+    return sorted(models)
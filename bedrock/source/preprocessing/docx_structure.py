@@ -0,0 +1,258 @@
+"""
+docx_structure.py
+
+Read the structure of the SOP and recipe Word documents.
+
+The documents use few Word styles: section headings are bold numbered lines
+("6.2.1. Issue: Leakage") in the SOPs and Heading styled lines in the
+recipes, procedure steps are Word lists, and the SOP header is a single
+paragraph of "Key: value" lines. This module turns a .docx file into a
+title, the header fields and a flat list of blocks (headings, paragraphs,
+list items and tables) in document order.
+"""
+import io
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Numbered section headings such as "6. Procedure" or "6.1. Initial Assessment".
+NUMBERED_HEADING = re.compile(r"^(\d+(?:\.\d+)*)\.?\s+(\S.*)$")
+MAX_HEADING_LENGTH = 80
+# "Machine Model: MashMaster Pro 5000" lines of the SOP header.
+HEADER_FIELD = re.compile(r"^\s*([A-Z][A-Za-z ]{1,30}?)\s*:\s*(.+?)\s*$")
+
+
+@dataclass
+class Block:
+    """
+    One element of a document body.
+
+    ``kind`` is "heading", "paragraph", "item" or "table". Headings carry
+    their number ("6.2.1") and depth, list items their marker ("3." or "-")
+    and nesting level, tables their rows.
+    """
+
+    kind: str
+    text: str = ""
+    number: str = ""
+    level: int = 0
+    marker: str = ""
+    rows: list = field(default_factory=list)
+
+
+@dataclass
+class DocumentStructure:
+    """
+    ``fields`` are the header's (key, value) pairs in order; keys can repeat,
+    e.g. the SOPs give the area and then the equipment as "Location".
+    """
+
+    title: str
+    fields: list
+    blocks: list
+
+    def header_value(self, key, last=False):
+        values = [value for name, value in self.fields if name == key]
+        if not values:
+            return None
+        return values[-1] if last else values[0]
+
+
+def _run_text(run):
+    parts = []
+    for node in run:
+        if node.tag == f"{W}t":
+            parts.append(node.text or "")
+        elif node.tag in (f"{W}br", f"{W}cr"):
+            parts.append("\n")
+        elif node.tag == f"{W}tab":
+            parts.append("\t")
+
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph):
+    return "".join(_run_text(run) for run in paragraph.iter(f"{W}r")).strip()
+
+
+def _is_bold(paragraph):
+    runs = [run for run in paragraph.iter(f"{W}r") if _run_text(run).strip()]
+    return bool(runs) and all(run.find(f"{W}rPr/{W}b") is not None for run in runs)
+
+
+def _style(paragraph):
+    style = paragraph.find(f"{W}pPr/{W}pStyle")
+    return style.get(f"{W}val") if style is not None else ""
+
+
+class Numbering:
+    """
+    Resolves Word list numbering to the markers Word would display.
+    """
+
+    def __init__(self, numbering_xml):
+        self.formats = {}
+        self.counters = {}
+        if numbering_xml is None:
+            return
+
+        root = ET.fromstring(numbering_xml)
+        abstract = {}
+        for definition in root.findall(f"{W}abstractNum"):
+            levels = {}
+            for level in definition.findall(f"{W}lvl"):
+                number_format = level.find(f"{W}numFmt")
+                start = level.find(f"{W}start")
+                levels[level.get(f"{W}ilvl")] = (
+                    (
+                        number_format.get(f"{W}val")
+                        if number_format is not None
+                        else "bullet"
+                    ),
+                    int(start.get(f"{W}val")) if start is not None else 1,
+                )
+            abstract[definition.get(f"{W}abstractNumId")] = levels
+
+        for num in root.findall(f"{W}num"):
+            abstract_id = num.find(f"{W}abstractNumId").get(f"{W}val")
+            self.formats[num.get(f"{W}numId")] = abstract.get(abstract_id, {})
+
+    def marker(self, num_id, level):
+        number_format, start = self.formats.get(num_id, {}).get(
+            str(level), ("bullet", 1)
+        )
+        # Starting a level restarts the numbering of the levels below it.
+        for key in [
+            key for key in self.counters if key[0] == num_id and key[1] > level
+        ]:
+            del self.counters[key]
+        count = self.counters.get((num_id, level), start - 1) + 1
+        self.counters[(num_id, level)] = count
+
+        if number_format == "decimal":
+            return f"{count}."
+        if number_format == "lowerLetter":
+            return f"{chr(ord('a') + (count - 1) % 26)})"
+        if number_format == "upperLetter":
+            return f"{chr(ord('A') + (count - 1) % 26)})"
+        return "-"
+
+
+def _heading(text, style, bold):
+    """
+    Return (number, depth) if the paragraph is a section heading.
+    """
+    if len(text) > MAX_HEADING_LENGTH or "\n" in text:
+        return None
+
+    match = NUMBERED_HEADING.match(text)
+    if style.startswith("Heading"):
+        depth = (
+            int(style[len("Heading") :] or 1)
+            if style[len("Heading") :].isdigit()
+            else 1
+        )
+        return (match.group(1) if match else "", depth)
+    if match and (bold or not text.rstrip().endswith((".", ":"))):
+        return (match.group(1), match.group(1).count(".") + 1)
+
+    return None
+
+
+def _table_rows(table):
+    rows = []
+    for row in table.findall(f"{W}tr"):
+        rows.append(
+            [
+                " ".join(
+                    _paragraph_text(paragraph) for paragraph in cell.findall(f"{W}p")
+                ).strip()
+                for cell in row.findall(f"{W}tc")
+            ]
+        )
+
+    return rows
+
+
+def parse_docx(body):
+    """
+    Parse a .docx file into its structure.
+
+    Args:
+        body (bytes): The .docx file content.
+
+    Returns:
+        DocumentStructure: Title (or ""), header fields and body blocks.
+    """
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        document = ET.fromstring(archive.read("word/document.xml"))
+        names = archive.namelist()
+        numbering = Numbering(
+            archive.read("word/numbering.xml")
+            if "word/numbering.xml" in names
+            else None
+        )
+
+    title = ""
+    fields = []
+    blocks = []
+    for element in document.find(f"{W}body"):
+        if element.tag == f"{W}tbl":
+            blocks.append(Block("table", rows=_table_rows(element)))
+            continue
+        if element.tag != f"{W}p":
+            continue
+
+        text = _paragraph_text(element)
+        if not text:
+            continue
+        style = _style(element)
+        bold = _is_bold(element)
+
+        lines = [line for line in text.split("\n") if line.strip()]
+        header = [HEADER_FIELD.match(line) for line in lines]
+        if not any(block.kind == "heading" for block in blocks) and all(header):
+            if len(lines) > 1 or title:
+                # The SOP header, "Key: value" lines before the first section.
+                fields.extend((match.group(1), match.group(2)) for match in header)
+                continue
+
+        heading = _heading(text, style, bold)
+        if not title and not blocks and (heading or bold or style == "Title"):
+            # The first heading, or bold line, names the document.
+            title = text
+            continue
+
+        if heading:
+            number, depth = heading
+            blocks.append(
+                Block("heading", text=text.rstrip(":"), number=number, level=depth)
+            )
+            continue
+
+        num_pr = element.find(f"{W}pPr/{W}numPr")
+        if num_pr is not None and num_pr.find(f"{W}numId") is not None:
+            level = (
+                int(num_pr.find(f"{W}ilvl").get(f"{W}val"))
+                if num_pr.find(f"{W}ilvl") is not None
+                else 0
+            )
+            marker = numbering.marker(num_pr.find(f"{W}numId").get(f"{W}val"), level)
+            blocks.append(Block("item", text=text, level=level, marker=marker))
+            continue
+
+        if not title and not blocks:
+            title = text
+            continue
+
+        if text.startswith(("- ", "• ")):
+            # Bullets typed as text rather than as a Word list.
+            blocks.append(Block("item", text=text[2:].strip(), marker="-"))
+            continue
+
+        blocks.append(Block("paragraph", text=text))
+
+    return DocumentStructure(title=title, fields=fields, blocks=blocks)
@@ -0,0 +1,271 @@
+"""
+sections.py
+
+Turn a parsed document into section chunks for the knowledge base.
+
+Each chunk is a numbered section rendered as Markdown, with the document
+title and heading path repeated at the top so a retrieved chunk says what it
+belongs to. Sections longer than ``max_words`` are split at their
+subsections. Chunk IDs are derived from the document name and the heading,
+so they stay the same between runs unless the heading changes.
+"""
+import re
+from dataclasses import dataclass, field
+
+from .docx_structure import Block, DocumentStructure
+from .asset_models import resolve_equipment
+
+# Sections above this size are split at their subsections; about 550 tokens.
+MAX_SECTION_WORDS = 400
+
+# Knowledge base folders and the document type they hold.
+DOCUMENT_TYPES = {"sop": "sop", "recipes": "recipe"}
+
+
+@dataclass
+class Section:
+    heading: str
+    number: str
+    level: int
+    blocks: list = field(default_factory=list)
+    children: list = field(default_factory=list)
+
+    def words(self):
+        own = sum(len(_render_block(block).split()) for block in self.blocks)
+        return own + sum(child.words() for child in self.children)
+
+
+@dataclass
+class Chunk:
+    section_id: str
+    heading_path: list
+    text: str
+    metadata: dict
+
+
+def slugify(text):
+    """
+    Turn a heading into an ID fragment.
+    """
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def compact(value):
+    """
+    Join the words of a name the way SiteWise names equipment, e.g.
+    "Mash Tun 100" becomes "MashTun100".
+    """
+    return "".join(
+        word[:1].upper() + word[1:] for word in re.findall(r"[A-Za-z0-9]+", value)
+    )
+
+
+def _render_table(rows):
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = [
+        "| " + " | ".join(cell.replace("|", "\\|") for cell in rows[0]) + " |",
+        "|" + "---|" * width,
+    ]
+    lines += [
+        "| " + " | ".join(cell.replace("|", "\\|") for cell in row) + " |"
+        for row in rows[1:]
+    ]
+    return "\n".join(lines)
+
+
+def _render_block(block):
+    if block.kind == "item":
+        return f"{'  ' * block.level}{block.marker} {block.text}"
+    if block.kind == "table":
+        return _render_table(block.rows)
+    if block.kind == "heading":
+        return f"{'#' * min(block.level + 1, 6)} {block.text}"
+    return block.text
+
+
+def _render_blocks(blocks):
+    # List items stay on consecutive lines, everything else is a paragraph.
+    lines = []
+    previous = None
+    for block in blocks:
+        if lines and not (block.kind == "item" and previous == "item"):
+            lines.append("")
+        lines.append(_render_block(block))
+        previous = block.kind
+
+    return "\n".join(lines)
+
+
+def build_tree(structure):
+    """
+    Nest the heading blocks into sections.
+
+    The header fields and blocks before the first heading form an
+    "Overview" section.
+    """
+    overview = Section("Overview", "", 1)
+    if structure.fields:
+        overview.blocks.append(
+            Block(
+                "paragraph",
+                text="\n".join(f"{key}: {value}" for key, value in structure.fields),
+            )
+        )
+    roots = [overview]
+    stack = []
+    for block in structure.blocks:
+        if block.kind == "heading":
+            section = Section(block.text, block.number, block.level)
+            while stack and stack[-1].level >= block.level:
+                stack.pop()
+            (stack[-1].children if stack else roots).append(section)
+            stack.append(section)
+        else:
+            (stack[-1] if stack else overview).blocks.append(block)
+
+    if not overview.blocks:
+        roots.remove(overview)
+
+    return roots
+
+
+def _flatten(section, path, max_words):
+    """
+    Yield (heading path, blocks) for a section, split at its subsections
+    when it is too long.
+    """
+    path = path + [section.heading]
+    if section.words() <= max_words or not section.children:
+        blocks = list(section.blocks)
+        for child in section.children:
+            blocks.extend(_with_headings(child))
+        yield path, blocks
+        return
+
+    if section.blocks:
+        yield path, list(section.blocks)
+    for child in section.children:
+        yield from _flatten(child, path, max_words)
+
+
+def _with_headings(section):
+    blocks = [
+        Block(
+            "heading", text=section.heading, number=section.number, level=section.level
+        )
+    ]
+    blocks.extend(section.blocks)
+    for child in section.children:
+        blocks.extend(_with_headings(child))
+
+    return blocks
+
+
+def document_metadata(name, folder, structure, asset_models=None):
+    """
+    Metadata attributes shared by every chunk of a document.
+
+    SOPs name their equipment in the last "Location" header field, which is
+    resolved to the SiteWise asset and its asset model (``equipment_model``,
+    the ``modelName`` of list_all_assets); the machine model and the area
+    are kept as additional tags.
+    """
+    document_type = DOCUMENT_TYPES.get(folder, folder or "document")
+    location = structure.header_value("Location", last=True)
+    area = structure.header_value("Location")
+    machine_model = structure.header_value("Machine Model")
+    equipment = equipment_model = None
+    if location:
+        equipment, equipment_model = resolve_equipment(
+            compact(location), asset_models or {}
+        )
+    tags = [
+        value
+        for value in [equipment, equipment_model]
+        + [compact(value) for value in (location, machine_model, area) if value]
+        if value
+    ]
+
+    metadata = {
+        "document": name,
+        "document_type": document_type,
+        "title": structure.title or name,
+    }
+    if equipment:
+        metadata["equipment"] = equipment
+        metadata["equipment_model"] = equipment_model
+    if tags:
+        metadata["equipment_tags"] = list(dict.fromkeys(tags))
+    if machine_model:
+        metadata["machine_model"] = machine_model
+
+    return metadata
+
+
+def chunk_document(
+    name,
+    folder,
+    structure: DocumentStructure,
+    max_words=MAX_SECTION_WORDS,
+    asset_models=None,
+):
+    """
+    Split a document into section chunks.
+
+    Args:
+        name (str): Document name, the file name without extension.
+        folder (str): Folder of the document below data/, e.g. "sop".
+        structure (DocumentStructure): The parsed document.
+        max_words (int): Size above which sections are split.
+        asset_models (dict): SiteWise asset model name by asset name.
+
+    Returns:
+        list: Chunks in document order.
+    """
+    shared = document_metadata(name, folder, structure, asset_models)
+    header = [f"# {shared['title']}"]
+    equipment = [
+        value
+        for value in (
+            structure.header_value("Location", last=True),
+            structure.header_value("Machine Model"),
+        )
+        if value
+    ]
+    if equipment:
+        header.append(f"Equipment: {', '.join(equipment)}")
+
+    chunks = []
+    seen = set()
+    for root in build_tree(structure):
+        for path, blocks in _flatten(root, [], max_words):
+            section_id = slugify(path[-1]) or "section"
+            candidate, suffix = section_id, 2
+            while candidate in seen:
+                candidate = f"{section_id}-{suffix}"
+                suffix += 1
+            seen.add(candidate)
+
+            text = "\n\n".join(
+                header
+                + [f"## {' > '.join(path)}"]
+                + ([_render_blocks(blocks)] if blocks else [])
+            )
+            chunks.append(
+                Chunk(
+                    section_id=f"{name}--{candidate}",
+                    heading_path=path,
+                    text=text + "\n",
+                    metadata=dict(
+                        shared,
+                        section=path[-1],
+                        section_path=" > ".join(path),
+                        section_id=f"{name}--{candidate}",
+                    ),
+                )
+            )
+
+    return chunks
@@ -1,5 +1,6 @@
 import os
 import json
+import hashlib
 import os.path as path
 import platform
 
@@ -7,6 +8,7 @@ from aws_cdk import (
     Duration,
     Aws,
     Stack,
+    Annotations,
     RemovalPolicy,
     CfnOutput,
     CfnResource,
@@ -20,6 +22,7 @@ from aws_cdk import (
     aws_s3 as s3,
     aws_opensearchserverless as opensearchserverless,
     aws_iam as iam,
+    aws_dynamodb as dynamodb,
 )
 from aws_cdk.aws_apigateway import (
     RestApi,
@@ -38,6 +41,8 @@ from constructs import Construct
 from aws_cdk.aws_ecr_assets import Platform
 from cdk_nag import NagSuppressions, NagPackSuppression
 
+from preprocessing import preprocess_documents, equipment_models, load_asset_models
+
 class BedrockStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -65,21 +70,33 @@ class BedrockStack(Stack):
         prefix = "AssistedDiagnosis"
 
         agent_assets_bucket = self.create_data_source_bucket()
-        self.upload_files_to_s3(agent_assets_bucket)
+        documents_deployment = self.upload_files_to_s3(agent_assets_bucket)
 
         agent_sitewise_executor_lambda = self.create_agent_sitewise_executor_lambda()
-        agent_workorder_executor_lambda = self.create_agent_workorder_executor_lambda()
+        work_order_table = self.create_work_order_table()
+        agent_workorder_executor_lambda = self.create_agent_workorder_executor_lambda(
+            work_order_table
+        )
 
         agent_resource_role = self.create_agent_execution_role(agent_assets_bucket)
 
+        # Embedding model, quantization and HNSW settings of the vector index
+        self.index_profile = self.load_index_profile()
+
         opensearch_layer = self.create_lambda_layer("opensearch_layer")
+        # Bulk loading, waiters and warm-up shared by the index Lambdas
+        index_layer = self.create_lambda_layer(
+            "index_layer", description="Vector index loading and warm-up helpers"
+        )
 
         (
             cfn_collection,
             vector_field_name,
             vector_index_name,
             lambda_cr,
-        ) = self.create_opensearch_index(agent_resource_role, opensearch_layer)
+        ) = self.create_opensearch_index(
+            agent_resource_role, opensearch_layer, index_layer
+        )
 
         knowledge_base, agent_resource_role_arn = self.create_knowledgebase(
             vector_field_name,
@@ -102,6 +119,8 @@ class BedrockStack(Stack):
         )
 
         boto3_layer = self.create_lambda_layer("boto3_layer")
+        # Native JSON encoder for the invoke Lambda's responses
+        orjson_layer = self.create_lambda_layer("orjson_layer")
 
         # Define the Powertools layer version
         power_tools_layer_version = "68"
@@ -124,9 +143,13 @@ class BedrockStack(Stack):
             ),
         )
 
+        chat_state_table = self.create_chat_state_table()
+
         invoke_lambda = self.create_bedrock_agent_invoke_lambda(
             agent, agent_assets_bucket, boto3_layer, 
-            power_tools_layer, self.x_origin_verify_secret 
+            power_tools_layer, self.x_origin_verify_secret,
+            chat_state_table, orjson_layer, knowledge_base,
+            opensearch_layer, cfn_collection, vector_index_name, vector_field_name,
         )
 
         _ = self.create_update_lambda(
@@ -135,6 +158,13 @@ class BedrockStack(Stack):
             agent,
             agent_resource_role_arn,
             boto3_layer,
+            agent_assets_bucket,
+            documents_deployment,
+            opensearch_layer,
+            index_layer,
+            cfn_collection,
+            vector_index_name,
+            vector_field_name,
         )
 
          # Create the User Pool
@@ -301,19 +331,93 @@ class BedrockStack(Stack):
 
         return agent_assets_bucket
 
+    @staticmethod
+    def hash_directory(directory):
+        """
+        Hash the names and contents of all files below a directory.
+        """
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = path.join(root, name)
+                digest.update(path.relpath(file_path, directory).encode("utf-8"))
+                with open(file_path, "rb") as f:
+                    digest.update(f.read())
+
+        return digest.hexdigest()
+
+    def load_index_profile(self):
+        """
+        Load the vector index profile selected with the vector_index_profile
+        context value (cdk.json or -c), falling back to the default profile.
+        The create index Lambda builds the index mapping from the same file.
+        """
+        profiles_path = path.join(
+            os.getcwd(), "lambdas", "create-index-lambda", "index_profiles.json"
+        )
+        with open(profiles_path, encoding="utf-8") as f:
+            definitions = json.load(f)
+
+        name = self.node.try_get_context("vector_index_profile") or definitions["default"]
+        if name not in definitions["profiles"]:
+            raise ValueError(
+                f"Unknown vector index profile {name}, expected one of "
+                f"{sorted(definitions['profiles'])}"
+            )
+
+        profile = dict(definitions["profiles"][name], name=name)
+        model = definitions["embedding_models"][profile["embedding_model_id"]]
+        profile["configurable"] = model["configurable"]
+        Annotations.of(self).add_info(f"Vector index profile: {name}.")
+
+        return profile
+
+    @staticmethod
+    def preprocess_knowledge_base():
+        """
+        Turn the documents in files/data into section files with metadata
+        below .build/knowledge-base/data. Documents whose content hash is
+        unchanged since the last synth are skipped. Equipment is matched to
+        the assets of the SiteWise assets template.
+        """
+        build_dir = path.join(os.getcwd(), ".build")
+        output_dir = path.join(build_dir, "knowledge-base", "data")
+        counts = preprocess_documents(
+            path.join(os.getcwd(), "files", "data"),
+            output_dir,
+            state_path=path.join(build_dir, "preprocess-state.json"),
+            asset_models=load_asset_models(
+                path.join(os.getcwd(), "cfn", "sitewise-assets-reduced.json")
+            ),
+        )
+        print(
+            f"Preprocessed {counts['processed']} documents, "
+            f"{counts['skipped']} unchanged."
+        )
+
+        return output_dir
+
     def upload_files_to_s3(self, agent_assets_bucket):
         local_files_dir = os.path.join(os.getcwd(), "files")
+        knowledge_base_dir = path.dirname(self.preprocess_knowledge_base())
 
-        # Uploading files to S3 bucket
-        s3deploy.BucketDeployment(
+        # Uploading files to S3 bucket; data/ holds the preprocessed section
+        # files rather than the original documents.
+        documents_deployment = s3deploy.BucketDeployment(
             self,
             "KnowledgeBaseDocumentDeployment",
-            sources=[s3deploy.Source.asset(local_files_dir)],
+            sources=[
+                s3deploy.Source.asset(local_files_dir, exclude=["data", "data/**"]),
+                s3deploy.Source.asset(knowledge_base_dir),
+            ],
             destination_bucket=agent_assets_bucket,
             retain_on_delete=False,
+            # Keep objects written at runtime when the deployment prunes.
+            exclude=["traces/*", "manifests/*", "embeddings/*"],
         )
 
-        return
+        return documents_deployment
     
 
     def create_agent_sitewise_executor_lambda(
@@ -364,8 +468,44 @@ class BedrockStack(Stack):
     
     
     
+    def create_work_order_table(self):
+        """
+        Work orders submitted through the agent, with the idempotency keys
+        of their submissions and the work order counter, keyed by a
+        prefixed ``pk``. Work orders are also indexed by equipment, status
+        and submission day, each sorted by submission time.
+        """
+        work_order_table = dynamodb.Table(
+            self,
+            "WorkOrderTable",
+            partition_key=dynamodb.Attribute(
+                name="pk", type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        for index_name, partition_key in (
+            ("equipment-index", "equipment_key"),
+            ("status-index", "status"),
+            ("submitted-day-index", "submitted_day"),
+        ):
+            work_order_table.add_global_secondary_index(
+                index_name=index_name,
+                partition_key=dynamodb.Attribute(
+                    name=partition_key, type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name="submitted_at", type=dynamodb.AttributeType.STRING
+                ),
+                projection_type=dynamodb.ProjectionType.ALL,
+            )
+
+        return work_order_table
+
     def create_agent_workorder_executor_lambda(
-        self,
+        self, work_order_table,
     ):
 
         # Create IAM role for Lambda function
@@ -392,9 +532,13 @@ class BedrockStack(Stack):
             timeout=Duration.seconds(900),
             code=lambda_.Code.from_asset("lambdas/workorder-lambda"),
             handler="index.lambda_handler",
-            environment={},
+            environment={
+                "WORK_ORDER_STORE": "dynamodb",
+                "WORK_ORDER_TABLE_NAME": work_order_table.table_name,
+            },
             role=lambda_role,
         )
+        work_order_table.grant_read_write_data(lambda_function)
 
         lambda_function.add_permission(
             "BedrockWorkorderLambdaInvokePermission",
@@ -455,7 +599,9 @@ class BedrockStack(Stack):
         return agent_resource_role
     
 
-    def create_lambda_layer(self, layer_name):
+    def create_lambda_layer(
+        self, layer_name, description="A layer new version of boto3"
+    ):
         """
         create a Lambda layer with necessary dependencies.
         """
@@ -466,7 +612,7 @@ class BedrockStack(Stack):
             entry=path.join(os.getcwd(), "layers", layer_name),
             compatible_runtimes=[self.lambda_runtime],
             compatible_architectures=[self.lambda_architecture],
-            description="A layer new version of boto3",
+            description=description,
             layer_version_name=layer_name,
         )
 
@@ -474,7 +620,9 @@ class BedrockStack(Stack):
 
 
     
-    def create_opensearch_index(self, agent_resource_role, opensearch_layer):
+    def create_opensearch_index(
+        self, agent_resource_role, opensearch_layer, index_layer
+    ):
 
         vector_index_name = "bedrock-knowledgebase-index"
         vector_field_name = "bedrock-knowledge-base-default-vector"
@@ -609,6 +757,10 @@ class BedrockStack(Stack):
                 "Policy": json_dump,
             },
         )
+        # Kept to grant roles created later access, see grant_collection_access.
+        self.collection_data_policy = data_policy
+        self.collection_data_policy_json = policy_json
+        self.collection_policy_statement = opensearch_policy_statement
 
         cfn_collection.add_dependency(network_policy)
         cfn_collection.add_dependency(encryption_policy)
@@ -626,12 +778,13 @@ class BedrockStack(Stack):
                 )
             ),
             # architecture=lambda_.Architecture.ARM_64,
-            layers=[opensearch_layer],
+            layers=[opensearch_layer, index_layer],
             environment={
                 "REGION_NAME": Aws.REGION,
                 "COLLECTION_HOST": cfn_collection.attr_collection_endpoint,
                 "VECTOR_INDEX_NAME": vector_index_name,
                 "VECTOR_FIELD_NAME": vector_field_name,
+                "VECTOR_INDEX_PROFILE": self.index_profile["name"],
             },
             role=create_index_lambda_execution_role,
             timeout=Duration.minutes(15),
@@ -644,10 +797,21 @@ class BedrockStack(Stack):
             on_event_handler=self.create_index_lambda,
         )
 
+        # The index name is an alias of a versioned index. Changing the
+        # profile or the mapping code sends an Update, which builds the new
+        # version and moves the alias once it is verified.
+        index_definition_hash = self.hash_directory(
+            path.join(os.getcwd(), "lambdas", "create-index-lambda")
+        )
+
         lambda_cr = CustomResource(
             self,
             "LambdaCreateIndexCustomResource",
             service_token=lambda_provider.service_token,
+            properties={
+                "VectorIndexProfile": self.index_profile["name"],
+                "IndexDefinitionHash": index_definition_hash,
+            },
         )
 
         return (
@@ -657,6 +821,17 @@ class BedrockStack(Stack):
             lambda_cr,
         )
     
+    def grant_collection_access(self, role):
+        """
+        Let a role read and write the vector index: IAM access to the
+        collection and a principal of the collection's data access policy.
+        """
+        role.add_to_policy(self.collection_policy_statement)
+        self.collection_data_policy_json[0]["Principal"].append(role.role_arn)
+        self.collection_data_policy.add_property_override(
+            "Policy", json.dumps(self.collection_data_policy_json)
+        )
+
     def create_knowledgebase(
         self,
         vector_field_name,
@@ -675,7 +850,7 @@ class BedrockStack(Stack):
         embed_moodel = bedrock.FoundationModel.from_foundation_model_id(
             self,
             "embedding_model",
-            bedrock.FoundationModelIdentifier.AMAZON_TITAN_EMBED_G1_TEXT_02,
+            bedrock.FoundationModelIdentifier(self.index_profile["embedding_model_id"]),
         )
         
         cfn_knowledge_base = bedrock.CfnKnowledgeBase(
@@ -705,6 +880,18 @@ class BedrockStack(Stack):
             description="Use this for returning detailed descriptive answers and step-by-step instructions directly from Standard Operating Procedures (SOPs) and Recipes to ensure consistency, accuracy, and compliance.",
         )
 
+        if self.index_profile["configurable"]:
+            # Embedding size and type must match the index mapping
+            cfn_knowledge_base.add_property_override(
+                "KnowledgeBaseConfiguration.VectorKnowledgeBaseConfiguration.EmbeddingModelConfiguration",
+                {
+                    "BedrockEmbeddingModelConfiguration": {
+                        "Dimensions": self.index_profile["dimension"],
+                        "EmbeddingDataType": self.index_profile["embedding_data_type"],
+                    }
+                },
+            )
+
         for child in lambda_cr.node.children:
             if isinstance(child, CustomResource):
                 break
@@ -734,6 +921,12 @@ class BedrockStack(Stack):
             ),
             knowledge_base_id=knowledge_base.attr_knowledge_base_id,
             name="BedrockKnowledgeBaseSource",
+            # Every file is already one section, see preprocess_knowledge_base.
+            vector_ingestion_configuration=bedrock.CfnDataSource.VectorIngestionConfigurationProperty(
+                chunking_configuration=bedrock.CfnDataSource.ChunkingConfigurationProperty(
+                    chunking_strategy="NONE"
+                )
+            ),
             # the properties below are optional
             data_deletion_policy="RETAIN",
             description="description",
@@ -743,9 +936,31 @@ class BedrockStack(Stack):
 
 
 
+    def create_chat_state_table(self):
+        """
+        Single table for chat state owned by the invoke Lambda, e.g.
+        asynchronous chat jobs and compact chat sessions. Items are keyed
+        by a prefixed ``pk``.
+        """
+        chat_state_table = dynamodb.Table(
+            self,
+            "ChatStateTable",
+            partition_key=dynamodb.Attribute(
+                name="pk", type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+
+        return chat_state_table
+
     def create_bedrock_agent_invoke_lambda(
         self, agent, agent_assets_bucket, boto3_layer,
-        power_tools_layer, x_origin_verify_secret
+        power_tools_layer, x_origin_verify_secret, chat_state_table,
+        orjson_layer, knowledge_base, opensearch_layer, cfn_collection,
+        vector_index_name, vector_field_name,
     ):
 
         invoke_lambda_role = iam.Role(
@@ -788,6 +1003,37 @@ class BedrockStack(Stack):
             )
         )
 
+        # Asset models are looked up to scope knowledge base retrieval
+        invoke_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["iotsitewise:DescribeAsset", "iotsitewise:DescribeAssetModel"],
+                resources=[
+                    f"arn:aws:iotsitewise:{Aws.REGION}:{Aws.ACCOUNT_ID}:asset/*",
+                    f"arn:aws:iotsitewise:{Aws.REGION}:{Aws.ACCOUNT_ID}:asset-model/*",
+                ],
+            )
+        )
+
+        # Sampled full agent traces are written under traces/
+        invoke_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:PutObject"],
+                resources=[
+                    f"arn:aws:s3:::{agent_assets_bucket.bucket_name}/traces/*",
+                ],
+            )
+        )
+
+        # The X-Ray SDK adds subsegments for the routes and latency phases but
+        # costs about 170 ms of every cold start, so it is only loaded with
+        # the xray_sdk_tracing context value. Lambda records the invocation
+        # segment either way.
+        xray_sdk_tracing = (
+            str(self.node.try_get_context("xray_sdk_tracing")).lower() == "true"
+        )
+
         self.invoke_lambda = lambda_.Function(
             self,
             "StreamlitLambdaInvoke",
@@ -797,11 +1043,36 @@ class BedrockStack(Stack):
             code=lambda_.Code.from_asset(
                 path.join(os.getcwd(), "lambdas", "invoke-lambda")
             ),
-            layers=[boto3_layer, power_tools_layer],
+            layers=[boto3_layer, power_tools_layer, orjson_layer],
             environment={
                 "AGENT_ID": agent.attr_agent_id, 
                 "REGION_NAME": Aws.REGION,
                 "X_ORIGIN_VERIFY_SECRET_ARN": x_origin_verify_secret.secret_arn,
+                "CHAT_STATE_TABLE_NAME": chat_state_table.table_name,
+                "COALESCE_WINDOW_SECONDS": "30",
+                "COALESCE_SHARED": "true",
+                "TRACE_LEVEL": "citations",
+                "TRACE_SAMPLE_RATE": "0.1",
+                "TRACE_BUCKET_NAME": agent_assets_bucket.bucket_name,
+                "METRICS_NAMESPACE": "AssistedDiagnosis",
+                "LATENCY_SINKS": "emf,xray" if xray_sdk_tracing else "emf",
+                "POWERTOOLS_TRACE_DISABLED": str(not xray_sdk_tracing).lower(),
+                "SESSION_STORE": "dynamodb",
+                "SESSION_TOKEN_BUDGET": "1500",
+                "BATCH_MAX_CONCURRENCY": "8",
+                "PREFETCH_ON_INIT": "true",
+                "CITATION_MANIFEST_BUCKET": agent_assets_bucket.bucket_name,
+                "CITATION_MANIFEST_KEY": "manifests/citation-manifest.json",
+                "JSON_SERIALIZER": "auto",
+                "LOG_EVENT_SAMPLE_RATE": "0.01",
+                "KNOWLEDGE_BASE_ID": knowledge_base.attr_knowledge_base_id,
+                # Asset models the preprocessed documents cover.
+                "RETRIEVAL_SCOPED_MODELS": ",".join(
+                    equipment_models(
+                        path.join(os.getcwd(), ".build", "knowledge-base", "data")
+                    )
+                ),
+                "RETRIEVAL_SHARED_DOCUMENT_TYPES": "recipe",
             },
             role=invoke_lambda_role,
             timeout=Duration.minutes(15),
@@ -809,6 +1080,45 @@ class BedrockStack(Stack):
         )
 
         x_origin_verify_secret.grant_read(self.invoke_lambda)
+        chat_state_table.grant_read_write_data(self.invoke_lambda)
+
+        # Hybrid BM25 + kNN retrieval (POST /search, hybrid_search.py) queries
+        # the index and embeds queries itself. It needs opensearch-py, the collection and
+        # the embedding model, so it is only wired with the hybrid_search
+        # context value (cdk.json or -c hybrid_search=true).
+        if str(self.node.try_get_context("hybrid_search")).lower() == "true":
+            self.invoke_lambda.add_layers(opensearch_layer)
+            hybrid_environment = {
+                "COLLECTION_HOST": cfn_collection.attr_collection_endpoint,
+                "VECTOR_INDEX_NAME": vector_index_name,
+                "VECTOR_FIELD_NAME": vector_field_name,
+                "EMBEDDING_MODEL_ID": self.index_profile["embedding_model_id"],
+                "EMBEDDING_DIMENSIONS": str(self.index_profile["dimension"]),
+            }
+            for name, value in hybrid_environment.items():
+                self.invoke_lambda.add_environment(name, value)
+            invoke_lambda_role.add_to_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["bedrock:InvokeModel"],
+                    resources=[
+                        f"arn:aws:bedrock:{Aws.REGION}::foundation-model/"
+                        f"{self.index_profile['embedding_model_id']}"
+                    ],
+                )
+            )
+            self.grant_collection_access(invoke_lambda_role)
+
+        # Asynchronous chat jobs are run by the function invoking itself.
+        invoke_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["lambda:InvokeFunction"],
+                resources=[
+                    f"arn:aws:lambda:{Aws.REGION}:{Aws.ACCOUNT_ID}:function:{Aws.STACK_NAME}-StreamlitLambdaInvoke-*"
+                ],
+            )
+        )
 
         CfnOutput(
             self,
@@ -825,6 +1135,13 @@ class BedrockStack(Stack):
         bedrock_agent,
         agent_resource_role_arn,
         boto3_layer,
+        agent_assets_bucket,
+        documents_deployment,
+        opensearch_layer,
+        index_layer,
+        cfn_collection,
+        vector_index_name,
+        vector_field_name,
     ):
 
         # Create IAM role for the update lambda
@@ -856,6 +1173,10 @@ class BedrockStack(Stack):
                 "bedrock:DeleteAgentAlias",
                 "bedrock:DeleteAgent",
                 "bedrock:ListAgentAliases",
+                "bedrock:IngestKnowledgeBaseDocuments",
+                "bedrock:DeleteKnowledgeBaseDocuments",
+                "bedrock:GetKnowledgeBaseDocuments",
+                "bedrock:ListKnowledgeBaseDocuments",
             ],
             resources=[
                 f"arn:aws:bedrock:{Aws.REGION}:{Aws.ACCOUNT_ID}:agent/*",
@@ -875,6 +1196,67 @@ class BedrockStack(Stack):
 
         lambda_role.attach_inline_policy(update_agent_kb_policy)
 
+        # Read the knowledge base documents, write the citation manifest and
+        # keep the ingestion manifest
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:ListBucket"],
+                resources=[f"arn:aws:s3:::{agent_assets_bucket.bucket_name}"],
+            )
+        )
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:GetObject"],
+                resources=[
+                    f"arn:aws:s3:::{agent_assets_bucket.bucket_name}/data/*",
+                    f"arn:aws:s3:::{agent_assets_bucket.bucket_name}/manifests/*",
+                ],
+            )
+        )
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:PutObject"],
+                resources=[
+                    f"arn:aws:s3:::{agent_assets_bucket.bucket_name}/manifests/*"
+                ],
+            )
+        )
+
+        # Direct ingestion embeds changed chunks, keeps the embedding cache
+        # and writes to the vector index itself
+        ingestion_mode = self.node.try_get_context("ingestion_mode") or "bedrock"
+        if ingestion_mode == "direct":
+            if self.index_profile["embedding_data_type"] != "FLOAT32":
+                raise ValueError(
+                    "Direct ingestion writes float vectors, the vector index "
+                    f"profile {self.index_profile['name']} needs the Bedrock sync"
+                )
+            lambda_role.add_to_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["bedrock:InvokeModel"],
+                    resources=[
+                        f"arn:aws:bedrock:{Aws.REGION}::foundation-model/"
+                        f"{self.index_profile['embedding_model_id']}"
+                    ],
+                )
+            )
+            lambda_role.add_to_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["s3:GetObject", "s3:PutObject", "s3:DeleteObject"],
+                    resources=[
+                        f"arn:aws:s3:::{agent_assets_bucket.bucket_name}/embeddings/*"
+                    ],
+                )
+            )
+        Annotations.of(self).add_info(f"Ingestion mode: {ingestion_mode}.")
+        # Both modes search the index to warm it up after ingestion.
+        self.grant_collection_access(lambda_role)
+
         # create lambda function to trigger crawler, create bedrock agent alias, knowledgebase data sync
         lambda_function_update = lambda_.Function(
             self,
@@ -895,11 +1277,22 @@ class BedrockStack(Stack):
                 "BEDROCK_AGENT_ALIAS": "assisted-diagnosis-agent-dev",
                 "BEDROCK_AGENT_RESOURCE_ROLE_ARN": agent_resource_role_arn,
                 "LOG_LEVEL": "info",
+                "ASSETS_BUCKET_NAME": agent_assets_bucket.bucket_name,
+                "DOCUMENTS_PREFIX": "data/",
+                "CITATION_MANIFEST_KEY": "manifests/citation-manifest.json",
+                "INGESTION_MANIFEST_KEY": "manifests/ingestion-manifest.json",
+                "INGESTION_MODE": ingestion_mode,
+                "COLLECTION_HOST": cfn_collection.attr_collection_endpoint,
+                "VECTOR_INDEX_NAME": vector_index_name,
+                "VECTOR_FIELD_NAME": vector_field_name,
+                "EMBEDDING_MODEL_ID": self.index_profile["embedding_model_id"],
+                "EMBEDDING_DIMENSIONS": str(self.index_profile["dimension"]),
+                "EMBEDDING_CACHE_PREFIX": "embeddings/",
             },
             role=lambda_role,
             timeout=Duration.minutes(15),
             memory_size=1024,
-            layers=[boto3_layer],
+            layers=[boto3_layer, opensearch_layer, index_layer],
         )
 
         lambda_provider = cr.Provider(
@@ -908,11 +1301,20 @@ class BedrockStack(Stack):
             on_event_handler=lambda_function_update,
         )
 
-        _ = CustomResource(
+        # Changing a document changes the hash, which sends an Update that
+        # ingests only the changed documents.
+        data_hash = self.hash_directory(
+            path.join(os.getcwd(), ".build", "knowledge-base", "data")
+        )
+
+        update_resource = CustomResource(
             self,
             "LambdaUpdateResourcesCustomResource",
             service_token=lambda_provider.service_token,
+            properties={"DataHash": data_hash},
         )
+        # Sync and describe the documents only once they are uploaded.
+        update_resource.node.add_dependency(documents_deployment)
 
         return lambda_function_update
     
@@ -0,0 +1,77 @@
+import sys
+import importlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+EMBEDDING_MODELS = {
+    "amazon.titan-embed-text-v2:0": {
+        "dimensions": [256, 512, 1024],
+        "data_types": ["FLOAT32", "BINARY"],
+    }
+}
+
+
+@pytest.fixture
+def retrieval_benchmark(lambda_module, monkeypatch):
+    # The benchmark imports hybrid_search from the invoke Lambda.
+    lambda_module("invoke-lambda", "hybrid_search")
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.delitem(sys.modules, "benchmarks.retrieval_benchmark", raising=False)
+
+    return importlib.import_module("benchmarks.retrieval_benchmark")
+
+
+def row(index, dimension, recall, p95_ms, **params):
+    return {
+        "index": index,
+        "dimension": dimension,
+        "recall": recall,
+        "p95_ms": p95_ms,
+        "bytes": 1000,
+        "chunks": 100,
+        "chunk_size": 300,
+        "vectors": 20000,
+        "m": 16,
+        "ef_construction": 256,
+        "ef_search": 64,
+        **params,
+    }
+
+
+def test_chunks_overlap(retrieval_benchmark):
+    text = " ".join(str(i) for i in range(10))
+
+    texts, sources = retrieval_benchmark.chunk_documents({"sop": text}, 4, 0.5)
+
+    assert texts == ["0 1 2 3", "2 3 4 5", "4 5 6 7", "6 7 8 9"]
+    assert sources == ["sop"] * 4
+
+
+def test_recall_counts_the_true_neighbours_found(retrieval_benchmark):
+    truth = np.array([[1, 2], [3, 4]])
+
+    assert retrieval_benchmark.recall_at_k([[2, 9], [4, 3]], truth) == 0.75
+
+
+def test_best_profile_is_the_fastest_that_reaches_the_recall(retrieval_benchmark):
+    rows = [
+        row("hnsw", 1024, 0.99, 2.0),
+        row("hnsw-fp16", 512, 0.97, 1.0, ef_search=128),
+        row("hnsw-binary", 1024, 0.80, 0.5),
+        row("ivf", 256, 0.99, 0.1),
+    ]
+
+    profile = retrieval_benchmark.best_profile(rows, 0.95, EMBEDDING_MODELS)
+
+    assert profile["dimension"] == 512
+    assert profile["quantization"] == "fp16"
+    assert profile["ef_search"] == 128
+    assert profile["space_type"] == "innerproduct"
+
+
+def test_no_profile_at_unsupported_dimensions(retrieval_benchmark):
+    rows = [row("hnsw", 768, 0.99, 1.0), row("hnsw", 1024, 0.90, 1.0)]
+
+    assert retrieval_benchmark.best_profile(rows, 0.95, EMBEDDING_MODELS) is None
@@ -0,0 +1,95 @@
+"""
+Shared fixtures.
+
+Every Lambda is deployed from its own directory and imports its modules by
+bare name (``import index``, ``from waiters import wait_until``), and some
+names exist in several Lambdas. ``lambda_module`` imports a module the way
+its Lambda does, from a fresh copy of that Lambda's modules and the code
+layers attached to it.
+"""
+import os
+import sys
+import importlib
+
+import pytest
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDAS_DIR = os.path.join(SOURCE_DIR, "lambdas")
+LAYERS_DIR = os.path.join(SOURCE_DIR, "layers")
+
+# Layers with modules of our own, by the Lambdas the stack attaches them to.
+LAMBDA_LAYERS = {
+    "create-index-lambda": ["index_layer"],
+    "update-lambda": ["index_layer"],
+}
+
+# The stack and the preprocessing package are imported from the source root.
+if SOURCE_DIR not in sys.path:
+    sys.path.insert(0, SOURCE_DIR)
+
+# Environment the invoke Lambda reads when its modules are imported.
+INVOKE_ENVIRONMENT = {
+    "AGENT_ID": "AGENT1234",
+    "REGION_NAME": "us-east-1",
+    "AWS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "POWERTOOLS_TRACE_DISABLED": "true",
+    "PREFETCH_ON_INIT": "false",
+    "LATENCY_SINKS": "local",
+}
+
+
+def _local_modules(directory):
+    names = set()
+    for entry in os.listdir(directory):
+        if entry.endswith(".py"):
+            names.add(entry[:-3])
+        elif os.path.isdir(os.path.join(directory, entry)) and entry != "__pycache__":
+            names.add(entry)
+
+    return names
+
+
+@pytest.fixture
+def lambda_module(monkeypatch):
+    """
+    Return a function importing a module of a Lambda, e.g.
+    ``lambda_module("update-lambda", "waiters")``. Modules imported in the
+    same test share one copy of the Lambda's modules.
+    """
+    loaded = []
+
+    def load(lambda_name, module_name):
+        if lambda_name not in loaded:
+            loaded.append(lambda_name)
+            directories = [
+                os.path.join(LAYERS_DIR, layer)
+                for layer in LAMBDA_LAYERS.get(lambda_name, [])
+            ]
+            directories.append(os.path.join(LAMBDAS_DIR, lambda_name))
+            local = set()
+            for directory in directories:
+                local |= _local_modules(directory)
+            for name in list(sys.modules):
+                if name.split(".")[0] in local:
+                    monkeypatch.delitem(sys.modules, name)
+            # The function's own directory comes first, as in the Lambda.
+            for directory in directories:
+                monkeypatch.syspath_prepend(directory)
+
+        return importlib.import_module(module_name)
+
+    return load
+
+
+@pytest.fixture
+def invoke_module(lambda_module, monkeypatch):
+    """
+    Return a function importing a module of the invoke Lambda with the
+    environment it needs and without a chat state table.
+    """
+    for name, value in INVOKE_ENVIRONMENT.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("CHAT_STATE_TABLE_NAME", raising=False)
+
+    return lambda module_name: lambda_module("invoke-lambda", module_name)
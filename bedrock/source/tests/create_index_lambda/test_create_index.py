@@ -0,0 +1,100 @@
+import pytest
+
+pytest.importorskip("opensearchpy")
+
+CREATE_INDEX_ENVIRONMENT = {
+    "COLLECTION_HOST": "https://collection.us-east-1.aoss.amazonaws.com",
+    "VECTOR_INDEX_NAME": "kb-index",
+    "VECTOR_FIELD_NAME": "embedding",
+    "REGION_NAME": "us-east-1",
+    "VECTOR_INDEX_PROFILE": "balanced",
+}
+
+
+class FakeSession:
+    def client(self, service_name):
+        class STS:
+            def get_caller_identity(self):
+                return {"Arn": "arn:aws:sts::123456789012:assumed-role/create-index"}
+
+        return STS()
+
+    def get_credentials(self):
+        return None
+
+
+@pytest.fixture
+def index(lambda_module, monkeypatch):
+    for name, value in CREATE_INDEX_ENVIRONMENT.items():
+        monkeypatch.setenv(name, value)
+    index = lambda_module("create-index-lambda", "index")
+    monkeypatch.setattr(index.boto3, "Session", FakeSession)
+    monkeypatch.setattr(index, "OpenSearch", lambda **kwargs: "client")
+    monkeypatch.setattr(index, "AWSV4SignerAuth", lambda *args: None)
+    return index
+
+
+def test_create_reports_the_serving_version(index, monkeypatch):
+    calls = []
+
+    def deploy_version(client, alias, index_body, vector_field_name, **kwargs):
+        calls.append((alias, index_body))
+        return {"index": "kb-index-3f9a0c1e2b4d", "swapped": True}
+
+    monkeypatch.setattr(index, "deploy_version", deploy_version)
+
+    response = index.lambda_handler({"RequestType": "Create"}, None)
+
+    assert response == {
+        "PhysicalResourceId": "kb-index",
+        "Data": {"IndexVersion": "kb-index-3f9a0c1e2b4d"},
+    }
+    [(alias, index_body)] = calls
+    assert alias == "kb-index"
+    assert index_body["mappings"]["properties"]["embedding"]["dimension"] == 1024
+
+
+def test_failures_fail_the_custom_resource(index, monkeypatch):
+    def deploy_version(*args, **kwargs):
+        raise TimeoutError("Index kb-index-3f9a0c1e2b4d not ready after 300s")
+
+    monkeypatch.setattr(index, "deploy_version", deploy_version)
+
+    with pytest.raises(TimeoutError):
+        index.lambda_handler({"RequestType": "Update"}, None)
+
+
+def test_delete_of_a_replaced_physical_id_keeps_the_index(index, monkeypatch):
+    deleted = []
+    monkeypatch.setattr(
+        index, "delete_versions", lambda client, alias: deleted.append(alias) or []
+    )
+
+    index.lambda_handler(
+        {"RequestType": "Delete", "PhysicalResourceId": "legacy-resource-id"}, None
+    )
+    assert deleted == []
+
+    index.lambda_handler(
+        {"RequestType": "Delete", "PhysicalResourceId": "kb-index"}, None
+    )
+    assert deleted == ["kb-index"]
+
+
+def test_index_is_ready_once_the_vector_field_is_mapped(index):
+    class Client:
+        def __init__(self, properties):
+            self.properties = properties
+            self.searches = 0
+            self.indices = self
+
+        def get_mapping(self, index):
+            return {index: {"mappings": {"properties": self.properties}}}
+
+        def search(self, index, body):
+            self.searches += 1
+
+    assert not index.index_ready(Client({}), "kb-index-1")
+    client = Client({"embedding": {"type": "knn_vector"}})
+    assert index.index_ready(client, "kb-index-1")
+    assert client.searches == 1
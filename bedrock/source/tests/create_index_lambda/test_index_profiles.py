@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def index_profiles(lambda_module):
+    return lambda_module("create-index-lambda", "index_profiles")
+
+
+def test_every_profile_is_valid(index_profiles):
+    definitions = index_profiles.load_profiles()
+
+    for name in definitions["profiles"]:
+        assert index_profiles.get_profile(name)["name"] == name
+    assert index_profiles.get_profile()["name"] == definitions["default"]
+
+
+def test_unknown_profile_lists_the_known_ones(index_profiles):
+    with pytest.raises(ValueError, match="high-recall"):
+        index_profiles.get_profile("fastest")
+
+
+@pytest.mark.parametrize(
+    "changes, message",
+    [
+        ({"dimension": 768}, "dimensions"),
+        ({"embedding_data_type": "BINARY"}, "Binary embeddings"),
+        ({"space_type": "hamming"}, "Hamming"),
+        ({"quantization": "int4"}, "quantization"),
+    ],
+)
+def test_profiles_must_match_their_embedding_model(
+    index_profiles, tmp_path, changes, message
+):
+    definitions = index_profiles.load_profiles()
+    definitions["profiles"]["balanced"].update(changes)
+    profiles_path = tmp_path / "index_profiles.json"
+    profiles_path.write_text(json.dumps(definitions))
+
+    with pytest.raises(ValueError, match=message):
+        index_profiles.get_profile("balanced", profiles_path=str(profiles_path))
+
+
+def test_fp16_profile_uses_scalar_quantization(index_profiles):
+    field = index_profiles.build_vector_field(index_profiles.get_profile("balanced"))
+
+    assert field["dimension"] == 1024
+    assert field["method"]["parameters"]["encoder"]["parameters"] == {"type": "fp16"}
+    assert "data_type" not in field
+
+
+def test_binary_profile_stores_bits(index_profiles):
+    field = index_profiles.build_vector_field(index_profiles.get_profile("binary"))
+
+    assert field["data_type"] == "binary"
+    assert field["method"]["space_type"] == "hamming"
+    assert "encoder" not in field["method"]["parameters"]
+
+
+def test_index_body_maps_the_vector_and_metadata_fields(index_profiles):
+    profile = index_profiles.get_profile("high-recall")
+
+    body = index_profiles.build_index_body(profile, "embedding")
+
+    assert body["settings"]["index.knn.algo_param.ef_search"] == profile["ef_search"]
+    properties = body["mappings"]["properties"]
+    assert properties["embedding"]["type"] == "knn_vector"
+    assert properties[index_profiles.EQUIPMENT_FIELD_NAME]["type"] == "keyword"
+
+
+def test_quantization_shrinks_the_graph(index_profiles):
+    full = dict(index_profiles.get_profile("balanced"), quantization="none")
+    fp16 = index_profiles.get_profile("balanced")
+
+    assert index_profiles.vector_bytes(full, 1000) == int(1.1 * (1024 * 4 + 128) * 1000)
+    assert index_profiles.vector_bytes(fp16, 1000) < index_profiles.vector_bytes(
+        full, 1000
+    )
@@ -0,0 +1,244 @@
+import fnmatch
+from functools import partial
+
+import pytest
+
+opensearchpy = pytest.importorskip("opensearchpy")
+
+ALIAS = "kb-index"
+URI = "x-amz-bedrock-kb-source-uri"
+TEXT = "AMAZON_BEDROCK_TEXT_CHUNK"
+
+
+def index_body(dimension=4, ef_search=64):
+    return {
+        "settings": {"index.knn": True, "index.knn.algo_param.ef_search": ef_search},
+        "mappings": {
+            "properties": {
+                "embedding": {"type": "knn_vector", "dimension": dimension},
+                URI: {"type": "keyword"},
+            }
+        },
+    }
+
+
+def chunk(i):
+    return {
+        "embedding": [float(i), 1.0, 0.0, float(i % 3)],
+        URI: f"s3://assets/data/doc-{i // 2}.md",
+        TEXT: f"chunk {i}",
+    }
+
+
+@pytest.fixture
+def collection(lambda_module):
+    bulk_loader = lambda_module("create-index-lambda", "bulk_loader")
+
+    class Indices:
+        def __init__(self, collection):
+            self.collection = collection
+
+        def exists(self, index):
+            return index in self.collection.bodies
+
+        def exists_alias(self, name):
+            return bool(self.collection.aliases.get(name))
+
+        def get_alias(self, name):
+            return {
+                index: {"aliases": {name: {}}}
+                for index in self.collection.aliases[name]
+            }
+
+        def get(self, index):
+            names = fnmatch.filter(self.collection.bodies, index)
+            if not names:
+                raise opensearchpy.NotFoundError(404, "index_not_found_exception", {})
+            return {name: {} for name in names}
+
+        def get_mapping(self, index):
+            name = self.collection.resolve(index)
+            return {name: {"mappings": self.collection.bodies[name]["mappings"]}}
+
+        def create(self, index, body):
+            self.collection.bodies[index] = body
+
+        def delete(self, index):
+            del self.collection.bodies[index]
+            for key in [key for key in self.collection.documents if key[0] == index]:
+                del self.collection.documents[key]
+
+        def update_aliases(self, body):
+            self.collection.alias_updates.append(body["actions"])
+            for action in body["actions"]:
+                ((kind, target),) = action.items()
+                if kind == "add":
+                    self.collection.aliases.setdefault(target["alias"], set()).add(
+                        target["index"]
+                    )
+                elif kind == "remove":
+                    self.collection.aliases[target["alias"]].discard(target["index"])
+                else:
+                    self.delete(target["index"])
+
+    class Collection(bulk_loader.InMemoryBulkClient):
+        """
+        The in-memory bulk client with the index, alias and search APIs the
+        versioning uses.
+        """
+
+        def __init__(self):
+            super().__init__(base_latency=0, latency_per_doc=0)
+            self.bodies = {}
+            self.aliases = {}
+            self.alias_updates = []
+            self.indices = Indices(self)
+
+        def resolve(self, index):
+            return next(iter(self.aliases[index])) if index in self.aliases else index
+
+        def sources(self, index):
+            name = self.resolve(index)
+            return [source for (i, _), source in self.documents.items() if i == name]
+
+        def count(self, index):
+            return {"count": len(self.sources(index))}
+
+        def search(self, index, body):
+            sources = self.sources(index)
+            if "aggs" in body:
+                composite = body["aggs"]["uris"]["composite"]
+                uris = sorted({source[URI] for source in sources})
+                if "after" in composite:
+                    uris = [uri for uri in uris if uri > composite["after"]["uri"]]
+                page = uris[: composite["size"]]
+                aggregation = {"buckets": [{"key": {"uri": uri}} for uri in page]}
+                if len(page) == composite["size"]:
+                    aggregation["after_key"] = {"uri": page[-1]}
+                return {"aggregations": {"uris": aggregation}}
+
+            query = body.get("query", {})
+            if "terms" in query:
+                ((field, uris),) = query["terms"].items()
+                sources = [
+                    s for s in sources if s[field.replace(".keyword", "")] in uris
+                ]
+            elif "knn" in query:
+                ((field, knn),) = query["knn"].items()
+                sources = sorted(
+                    sources,
+                    key=lambda s: -sum(a * b for a, b in zip(s[field], knn["vector"])),
+                )[: knn["k"]]
+            return {
+                "hits": {
+                    "hits": [{"_source": source} for source in sources[: body["size"]]]
+                }
+            }
+
+    return Collection()
+
+
+@pytest.fixture
+def index_versions(lambda_module, monkeypatch):
+    index_versions = lambda_module("create-index-lambda", "index_versions")
+    waiters = lambda_module("create-index-lambda", "waiters")
+    monkeypatch.setattr(
+        index_versions,
+        "wait_until",
+        partial(waiters.wait_until, clock=waiters.FakeClock()),
+    )
+    return index_versions
+
+
+def deploy(index_versions, collection, body, **kwargs):
+    return index_versions.deploy_version(
+        collection, ALIAS, body, "embedding", ready=lambda client, name: True, **kwargs
+    )
+
+
+def fill(collection, index, count):
+    for i in range(count):
+        collection.documents[(index, f"{index}-{i}")] = chunk(i)
+
+
+def test_version_names_follow_the_body(index_versions):
+    name = index_versions.version_name(ALIAS, index_body())
+
+    assert name.startswith(f"{ALIAS}-")
+    assert name == index_versions.version_name(ALIAS, index_body())
+    assert name != index_versions.version_name(ALIAS, index_body(ef_search=128))
+
+
+def test_first_deployment_points_the_alias_at_a_new_version(index_versions, collection):
+    result = deploy(index_versions, collection, index_body())
+
+    assert result["swapped"]
+    assert result["copied"] == 0
+    assert collection.aliases[ALIAS] == {result["index"]}
+
+    again = deploy(index_versions, collection, index_body())
+    assert not again["swapped"]
+    assert len(collection.alias_updates) == 1
+
+
+def test_changed_body_is_copied_verified_and_swapped(index_versions, collection):
+    first = deploy(index_versions, collection, index_body())["index"]
+    fill(collection, first, 25)
+
+    result = deploy(
+        index_versions,
+        collection,
+        index_body(ef_search=128),
+        warm_up=lambda client, name: {"method": "search"},
+    )
+
+    assert result["copied"] == 25
+    assert result["recall"] == 1.0
+    assert result["warmup"] == {"method": "search"}
+    assert collection.aliases[ALIAS] == {result["index"]}
+    # The previous version is deleted once the alias moved.
+    assert first not in collection.bodies
+    assert sorted(s[TEXT] for s in collection.sources(ALIAS)) == sorted(
+        f"chunk {i}" for i in range(25)
+    )
+
+
+def test_legacy_index_is_replaced_by_a_version(index_versions, collection):
+    collection.bodies[ALIAS] = index_body()
+    fill(collection, ALIAS, 4)
+
+    result = deploy(index_versions, collection, index_body())
+
+    assert result["copied"] == 4
+    assert {"remove_index": {"index": ALIAS}} in collection.alias_updates[-1]
+    assert ALIAS not in collection.bodies
+    assert collection.count(ALIAS) == {"count": 4}
+
+
+def test_new_embedding_size_is_refused(index_versions, collection):
+    first = deploy(index_versions, collection, index_body())["index"]
+    fill(collection, first, 2)
+
+    with pytest.raises(index_versions.IndexVersionError, match="dimension 4 != 8"):
+        deploy(index_versions, collection, index_body(dimension=8))
+
+    assert collection.aliases[ALIAS] == {first}
+
+
+def test_copy_with_other_chunks_fails_verification(index_versions, collection):
+    collection.bodies["serving"] = collection.bodies["copy"] = index_body()
+    fill(collection, "serving", 6)
+    for i in range(6):
+        collection.documents[("copy", str(i))] = dict(chunk(i), **{TEXT: "other"})
+
+    with pytest.raises(index_versions.IndexVersionError, match="Recall"):
+        index_versions.verify_copy(collection, "serving", "copy", "embedding")
+
+
+def test_delete_removes_every_version(index_versions, collection):
+    deploy(index_versions, collection, index_body())
+    deploy(index_versions, collection, index_body(ef_search=128))
+
+    index_versions.delete_versions(collection, ALIAS)
+
+    assert collection.bodies == {}
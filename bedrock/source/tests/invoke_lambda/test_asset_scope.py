@@ -0,0 +1,100 @@
+import pytest
+
+ASSETS = {
+    "asset-mash-tun": ("model-mash-tun", "MashTun"),
+    "asset-mashing": ("model-area", "Area"),
+}
+
+
+class FakeSiteWise:
+    def __init__(self):
+        self.calls = 0
+
+    def describe_asset(self, assetId):
+        self.calls += 1
+        if assetId not in ASSETS:
+            raise KeyError(assetId)
+        return {"assetModelId": ASSETS[assetId][0]}
+
+    def describe_asset_model(self, assetModelId):
+        return {
+            "assetModelName": next(
+                name for model_id, name in ASSETS.values() if model_id == assetModelId
+            )
+        }
+
+
+@pytest.fixture
+def sitewise(invoke_module):
+    sitewise = FakeSiteWise()
+    invoke_module("clients").set_client("iotsitewise", sitewise)
+    return sitewise
+
+
+@pytest.fixture
+def asset_scope(invoke_module, sitewise, monkeypatch):
+    asset_scope = invoke_module("asset_scope")
+    monkeypatch.setattr(asset_scope, "KNOWLEDGE_BASE_ID", "KB1234")
+    monkeypatch.setattr(asset_scope, "RETRIEVAL_SCOPED_MODELS", {"MashTun"})
+    return asset_scope
+
+
+def test_most_recent_asset_with_documents_is_picked(asset_scope, sitewise):
+    assert asset_scope.scoped_model(["asset-mash-tun", "asset-mashing"]) == "MashTun"
+    assert asset_scope.scoped_model(["asset-mashing", "unknown"]) is None
+    assert asset_scope.scoped_model([]) is None
+
+    # Resolved models are cached, failed lookups are retried.
+    asset_scope.scoped_model(["asset-mash-tun", "asset-mashing", "unknown"])
+    assert sitewise.calls == 4
+
+
+def test_session_state_filters_to_the_model_and_shared_documents(asset_scope):
+    session_state = asset_scope.scope_session_state(
+        {"promptSessionAttributes": {"turn": "2"}}, "MashTun"
+    )
+
+    assert session_state["promptSessionAttributes"] == {
+        "turn": "2",
+        "asset_model": "MashTun",
+    }
+    [configuration] = session_state["knowledgeBaseConfigurations"]
+    assert configuration["knowledgeBaseId"] == "KB1234"
+    assert configuration["retrievalConfiguration"]["vectorSearchConfiguration"][
+        "filter"
+    ] == {
+        "orAll": [
+            {"equals": {"key": "equipment_model", "value": "MashTun"}},
+            {"in": {"key": "document_type", "value": ["recipe"]}},
+        ]
+    }
+
+
+def test_unscoped_sessions_are_left_alone(asset_scope, monkeypatch):
+    session_state = {"promptSessionAttributes": {}}
+
+    assert asset_scope.scope_session_state(session_state, None) is session_state
+    monkeypatch.setattr(asset_scope, "KNOWLEDGE_BASE_ID", None)
+    assert asset_scope.scope_session_state(session_state, "MashTun") is session_state
+
+
+def test_next_turn_is_scoped_to_the_asset_looked_up(
+    invoke_module, asset_scope, monkeypatch
+):
+    chat = invoke_module("routes.chat")
+    session_store = invoke_module("session_store")
+    session_store.set_session_store(session_store.InMemorySessionStore())
+    monkeypatch.setattr(chat, "COALESCE_WINDOW_SECONDS", 0)
+    session_states = []
+
+    def invoke_and_format(query, agent_session, on_chunk, trace_level, session_state):
+        session_states.append(session_state)
+        return {"answer": "It is running."}, {"asset_ids": ["asset-mash-tun"]}
+
+    monkeypatch.setattr(chat, "invoke_and_format", invoke_and_format)
+
+    chat.answer_query("Is MashTun100 running?", "session-a")
+    chat.answer_query("How do I clean it?", "session-a")
+
+    assert "knowledgeBaseConfigurations" not in (session_states[0] or {})
+    assert session_states[1]["promptSessionAttributes"]["asset_model"] == "MashTun"
@@ -0,0 +1,93 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+
+class FakeSecretsManager:
+    def __init__(self, current, previous=None):
+        self.values = {"AWSCURRENT": current, "AWSPREVIOUS": previous}
+        self.reads = 0
+
+    def get_secret_value(self, SecretId, VersionStage):
+        self.reads += 1
+        value = self.values[VersionStage]
+        if value is None:
+            raise ClientError(
+                {"Error": {"Code": "ResourceNotFoundException"}}, "GetSecretValue"
+            )
+        return {"SecretString": json.dumps({"headerValue": value})}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def auth(invoke_module, monkeypatch, clock):
+    clients = invoke_module("clients")
+    auth = invoke_module("auth")
+    monkeypatch.setattr(auth, "time", SimpleNamespace(monotonic=clock))
+    yield auth
+    clients.reset()
+
+
+@pytest.fixture
+def secrets(invoke_module):
+    secrets = FakeSecretsManager("current")
+    invoke_module("clients").set_client("secretsmanager", secrets)
+    return secrets
+
+
+def test_header_is_looked_up_case_insensitively(auth):
+    assert auth.get_header({"x-origin-verify": "v"}, "X-Origin-Verify") == "v"
+    assert auth.get_header(None, "X-Origin-Verify") is None
+
+
+def test_current_and_previous_values_are_accepted(auth, secrets):
+    secrets.values["AWSPREVIOUS"] = "previous"
+    verifier = auth.OriginVerifier("secret")
+
+    assert verifier.verify({"X-Origin-Verify": "current"})
+    assert verifier.verify({"X-Origin-Verify": "previous"})
+    assert not verifier.verify({"X-Origin-Verify": "forged"})
+    assert not verifier.verify({})
+    # Both stages are read once; mismatches don't refresh right away.
+    assert secrets.reads == 2
+
+
+def test_mismatch_refreshes_early_for_a_rotated_secret(auth, secrets, clock):
+    verifier = auth.OriginVerifier(
+        "secret", refresh_seconds=300, min_refresh_seconds=30
+    )
+    assert verifier.verify({"X-Origin-Verify": "current"})
+
+    secrets.values.update(AWSCURRENT="rotated", AWSPREVIOUS="current")
+    assert not verifier.verify({"X-Origin-Verify": "rotated"})
+    clock.now += 30
+
+    assert verifier.verify({"X-Origin-Verify": "rotated"})
+    assert verifier.verify({"X-Origin-Verify": "current"})
+
+
+def test_cached_values_are_used_while_secrets_manager_fails(auth, secrets, clock):
+    verifier = auth.OriginVerifier("secret", refresh_seconds=300)
+    assert verifier.verify({"X-Origin-Verify": "current"})
+
+    def fail(**kwargs):
+        raise ClientError({"Error": {"Code": "InternalServiceError"}}, "GetSecretValue")
+
+    secrets.get_secret_value = fail
+    clock.now += 300
+
+    assert verifier.verify({"X-Origin-Verify": "current"})
@@ -0,0 +1,145 @@
+import json
+
+import pytest
+from aws_lambda_powertools.event_handler import APIGatewayRestResolver
+
+
+@pytest.fixture
+def batch(invoke_module, monkeypatch):
+    batch = invoke_module("routes.batch")
+    job_store = invoke_module("job_store")
+    job_store.set_job_store(job_store.InMemoryJobStore())
+
+    def answer_query(query, session_id, trace_level=None, max_wait=None):
+        batch.waits.append(max_wait)
+        if query == "fail":
+            raise RuntimeError("agent failed")
+        return {"answer": f"{query} ({session_id})"}
+
+    monkeypatch.setattr(batch, "answer_query", answer_query)
+    monkeypatch.setattr(batch, "waits", [], raising=False)
+    return batch
+
+
+def post(batch, body):
+    app = APIGatewayRestResolver()
+    app.include_router(batch.router)
+    event = {
+        "httpMethod": "POST",
+        "path": "/chat/batch",
+        "resource": "/chat/batch",
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(body),
+        "requestContext": {"requestId": "request-1", "stage": "prod"},
+    }
+    response = app.resolve(event, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_items_get_their_own_sessions(batch):
+    items, max_concurrency = batch.normalize_batch_request(
+        {
+            "session_id": "chat-1",
+            "queries": ["Is the pump running?", {"query": "q", "session_id": "s"}],
+            "max_concurrency": "4",
+        }
+    )
+
+    assert items == [
+        {"index": 0, "query": "Is the pump running?", "session_id": "chat-1-batch-0"},
+        {"index": 1, "query": "q", "session_id": "s"},
+    ]
+    assert max_concurrency == 4
+
+
+@pytest.mark.parametrize("max_concurrency", [0, -1, 1.5, "two", True, None])
+def test_invalid_max_concurrency_is_rejected(batch, max_concurrency):
+    with pytest.raises(ValueError):
+        batch.normalize_batch_request(
+            {"session_id": "chat-1", "queries": [], "max_concurrency": max_concurrency}
+        )
+
+
+def test_invalid_batch_request_is_a_bad_request(batch):
+    status, body = post(
+        batch, {"session_id": "chat-1", "queries": ["q"], "max_concurrency": 0}
+    )
+
+    assert status == 400
+    assert "max_concurrency" in body["message"]
+
+
+def test_failures_are_isolated_and_results_ordered(batch):
+    items, _ = batch.normalize_batch_request(
+        {"session_id": "chat-1", "queries": ["a", "fail", "c"]}
+    )
+    finished = []
+
+    results = batch.run_batch(items, max_concurrency=2, on_result=finished.append)
+
+    assert [result["ok"] for result in results] == [True, False, True]
+    assert results[1]["error"] == "agent failed"
+    assert results[2]["response"] == {"answer": "c (chat-1-batch-2)"}
+    assert len(finished) == 3
+
+
+def test_batch_job_stores_item_results_apart(batch, invoke_module):
+    chat = invoke_module("routes.chat")
+    job_store = invoke_module("job_store").get_job_store()
+    items, max_concurrency = batch.normalize_batch_request(
+        {"session_id": "chat-1", "queries": ["a", "fail"]}
+    )
+    job = job_store.create({"items": items, "max_concurrency": max_concurrency})
+
+    assert batch.run_batch_job(job["job_id"]) == {"ok": True}
+
+    stored = job_store.get(job["job_id"])
+    assert stored["status"] == "SUCCEEDED"
+    assert stored["result"] == {"total": 2, "completed": 2, "failed": 1}
+    response = chat.get_chat_job(job["job_id"])["response"]
+    assert [result["ok"] for result in response["results"]] == [True, False]
+
+
+class FakeContext:
+    def __init__(self, remaining_millis):
+        self.remaining_millis = remaining_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis
+
+
+def test_batch_job_waits_as_long_as_the_lambda_runs(batch, invoke_module):
+    chat = invoke_module("routes.chat")
+    job_store = invoke_module("job_store").get_job_store()
+    items, max_concurrency = batch.normalize_batch_request(
+        {"session_id": "chat-1", "queries": ["a"]}
+    )
+    job = job_store.create({"items": items, "max_concurrency": max_concurrency})
+
+    chat.run_job(
+        {"chat_job_id": job["job_id"], "job_kind": "batch"}, FakeContext(600_000)
+    )
+
+    expected = 600 - chat.JOB_DEADLINE_MARGIN_SECONDS
+    assert expected - 5 < batch.waits[0] <= expected
+
+
+def test_jobs_on_threads_wait_without_limit(batch, invoke_module):
+    job_store = invoke_module("job_store").get_job_store()
+    items, max_concurrency = batch.normalize_batch_request(
+        {"session_id": "chat-1", "queries": ["a"]}
+    )
+    job = job_store.create({"items": items, "max_concurrency": max_concurrency})
+
+    invoke_module("routes.chat").run_job(
+        {"chat_job_id": job["job_id"], "job_kind": "batch"}
+    )
+
+    assert batch.waits == [None]
+
+
+def test_sync_batch_waits_within_the_api_timeout(batch):
+    status, _ = post(batch, {"session_id": "chat-1", "queries": ["a", "b"]})
+
+    assert status == 200
+    assert all(0 < wait <= batch.COALESCE_MAX_WAIT_SECONDS for wait in batch.waits)
@@ -0,0 +1,74 @@
+import pytest
+
+
+@pytest.fixture
+def chat(invoke_module, monkeypatch):
+    chat = invoke_module("routes.chat")
+    job_store = invoke_module("job_store")
+
+    class RecordingJobStore(job_store.InMemoryJobStore):
+        def __init__(self):
+            super().__init__()
+            self.partials = []
+
+        def update(self, job_id, **fields):
+            if "partial" in fields:
+                self.partials.append(fields["partial"]["answer"])
+            return super().update(job_id, **fields)
+
+    job_store.set_job_store(RecordingJobStore())
+    return chat
+
+
+def streaming_answer(*chunks, error=None):
+    def answer_query(query, session_id, on_chunk=None, **kwargs):
+        text = ""
+        for chunk in chunks:
+            text += chunk
+            on_chunk(text)
+        if error:
+            raise error
+        return {"answer": text, "source": ""}
+
+    return answer_query
+
+
+def test_partial_answers_are_throttled(chat, monkeypatch):
+    monkeypatch.setattr(chat, "JOB_PARTIAL_WRITE_SECONDS", 60)
+    monkeypatch.setattr(chat, "answer_query", streaming_answer("a", "b", "c"))
+    job_store = chat.get_job_store()
+    job = job_store.create({"query": "q", "session_id": "chat-1"})
+
+    assert chat.run_chat_job(job["job_id"]) == {"ok": True}
+
+    # The first chunk is written at once, the rest with the outcome.
+    assert job_store.partials == ["a", "abc"]
+    assert job_store.get(job["job_id"])["result"]["answer"] == "abc"
+
+
+def test_failed_jobs_keep_the_last_partial_answer(chat, monkeypatch):
+    monkeypatch.setattr(chat, "JOB_PARTIAL_WRITE_SECONDS", 60)
+    monkeypatch.setattr(
+        chat,
+        "answer_query",
+        streaming_answer("a", "b", error=RuntimeError("stream broke")),
+    )
+    job_store = chat.get_job_store()
+    job = job_store.create({"query": "q", "session_id": "chat-1"})
+
+    assert chat.run_chat_job(job["job_id"]) == {"ok": False}
+
+    stored = job_store.get(job["job_id"])
+    assert stored["status"] == "FAILED"
+    assert stored["partial"] == {"answer": "ab"}
+
+
+def test_every_chunk_is_written_without_an_interval(chat, monkeypatch):
+    monkeypatch.setattr(chat, "JOB_PARTIAL_WRITE_SECONDS", 0)
+    monkeypatch.setattr(chat, "answer_query", streaming_answer("a", "b", "c"))
+    job_store = chat.get_job_store()
+    job = job_store.create({"query": "q", "session_id": "chat-1"})
+
+    chat.run_chat_job(job["job_id"])
+
+    assert job_store.partials == ["a", "ab", "abc"]
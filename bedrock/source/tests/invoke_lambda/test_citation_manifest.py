@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+MANIFEST = {
+    "documents": {
+        "s3://assets/data/sop/mash-tun.docx": {
+            "title": "Mash Tun Cleaning",
+            "url": "https://docs/mash-tun",
+            "doc_type": "sop",
+            "sections": [],
+        }
+    }
+}
+
+
+class FakeS3:
+    def __init__(self, error_code=None):
+        self.error_code = error_code
+        self.requests = []
+
+    def get_object(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.error_code:
+            raise ClientError({"Error": {"Code": self.error_code}}, "GetObject")
+        if kwargs.get("IfNoneMatch") == '"v1"':
+            raise ClientError({"Error": {"Code": "304"}}, "GetObject")
+        return {"Body": io.BytesIO(json.dumps(MANIFEST).encode()), "ETag": '"v1"'}
+
+
+@pytest.fixture
+def citation_manifest(invoke_module):
+    clients = invoke_module("clients")
+    yield invoke_module("citation_manifest")
+    clients.reset()
+
+
+def test_manifest_is_loaded_once_and_rechecked_by_etag(
+    citation_manifest, invoke_module
+):
+    s3 = FakeS3()
+    invoke_module("clients").set_client("s3", s3)
+    manifest = citation_manifest.CitationManifest("assets", "manifest.json")
+
+    entry = manifest.get("s3://assets/data/sop/mash-tun.docx")
+    assert entry["title"] == "Mash Tun Cleaning"
+    assert manifest.get("s3://assets/data/sop/other.docx") is None
+    assert len(s3.requests) == 1
+
+    # An unchanged manifest isn't downloaded again.
+    manifest.refresh(force=True)
+    assert s3.requests[-1]["IfNoneMatch"] == '"v1"'
+    assert manifest.get("s3://assets/data/sop/mash-tun.docx") == entry
+
+
+@pytest.mark.parametrize("error_code", ["NoSuchKey", "AccessDenied"])
+def test_missing_manifest_falls_back_to_reading_documents(
+    citation_manifest, invoke_module, error_code
+):
+    invoke_module("clients").set_client("s3", FakeS3(error_code))
+    manifest = citation_manifest.CitationManifest("assets", "manifest.json")
+
+    assert manifest.get("s3://assets/data/sop/mash-tun.docx") is None
+
+
+def test_no_bucket_means_no_manifest(citation_manifest):
+    manifest = citation_manifest.CitationManifest(None, "manifest.json")
+
+    assert manifest.get("s3://assets/data/sop/mash-tun.docx") is None
@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def citations(invoke_module):
+    return invoke_module("citations")
+
+
+def reference(uri):
+    return {"location": {"s3Location": {"uri": uri}}}
+
+
+def test_references_from_every_lookup_are_deduplicated(citations):
+    collector = citations.CitationCollector()
+
+    collector.add_references([reference("s3://kb/a.md"), {"location": {}}])
+    collector.add_references([reference("s3://kb/b.md"), reference("s3://kb/a.md")])
+
+    assert collector.uris == ["s3://kb/a.md", "s3://kb/b.md"]
+    assert collector.resolved() == ["s3://kb/a.md", "s3://kb/b.md"]
+
+
+def test_uris_are_resolved_once_while_collecting(citations):
+    calls = []
+    lock = threading.Lock()
+
+    def resolver(uri):
+        with lock:
+            calls.append(uri)
+        return (uri.rsplit("/", 1)[1], f"https://docs/{uri[-4:]}")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        collector = citations.CitationCollector(resolver, executor)
+        collector.add(["s3://kb/a.md", "s3://kb/b.md"])
+        collector.add(["s3://kb/b.md", "s3://kb/c.md"])
+        resolved = collector.resolved()
+
+    assert sorted(calls) == ["s3://kb/a.md", "s3://kb/b.md", "s3://kb/c.md"]
+    assert [title for title, link in resolved] == ["a.md", "b.md", "c.md"]
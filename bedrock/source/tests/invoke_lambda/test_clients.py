@@ -0,0 +1,55 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def clients(invoke_module):
+    clients = invoke_module("clients")
+    yield clients
+    clients.reset()
+
+
+def test_clients_are_shared(clients):
+    assert clients.get_client("s3") is clients.get_client("s3")
+
+
+def test_only_agent_calls_wait_for_long_responses(clients):
+    agent = clients.get_client("bedrock-agent-runtime")
+    s3 = clients.get_client("s3")
+
+    assert agent.meta.config.read_timeout == 900
+    assert s3.meta.config.read_timeout == 60
+    # Everything else in the shared configuration still applies.
+    assert agent.meta.config.max_pool_connections == (
+        clients.CLIENT_CONFIG.max_pool_connections
+    )
+
+
+def test_reset_drops_replaced_clients(clients):
+    fake = object()
+    clients.set_client("s3", fake)
+    assert clients.get_client("s3") is fake
+
+    clients.reset()
+
+    assert clients.get_client("s3") is not fake
+
+
+def test_disabled_tracing_does_not_import_the_xray_sdk(invoke_module, monkeypatch):
+    monkeypatch.delitem(sys.modules, "aws_xray_sdk.core", raising=False)
+    tracing = invoke_module("tracing")
+    tracer = tracing.get_tracer()
+
+    @tracer.capture_method
+    def method():
+        return "result"
+
+    @tracer.capture_lambda_handler(capture_response=False)
+    def handler(event, context):
+        return event
+
+    assert isinstance(tracer, tracing.NullTracer)
+    assert method() == "result"
+    assert handler("event", None) == "event"
+    assert "aws_xray_sdk.core" not in sys.modules
@@ -0,0 +1,226 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def coalescing(invoke_module):
+    return invoke_module("coalescing")
+
+
+class WatchedEvent(threading.Event):
+    """
+    Event that tells when someone waits on it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.waiting = threading.Event()
+
+    def wait(self, timeout=None):
+        self.waiting.set()
+        return super().wait(timeout)
+
+
+def follow(single_flight, key, target):
+    """
+    Start a follower of the running call of key and return it once it waits.
+    """
+    done = single_flight._calls[key].done = WatchedEvent()
+    follower = threading.Thread(target=target)
+    follower.start()
+    assert done.waiting.wait(5)
+    return follower
+
+
+def test_key_ignores_case_whitespace_and_punctuation(coalescing):
+    key = coalescing.coalescing_key("Why is the pump  noisy?", now=100)
+
+    assert key == coalescing.coalescing_key(" why is the pump noisy", now=100)
+
+
+def test_key_changes_with_window_and_scope(coalescing):
+    key = coalescing.coalescing_key("pump noise", window_seconds=30, now=100)
+
+    assert key == coalescing.coalescing_key("pump noise", window_seconds=30, now=119)
+    assert key != coalescing.coalescing_key("pump noise", window_seconds=30, now=120)
+    assert key != coalescing.coalescing_key(
+        "pump noise", window_seconds=30, now=100, scope="Fermenter:session-2"
+    )
+
+
+def test_concurrent_callers_share_one_call(coalescing):
+    single_flight = coalescing.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.do("k", fn)))
+    leader.start()
+    started.wait(5)
+    follower = follow(
+        single_flight, "k", lambda: results.append(single_flight.do("k", fn))
+    )
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert calls == [1]
+    assert sorted(results) == [("answer", False), ("answer", True)]
+
+
+def test_follower_gets_the_leader_error(coalescing):
+    single_flight = coalescing.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("agent failed")
+
+    errors = []
+
+    def call():
+        try:
+            single_flight.do("k", fn)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = follow(single_flight, "k", call)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2
+
+
+def test_follower_stops_waiting_after_max_wait(coalescing):
+    single_flight = coalescing.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    leader = threading.Thread(target=lambda: single_flight.do("k", fn))
+    leader.start()
+    started.wait(5)
+    try:
+        with pytest.raises(coalescing.CoalescingTimeout):
+            single_flight.do("k", fn, max_wait=0.05)
+    finally:
+        release.set()
+        leader.join(5)
+
+
+def test_shared_result_is_reused_by_other_containers(coalescing):
+    store = coalescing.InMemoryFlightStore()
+
+    first = coalescing.SingleFlight(store).do("k", lambda: "answer")
+    second = coalescing.SingleFlight(store).do("k", lambda: "other")
+
+    assert first == ("answer", False)
+    assert second == ("answer", True)
+
+
+def test_failed_leader_releases_the_shared_lease(coalescing):
+    store = coalescing.InMemoryFlightStore()
+
+    def fail():
+        raise RuntimeError("agent failed")
+
+    with pytest.raises(RuntimeError):
+        coalescing.SingleFlight(store).do("k", fail)
+
+    # Another container takes over at once instead of after the lease.
+    assert coalescing.SingleFlight(store, poll_interval=0.01).do(
+        "k", lambda: "answer", max_wait=0.05
+    ) == ("answer", False)
+
+
+def test_shared_follower_stops_waiting_for_a_held_lease(coalescing):
+    store = coalescing.InMemoryFlightStore()
+    assert store.acquire("k", lease_seconds=60)
+    calls = []
+
+    with pytest.raises(coalescing.CoalescingTimeout):
+        coalescing.SingleFlight(store, poll_interval=0.01).do(
+            "k", lambda: calls.append(1), max_wait=0.05
+        )
+
+    assert calls == []
+
+
+def test_shared_follower_without_max_wait_waits_for_the_leader(coalescing):
+    store = coalescing.InMemoryFlightStore()
+    assert store.acquire("k", lease_seconds=60)
+    # The follower keeps polling until the leader publishes.
+    leader = threading.Timer(0.2, store.publish, args=("k", "answer"))
+    leader.start()
+
+    result = coalescing.SingleFlight(store, poll_interval=0.01).do(
+        "k", lambda: "own answer", max_wait=None
+    )
+
+    leader.join()
+    assert result == ("answer", True)
+
+
+def test_release_keeps_a_published_result(coalescing):
+    store = coalescing.InMemoryFlightStore()
+    store.acquire("k", lease_seconds=60)
+    store.publish("k", "answer")
+
+    store.release("k")
+
+    assert store.get_result("k") == "answer"
+
+
+def test_follow_ups_are_not_shared_across_sessions(invoke_module, monkeypatch):
+    chat = invoke_module("routes.chat")
+    session_store = invoke_module("session_store")
+    coalescing = invoke_module("coalescing")
+    session_store.set_session_store(session_store.InMemorySessionStore())
+    coalescing.set_single_flight(
+        coalescing.SingleFlight(coalescing.InMemoryFlightStore())
+    )
+    invocations = []
+
+    states = []
+
+    def invoke_and_format(query, agent_session, on_chunk, trace_level, state):
+        invocations.append(agent_session)
+        states.append(state)
+        return {"answer": f"answer {len(invocations)}"}, {"asset_ids": []}
+
+    monkeypatch.setattr(chat, "invoke_and_format", invoke_and_format)
+
+    # First turns are shared, the coalesced answer is recorded in both.
+    first = chat.answer_query("Is the pump running?", "session-a")
+    assert chat.answer_query("is the pump running", "session-b") == first
+    assert len(invocations) == 1
+    store = session_store.get_session_store()
+    assert store.get("session-a")["turns"] == [["Is the pump running?", "answer 1"]]
+    assert store.get("session-b")["turns"] == []
+
+    chat.answer_query("And the fermenter?", "session-a")
+    chat.answer_query("And the fermenter?", "session-b")
+    assert len(invocations) == 3
+    assert invocations[1] != invocations[2]
+    # Session b's agent never saw the shared exchange, it gets it as summary.
+    assert states[1] is None
+    assert states[2] == {
+        "promptSessionAttributes": {
+            "conversation_summary": "Q: is the pump running A: answer 1"
+        }
+    }
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def hybrid_search(invoke_module):
+    return invoke_module("hybrid_search")
+
+
+def hit(hit_id, score, source="s3://kb/sop.md"):
+    return {
+        "_id": hit_id,
+        "_score": score,
+        "_source": {
+            "AMAZON_BEDROCK_TEXT_CHUNK": f"chunk {hit_id}",
+            "x-amz-bedrock-kb-source-uri": source,
+        },
+    }
+
+
+def test_equipment_tags_are_found_once(hybrid_search):
+    tags = hybrid_search.equipment_tags(
+        "BoilKettle100 trips when FV-101 opens, is BoilKettle100 faulty?"
+    )
+
+    assert tags == ["BoilKettle100", "FV-101"]
+    assert hybrid_search.equipment_tags("the kettle is cold") == []
+
+
+def test_lexical_query_boosts_the_named_equipment(hybrid_search):
+    query = hybrid_search.lexical_query(
+        "MashTun100 is leaking", 20, filters={"document_type": ["sop", "manual"]}
+    )
+
+    should = query["query"]["bool"]["should"]
+    assert {"terms": {"equipment": ["mashtun100"], "boost": 2.0}} in should
+    assert query["query"]["bool"]["filter"] == [
+        {"terms": {"document_type": ["sop", "manual"]}}
+    ]
+
+
+def test_knn_query_filters_during_the_search(hybrid_search):
+    query = hybrid_search.knn_query([0.1, 0.2], 8, filters={"equipment": "mashtun100"})
+
+    knn = query["query"]["knn"][hybrid_search.VECTOR_FIELD_NAME]
+    assert knn["k"] == 8
+    assert knn["filter"] == {
+        "bool": {"filter": [{"term": {"equipment": "mashtun100"}}]}
+    }
+    assert (
+        "filter"
+        not in hybrid_search.knn_query([0.1], 8)["query"]["knn"][
+            hybrid_search.VECTOR_FIELD_NAME
+        ]
+    )
+
+
+def test_fuse_weights_normalized_scores(hybrid_search):
+    lexical = [hit("a", 12.0), hit("b", 2.0)]
+    vector = [hit("b", 0.9), hit("c", 0.5)]
+
+    fused = hybrid_search.fuse(lexical, vector, lexical_weight=0.3)
+
+    assert [h["_id"] for h in fused] == ["b", "a", "c"]
+    assert fused[0]["_score"] == pytest.approx(0.7)
+    assert fused[1]["_score"] == pytest.approx(0.3)
+    assert fused[2]["_score"] == 0.0
+    assert hybrid_search.fuse(lexical, vector, size=1)[0]["_id"] == "b"
+
+
+def test_equal_scores_normalize_to_one(hybrid_search):
+    assert hybrid_search.min_max_normalize([hit("a", 3.0), hit("b", 3.0)]) == {
+        "a": 1.0,
+        "b": 1.0,
+    }
+    assert hybrid_search.min_max_normalize([]) == {}
+
+
+class FakeSearchClient:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.bodies = []
+
+    def msearch(self, body):
+        self.bodies.append(body)
+        return {"responses": self.responses}
+
+
+def test_retriever_sends_both_queries_in_one_request(hybrid_search):
+    client = FakeSearchClient(
+        {"hits": {"hits": [hit("a", 5.0), hit("b", 1.0)]}},
+        {"hits": {"hits": [hit("b", 0.8), hit("a", 0.4)]}},
+    )
+    retriever = hybrid_search.HybridRetriever(
+        client, index_name="kb-index", embed=lambda text: [0.1, 0.2], candidate_factor=2
+    )
+
+    results = retriever.retrieve("MashTun100 leaking", k=1)
+
+    [body] = client.bodies
+    lines = [json.loads(line) for line in body.strip().split("\n")]
+    assert lines[0] == lines[2] == {"index": "kb-index"}
+    assert lines[1]["size"] == lines[3]["size"] == 2
+    assert results == [
+        {
+            "text": "chunk b",
+            "source": "s3://kb/sop.md",
+            "score": pytest.approx(0.7),
+            "lexical_score": 0.0,
+            "vector_score": 1.0,
+        }
+    ]
+
+
+def test_retriever_raises_on_a_failed_query(hybrid_search):
+    client = FakeSearchClient(
+        {"hits": {"hits": []}}, {"error": {"type": "index_not_found_exception"}}
+    )
+    retriever = hybrid_search.HybridRetriever(client, embed=lambda text: [0.1])
+
+    with pytest.raises(RuntimeError, match="index_not_found_exception"):
+        retriever.retrieve("pump")
@@ -0,0 +1,109 @@
+import pytest
+
+
+@pytest.fixture
+def job_store(invoke_module):
+    return invoke_module("job_store")
+
+
+class FakeTable:
+    name = "chat-state"
+
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, Item):
+        self.items[Item["pk"]] = dict(Item)
+
+
+class FakeResource:
+    """
+    BatchGetItem over a FakeTable that leaves the last key of every request
+    unprocessed once.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.requests = []
+        self._deferred = set()
+
+    def batch_get_item(self, RequestItems):
+        request = RequestItems[self.table.name]
+        keys = [key["pk"] for key in request["Keys"]]
+        self.requests.append(keys)
+        assert len(keys) <= 100
+
+        unprocessed = []
+        if len(keys) > 1 and keys[-1] not in self._deferred:
+            self._deferred.add(keys[-1])
+            unprocessed, keys = [{"pk": keys[-1]}], keys[:-1]
+        response = {
+            "Responses": {
+                self.table.name: [
+                    self.table.items[key] for key in keys if key in self.table.items
+                ]
+            }
+        }
+        if unprocessed:
+            response["UnprocessedKeys"] = {self.table.name: {"Keys": unprocessed}}
+        return response
+
+
+def test_create_stores_a_pending_job(job_store):
+    store = job_store.InMemoryJobStore()
+
+    job = store.create({"query": "Why is the mash tun leaking?"})
+
+    assert job["status"] == job_store.JOB_PENDING
+    assert store.get(job["job_id"]) == job
+
+
+def test_update_returns_a_copy(job_store):
+    store = job_store.InMemoryJobStore()
+    job = store.create({})
+
+    updated = store.update(job["job_id"], status=job_store.JOB_RUNNING)
+    updated["status"] = "changed"
+
+    assert store.get(job["job_id"])["status"] == job_store.JOB_RUNNING
+    assert store.get("missing") is None
+
+
+def test_item_results_are_none_until_stored(job_store):
+    store = job_store.InMemoryJobStore()
+    job = store.create({"items": [{}, {}, {}]})
+
+    store.put_item_result(job["job_id"], 2, {"answer": "c"})
+    store.put_item_result(job["job_id"], 0, {"answer": "a"})
+
+    assert store.get_item_results(job["job_id"], 3) == [
+        {"answer": "a"},
+        None,
+        {"answer": "c"},
+    ]
+
+
+def test_incomplete_store_fails_on_creation(job_store):
+    class PutOnly(job_store.JobStore):
+        def put(self, job):
+            pass
+
+    with pytest.raises(TypeError):
+        PutOnly()
+
+
+def test_dynamodb_item_results_are_read_in_chunks(job_store, monkeypatch):
+    table = FakeTable()
+    resource = FakeResource(table)
+    monkeypatch.setattr(job_store, "get_resource", lambda service_name: resource)
+    store = job_store.DynamoDBJobStore.__new__(job_store.DynamoDBJobStore)
+    store.table = table
+
+    for index in range(0, 250, 2):
+        store.put_item_result("job-1", index, {"index": index})
+    results = store.get_item_results("job-1", 250)
+
+    assert results == [{"index": i} if i % 2 == 0 else None for i in range(250)]
+    # Three chunks of at most 100 keys, each retrying one unprocessed key.
+    assert [len(keys) for keys in resource.requests] == [100, 1, 100, 1, 50, 1]
+    assert table.items["job#job-1#4"]["expires_at"] > 0
@@ -0,0 +1,68 @@
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture
+def latency(invoke_module):
+    return invoke_module("latency")
+
+
+def test_phases_marks_and_total_reach_the_sinks(latency):
+    sink = latency.LocalSink()
+    recorder = latency.LatencyRecorder(sinks=[sink], route="chat")
+
+    with recorder.phase("agent_invoke", model="claude"):
+        pass
+    recorder.mark("first_token")
+    recorder.mark("first_token")
+    recorder.emit()
+
+    [record] = sink.records
+    assert [phase["name"] for phase in record["phases"]] == [
+        "agent_invoke",
+        "first_token",
+        "total",
+    ]
+    assert record["phases"][0]["annotations"] == {"model": "claude"}
+    assert record["properties"] == {"route": "chat"}
+
+
+def test_emf_sink_writes_one_metric_per_phase(latency):
+    stream = io.StringIO()
+    phases = [
+        {"name": "orchestration_step", "duration_ms": 10.0},
+        {"name": "orchestration_step", "duration_ms": 20.0},
+        {"name": "total", "duration_ms": 35.0},
+    ]
+
+    latency.EMFSink(namespace="Test", stream=stream).emit(phases, {"route": "chat"})
+
+    record = json.loads(stream.getvalue())
+    [metrics] = record["_aws"]["CloudWatchMetrics"]
+    assert metrics["Namespace"] == "Test"
+    assert [metric["Name"] for metric in metrics["Metrics"]] == [
+        "orchestration_step",
+        "total",
+    ]
+    assert record["orchestration_step"] == [10.0, 20.0]
+    assert record["total"] == 35.0
+    assert record["route"] == "chat"
+
+
+def test_failing_sink_does_not_fail_the_request(latency):
+    class BrokenSink:
+        def emit(self, phases, properties):
+            raise RuntimeError("no stdout")
+
+    sink = latency.LocalSink()
+    latency.LatencyRecorder(sinks=[BrokenSink(), sink]).emit()
+
+    assert len(sink.records) == 1
+
+
+def test_xray_sink_is_skipped_while_tracing_is_disabled(latency):
+    sinks = latency.create_sinks("emf, xray, local")
+
+    assert [type(sink).__name__ for sink in sinks] == ["EMFSink", "LocalSink"]
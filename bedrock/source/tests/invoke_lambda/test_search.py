@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from aws_lambda_powertools.event_handler import APIGatewayRestResolver
+
+
+class FakeRetriever:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve(self, text, k=5, filters=None):
+        self.calls.append((text, k, filters))
+        return [{"text": "chunk", "source": "s3://kb/sop.md", "score": 1.0}]
+
+
+@pytest.fixture
+def search(invoke_module, monkeypatch):
+    search = invoke_module("routes.search")
+    retriever = FakeRetriever()
+    invoke_module("hybrid_search").set_hybrid_retriever(retriever)
+    monkeypatch.setattr(search, "COLLECTION_HOST", "https://collection.aoss")
+    monkeypatch.setattr(search, "retriever", retriever, raising=False)
+    return search
+
+
+def post(search, body):
+    app = APIGatewayRestResolver()
+    app.include_router(search.router)
+    event = {
+        "httpMethod": "POST",
+        "path": "/search",
+        "resource": "/search",
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(body),
+        "requestContext": {"requestId": "request-1", "stage": "prod"},
+    }
+    response = app.resolve(event, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_search_returns_hybrid_results(search):
+    status, body = post(
+        search,
+        {
+            "query": "MashTun100 is leaking",
+            "k": 3,
+            "filters": {"document_type": ["sop"]},
+            "asset_model": "MashTun",
+        },
+    )
+
+    assert status == 200
+    assert body["results"][0]["source"] == "s3://kb/sop.md"
+    assert search.retriever.calls == [
+        (
+            "MashTun100 is leaking",
+            3,
+            {"document_type": ["sop"], "equipment_model": "MashTun"},
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"query": " "},
+        {"query": "pump", "k": 0},
+        {"query": "pump", "k": True},
+        {"query": "pump", "filters": {"AMAZON_BEDROCK_TEXT_CHUNK": "x"}},
+    ],
+)
+def test_invalid_searches_are_rejected(search, body):
+    status, _ = post(search, body)
+
+    assert status == 400
+    assert search.retriever.calls == []
+
+
+def test_search_is_not_found_without_a_collection(search, monkeypatch):
+    monkeypatch.setattr(search, "COLLECTION_HOST", None)
+
+    status, _ = post(search, {"query": "pump"})
+
+    assert status == 404
+    assert search.retriever.calls == []
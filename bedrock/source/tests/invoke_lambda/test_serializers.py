@@ -0,0 +1,49 @@
+import json
+import uuid
+import decimal
+import datetime
+
+import pytest
+
+VALUE = {
+    "count": decimal.Decimal("3"),
+    "ratio": decimal.Decimal("0.5"),
+    "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "at": datetime.datetime(2024, 5, 1, 12, 30),
+    "tags": {"pump"},
+    "answer": "Druckverlust über 2 bar",
+}
+EXPECTED = {
+    "count": 3,
+    "ratio": 0.5,
+    "id": "12345678-1234-5678-1234-567812345678",
+    "at": "2024-05-01T12:30:00",
+    "tags": ["pump"],
+    "answer": "Druckverlust über 2 bar",
+}
+
+
+@pytest.fixture
+def utils(invoke_module):
+    return invoke_module("utils")
+
+
+@pytest.mark.parametrize("name", ["json", "orjson"])
+def test_serializers_agree(utils, name):
+    if name not in utils.SERIALIZERS:
+        pytest.skip(f"{name} is not installed")
+
+    assert json.loads(utils.SERIALIZERS[name](VALUE)) == EXPECTED
+
+
+def test_unsupported_values_are_rejected(utils):
+    with pytest.raises(TypeError):
+        utils.json_dumps({"value": object()})
+
+
+def test_serializer_is_selected_by_environment(invoke_module, monkeypatch):
+    monkeypatch.setenv("JSON_SERIALIZER", "json")
+    utils = invoke_module("utils")
+
+    assert utils.get_serializer() is utils.json_dumps
+    assert utils.dumps({"ok": True}) == '{"ok":true}'
@@ -0,0 +1,84 @@
+import pytest
+
+
+@pytest.fixture
+def session_store(invoke_module):
+    return invoke_module("session_store")
+
+
+def test_new_session_uses_the_chat_session_id(session_store):
+    session = session_store.InMemorySessionStore().load("chat-1")
+
+    assert session_store.agent_session_id(session) == "chat-1"
+    assert session_store.build_session_state(session) is None
+
+
+def test_turns_over_the_budget_fold_into_the_summary(session_store):
+    session = session_store.new_session("chat-1")
+
+    assert not session_store.record_turn(
+        session, "Is the pump running?", "Yes. It runs at 40 Hz.", budget=100
+    )
+    assert session_store.record_turn(
+        session, "And the fermenter?", "It is at 18 C. " + "x" * 400, budget=100
+    )
+
+    assert session["turns"] == []
+    assert session["summary"] == (
+        "Q: Is the pump running? A: Yes. Q: And the fermenter? A: It is at 18 C."
+    )
+    # The agent starts a fresh session that only carries the summary.
+    assert session_store.agent_session_id(session) == "chat-1-1"
+    assert session_store.build_session_state(session) == {
+        "promptSessionAttributes": {"conversation_summary": session["summary"]}
+    }
+
+
+def test_shared_turns_reach_the_agent_through_the_summary(session_store):
+    session = session_store.new_session("chat-1")
+
+    session_store.record_shared_turn(
+        session, "Is the pump running?", "Yes. It runs at 40 Hz.", assets=["a1"]
+    )
+
+    assert session["turns"] == []
+    assert session_store.agent_session_id(session) == "chat-1"
+    assert session_store.build_session_state(session) == {
+        "promptSessionAttributes": {
+            "conversation_summary": "Q: Is the pump running? A: Yes.",
+            "last_resolved_asset_ids": "a1",
+        }
+    }
+
+
+def test_recent_assets_are_kept_most_recent_last(session_store):
+    session = session_store.new_session("chat-1")
+
+    session_store.record_turn(session, "q", "a", assets=["a1", "a2", "a3"])
+    session_store.record_turn(session, "q", "a", assets=["a1", "a4", "a5", "a6"])
+
+    assert session["assets"] == ["a3", "a1", "a4", "a5", "a6"]
+
+
+@pytest.mark.parametrize("store_type", ["memory", "sqlite"])
+def test_stores_round_trip_sessions(session_store, store_type, tmp_path):
+    if store_type == "sqlite":
+        store = session_store.SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    else:
+        store = session_store.InMemorySessionStore()
+    session = store.load("chat-1")
+    session_store.record_turn(session, "q", "a", assets=["a1"])
+
+    store.save(session)
+
+    assert store.get("chat-1") == session
+    assert store.get("chat-2") is None
+
+
+def test_incomplete_store_fails_on_creation(session_store):
+    class ReadOnly(session_store.SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnly()
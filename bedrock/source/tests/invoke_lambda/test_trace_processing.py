@@ -0,0 +1,111 @@
+import pytest
+
+
+@pytest.fixture
+def trace_processing(invoke_module):
+    return invoke_module("trace_processing")
+
+
+def action_group_trace(trace_id, asset_id):
+    return {
+        "trace": {
+            "orchestrationTrace": {
+                "invocationInput": {
+                    "traceId": trace_id,
+                    "actionGroupInvocationInput": {
+                        "actionGroupName": "sitewise",
+                        "verb": "get",
+                        "apiPath": "/assets",
+                        "parameters": [{"name": "asset_id", "value": asset_id}],
+                    },
+                }
+            }
+        }
+    }
+
+
+def lookup_output_trace(trace_id, *uris):
+    return {
+        "trace": {
+            "orchestrationTrace": {
+                "observation": {
+                    "traceId": trace_id,
+                    "knowledgeBaseLookupOutput": {
+                        "retrievedReferences": [
+                            {"location": {"s3Location": {"uri": uri}}} for uri in uris
+                        ]
+                    },
+                }
+            }
+        }
+    }
+
+
+def test_unknown_level_falls_back_to_citations(trace_processing):
+    assert trace_processing.resolve_trace_level("FULL") == "full"
+    assert trace_processing.resolve_trace_level("verbose") == "citations"
+
+
+def test_citations_level_collects_assets_and_every_lookup(trace_processing):
+    processor = trace_processing.TraceProcessor(level="citations")
+
+    processor.process(action_group_trace("t1", "asset-1"))
+    processor.process(lookup_output_trace("t2", "s3://kb/a.md", "s3://kb/b.md"))
+    processor.process(lookup_output_trace("t3", "s3://kb/b.md", "s3://kb/c.md"))
+    processor.finish()
+
+    assert processor.asset_ids == ["asset-1"]
+    assert processor.source_list == ["s3://kb/a.md", "s3://kb/b.md", "s3://kb/c.md"]
+    # Steps are only kept from the summary level on.
+    assert processor.summary() == []
+
+
+def test_summary_level_records_steps_and_tools(trace_processing):
+    processor = trace_processing.TraceProcessor(level="summary")
+
+    processor.process(action_group_trace("t1", "asset-1"))
+    processor.process(lookup_output_trace("t1"))
+
+    [step] = processor.summary()
+    assert step["trace_id"] == "t1"
+    assert step["tools"] == ["sitewise:get/assets"]
+
+
+def test_off_level_ignores_traces(trace_processing):
+    processor = trace_processing.TraceProcessor(level="off")
+
+    processor.process(action_group_trace("t1", "asset-1"))
+
+    assert not processor.enable_trace
+    assert processor.asset_ids == []
+
+
+def test_full_level_batches_sampled_traces(trace_processing, monkeypatch):
+    monkeypatch.setattr(trace_processing, "TRACE_BATCH_SIZE", 2)
+    sink = trace_processing.InMemoryTraceSink()
+    processor = trace_processing.TraceProcessor(
+        level="full", request_id="request-1", sink=sink, sample_rate=1.0
+    )
+
+    for i in range(3):
+        processor.process(action_group_trace(f"t{i}", f"asset-{i}"))
+    processor.finish()
+
+    assert [
+        (request_id, part, len(traces)) for request_id, part, traces in sink.batches
+    ] == [
+        ("request-1", 0, 2),
+        ("request-1", 1, 1),
+    ]
+
+
+def test_unsampled_requests_write_nothing(trace_processing):
+    sink = trace_processing.InMemoryTraceSink()
+    processor = trace_processing.TraceProcessor(
+        level="full", sink=sink, sample_rate=0.0
+    )
+
+    processor.process(action_group_trace("t1", "asset-1"))
+    processor.finish()
+
+    assert sink.batches == []
@@ -0,0 +1,38 @@
+import os
+
+from preprocessing import load_asset_models
+from preprocessing.asset_models import resolve_equipment
+
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "cfn", "sitewise-assets-reduced.json"
+)
+
+
+def test_assets_are_mapped_to_their_model_names():
+    asset_models = load_asset_models(TEMPLATE_PATH)
+
+    assert asset_models["MashTun100"] == "MashTun"
+    assert asset_models["BottleLine401"] == "BottleLine"
+    assert (
+        load_asset_models(os.path.join(os.path.dirname(__file__), "missing.json")) == {}
+    )
+
+
+def test_equipment_resolves_to_its_asset():
+    asset_models = {
+        "BottleLine401": "BottleLine",
+        "BoilKettle100": "BoilKettle",
+        "BoilKettle200": "BoilKettle",
+    }
+
+    assert resolve_equipment("BoilKettle100", asset_models) == (
+        "BoilKettle100",
+        "BoilKettle",
+    )
+    # A unique suffix match, "Line 401" for BottleLine401.
+    assert resolve_equipment("Line401", asset_models) == ("BottleLine401", "BottleLine")
+    # Without a match the model is the name without its number.
+    assert resolve_equipment("Centrifuge300", asset_models) == (
+        "Centrifuge300",
+        "Centrifuge",
+    )
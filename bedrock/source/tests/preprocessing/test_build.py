@@ -0,0 +1,64 @@
+import os
+import json
+import shutil
+
+from preprocessing import preprocess_documents, equipment_models
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "files", "data")
+
+
+def sources(tmp_path):
+    source_dir = tmp_path / "data"
+    (source_dir / "sop").mkdir(parents=True)
+    shutil.copy(os.path.join(DATA_DIR, "sop", "mash-tun-sop.docx"), source_dir / "sop")
+    (source_dir / "sop" / "notes.txt").write_text("Check the gaskets weekly.")
+    return source_dir
+
+
+def test_sections_are_written_with_metadata(tmp_path):
+    source_dir = sources(tmp_path)
+    output_dir = tmp_path / "out"
+
+    counts = preprocess_documents(str(source_dir), str(output_dir))
+
+    assert counts == {"processed": 2, "skipped": 0, "removed": 0}
+    assert (output_dir / "sop" / "notes.txt").exists()
+    section = output_dir / "sop" / "mash-tun-sop" / "6-2-3-issue-leakage.md"
+    assert "Leakage" in section.read_text()
+    metadata = json.loads(
+        (section.parent / (section.name + ".metadata.json")).read_text()
+    )
+    assert metadata["metadataAttributes"]["section_id"] == (
+        "mash-tun-sop--6-2-3-issue-leakage"
+    )
+    assert equipment_models(str(output_dir)) == ["MashTun"]
+    # The state file stays out of the uploaded directory.
+    assert (tmp_path / "out.state.json").exists()
+
+
+def test_unchanged_sources_are_skipped_and_deleted_ones_removed(tmp_path):
+    source_dir = sources(tmp_path)
+    output_dir = tmp_path / "out"
+    preprocess_documents(str(source_dir), str(output_dir))
+
+    (source_dir / "sop" / "notes.txt").write_text("Check the gaskets daily.")
+    (source_dir / "sop" / "mash-tun-sop.docx").unlink()
+    counts = preprocess_documents(str(source_dir), str(output_dir))
+
+    assert counts == {"processed": 1, "skipped": 0, "removed": 1}
+    assert not (output_dir / "sop" / "mash-tun-sop").exists()
+    assert preprocess_documents(str(source_dir), str(output_dir)) == {
+        "processed": 0,
+        "skipped": 1,
+        "removed": 0,
+    }
+
+
+def test_changed_settings_rebuild_everything(tmp_path):
+    source_dir = sources(tmp_path)
+    output_dir = tmp_path / "out"
+    preprocess_documents(str(source_dir), str(output_dir))
+
+    counts = preprocess_documents(str(source_dir), str(output_dir), max_words=100)
+
+    assert counts == {"processed": 2, "skipped": 0, "removed": 0}
@@ -0,0 +1,111 @@
+import os
+
+from preprocessing import chunk_document, parse_docx
+from preprocessing.docx_structure import Block, DocumentStructure
+from preprocessing.sections import compact, slugify
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "files", "data")
+
+
+def heading(number, text):
+    return Block(
+        "heading", text=f"{number}. {text}", number=number, level=number.count(".") + 1
+    )
+
+
+def paragraph(words):
+    return Block("paragraph", text=" ".join(["word"] * words))
+
+
+def structure(*blocks):
+    return DocumentStructure(
+        title="SOP for Repairing the Boil Kettle",
+        fields=[
+            ("Machine Model", "BrewMaster Kettle 8000"),
+            ("Location", "Brewhouse"),
+            ("Location", "Boil Kettle 100"),
+        ],
+        blocks=list(blocks),
+    )
+
+
+def test_names_are_compacted_and_slugified():
+    assert compact("Mash Tun 100") == "MashTun100"
+    assert slugify("6.2.1. Issue: Leakage") == "6-2-1-issue-leakage"
+
+
+def test_short_sections_keep_their_subsections():
+    chunks = chunk_document(
+        "kettle",
+        "sop",
+        structure(
+            heading("1", "Purpose"),
+            paragraph(10),
+            heading("2", "Procedure"),
+            heading("2.1", "Drain"),
+            Block("item", text="Open the valve", marker="1."),
+            Block("item", text="Wait", marker="2."),
+        ),
+    )
+
+    assert [chunk.section_id for chunk in chunks] == [
+        "kettle--overview",
+        "kettle--1-purpose",
+        "kettle--2-procedure",
+    ]
+    procedure = chunks[2].text
+    assert procedure.startswith("# SOP for Repairing the Boil Kettle\n\n")
+    assert "Equipment: Boil Kettle 100, BrewMaster Kettle 8000" in procedure
+    assert "### 2.1. Drain\n\n1. Open the valve\n2. Wait" in procedure
+
+
+def test_long_sections_are_split_at_their_subsections():
+    chunks = chunk_document(
+        "kettle",
+        "sop",
+        structure(
+            heading("2", "Procedure"),
+            paragraph(5),
+            heading("2.1", "Drain"),
+            paragraph(30),
+            heading("2.2", "Drain"),
+            paragraph(30),
+        ),
+        max_words=40,
+    )
+
+    assert [chunk.metadata["section_path"] for chunk in chunks[1:]] == [
+        "2. Procedure",
+        "2. Procedure > 2.1. Drain",
+        "2. Procedure > 2.2. Drain",
+    ]
+    # Section IDs stay unique when headings repeat.
+    assert chunks[2].section_id == "kettle--2-1-drain"
+    assert chunks[3].section_id == "kettle--2-2-drain"
+
+
+def test_chunks_carry_the_equipment_metadata():
+    [overview] = chunk_document("kettle", "sop", structure())
+
+    metadata = overview.metadata
+    assert metadata["document_type"] == "sop"
+    assert metadata["equipment"] == "BoilKettle100"
+    assert metadata["equipment_model"] == "BoilKettle"
+    assert metadata["equipment_tags"] == [
+        "BoilKettle100",
+        "BoilKettle",
+        "BrewMasterKettle8000",
+        "Brewhouse",
+    ]
+
+
+def test_sop_header_and_numbered_headings_are_parsed():
+    with open(os.path.join(DATA_DIR, "sop", "mash-tun-sop.docx"), "rb") as f:
+        document = parse_docx(f.read())
+
+    assert document.title.startswith("Standard Operating Procedure")
+    assert document.header_value("Location") == "Mashing Section"
+    assert document.header_value("Location", last=True) == "Mash Tun 100"
+    headings = [block.number for block in document.blocks if block.kind == "heading"]
+    assert headings[:3] == ["1", "2", "3"]
+    assert "6.2.3" in headings
@@ -0,0 +1,80 @@
+import io
+import json
+
+import pytest
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+        self.put = {}
+
+    def get_paginator(self, name):
+        objects = self.objects
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = [key for key in objects if key.startswith(Prefix)]
+                yield {"Contents": [{"Key": key} for key in keys]}
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        body = self.objects[Key]
+        if isinstance(body, Exception):
+            raise body
+        return {"Body": io.BytesIO(body)}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.put[Key] = json.loads(Body)
+
+
+@pytest.fixture
+def citation_manifest(lambda_module):
+    return lambda_module("update-lambda", "citation_manifest")
+
+
+def sidecar(**attributes):
+    return json.dumps({"metadataAttributes": attributes}).encode()
+
+
+def test_manifest_describes_every_document(citation_manifest):
+    s3 = FakeS3(
+        {
+            "data/": b"",
+            "data/sop/mash-tun/procedure-valves.md": b"# Mash Tun SOP\n",
+            "data/sop/mash-tun/procedure-valves.md.metadata.json": sidecar(
+                title="Mash Tun Cleaning SOP",
+                document_type="sop",
+                section="Valves",
+                section_path="Procedure > Valves",
+                section_id="mash-tun--procedure-valves",
+            ),
+            "data/recipes/ipa.json": json.dumps(
+                {"Topic": "IPA", "Url": "https://docs/ipa"}
+            ).encode(),
+            "data/recipes/stout/steps.md": b"# Stout\n## Brewing > Mash In\n",
+            "data/sop/broken.md": RuntimeError("corrupt"),
+            "data/notes/readme.txt": b"",
+        }
+    )
+
+    count = citation_manifest.publish_citation_manifest(
+        s3, "assets", "data/", "manifests/citation-manifest.json"
+    )
+
+    documents = s3.put["manifests/citation-manifest.json"]["documents"]
+    assert count == len(documents) == 5
+    # Section files are described by their sidecars.
+    section = documents["s3://assets/data/sop/mash-tun/procedure-valves.md"]
+    assert section["title"] == "Mash Tun Cleaning SOP"
+    assert section["doc_type"] == "sop"
+    assert section["sections"] == [{"title": "Valves", "anchor": "procedure-valves"}]
+    assert documents["s3://assets/data/recipes/ipa.json"]["url"] == "https://docs/ipa"
+    # Without a sidecar the headings of the section file are used.
+    section = documents["s3://assets/data/recipes/stout/steps.md"]
+    assert section["title"] == "Stout"
+    assert section["sections"] == [{"title": "Mash In", "anchor": "mash-in"}]
+    # Documents that can't be read are listed with defaults.
+    assert documents["s3://assets/data/sop/broken.md"]["title"] == "Broken"
+    assert documents["s3://assets/data/notes/readme.txt"]["doc_type"] == "notes"
@@ -0,0 +1,218 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def bulk_loader(lambda_module):
+    return lambda_module("update-lambda", "bulk_loader")
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class TransportError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedClient:
+    """
+    Answers each _bulk request with the statuses a function returns for its
+    items, or raises what it returns.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+
+    def bulk(self, body):
+        lines = [json.loads(line) for line in body.split("\n") if line]
+        actions = [line for line in lines if set(line) <= {"index", "delete"}]
+        self.requests.append(actions)
+        statuses = self.respond(len(self.requests), actions)
+        if isinstance(statuses, Exception):
+            raise statuses
+        return {
+            "errors": any(status >= 300 for status in statuses),
+            "items": [
+                {next(iter(action)): {"status": status, "error": f"status {status}"}}
+                for action, status in zip(actions, statuses)
+            ],
+        }
+
+
+def loader(bulk_loader, client, **kwargs):
+    return bulk_loader.BulkLoader(
+        client, "kb-index", workers=1, sleep=lambda seconds: None, **kwargs
+    )
+
+
+def records(count):
+    return ({"_source": {"text": f"chunk {i}"}} for i in range(count))
+
+
+def test_documents_and_deletes_are_written(bulk_loader):
+    client = bulk_loader.InMemoryBulkClient(base_latency=0, latency_per_doc=0)
+
+    stats = loader(bulk_loader, client, initial_batch_size=10).load(records(25))
+
+    assert (stats["docs"], stats["succeeded"], stats["failed"]) == (25, 25, 0)
+    assert len(client.documents) == 25
+
+    ids = [_id for _, _id in list(client.documents)[:5]] + ["already-gone"]
+    stats = loader(bulk_loader, client).load(
+        {"_op_type": "delete", "_id": _id} for _id in ids
+    )
+
+    # Deleting a document that is already gone counts as done.
+    assert (stats["succeeded"], stats["failed"]) == (6, 0)
+    assert len(client.documents) == 20
+
+
+def test_batches_stay_below_the_byte_limit(bulk_loader):
+    client = ScriptedClient(lambda request, actions: [201] * len(actions))
+
+    loader(bulk_loader, client, initial_batch_size=100, max_batch_bytes=200).load(
+        records(10)
+    )
+
+    assert len(client.requests) > 1
+    assert sum(len(actions) for actions in client.requests) == 10
+
+
+def test_rejected_items_are_retried(bulk_loader):
+    client = bulk_loader.InMemoryBulkClient(
+        base_latency=0, latency_per_doc=0, failure_rate=0.3, seed=1
+    )
+
+    stats = loader(bulk_loader, client, initial_batch_size=20, max_retries=10).load(
+        records(100)
+    )
+
+    assert stats["succeeded"] == 100
+    assert stats["retries"] > 0
+    assert len(client.documents) == 100
+
+
+def test_items_fail_once_retries_run_out(bulk_loader):
+    client = bulk_loader.InMemoryBulkClient(
+        base_latency=0, latency_per_doc=0, failure_rate=1.0
+    )
+    load = loader(bulk_loader, client, max_retries=2).load
+
+    with pytest.raises(bulk_loader.BulkLoadError) as error:
+        load(records(5), raise_on_error=True)
+
+    assert error.value.stats["failed"] == 5
+    assert error.value.stats["errors"] == ["retries exhausted"]
+    assert client.requests == 3
+
+
+def test_client_errors_are_not_retried(bulk_loader):
+    client = ScriptedClient(lambda request, actions: [400] + [201] * (len(actions) - 1))
+
+    stats = loader(bulk_loader, client).load(records(3))
+
+    assert (stats["succeeded"], stats["failed"], stats["retries"]) == (2, 1, 0)
+    assert stats["errors"] == ["status 400"]
+    assert len(client.requests) == 1
+
+
+def test_throttled_requests_are_retried_and_other_errors_fail(bulk_loader):
+    throttled = ScriptedClient(
+        lambda request, actions: (
+            TransportError(429) if request == 1 else [201] * len(actions)
+        )
+    )
+    stats = loader(bulk_loader, throttled).load(records(3))
+    assert (stats["succeeded"], stats["retries"]) == (3, 3)
+
+    forbidden = ScriptedClient(lambda request, actions: TransportError(403))
+    stats = loader(bulk_loader, forbidden).load(records(3))
+    assert (stats["failed"], stats["errors"]) == (3, ["status 403"])
+
+
+def test_retried_items_are_split_to_the_shrunk_batch_size(bulk_loader):
+    client = ScriptedClient(
+        lambda request, actions: (
+            [429] * len(actions) if request == 1 else [201] * len(actions)
+        )
+    )
+
+    loader(bulk_loader, client, initial_batch_size=40, min_batch_size=10).load(
+        records(40)
+    )
+
+    assert [len(actions) for actions in client.requests] == [40, 20, 20]
+
+
+def test_batches_shrink_when_throttled_and_stay_below_the_ceiling(bulk_loader):
+    clock = Clock()
+    bulk = loader(
+        bulk_loader,
+        ScriptedClient(None),
+        initial_batch_size=100,
+        target_latency=1.0,
+        clock=clock,
+    )
+
+    bulk._adapt(0.2, True, 100)
+    # A second response of the same moment doesn't halve the size again.
+    bulk._adapt(0.2, True, 100)
+    assert bulk.batch_size == 50
+
+    clock.time += bulk.throttle_cooldown
+    for _ in range(20):
+        clock.time += 1
+        bulk._adapt(0.2, False, bulk.batch_size)
+
+    assert bulk.batch_size == 90
+
+
+def test_slow_requests_shrink_the_batches(bulk_loader):
+    clock = Clock()
+    bulk = loader(
+        bulk_loader,
+        ScriptedClient(None),
+        initial_batch_size=100,
+        target_latency=1.0,
+        clock=clock,
+    )
+
+    bulk._adapt(0.2, False, 100)
+    assert bulk.batch_size == 125
+    clock.time += 1
+    # Batches built before the growth say nothing about the new size.
+    bulk._adapt(0.2, False, 100)
+    assert bulk.batch_size == 125
+    # A slow request that started after the growth.
+    clock.time += 3
+    bulk._adapt(3.0, False, 125)
+    assert bulk.batch_size == 62
+
+
+def test_in_memory_client_rejects_writes_over_capacity(bulk_loader):
+    client = bulk_loader.InMemoryBulkClient(
+        base_latency=0, latency_per_doc=0, capacity=5
+    )
+
+    def body(count):
+        return "".join(
+            f'{{"index": {{"_index": "kb-index"}}}}\n{{"n": {i}}}\n'
+            for i in range(count)
+        )
+
+    overloaded = client.bulk(body=body(6))
+    accepted = client.bulk(body=body(5))
+
+    assert overloaded["errors"]
+    assert {item["index"]["status"] for item in overloaded["items"]} == {429}
+    assert not accepted["errors"]
+    assert len(client.documents) == 5
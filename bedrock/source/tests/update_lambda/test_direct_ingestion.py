@@ -0,0 +1,189 @@
+import io
+import json
+import hashlib
+
+import pytest
+
+MODEL_ID = "amazon.titan-embed-text-v2:0"
+VECTOR_FIELD = "embedding"
+MANIFEST_KEY = "manifests/ingestion.json"
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class FakeS3:
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {
+                    "Contents": [
+                        {
+                            "Key": key,
+                            "ETag": f'"{hashlib.md5(body).hexdigest()}"',
+                            "Size": len(body),
+                        }
+                        for key, body in sorted(s3.objects.items())
+                        if key.startswith(Prefix)
+                    ]
+                }
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as f:
+            f.write(self.objects[Key])
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = Body if isinstance(Body, bytes) else Body.encode()
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+
+class FakeBedrockRuntime:
+    def __init__(self):
+        self.texts = []
+
+    def invoke_model(self, modelId, body):
+        request = json.loads(body)
+        self.texts.append(request["inputText"])
+        embedding = [float(len(request["inputText"])), 0.5, 0.25, 1.0]
+        return {"body": io.BytesIO(json.dumps({"embedding": embedding}).encode())}
+
+
+@pytest.fixture
+def search_client(lambda_module):
+    bulk_loader = lambda_module("update-lambda", "bulk_loader")
+
+    class SearchClient(bulk_loader.InMemoryBulkClient):
+        """
+        The in-memory bulk client with the terms search of the indexed chunks.
+        """
+
+        def search(self, index, body):
+            uris = body["query"]["terms"]["x-amz-bedrock-kb-source-uri"]
+            return {
+                "hits": {
+                    "hits": [
+                        {"_id": _id}
+                        for (index_name, _id), source in self.documents.items()
+                        if index_name == index
+                        and source["x-amz-bedrock-kb-source-uri"] in uris
+                    ]
+                }
+            }
+
+    return SearchClient(base_latency=0, latency_per_doc=0, sleep=lambda seconds: None)
+
+
+@pytest.fixture
+def ingest(lambda_module, search_client, monkeypatch, tmp_path):
+    direct_ingestion = lambda_module("update-lambda", "direct_ingestion")
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+
+    def ingest(s3, bedrock_runtime, index_name="kb-index"):
+        return direct_ingestion.ingest_directly(
+            s3,
+            bedrock_runtime,
+            search_client,
+            "assets",
+            "data/",
+            MANIFEST_KEY,
+            index_name,
+            VECTOR_FIELD,
+            MODEL_ID,
+            4,
+            "DS1234",
+        )
+
+    return ingest
+
+
+def indexed(search_client, index_name="kb-index"):
+    return {
+        source["x-amz-bedrock-kb-source-uri"]: source
+        for (name, _), source in search_client.documents.items()
+        if name == index_name
+    }
+
+
+def test_chunks_are_written_in_the_knowledge_base_layout(ingest, search_client):
+    s3 = FakeS3(
+        {
+            "data/sop/pump.md": b"Prime the pump.",
+            "data/sop/pump.md.metadata.json": json.dumps(
+                {"metadataAttributes": {"equipment": "Pump100"}}
+            ).encode(),
+        }
+    )
+
+    result = ingest(s3, FakeBedrockRuntime())
+
+    assert result["changes"] == {"added": 1, "changed": 0, "deleted": 0}
+    chunk = indexed(search_client)["s3://assets/data/sop/pump.md"]
+    assert chunk["AMAZON_BEDROCK_TEXT_CHUNK"] == "Prime the pump."
+    assert chunk["equipment"] == "Pump100"
+    assert chunk["x-amz-bedrock-kb-data-source-id"] == "DS1234"
+    assert chunk[VECTOR_FIELD] == [15.0, 0.5, 0.25, 1.0]
+
+
+def test_changed_and_deleted_documents_replace_their_chunks(ingest, search_client):
+    s3 = FakeS3({"data/sop/pump.md": b"Prime the pump.", "data/sop/valve.md": b"Open."})
+    ingest(s3, FakeBedrockRuntime())
+
+    s3.objects["data/sop/valve.md"] = b"Open slowly."
+    del s3.objects["data/sop/pump.md"]
+    bedrock_runtime = FakeBedrockRuntime()
+    result = ingest(s3, bedrock_runtime)
+
+    assert result["changes"] == {"added": 0, "changed": 1, "deleted": 1}
+    assert bedrock_runtime.texts == ["Open slowly."]
+    chunks = indexed(search_client)
+    assert list(chunks) == ["s3://assets/data/sop/valve.md"]
+    assert chunks["s3://assets/data/sop/valve.md"]["AMAZON_BEDROCK_TEXT_CHUNK"] == (
+        "Open slowly."
+    )
+
+
+def test_reingesting_into_a_new_index_reuses_the_embeddings(ingest, search_client):
+    s3 = FakeS3({"data/sop/pump.md": b"Prime the pump.", "data/sop/valve.md": b"Open."})
+    ingest(s3, FakeBedrockRuntime())
+    del s3.objects[MANIFEST_KEY]
+
+    bedrock_runtime = FakeBedrockRuntime()
+    result = ingest(s3, bedrock_runtime, index_name="kb-index-v2")
+
+    assert result["cache"] == {"hits": 2, "misses": 0}
+    assert bedrock_runtime.texts == []
+    assert len(indexed(search_client, "kb-index-v2")) == 2
+
+
+def test_a_manifest_from_the_bedrock_sync_is_ignored(ingest, search_client):
+    s3 = FakeS3({"data/sop/pump.md": b"Prime the pump.", "data/sop/valve.md": b"Open."})
+    ingest(s3, FakeBedrockRuntime())
+    manifest = json.loads(s3.objects[MANIFEST_KEY])
+    manifest["ingestion_mode"] = "bedrock"
+    s3.objects[MANIFEST_KEY] = json.dumps(manifest).encode()
+    search_client.documents.clear()
+
+    result = ingest(s3, FakeBedrockRuntime())
+
+    # The documents were indexed by the other path, so all are written again.
+    assert result["changes"] == {"added": 2, "changed": 0, "deleted": 0}
+    assert len(indexed(search_client)) == 2
+    assert json.loads(s3.objects[MANIFEST_KEY])["ingestion_mode"] == "direct"
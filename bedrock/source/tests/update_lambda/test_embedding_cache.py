@@ -0,0 +1,158 @@
+import io
+import json
+
+import pytest
+
+PREFIX = "embeddings/amazon.titan-embed-text-v2-0-4/"
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class FakeS3:
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as f:
+            f.write(self.objects[Key])
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = Body
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+
+@pytest.fixture
+def embedding_cache(lambda_module):
+    return lambda_module("update-lambda", "embedding_cache")
+
+
+@pytest.fixture
+def open_cache(embedding_cache, tmp_path):
+    s3 = FakeS3()
+    caches = []
+
+    def open_cache(dimensions=4):
+        cache = embedding_cache.EmbeddingCache(
+            s3,
+            "assets",
+            "embeddings/",
+            "amazon.titan-embed-text-v2:0",
+            dimensions,
+            work_dir=str(tmp_path),
+        ).load()
+        caches.append(cache)
+        return cache
+
+    open_cache.s3 = s3
+    yield open_cache
+    for cache in caches:
+        cache.close()
+
+
+def vector(text):
+    # Exactly representable as float32.
+    return [len(text) / 4, 0.5, -0.25, 1.0]
+
+
+def embedder(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [vector(text) for text in texts]
+
+    return embed
+
+
+def test_prefix_is_per_model_and_size(embedding_cache):
+    assert embedding_cache.cache_prefix(
+        "embeddings", "amazon.titan-embed-text-v2:0", 1024
+    ) == ("embeddings/amazon.titan-embed-text-v2-0-1024/")
+
+
+def test_only_misses_are_embedded(open_cache):
+    cache = open_cache()
+    calls = []
+
+    vectors = cache.embed(["pump", "valve", "pump"], embedder(calls))
+
+    assert vectors == [vector("pump"), vector("valve"), vector("pump")]
+    assert calls == [["pump", "valve"]]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_saved_vectors_are_read_back_by_the_next_run(open_cache):
+    cache = open_cache()
+    cache.embed(["pump", "valve"], embedder([]))
+    cache.save()
+
+    calls = []
+    cache = open_cache()
+    vectors = cache.embed(["valve", "kettle"], embedder(calls))
+
+    assert vectors == [vector("valve"), vector("kettle")]
+    assert calls == [["kettle"]]
+    index = json.loads(open_cache.s3.objects[PREFIX + "index.json"])
+    # Two rows of four little-endian float32 components.
+    assert sorted(index["rows"].values()) == [0, 1]
+    assert len(open_cache.s3.objects[index["vectors_key"]]) == 2 * 4 * 4
+
+
+def test_rewrites_replace_the_vectors_file(open_cache, embedding_cache):
+    cache = open_cache()
+    cache.embed(["pump"], embedder([]))
+    cache.save()
+    first_key = cache.vectors_key
+
+    cache = open_cache()
+    cache.embed(["valve"], embedder([]))
+    cache.save()
+
+    assert cache.vectors_key != first_key
+    assert first_key not in open_cache.s3.objects
+    # Lookups keep working from the rows just written.
+    assert cache.get(embedding_cache.chunk_hash("pump")) == vector("pump")
+
+
+def test_dead_rows_are_dropped_once_they_are_most_of_the_file(
+    open_cache, embedding_cache
+):
+    cache = open_cache()
+    cache.embed(["a", "bb", "ccc", "dddd"], embedder([]))
+    cache.save()
+    live = {embedding_cache.chunk_hash(text) for text in ["a", "bb", "ccc"]}
+
+    cache = open_cache()
+    cache.save(live=live)
+    # One dead row of four isn't worth a rewrite.
+    assert len(cache.rows) == 4
+
+    cache.save(live={embedding_cache.chunk_hash("ccc")})
+    assert len(cache.rows) == 1
+    assert cache.get(embedding_cache.chunk_hash("ccc")) == vector("ccc")
+
+
+def test_cache_of_another_size_is_ignored(open_cache):
+    cache = open_cache()
+    cache.embed(["pump"], embedder([]))
+    cache.save()
+    index = json.loads(open_cache.s3.objects[PREFIX + "index.json"])
+    index["dimensions"] = 8
+    open_cache.s3.objects[PREFIX + "index.json"] = json.dumps(index).encode()
+
+    assert open_cache().rows == {}
+
+
+def test_vectors_of_the_wrong_size_are_rejected(open_cache):
+    with pytest.raises(ValueError, match="Expected 4 dimensions"):
+        open_cache().put("key", [0.1, 0.2])
@@ -0,0 +1,95 @@
+import pytest
+
+
+@pytest.fixture
+def index_warmup(lambda_module):
+    return lambda_module("update-lambda", "index_warmup")
+
+
+class FakeClient:
+    """
+    Vector index whose first k-NN search is slow, on a clock the searches
+    advance.
+    """
+
+    def __init__(self, vectors=(), field=None, warmup=None):
+        self.vectors = list(vectors)
+        self.field = field or {"type": "knn_vector", "dimension": 4}
+        self.warmup = warmup
+        self.time = 0.0
+        self.knn_searches = []
+        self.indices = self
+        self.transport = self
+
+    def clock(self):
+        return self.time
+
+    def perform_request(self, method, url):
+        if isinstance(self.warmup, Exception):
+            raise self.warmup
+        return self.warmup
+
+    def get_mapping(self, index):
+        return {index: {"mappings": {"properties": {"embedding": self.field}}}}
+
+    def search(self, index, body):
+        if "query" not in body:
+            return {
+                "hits": {
+                    "hits": [
+                        {"_source": {"embedding": vector}}
+                        for vector in self.vectors[: body["size"]]
+                    ]
+                }
+            }
+        self.knn_searches.append(body["query"]["knn"]["embedding"]["vector"])
+        self.time += 0.5 if len(self.knn_searches) == 1 else 0.002
+        return {"hits": {"hits": []}}
+
+
+def test_warmup_api_is_used_where_available(index_warmup):
+    assert index_warmup.warmup_api(FakeClient(warmup={"_shards": {"failed": 0}}), "kb")
+    assert not index_warmup.warmup_api(
+        FakeClient(warmup={"_shards": {"failed": 1}}), "kb"
+    )
+    assert not index_warmup.warmup_api(
+        FakeClient(warmup=ConnectionError("404 Not Found")), "kb"
+    )
+
+
+def test_indexed_vectors_are_topped_up_with_random_ones(index_warmup):
+    client = FakeClient(vectors=[[0.1, 0.2, 0.3, 0.4]])
+
+    vectors = index_warmup.synthetic_queries(client, "kb", "embedding", 3)
+
+    assert vectors[0] == [0.1, 0.2, 0.3, 0.4]
+    assert len(vectors) == 3
+    assert all(len(vector) == 4 for vector in vectors)
+    assert vectors == index_warmup.synthetic_queries(client, "kb", "embedding", 3)
+
+
+def test_binary_fields_get_signed_bytes(index_warmup):
+    client = FakeClient(
+        field={"type": "knn_vector", "dimension": 64, "data_type": "binary"}
+    )
+
+    [vector] = index_warmup.synthetic_queries(client, "kb", "embedding", 1)
+
+    assert len(vector) == 8
+    assert all(-128 <= value <= 127 and isinstance(value, int) for value in vector)
+
+
+def test_cold_and_steady_state_latencies_are_reported(index_warmup):
+    client = FakeClient(warmup=ConnectionError("404 Not Found"))
+
+    result = index_warmup.warm_up(
+        client, "kb", "embedding", queries=5, rounds=2, clock=client.clock
+    )
+
+    assert result == {
+        "method": "synthetic",
+        "queries": 10,
+        "first_query_ms": 500.0,
+        "steady_state_ms": 2.0,
+    }
+    assert client.knn_searches[:5] == client.knn_searches[5:]
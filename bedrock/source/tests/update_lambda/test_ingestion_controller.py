@@ -0,0 +1,254 @@
+import io
+import hashlib
+
+import pytest
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class FakeS3:
+    """
+    Objects in a dict, with ETags and a record of the downloaded keys.
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.downloads = []
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {
+                    "Contents": [
+                        {
+                            "Key": key,
+                            "ETag": f'"{hashlib.md5(body).hexdigest()}"',
+                            "Size": len(body),
+                        }
+                        for key, body in sorted(s3.objects.items())
+                        if key.startswith(Prefix)
+                    ]
+                }
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise NoSuchKey(Key)
+        self.downloads.append(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = Body
+
+
+class FakeBedrockAgent:
+    """
+    Knowledge base that indexes and deletes every document except the
+    failing ones.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.indexed = set()
+        self.ingested = []
+        self.deleted = []
+        self.ingestion_jobs = 0
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId):
+        self.ingestion_jobs += 1
+        return {"ingestionJob": {"ingestionJobId": "job-1"}}
+
+    def get_ingestion_job(self, **kwargs):
+        return {"ingestionJob": {"status": "COMPLETE"}}
+
+    def get_paginator(self, name):
+        class Paginator:
+            def paginate(self, knowledgeBaseId, dataSourceId):
+                yield {"documentDetails": []}
+
+        return Paginator()
+
+    def ingest_knowledge_base_documents(self, knowledgeBaseId, dataSourceId, documents):
+        for document in documents:
+            uri = document["content"]["s3"]["s3Location"]["uri"]
+            self.ingested.append((uri, "metadata" in document))
+
+    def delete_knowledge_base_documents(
+        self, knowledgeBaseId, dataSourceId, documentIdentifiers
+    ):
+        self.deleted.extend(
+            identifier["s3"]["uri"] for identifier in documentIdentifiers
+        )
+
+    def get_knowledge_base_documents(
+        self, knowledgeBaseId, dataSourceId, documentIdentifiers
+    ):
+        details = []
+        for identifier in documentIdentifiers:
+            uri = identifier["s3"]["uri"]
+            if uri in self.failing:
+                status = "FAILED"
+            elif uri in self.deleted:
+                status = "NOT_FOUND"
+            else:
+                status = "INDEXED"
+            details.append({"identifier": identifier, "status": status})
+        return {"documentDetails": details}
+
+
+@pytest.fixture
+def ingestion_controller(lambda_module):
+    return lambda_module("update-lambda", "ingestion_controller")
+
+
+def sync(ingestion_controller, agent, s3):
+    return ingestion_controller.sync_knowledge_base(
+        agent, s3, "kb-1", "ds-1", "assets", "data/", "manifests/ingestion.json"
+    )
+
+
+def test_first_run_syncs_everything_then_only_changes(ingestion_controller):
+    s3 = FakeS3(
+        {
+            "data/sop/pump.md": b"pump",
+            "data/sop/pump.md.metadata.json": b'{"metadataAttributes": {}}',
+            "data/sop/valve.md": b"valve",
+            "data/sop/tank.md": b"tank",
+        }
+    )
+    agent = FakeBedrockAgent()
+
+    first = sync(ingestion_controller, agent, s3)
+    assert first["mode"] == "full"
+    assert first["changes"] == {"added": 3, "changed": 0, "deleted": 0}
+    assert agent.ingestion_jobs == 1
+
+    s3.objects["data/sop/valve.md"] = b"valve v2"
+    s3.objects["data/sop/kettle.md"] = b"kettle"
+    del s3.objects["data/sop/tank.md"]
+    s3.downloads = []
+
+    second = sync(ingestion_controller, agent, s3)
+    assert second["mode"] == "incremental"
+    assert second["changes"] == {"added": 1, "changed": 1, "deleted": 1}
+    assert agent.ingestion_jobs == 1
+    assert sorted(agent.ingested) == [
+        ("s3://assets/data/sop/kettle.md", False),
+        ("s3://assets/data/sop/valve.md", False),
+    ]
+    assert agent.deleted == ["s3://assets/data/sop/tank.md"]
+    assert second["documents"]["data/sop/tank.md"]["status"] == "DELETED"
+    # Unchanged documents aren't downloaded to be hashed again.
+    assert "data/sop/pump.md" not in s3.downloads
+
+
+def test_failed_documents_are_retried_by_the_next_run(ingestion_controller):
+    s3 = FakeS3({"data/sop/pump.md": b"pump"})
+    sync(ingestion_controller, FakeBedrockAgent(), s3)
+    s3.objects["data/sop/valve.md"] = b"valve"
+    agent = FakeBedrockAgent(failing={"s3://assets/data/sop/valve.md"})
+
+    report = sync(ingestion_controller, agent, s3)
+    assert report["documents"]["data/sop/valve.md"]["status"] == "FAILED"
+
+    retry = sync(ingestion_controller, FakeBedrockAgent(), s3)
+    assert retry["changes"] == {"added": 1, "changed": 0, "deleted": 0}
+    assert retry["documents"]["data/sop/valve.md"]["status"] == "INDEXED"
+
+
+def test_metadata_changes_reingest_the_document(ingestion_controller):
+    s3 = FakeS3({"data/sop/pump.md": b"pump"})
+    sync(ingestion_controller, FakeBedrockAgent(), s3)
+    s3.objects["data/sop/pump.md.metadata.json"] = b'{"metadataAttributes": {}}'
+    agent = FakeBedrockAgent()
+
+    report = sync(ingestion_controller, agent, s3)
+
+    assert report["changes"]["changed"] == 1
+    assert agent.ingested == [("s3://assets/data/sop/pump.md", True)]
+
+
+def test_a_manifest_from_direct_ingestion_starts_a_full_sync(ingestion_controller):
+    s3 = FakeS3({"data/sop/pump.md": b"pump"})
+    sync(ingestion_controller, FakeBedrockAgent(), s3)
+    manifest = ingestion_controller.load_manifest(
+        s3, "assets", "manifests/ingestion.json"
+    )
+    ingestion_controller.save_manifest(
+        s3,
+        "assets",
+        "manifests/ingestion.json",
+        manifest["documents"],
+        ingestion_controller.DIRECT_INGESTION,
+    )
+    agent = FakeBedrockAgent()
+
+    report = sync(ingestion_controller, agent, s3)
+
+    assert report["mode"] == "full"
+    assert agent.ingestion_jobs == 1
+
+
+def test_failed_deletes_are_retried_by_the_next_run(ingestion_controller):
+    s3 = FakeS3({"data/sop/pump.md": b"pump", "data/sop/tank.md": b"tank"})
+    sync(ingestion_controller, FakeBedrockAgent(), s3)
+    del s3.objects["data/sop/tank.md"]
+
+    report = sync(
+        ingestion_controller,
+        FakeBedrockAgent(failing={"s3://assets/data/sop/tank.md"}),
+        s3,
+    )
+    assert report["documents"]["data/sop/tank.md"]["status"] == "FAILED"
+    manifest = ingestion_controller.load_manifest(
+        s3, "assets", "manifests/ingestion.json"
+    )
+    assert manifest["documents"]["data/sop/tank.md"]["pending_delete"]
+
+    agent = FakeBedrockAgent()
+    retry = sync(ingestion_controller, agent, s3)
+    assert retry["changes"] == {"added": 0, "changed": 0, "deleted": 1}
+    assert agent.deleted == ["s3://assets/data/sop/tank.md"]
+    manifest = ingestion_controller.load_manifest(
+        s3, "assets", "manifests/ingestion.json"
+    )
+    assert list(manifest["documents"]) == ["data/sop/pump.md"]
+
+
+def test_a_document_back_before_its_delete_finished_is_added(ingestion_controller):
+    s3 = FakeS3({"data/sop/pump.md": b"pump", "data/sop/tank.md": b"tank"})
+    sync(ingestion_controller, FakeBedrockAgent(), s3)
+    del s3.objects["data/sop/tank.md"]
+    sync(
+        ingestion_controller,
+        FakeBedrockAgent(failing={"s3://assets/data/sop/tank.md"}),
+        s3,
+    )
+    s3.objects["data/sop/tank.md"] = b"tank"
+    agent = FakeBedrockAgent()
+
+    report = sync(ingestion_controller, agent, s3)
+
+    assert report["changes"] == {"added": 1, "changed": 0, "deleted": 0}
+    assert agent.ingested == [("s3://assets/data/sop/tank.md", False)]
+
+
+def test_a_manifest_of_another_data_source_starts_a_full_sync(ingestion_controller):
+    s3 = FakeS3({"data/sop/pump.md": b"pump"})
+    sync(ingestion_controller, FakeBedrockAgent(), s3)
+    agent = FakeBedrockAgent()
+
+    report = ingestion_controller.sync_knowledge_base(
+        agent, s3, "kb-1", "ds-2", "assets", "data/", "manifests/ingestion.json"
+    )
+
+    assert report["mode"] == "full"
+    assert agent.ingestion_jobs == 1
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+UPDATE_ENVIRONMENT = {
+    "AWS_REGION": "us-east-1",
+    "KNOWLEDGEBASE_ID": "KB1234",
+    "KNOWLEDGEBASE_DATASOURCE_ID": "DS1234",
+    "BEDROCK_AGENT_ID": "AGENT1234",
+    "BEDROCK_AGENT_NAME": "brewery-agent",
+    "BEDROCK_AGENT_ALIAS": "live",
+    "BEDROCK_AGENT_RESOURCE_ROLE_ARN": "arn:aws:iam::123456789012:role/agent",
+    "LOG_LEVEL": "INFO",
+}
+
+
+@pytest.fixture
+def step_graph(lambda_module):
+    return lambda_module("update-lambda", "step_graph")
+
+
+@pytest.fixture
+def handler(lambda_module, monkeypatch):
+    for name, value in UPDATE_ENVIRONMENT.items():
+        monkeypatch.setenv(name, value)
+
+    return lambda_module("update-lambda", "lambda_handler")
+
+
+def test_independent_steps_run_concurrently(step_graph):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def step(result):
+        def run():
+            barrier.wait()
+            return result
+
+        return run
+
+    results, durations = step_graph.run_step_graph(
+        {
+            "sync": (step("synced"), []),
+            "prepare": (step("prepared"), []),
+            "alias": (lambda: "created", ["prepare"]),
+        }
+    )
+
+    assert results == {"sync": "synced", "prepare": "prepared", "alias": "created"}
+    assert set(durations) == {"sync", "prepare", "alias"}
+
+
+def test_dependents_of_a_failed_step_are_skipped(step_graph):
+    ran = []
+
+    def fail():
+        raise RuntimeError("agent failed")
+
+    with pytest.raises(step_graph.StepFailed) as error:
+        step_graph.run_step_graph(
+            {
+                "prepare": (fail, []),
+                "alias": (lambda: ran.append("alias"), ["prepare"]),
+                "sync": (lambda: ran.append("sync"), []),
+            }
+        )
+
+    assert ran == ["sync"]
+    assert error.value.errors["alias"] == "skipped"
+    assert "prepare: agent failed" in str(error.value)
+    assert set(error.value.durations) == {"prepare", "sync"}
+
+
+def test_unknown_dependencies_and_cycles_are_rejected(step_graph):
+    with pytest.raises(ValueError, match="unknown"):
+        step_graph.run_step_graph({"alias": (lambda: None, ["prepare"])})
+    with pytest.raises(ValueError, match="cycle"):
+        step_graph.run_step_graph(
+            {"a": (lambda: None, ["b"]), "b": (lambda: None, ["a"])}
+        )
+
+
+def test_update_returns_the_sync_results_as_data(handler, monkeypatch):
+    monkeypatch.setattr(
+        handler, "sync_documents", lambda: {"SyncMode": "incremental", "added": 2}
+    )
+    monkeypatch.setattr(handler, "publish_manifest", lambda: None)
+    monkeypatch.setattr(handler, "warm_up_index", lambda: {"WarmupMethod": "knn"})
+
+    response = handler.lambda_handler({"RequestType": "Update"}, None)
+
+    data = response["Data"]
+    assert data["SyncMode"] == "incremental"
+    assert data["added"] == 2
+    assert data["WarmupMethod"] == "knn"
+    assert "sync_documents_seconds" in data
+
+
+def test_failed_step_fails_the_custom_resource(handler, monkeypatch):
+    def sync_documents():
+        raise RuntimeError("ingestion job FAILED")
+
+    monkeypatch.setattr(handler, "sync_documents", sync_documents)
+    monkeypatch.setattr(handler, "publish_manifest", lambda: None)
+
+    with pytest.raises(handler.StepFailed, match="ingestion job FAILED"):
+        handler.lambda_handler({"RequestType": "Update"}, None)
+
+
+class FakeBedrockAgent:
+    def __init__(self):
+        self.deleted = []
+
+    def list_agent_aliases(self, agentId):
+        return {"agentAliasSummaries": [{"agentAliasId": "A1"}, {"agentAliasId": "A2"}]}
+
+    def delete_agent_alias(self, agentId, agentAliasId):
+        self.deleted.append(agentAliasId)
+
+    def delete_agent(self, agentId, skipResourceInUseCheck):
+        self.deleted.append(agentId)
+
+
+def test_delete_removes_the_aliases_before_the_agent(handler, monkeypatch):
+    bedrock_agent = FakeBedrockAgent()
+    monkeypatch.setattr(handler, "bedrock_agent", bedrock_agent)
+
+    response = handler.lambda_handler({"RequestType": "Delete"}, None)
+
+    assert sorted(bedrock_agent.deleted[:2]) == ["A1", "A2"]
+    assert bedrock_agent.deleted[2] == "AGENT1234"
+    assert "delete_agent_seconds" in response["Data"]
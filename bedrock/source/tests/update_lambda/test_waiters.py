@@ -0,0 +1,147 @@
+import random
+
+import pytest
+
+
+@pytest.fixture
+def waiters(lambda_module):
+    return lambda_module("update-lambda", "waiters")
+
+
+def states(*values):
+    """
+    Return a describe function returning values in turn.
+    """
+    values = iter(values)
+    return lambda: next(values)
+
+
+def test_status_waiter_returns_the_success_state(waiters):
+    clock = waiters.FakeClock()
+
+    state = waiters.wait_for_status(
+        states("CREATING", "UPDATING", "PREPARED"),
+        "agent",
+        success={"PREPARED"},
+        pending={"CREATING", "UPDATING"},
+        clock=clock,
+        rng=random.Random(0),
+    )
+
+    assert state == "PREPARED"
+    assert len(clock.sleeps) == 2
+
+
+def test_status_waiter_backs_off_up_to_the_max_delay(waiters):
+    clock = waiters.FakeClock()
+
+    waiters.wait_for_status(
+        states(*["IN_PROGRESS"] * 8, "COMPLETE"),
+        "ingestion job",
+        success={"COMPLETE"},
+        pending={"IN_PROGRESS"},
+        initial_delay=2.0,
+        max_delay=10.0,
+        clock=clock,
+    )
+
+    # Equal jitter: every delay is between half and all of its bound.
+    bounds = [2.0, 4.0, 8.0] + [10.0] * 5
+    assert all(
+        bound / 2 <= slept <= bound for slept, bound in zip(clock.sleeps, bounds)
+    )
+
+
+def test_status_waiter_raises_on_a_failed_state(waiters):
+    with pytest.raises(waiters.WaiterError) as error:
+        waiters.wait_for_status(
+            states("IN_PROGRESS", ("FAILED", "no documents")),
+            "ingestion job",
+            success={"COMPLETE"},
+            pending={"IN_PROGRESS"},
+            clock=waiters.FakeClock(),
+        )
+
+    assert error.value.state == "FAILED"
+    assert error.value.reason == "no documents"
+    assert not isinstance(error.value, waiters.WaiterTimeout)
+
+
+def test_status_waiter_times_out_at_the_deadline(waiters):
+    clock = waiters.FakeClock()
+
+    with pytest.raises(waiters.WaiterTimeout) as error:
+        waiters.wait_for_status(
+            lambda: "IN_PROGRESS",
+            "ingestion job",
+            success={"COMPLETE"},
+            pending={"IN_PROGRESS"},
+            timeout=60,
+            clock=clock,
+        )
+
+    assert error.value.state == "IN_PROGRESS"
+    # The last sleep is cut short at the deadline.
+    assert clock.time == 60
+
+
+def test_probe_waiter_needs_consecutive_passes(waiters):
+    results = iter([True, False, True, True])
+    clock = waiters.FakeClock()
+
+    waiters.wait_until(lambda: next(results), "index", consecutive=2, clock=clock)
+
+    assert len(clock.sleeps) == 3
+
+
+def test_probe_errors_count_as_not_ready(waiters):
+    attempts = []
+
+    def probe():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("index not found")
+        return True
+
+    waiters.wait_until(probe, "index", clock=waiters.FakeClock())
+
+    assert len(attempts) == 3
+
+
+def test_probe_waiter_reports_the_last_error(waiters):
+    def probe():
+        raise ConnectionError("index not found")
+
+    with pytest.raises(waiters.WaiterTimeout, match="index not found") as error:
+        waiters.wait_until(probe, "index", timeout=30, clock=waiters.FakeClock())
+
+    assert isinstance(error.value.reason, ConnectionError)
+
+
+class FakeBedrockAgent:
+    def __init__(self, *statuses):
+        self.statuses = iter(statuses)
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId):
+        return {"ingestionJob": {"ingestionJobId": "job-1"}}
+
+    def get_ingestion_job(self, knowledgeBaseId, dataSourceId, ingestionJobId):
+        status, reasons = next(self.statuses)
+        return {"ingestionJob": {"status": status, "failureReasons": reasons}}
+
+
+def test_failed_ingestion_job_raises(lambda_module):
+    trigger_data_source_sync = lambda_module(
+        "update-lambda", "trigger_data_source_sync"
+    )
+    waiters = lambda_module("update-lambda", "waiters")
+    bedrock_agent = FakeBedrockAgent(
+        ("STARTING", []), ("FAILED", ["Access denied", "Bucket not found"])
+    )
+
+    with pytest.raises(waiters.WaiterError) as error:
+        trigger_data_source_sync.trigger_data_source_sync(
+            bedrock_agent, "kb-1", "ds-1", clock=waiters.FakeClock()
+        )
+
+    assert error.value.reason == "Access denied; Bucket not found"
@@ -0,0 +1,121 @@
+import pytest
+
+
+@pytest.fixture
+def work_orders(lambda_module):
+    return lambda_module("workorder-lambda", "work_orders")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def repository(request, work_orders, tmp_path):
+    if request.param == "memory":
+        return work_orders.InMemoryWorkOrderRepository()
+
+    return work_orders.SQLiteWorkOrderRepository(str(tmp_path / "work_orders.db"))
+
+
+def test_repeated_submissions_return_the_first_order(repository):
+    first, created = repository.submit("Boiler 123", "Replace the gasket", "session-1")
+    again, created_again = repository.submit(
+        "boiler  123", " replace the GASKET ", "session-1"
+    )
+
+    assert created and not created_again
+    assert again["work_order_number"] == first["work_order_number"] == "00001"
+    assert repository.get("00001") == first
+
+
+def test_other_sessions_and_requests_get_new_orders(repository):
+    repository.submit("Boiler 123", "Replace the gasket", "session-1")
+
+    other_session, created = repository.submit(
+        "Boiler 123", "Replace the gasket", "session-2"
+    )
+    other_request, _ = repository.submit("Boiler 123", "Descale", "session-1")
+
+    assert created
+    assert [other_session["work_order_number"], other_request["work_order_number"]] == [
+        "00002",
+        "00003",
+    ]
+
+
+def test_orders_are_listed_by_equipment_status_and_time(repository, work_orders):
+    for request in ("Replace the gasket", "Descale", "Check the burner"):
+        repository.submit("Boiler 123", request)
+    repository.submit("Pump 7", "Prime")
+    repository.update_status("00002", work_orders.DONE)
+
+    by_equipment = repository.list_by_equipment("boiler 123")
+    assert [w["request_description"] for w in by_equipment] == [
+        "Check the burner",
+        "Descale",
+        "Replace the gasket",
+    ]
+    assert [w["work_order_number"] for w in repository.list_by_status("DONE")] == [
+        "00002"
+    ]
+    assert len(repository.list_by_status(work_orders.OPEN, limit=2)) == 2
+    everything = repository.list_submitted_between("2000-01-01", "9999-12-31")
+    assert len(everything) == 4
+
+
+def test_status_updates_check_the_expected_status(repository, work_orders):
+    repository.submit("Boiler 123", "Replace the gasket")
+
+    updated = repository.update_status(
+        "00001", work_orders.IN_PROGRESS, expected_status=work_orders.OPEN
+    )
+    assert updated["status"] == work_orders.IN_PROGRESS
+
+    with pytest.raises(work_orders.WorkOrderConflict, match="IN_PROGRESS, not OPEN"):
+        repository.update_status(
+            "00001", work_orders.DONE, expected_status=work_orders.OPEN
+        )
+    with pytest.raises(work_orders.WorkOrderNotFound):
+        repository.update_status("00099", work_orders.DONE)
+    with pytest.raises(ValueError, match="Unknown status"):
+        repository.update_status("00001", "CLOSED")
+
+
+def test_incomplete_repository_fails_on_creation(work_orders):
+    class GetOnly(work_orders.WorkOrderRepository):
+        def get(self, work_order_number):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+class FakeClient:
+    def __init__(self):
+        self.transactions = []
+
+    def transact_write_items(self, TransactItems):
+        self.transactions.append(TransactItems)
+
+
+def test_dynamodb_orders_without_equipment_skip_the_index(work_orders):
+    repository = work_orders.DynamoDBWorkOrderRepository.__new__(
+        work_orders.DynamoDBWorkOrderRepository
+    )
+    repository.table = type("Table", (), {"name": "work-orders"})()
+    repository.client = FakeClient()
+
+    for equipment_id in ("Boiler 123", "  "):
+        repository.insert(
+            work_orders.new_work_order(
+                "00001",
+                equipment_id,
+                "Replace the gasket",
+                None,
+                work_orders.idempotency_key(None, equipment_id, "Replace the gasket"),
+            )
+        )
+
+    items = [
+        transaction[1]["Put"]["Item"] for transaction in repository.client.transactions
+    ]
+    assert items[0]["equipment_key"] == "boiler 123"
+    # Secondary index keys can't be empty strings.
+    assert "equipment_key" not in items[1]
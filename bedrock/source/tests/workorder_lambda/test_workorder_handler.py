@@ -0,0 +1,66 @@
+import pytest
+
+
+@pytest.fixture
+def handler(lambda_module):
+    work_orders = lambda_module("workorder-lambda", "work_orders")
+    work_orders.set_repository(work_orders.InMemoryWorkOrderRepository())
+    return lambda_module("workorder-lambda", "index")
+
+
+def event(equipment_id, description="Replace the gasket", session_id="session-1"):
+    return {
+        "actionGroup": "workorders",
+        "apiPath": "/submitWorkOrder",
+        "httpMethod": "POST",
+        "messageVersion": "1.0",
+        "sessionId": session_id,
+        "inputText": "The boiler gasket is leaking",
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "properties": [
+                        {"name": "equipmentId", "value": equipment_id},
+                        {"name": "requestDescription", "value": description},
+                    ]
+                }
+            }
+        },
+    }
+
+
+def body(response):
+    return response["response"]["responseBody"]["application/json"]["body"]
+
+
+def test_retried_submissions_return_the_same_order(handler):
+    first = handler.lambda_handler(event("Boiler 123"), None)
+    retry = handler.lambda_handler(event("Boiler 123"), None)
+
+    assert first["response"]["httpStatusCode"] == 201
+    assert retry["response"]["httpStatusCode"] == 200
+    assert body(retry)["workOrderNumber"] == body(first)["workOrderNumber"]
+    assert body(retry)["duplicate"]
+    assert "already submitted" in body(retry)["message"]
+
+
+def test_missing_description_falls_back_to_the_user_input(handler):
+    request = event("Boiler 123", description="")
+
+    response = handler.lambda_handler(request, None)
+
+    assert body(response)["requestDescription"] == "The boiler gasket is leaking"
+
+
+@pytest.mark.parametrize("equipment_id", ["", "   "])
+def test_empty_equipment_id_is_rejected(handler, equipment_id):
+    response = handler.lambda_handler(event(equipment_id), None)
+
+    assert response["response"]["httpStatusCode"] == 400
+    assert "equipmentId" in body(response)
+
+
+def test_unknown_paths_are_not_found(handler):
+    response = handler.lambda_handler(dict(event("Boiler 123"), apiPath="/other"), None)
+
+    assert response["response"]["httpStatusCode"] == 404